@@ -0,0 +1,85 @@
+import sys
+import asyncio
+import functools
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterable, Optional, TypeVar
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from aws.automated_priority_response import ImportantEmailManager
+from aws.automated_response import AutomatedResponseManager
+from aws.dynamodb import MAX_POOL_CONNECTIONS
+from aws.email_automation_preferences import EmailAutomationPreferences
+
+# Bounded so a DynamoDB slowdown queues work instead of spawning threads without limit;
+# matches the HTTP pool so every worker can hold a connection
+AWS_EXECUTOR_MAX_WORKERS = MAX_POOL_CONNECTIONS
+AWS_CALL_TIMEOUT_SECONDS = 15.0
+
+_executor = ThreadPoolExecutor(max_workers=AWS_EXECUTOR_MAX_WORKERS, thread_name_prefix='convoia-aws')
+
+async def run_aws_call(func: Callable[..., Any], *args, timeout: Optional[float] = AWS_CALL_TIMEOUT_SECONDS, **kwargs) -> Any:
+    # Runs a blocking boto3 call off the event loop. On timeout the caller gets
+    # asyncio.TimeoutError; the worker thread finishes the call in the background.
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+    if timeout is None:
+        return await future
+    return await asyncio.wait_for(future, timeout)
+
+T = TypeVar('T')
+
+async def aiter_pages(pages: Iterable[T], timeout: Optional[float] = AWS_CALL_TIMEOUT_SECONDS) -> AsyncIterator[T]:
+    # Pulls each page of a blocking paginator on the aws executor, so the caller can
+    # work on one page while the loop stays free and the next request is not yet sent
+    iterator = iter(pages)
+    done = object()
+    while True:
+        page = await run_aws_call(next, iterator, done, timeout=timeout)
+        if page is done:
+            return
+        yield page
+
+def shutdown_aws_executor(wait: bool = True) -> None:
+    _executor.shutdown(wait=wait)
+
+class AsyncManager:
+    """
+    Awaitable wrapper around one of the sync aws managers. Every public method keeps its
+    name and arguments but returns a coroutine that runs on the bounded aws executor.
+    """
+
+    def __init__(self, manager: Any, timeout: Optional[float] = AWS_CALL_TIMEOUT_SECONDS):
+        self._manager = manager
+        self._timeout = timeout
+
+    @property
+    def sync(self) -> Any:
+        return self._manager
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._manager, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            return await run_aws_call(attr, *args, timeout=self._timeout, **kwargs)
+
+        return call
+
+class AsyncEmailAutomationPreferences(AsyncManager):
+
+    def __init__(self, timeout: Optional[float] = AWS_CALL_TIMEOUT_SECONDS):
+        super().__init__(EmailAutomationPreferences(), timeout)
+
+class AsyncImportantEmailManager(AsyncManager):
+
+    def __init__(self, timeout: Optional[float] = AWS_CALL_TIMEOUT_SECONDS):
+        super().__init__(ImportantEmailManager(), timeout)
+
+class AsyncAutomatedResponseManager(AsyncManager):
+
+    def __init__(self, timeout: Optional[float] = AWS_CALL_TIMEOUT_SECONDS):
+        super().__init__(AutomatedResponseManager(), timeout)
@@ -1,28 +1,34 @@
-import csv
 import sys
-import boto3
 from pathlib import Path
+from dataclasses import replace
 from botocore.exceptions import ClientError
 from typing import Dict, List, Optional
 
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
+from aws.dynamodb import get_table, iter_items, load_aws_credentials, query_pages, IMPORTANT_KEYWORDS_TABLE, IMPORTANT_SENDERS_TABLE, IMPORTANT_DESCRIPTIONS_TABLE
+from aws.user_config import (
+    DESCRIPTIONS,
+    KEYWORDS,
+    SENDERS,
+    UserConfig,
+    VersionConflictError,
+    get_user_config_store,
+    reads_compact,
+    writes_legacy,
+)
+from aws.write_behind import flush_write_behind, get_write_behind, overlay_partition
+
 class ImportantEmailManager:
     
     def __init__(self):
         pass
 
     def get_aws_credentials(self, credentials_path: str) -> Dict[str, str]:
-        with open(credentials_path, 'r') as file:
-            csv_reader = csv.DictReader(file)
-            credentials = next(csv_reader)
-            return {
-                'aws_access_key_id': credentials['Access key ID'],
-                'aws_secret_access_key': credentials['Secret access key']
-            }
+        return load_aws_credentials(credentials_path)
 
-    def write_to_dynamodb_table(self, dynamodb, table_name: str, items: list) -> bool:
-        table = dynamodb.Table(table_name)
+    def write_to_dynamodb_table(self, table_name: str, items: list) -> bool:
+        table = get_table(table_name)
         try:
             with table.batch_writer() as batch:
                 for item in items:
@@ -33,17 +39,23 @@ class ImportantEmailManager:
             print(f"Error writing to table {table_name}: {str(e)}")
             return False
 
+    def _read_compact(self, email_id: str, field_name: str) -> Optional[List[str]]:
+        # None means "read the legacy tables"; see aws/user_config.py for the storage modes
+        if not reads_compact():
+            return None
+        config = get_user_config_store().get(email_id)
+        if config is not None:
+            return getattr(config, field_name)
+        return None if writes_legacy() else []
+
+    def _write_compact(self, operation, email_id: str, *args) -> bool:
+        if not reads_compact():
+            return True
+        # While legacy is authoritative, users not yet migrated are skipped rather than half-written
+        return operation(email_id, *args, require_existing=writes_legacy()) or writes_legacy()
+
     def initialize_important_emails_data_for_new_user(self, email_id: str) -> bool:
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-
             # Initialize templates for each table
             important_keywords = [
                 { "email_id": email_id, "keyword": "urgent" },
@@ -82,11 +94,26 @@ class ImportantEmailManager:
                 { "email_id": email_id, "description": "no description" }
             ]
 
-            success = all([
-                self.write_to_dynamodb_table(dynamodb, 'Conovia_Important_Emails_Keywords', important_keywords),
-                self.write_to_dynamodb_table(dynamodb, 'Conovia_Important_Emails_Sender', important_senders),
-                self.write_to_dynamodb_table(dynamodb, 'Conovia_Important_Emails_Description', important_descriptions)
-            ])
+            results = []
+            if writes_legacy():
+                results.extend([
+                    self.write_to_dynamodb_table(IMPORTANT_KEYWORDS_TABLE, important_keywords),
+                    self.write_to_dynamodb_table(IMPORTANT_SENDERS_TABLE, important_senders),
+                    self.write_to_dynamodb_table(IMPORTANT_DESCRIPTIONS_TABLE, important_descriptions)
+                ])
+            if reads_compact():
+                # One item holding all three lists, merged like the legacy put_item overwrites
+                def add_defaults(config: UserConfig) -> UserConfig:
+                    return replace(
+                        config,
+                        keywords=sorted(set(config.keywords) | {item['keyword'] for item in important_keywords}),
+                        senders=sorted(set(config.senders) | {item['sender_email_id'] for item in important_senders}),
+                        descriptions=sorted(set(config.descriptions) | {item['description'] for item in important_descriptions})
+                    )
+                get_user_config_store().update(email_id, add_defaults)
+                results.append(True)
+
+            success = all(results)
 
             if success:
                 print(f"Successfully initialized important emails data for {email_id}")
@@ -106,24 +133,18 @@ class ImportantEmailManager:
 
     def delete_all_keywords_for_email(self, email_id: str) -> bool:
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-            table = dynamodb.Table('Conovia_Important_Emails_Keywords')
-            
-            # Query all keywords for this email_id
-            response = table.query(
-                KeyConditionExpression='email_id = :email',
-                ExpressionAttributeValues={':email': email_id}
-            )
+            if not self._write_compact(get_user_config_store().clear_field, email_id, KEYWORDS):
+                print(f"Error deleting keywords for {email_id}: the config item was not updated")
+                return False
+            if not writes_legacy():
+                print(f"Successfully deleted all keywords for {email_id}")
+                return True
+
+            table = get_table(IMPORTANT_KEYWORDS_TABLE)
             
-            # Delete each item
+            # Delete page by page, projecting only the sort key needed for each delete
             with table.batch_writer() as batch:
-                for item in response['Items']:
+                for item in iter_items(query_pages(IMPORTANT_KEYWORDS_TABLE, 'email_id', email_id, ('keyword',))):
                     batch.delete_item(
                         Key={
                             'email_id': email_id,
@@ -133,28 +154,26 @@ class ImportantEmailManager:
             
             print(f"Successfully deleted all keywords for {email_id}")
             return True
-        except ClientError as e:
+        except (ClientError, VersionConflictError) as e:
             print(f"Error deleting keywords for {email_id}: {str(e)}")
             return False
 
     def delete_all_senders_for_email(self, email_id: str) -> bool:
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-            table = dynamodb.Table('Conovia_Important_Emails_Sender')
-            
-            response = table.query(
-                KeyConditionExpression='email_id = :email',
-                ExpressionAttributeValues={':email': email_id}
-            )
+            if not self._write_compact(get_user_config_store().clear_field, email_id, SENDERS):
+                print(f"Error deleting senders for {email_id}: the config item was not updated")
+                return False
+            if not writes_legacy():
+                print(f"Successfully deleted all senders for {email_id}")
+                return True
+
+            # Queued sender writes must land first or they would reappear after the delete
+            flush_write_behind()
+            table = get_table(IMPORTANT_SENDERS_TABLE)
             
+            # Delete page by page, projecting only the sort key needed for each delete
             with table.batch_writer() as batch:
-                for item in response['Items']:
+                for item in iter_items(query_pages(IMPORTANT_SENDERS_TABLE, 'email_id', email_id, ('sender_email_id',))):
                     batch.delete_item(
                         Key={
                             'email_id': email_id,
@@ -164,28 +183,24 @@ class ImportantEmailManager:
             
             print(f"Successfully deleted all senders for {email_id}")
             return True
-        except ClientError as e:
+        except (ClientError, VersionConflictError) as e:
             print(f"Error deleting senders for {email_id}: {str(e)}")
             return False
 
     def delete_all_descriptions_for_email(self,email_id: str) -> bool:
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-            table = dynamodb.Table('Conovia_Important_Emails_Description')
-            
-            response = table.query(
-                KeyConditionExpression='email_id = :email',
-                ExpressionAttributeValues={':email': email_id}
-            )
+            if not self._write_compact(get_user_config_store().clear_field, email_id, DESCRIPTIONS):
+                print(f"Error deleting descriptions for {email_id}: the config item was not updated")
+                return False
+            if not writes_legacy():
+                print(f"Successfully deleted all descriptions for {email_id}")
+                return True
+
+            table = get_table(IMPORTANT_DESCRIPTIONS_TABLE)
             
+            # Delete page by page, projecting only the sort key needed for each delete
             with table.batch_writer() as batch:
-                for item in response['Items']:
+                for item in iter_items(query_pages(IMPORTANT_DESCRIPTIONS_TABLE, 'email_id', email_id, ('description',))):
                     batch.delete_item(
                         Key={
                             'email_id': email_id,
@@ -195,7 +210,7 @@ class ImportantEmailManager:
             
             print(f"Successfully deleted all descriptions for {email_id}")
             return True
-        except ClientError as e:
+        except (ClientError, VersionConflictError) as e:
             print(f"Error deleting descriptions for {email_id}: {str(e)}")
             return False
 
@@ -203,21 +218,13 @@ class ImportantEmailManager:
 
     def get_keywords_for_email(self, email_id: str) -> Optional[List[str]]:
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-            table = dynamodb.Table('Conovia_Important_Emails_Keywords')
-            
-            response = table.query(
-                KeyConditionExpression='email_id = :email',
-                ExpressionAttributeValues={':email': email_id}
-            )
-            
-            keywords = [item['keyword'] for item in response['Items']]
+            compact = self._read_compact(email_id, KEYWORDS)
+            if compact is not None:
+                print(f"Retrieved {len(compact)} keywords for {email_id}")
+                return compact
+
+            pages = query_pages(IMPORTANT_KEYWORDS_TABLE, 'email_id', email_id, ('keyword',))
+            keywords = [item['keyword'] for item in iter_items(pages)]
             print(f"Retrieved {len(keywords)} keywords for {email_id}")
             return keywords
         except ClientError as e:
@@ -226,21 +233,14 @@ class ImportantEmailManager:
 
     def get_senders_for_email(self, email_id: str) -> Optional[List[str]]:
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-            table = dynamodb.Table('Conovia_Important_Emails_Sender')
-            
-            response = table.query(
-                KeyConditionExpression='email_id = :email',
-                ExpressionAttributeValues={':email': email_id}
-            )
-            
-            senders = [item['sender_email_id'] for item in response['Items']]
+            compact = self._read_compact(email_id, SENDERS)
+            if compact is not None:
+                print(f"Retrieved {len(compact)} senders for {email_id}")
+                return compact
+
+            pages = query_pages(IMPORTANT_SENDERS_TABLE, 'email_id', email_id, ('sender_email_id',))
+            items = overlay_partition(IMPORTANT_SENDERS_TABLE, email_id, list(iter_items(pages)))
+            senders = [item['sender_email_id'] for item in items]
             print(f"Retrieved {len(senders)} senders for {email_id}")
             return senders
         except ClientError as e:
@@ -249,21 +249,13 @@ class ImportantEmailManager:
 
     def get_descriptions_for_email(self, email_id: str) -> Optional[List[str]]:
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-            table = dynamodb.Table('Conovia_Important_Emails_Description')
-            
-            response = table.query(
-                KeyConditionExpression='email_id = :email',
-                ExpressionAttributeValues={':email': email_id}
-            )
-            
-            descriptions = [item['description'] for item in response['Items']]
+            compact = self._read_compact(email_id, DESCRIPTIONS)
+            if compact is not None:
+                print(f"Retrieved {len(compact)} descriptions for {email_id}")
+                return compact
+
+            pages = query_pages(IMPORTANT_DESCRIPTIONS_TABLE, 'email_id', email_id, ('description',))
+            descriptions = [item['description'] for item in iter_items(pages)]
             print(f"Retrieved {len(descriptions)} descriptions for {email_id}")
             return descriptions
         except ClientError as e:
@@ -274,14 +266,14 @@ class ImportantEmailManager:
 
     def delete_specific_keyword(self, email_id: str, keyword: str) -> bool:
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-            table = dynamodb.Table('Conovia_Important_Emails_Keywords')
+            if not self._write_compact(get_user_config_store().remove_values, email_id, KEYWORDS, [keyword]):
+                print(f"Error deleting keyword for {email_id}: the config item was not updated")
+                return False
+            if not writes_legacy():
+                print(f"Successfully deleted keyword '{keyword}' for {email_id}")
+                return True
+
+            table = get_table(IMPORTANT_KEYWORDS_TABLE)
             
             table.delete_item(
                 Key={
@@ -292,44 +284,45 @@ class ImportantEmailManager:
             
             print(f"Successfully deleted keyword '{keyword}' for {email_id}")
             return True
-        except ClientError as e:
+        except (ClientError, VersionConflictError) as e:
             print(f"Error deleting keyword for {email_id}: {str(e)}")
             return False
 
     def delete_specific_sender(self, email_id: str, sender: str) -> bool:
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-            table = dynamodb.Table('Conovia_Important_Emails_Sender')
-            
-            table.delete_item(
-                Key={
-                    'email_id': email_id,
-                    'sender_email_id': sender
-                }
-            )
+            if not self._write_compact(get_user_config_store().remove_values, email_id, SENDERS, [sender]):
+                print(f"Error deleting sender for {email_id}: the config item was not updated")
+                return False
+            if not writes_legacy():
+                print(f"Successfully deleted sender '{sender}' for {email_id}")
+                return True
+
+            key = {
+                'email_id': email_id,
+                'sender_email_id': sender
+            }
+            queue = get_write_behind()
+            if queue is not None:
+                queue.delete(IMPORTANT_SENDERS_TABLE, key)
+            else:
+                get_table(IMPORTANT_SENDERS_TABLE).delete_item(Key=key)
             
             print(f"Successfully deleted sender '{sender}' for {email_id}")
             return True
-        except ClientError as e:
+        except (ClientError, VersionConflictError) as e:
             print(f"Error deleting sender for {email_id}: {str(e)}")
             return False
 
     def delete_specific_description(self, email_id: str, description: str) -> bool:
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-            table = dynamodb.Table('Conovia_Important_Emails_Description')
+            if not self._write_compact(get_user_config_store().remove_values, email_id, DESCRIPTIONS, [description]):
+                print(f"Error deleting description for {email_id}: the config item was not updated")
+                return False
+            if not writes_legacy():
+                print(f"Successfully deleted description for {email_id}")
+                return True
+
+            table = get_table(IMPORTANT_DESCRIPTIONS_TABLE)
             
             table.delete_item(
                 Key={
@@ -340,7 +333,7 @@ class ImportantEmailManager:
             
             print(f"Successfully deleted description for {email_id}")
             return True
-        except ClientError as e:
+        except (ClientError, VersionConflictError) as e:
             print(f"Error deleting description for {email_id}: {str(e)}")
             return False
 
@@ -348,14 +341,14 @@ class ImportantEmailManager:
 
     def add_keyword(self, email_id: str, keyword: str) -> bool:
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-            table = dynamodb.Table('Conovia_Important_Emails_Keywords')
+            if not self._write_compact(get_user_config_store().add_values, email_id, KEYWORDS, [keyword]):
+                print(f"Error adding keyword for {email_id}: the config item was not updated")
+                return False
+            if not writes_legacy():
+                print(f"Successfully added keyword '{keyword}' for {email_id}")
+                return True
+
+            table = get_table(IMPORTANT_KEYWORDS_TABLE)
             
             table.put_item(
                 Item={
@@ -366,44 +359,45 @@ class ImportantEmailManager:
             
             print(f"Successfully added keyword '{keyword}' for {email_id}")
             return True
-        except ClientError as e:
+        except (ClientError, VersionConflictError) as e:
             print(f"Error adding keyword for {email_id}: {str(e)}")
             return False
 
     def add_sender(self, email_id: str, sender: str) -> bool:
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-            table = dynamodb.Table('Conovia_Important_Emails_Sender')
-            
-            table.put_item(
-                Item={
-                    'email_id': email_id,
-                    'sender_email_id': sender
-                }
-            )
+            if not self._write_compact(get_user_config_store().add_values, email_id, SENDERS, [sender]):
+                print(f"Error adding sender for {email_id}: the config item was not updated")
+                return False
+            if not writes_legacy():
+                print(f"Successfully added sender '{sender}' for {email_id}")
+                return True
+
+            item = {
+                'email_id': email_id,
+                'sender_email_id': sender
+            }
+            queue = get_write_behind()
+            if queue is not None:
+                queue.put(IMPORTANT_SENDERS_TABLE, item)
+            else:
+                get_table(IMPORTANT_SENDERS_TABLE).put_item(Item=item)
             
             print(f"Successfully added sender '{sender}' for {email_id}")
             return True
-        except ClientError as e:
+        except (ClientError, VersionConflictError) as e:
             print(f"Error adding sender for {email_id}: {str(e)}")
             return False
 
     def add_description(self, email_id: str, description: str) -> bool:
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-            table = dynamodb.Table('Conovia_Important_Emails_Description')
+            if not self._write_compact(get_user_config_store().add_values, email_id, DESCRIPTIONS, [description]):
+                print(f"Error adding description for {email_id}: the config item was not updated")
+                return False
+            if not writes_legacy():
+                print(f"Successfully added description for {email_id}")
+                return True
+
+            table = get_table(IMPORTANT_DESCRIPTIONS_TABLE)
             
             table.put_item(
                 Item={
@@ -414,7 +408,7 @@ class ImportantEmailManager:
             
             print(f"Successfully added description for {email_id}")
             return True
-        except ClientError as e:
+        except (ClientError, VersionConflictError) as e:
             print(f"Error adding description for {email_id}: {str(e)}")
             return False
 
@@ -1,39 +1,41 @@
-import csv
 import sys
-import boto3
 from pathlib import Path
+from dataclasses import replace
 from botocore.exceptions import ClientError
 from typing import Dict, List, Optional
 
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
+from aws.dynamodb import get_table, iter_items, load_aws_credentials, query_pages, AUTOMATED_RESPONSES_TABLE
+from aws.user_config import CATEGORIES, UserConfig, VersionConflictError, get_user_config_store, reads_compact, writes_legacy
+from aws.write_behind import flush_write_behind, get_write_behind, overlay_partition
+
 class AutomatedResponseManager:
     def __init__(self):
         pass
 
     def get_aws_credentials(self, credentials_path: str) -> Dict[str, str]:
+        return load_aws_credentials(credentials_path)
 
-        with open(credentials_path, 'r') as file:
-            csv_reader = csv.DictReader(file)
-            credentials = next(csv_reader)
-            return {
-                'aws_access_key_id': credentials['Access key ID'],
-                'aws_secret_access_key': credentials['Secret access key']
-            }
+    def _read_compact_categories(self, email_id: str) -> Optional[Dict[str, Dict[str, str]]]:
+        # None means "read the legacy table"; see aws/user_config.py for the storage modes
+        if not reads_compact():
+            return None
+        config = get_user_config_store().get(email_id)
+        if config is not None:
+            return config.categories
+        return None if writes_legacy() else {}
+
+    def _write_compact(self, operation, email_id: str, *args) -> bool:
+        if not reads_compact():
+            return True
+        # While legacy is authoritative, users not yet migrated are skipped rather than half-written
+        return operation(email_id, *args, require_existing=writes_legacy()) or writes_legacy()
 
     def initialize_automated_responses_for_new_user(self, email_id: str) -> bool:
 
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',  # Replace with your region
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-
-            table = dynamodb.Table('Convoia_Automated_Responses')
+            table = get_table(AUTOMATED_RESPONSES_TABLE)
             
             # Default templates
             templates = [
@@ -82,40 +84,42 @@ class AutomatedResponseManager:
             ]
             
             # Use batch writer to add all items efficiently
-            with table.batch_writer() as batch:
-                for template in templates:
-                    batch.put_item(Item=template)
+            if writes_legacy():
+                with table.batch_writer() as batch:
+                    for template in templates:
+                        batch.put_item(Item=template)
+
+            if reads_compact():
+                # Single item with a category map, merged like the legacy put_item overwrites
+                def add_templates(config: UserConfig) -> UserConfig:
+                    categories = dict(config.categories)
+                    for template in templates:
+                        categories[template['category']] = {
+                            'description': template['description'],
+                            'response_directive': template['response_directive']
+                        }
+                    return replace(config, categories=categories)
+                get_user_config_store().update(email_id, add_templates)
             
             print(f"Successfully initialized automated responses for {email_id}")
             return True
             
-        except ClientError as e:
+        except (ClientError, VersionConflictError) as e:
             print(f"Error initializing automated responses for {email_id}: {str(e)}")
             return False
 
     def get_categories_for_email(self, email_id: str) -> Optional[List[str]]:
 
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',  # Replace with your region
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
+            compact = self._read_compact_categories(email_id)
+            if compact is not None:
+                categories = list(compact)
+                print(f"Retrieved {len(categories)} categories for {email_id}")
+                return categories
 
-            table = dynamodb.Table('Convoia_Automated_Responses')
-            
-            response = table.query(
-                KeyConditionExpression='email_id = :email',
-                ExpressionAttributeValues={
-                    ':email': email_id
-                },
-                ProjectionExpression='category'
-            )
-            
-            categories = [item['category'] for item in response['Items']]
+            pages = query_pages(AUTOMATED_RESPONSES_TABLE, 'email_id', email_id, ('category',))
+            items = overlay_partition(AUTOMATED_RESPONSES_TABLE, email_id, list(iter_items(pages)))
+            categories = [item['category'] for item in items]
             print(f"Retrieved {len(categories)} categories for {email_id}")
             return categories
             
@@ -126,28 +130,20 @@ class AutomatedResponseManager:
     def delete_all_entries_for_email(self, email_id: str) -> bool:
 
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',  # Replace with your region
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
+            if not self._write_compact(get_user_config_store().clear_field, email_id, CATEGORIES):
+                print(f"Error deleting entries for {email_id}: the config item was not updated")
+                return False
+            if not writes_legacy():
+                print(f"Successfully deleted all entries for {email_id}")
+                return True
 
-            table = dynamodb.Table('Convoia_Automated_Responses')
-            
-            # First, query all items for this email_id
-            response = table.query(
-                KeyConditionExpression='email_id = :email',
-                ExpressionAttributeValues={
-                    ':email': email_id
-                }
-            )
+            # Queued category writes must land first or they would reappear after the delete
+            flush_write_behind()
+            table = get_table(AUTOMATED_RESPONSES_TABLE)
             
-            # Delete each item
+            # Delete page by page, projecting only the sort key needed for each delete
             with table.batch_writer() as batch:
-                for item in response['Items']:
+                for item in iter_items(query_pages(AUTOMATED_RESPONSES_TABLE, 'email_id', email_id, ('category',))):
                     batch.delete_item(
                         Key={
                             'email_id': email_id,
@@ -158,35 +154,34 @@ class AutomatedResponseManager:
             print(f"Successfully deleted all entries for {email_id}")
             return True
             
-        except ClientError as e:
+        except (ClientError, VersionConflictError) as e:
             print(f"Error deleting entries for {email_id}: {str(e)}")
             return False
 
     def delete_specific_category(self, email_id: str, category: str) -> bool:
 
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',  # Replace with your region
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
+            if not self._write_compact(get_user_config_store().remove_category, email_id, category):
+                print(f"Error deleting category '{category}' for {email_id}: the config item was not updated")
+                return False
+            if not writes_legacy():
+                print(f"Successfully deleted category '{category}' for {email_id}")
+                return True
 
-            table = dynamodb.Table('Convoia_Automated_Responses')
-            
-            table.delete_item(
-                Key={
-                    'email_id': email_id,
-                    'category': category
-                }
-            )
+            key = {
+                'email_id': email_id,
+                'category': category
+            }
+            queue = get_write_behind()
+            if queue is not None:
+                queue.delete(AUTOMATED_RESPONSES_TABLE, key)
+            else:
+                get_table(AUTOMATED_RESPONSES_TABLE).delete_item(Key=key)
             
             print(f"Successfully deleted category '{category}' for {email_id}")
             return True
             
-        except ClientError as e:
+        except (ClientError, VersionConflictError) as e:
             print(f"Error deleting category '{category}' for {email_id}: {str(e)}")
             return False
 
@@ -199,17 +194,13 @@ class AutomatedResponseManager:
     ) -> bool:
 
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',  # Replace with your region
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
+            if not self._write_compact(get_user_config_store().set_category, email_id, category, description, response_directive):
+                print(f"Error adding response for {email_id}: the config item was not updated")
+                return False
+            if not writes_legacy():
+                print(f"Successfully added new response for {email_id} in category '{category}'")
+                return True
 
-            table = dynamodb.Table('Convoia_Automated_Responses')
-            
             item = {
                 'email_id': email_id,
                 'category': category,
@@ -217,42 +208,34 @@ class AutomatedResponseManager:
                 'response_directive': response_directive
             }
             
-            table.put_item(Item=item)
+            queue = get_write_behind()
+            if queue is not None:
+                queue.put(AUTOMATED_RESPONSES_TABLE, item)
+            else:
+                get_table(AUTOMATED_RESPONSES_TABLE).put_item(Item=item)
             
             print(f"Successfully added new response for {email_id} in category '{category}'")
             return True
             
-        except ClientError as e:
+        except (ClientError, VersionConflictError) as e:
             print(f"Error adding response for {email_id}: {str(e)}")
             return False
 
     def get_categories_with_descriptions(self, email_id: str) -> Optional[Dict[str, str]]:
 
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',  # Replace with your region
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
+            compact = self._read_compact_categories(email_id)
+            if compact is not None:
+                categories_dict = {category: entry.get('description', '') for category, entry in compact.items()}
+                print(f"Retrieved {len(categories_dict)} category-description pairs for {email_id}")
+                return categories_dict
 
-            table = dynamodb.Table('Convoia_Automated_Responses')
-            
-            # Query all items for this email_id, projecting only category and description
-            response = table.query(
-                KeyConditionExpression='email_id = :email',
-                ExpressionAttributeValues={
-                    ':email': email_id
-                },
-                ProjectionExpression='category, description'
-            )
+            pages = query_pages(AUTOMATED_RESPONSES_TABLE, 'email_id', email_id, ('category', 'description'))
             
             # Create dictionary mapping categories to descriptions
             categories_dict = {
                 item['category']: item['description'] 
-                for item in response['Items']
+                for item in overlay_partition(AUTOMATED_RESPONSES_TABLE, email_id, list(iter_items(pages)))
             }
             
             print(f"Retrieved {len(categories_dict)} category-description pairs for {email_id}")
@@ -265,30 +248,18 @@ class AutomatedResponseManager:
     def get_categories_with_response_directive(self, email_id: str) -> Optional[Dict[str, str]]:
 
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',  # Replace with your region
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
+            compact = self._read_compact_categories(email_id)
+            if compact is not None:
+                response_dict = {category: entry.get('response_directive', '') for category, entry in compact.items()}
+                print(f"Retrieved {len(response_dict)} category-response directive pairs for {email_id}")
+                return response_dict
 
-            table = dynamodb.Table('Convoia_Automated_Responses')
-            
-            # Query all items for this email_id, projecting only category and response_directive
-            response = table.query(
-                KeyConditionExpression='email_id = :email',
-                ExpressionAttributeValues={
-                    ':email': email_id
-                },
-                ProjectionExpression='category, response_directive'
-            )
+            pages = query_pages(AUTOMATED_RESPONSES_TABLE, 'email_id', email_id, ('category', 'response_directive'))
             
             # Create dictionary mapping categories to response directives
             response_dict = {
                 item['category']: item['response_directive'] 
-                for item in response['Items']
+                for item in overlay_partition(AUTOMATED_RESPONSES_TABLE, email_id, list(iter_items(pages)))
             }
             
             print(f"Retrieved {len(response_dict)} category-response directive pairs for {email_id}")
@@ -0,0 +1,163 @@
+import csv
+import time
+import codecs
+import threading
+import boto3
+from botocore.config import Config
+from boto3.dynamodb.conditions import Key
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+AWS_CREDENTIALS_PATH = 'credentials/credential_aws.csv'
+AWS_REGION = 'us-west-2'
+
+# Sized for the hourly tick fanning out over many users at once
+MAX_POOL_CONNECTIONS = 50
+
+# BatchGetItem accepts at most 100 keys per request
+BATCH_GET_LIMIT = 100
+
+USERS_TABLE = 'ConvoiaUsers'
+TRACKING_TABLE = 'Convoia_Tracking_Automated_Responses'
+AUTOMATED_RESPONSES_TABLE = 'Convoia_Automated_Responses'
+IMPORTANT_KEYWORDS_TABLE = 'Conovia_Important_Emails_Keywords'
+IMPORTANT_SENDERS_TABLE = 'Conovia_Important_Emails_Sender'
+IMPORTANT_DESCRIPTIONS_TABLE = 'Conovia_Important_Emails_Description'
+
+# One item per user holding the keyword/sender/description sets and category map
+USER_CONFIG_TABLE = 'Convoia_User_Automation_Config'
+
+CONVOIA_TABLES = (
+    USERS_TABLE,
+    TRACKING_TABLE,
+    AUTOMATED_RESPONSES_TABLE,
+    IMPORTANT_KEYWORDS_TABLE,
+    IMPORTANT_SENDERS_TABLE,
+    IMPORTANT_DESCRIPTIONS_TABLE,
+)
+
+_lock = threading.RLock()
+_credentials: Dict[str, Dict[str, str]] = {}
+_resource = None
+_tables: Dict[str, object] = {}
+
+def load_aws_credentials(credentials_path: str = AWS_CREDENTIALS_PATH) -> Dict[str, str]:
+    # Credentials are read from disk once per path and reused for the process lifetime
+    cached = _credentials.get(credentials_path)
+    if cached is not None:
+        return cached
+
+    with _lock:
+        if credentials_path not in _credentials:
+            aws_credentials = {}
+            with codecs.open(credentials_path, 'r', encoding='utf-8-sig') as file:
+                reader = csv.DictReader(file)
+                for row in reader:
+                    aws_credentials['aws_access_key_id'] = row.get('Access key ID', '').strip()
+                    aws_credentials['aws_secret_access_key'] = row.get('Secret access key', '').strip()
+                    break
+            _credentials[credentials_path] = aws_credentials
+        return _credentials[credentials_path]
+
+def get_dynamodb():
+    # One resource (and one pooled, keep-alive HTTP client underneath) for the whole process.
+    # Only stateless table actions are used on it, so sharing across threads is safe.
+    global _resource
+    if _resource is not None:
+        return _resource
+
+    with _lock:
+        if _resource is None:
+            credentials = load_aws_credentials(AWS_CREDENTIALS_PATH)
+            _resource = boto3.resource(
+                'dynamodb',
+                region_name=AWS_REGION,
+                aws_access_key_id=credentials['aws_access_key_id'],
+                aws_secret_access_key=credentials['aws_secret_access_key'],
+                config=Config(
+                    max_pool_connections=MAX_POOL_CONNECTIONS,
+                    tcp_keepalive=True,
+                    retries={'max_attempts': 5, 'mode': 'standard'}
+                )
+            )
+        return _resource
+
+def get_table(table_name: str):
+    table = _tables.get(table_name)
+    if table is not None:
+        return table
+
+    dynamodb = get_dynamodb()
+    with _lock:
+        if table_name not in _tables:
+            _tables[table_name] = dynamodb.Table(table_name)
+        return _tables[table_name]
+
+def get_client():
+    return get_dynamodb().meta.client
+
+def batch_get_items(table_name: str, keys: List[dict], projection: Optional[str] = None, max_retries: int = 5) -> List[dict]:
+    # BatchGetItem in chunks of 100, retrying UnprocessedKeys with exponential backoff
+    dynamodb = get_dynamodb()
+    items = []
+    for start in range(0, len(keys), BATCH_GET_LIMIT):
+        request = {'Keys': keys[start:start + BATCH_GET_LIMIT]}
+        if projection:
+            request['ProjectionExpression'] = projection
+        request_items = {table_name: request}
+
+        for attempt in range(max_retries + 1):
+            response = dynamodb.batch_get_item(RequestItems=request_items)
+            items.extend(response.get('Responses', {}).get(table_name, []))
+            request_items = response.get('UnprocessedKeys') or {}
+            if not request_items:
+                break
+            time.sleep(min(0.05 * (2 ** attempt), 1.0))
+        else:
+            unprocessed = len(request_items.get(table_name, {}).get('Keys', []))
+            print(f"Gave up on {unprocessed} unprocessed keys from {table_name}")
+    return items
+
+def projection_kwargs(attributes: Iterable[str]) -> Dict[str, Any]:
+    # Placeholders keep reserved words (e.g. `description`) usable in the projection
+    names = {f"#p{i}": name for i, name in enumerate(attributes)}
+    return {
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names
+    }
+
+def iter_pages(operation: Callable[..., dict], attributes: Optional[Iterable[str]] = None, **kwargs) -> Iterator[List[dict]]:
+    # Yields one page of items per request, so callers can start on page one while the
+    # rest is still unread; `operation` is a bound table.query or table.scan
+    if attributes:
+        projection = projection_kwargs(attributes)
+        projection['ExpressionAttributeNames'].update(kwargs.pop('ExpressionAttributeNames', {}))
+        kwargs.update(projection)
+    while True:
+        response = operation(**kwargs)
+        yield response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def query_pages(table_name: str, key_name: str, key_value: Any, attributes: Optional[Iterable[str]] = None, **kwargs) -> Iterator[List[dict]]:
+    return iter_pages(
+        get_table(table_name).query,
+        attributes,
+        KeyConditionExpression=Key(key_name).eq(key_value),
+        **kwargs
+    )
+
+def scan_pages(table_name: str, attributes: Optional[Iterable[str]] = None, **kwargs) -> Iterator[List[dict]]:
+    return iter_pages(get_table(table_name).scan, attributes, **kwargs)
+
+def iter_items(pages: Iterable[List[dict]]) -> Iterator[dict]:
+    for page in pages:
+        yield from page
+
+def reset_dynamodb(resource: Optional[object] = None) -> None:
+    # Drops cached handles; passing a resource installs it in place of the AWS one
+    global _resource
+    with _lock:
+        _resource = resource
+        _tables.clear()
+        _credentials.clear()
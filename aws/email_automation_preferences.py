@@ -1,40 +1,37 @@
-import csv
 import sys
-import boto3
 from pathlib import Path
+from boto3.dynamodb.conditions import Attr
 from botocore.exceptions import ClientError
 from typing import Dict, List, Optional
 
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
+from aws.dynamodb import get_table, iter_items, load_aws_credentials, query_pages, scan_pages, TRACKING_TABLE
+from aws.write_behind import flush_write_behind, get_write_behind, overlay_item, pending_values
+
+# Sparse GSI per flag: the marker attribute only exists while the flag is on,
+# so each index contains exactly the users with that feature enabled
+ACTIVE_MARKER = 'Y'
+ACTIVE_FLAG_INDEXES = {
+    'automated_response': ('active_automated_response', 'active-automated-response-index'),
+    'important_emails': ('active_important_emails', 'active-important-emails-index'),
+    'follow_up_emails': ('active_follow_up_emails', 'active-follow-up-emails-index'),
+}
+
 class EmailAutomationPreferences:
     
     def __init__(self):
         pass
 
     def get_aws_credentials(self, credentials_path: str) -> Dict[str, str]:
-
-        with open(credentials_path, 'r') as file:
-            csv_reader = csv.DictReader(file)
-            credentials = next(csv_reader)
-            return {
-                'aws_access_key_id': credentials['Access key ID'],
-                'aws_secret_access_key': credentials['Secret access key']
-            }
+        return load_aws_credentials(credentials_path)
 
     def initialize_automated_response_tracking_database(self, email_id: str) -> bool:
 
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',  # Replace with your region
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-
-            table = dynamodb.Table('Convoia_Tracking_Automated_Responses')
+            # Queued flag updates must land before the row is reset
+            flush_write_behind()
+            table = get_table(TRACKING_TABLE)
             
             # Default templates
             new_user = [
@@ -55,16 +52,7 @@ class EmailAutomationPreferences:
 
     def get_automated_response_status(self, email_id: str) -> Optional[Dict]:
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-            
-            table = dynamodb.Table('Convoia_Tracking_Automated_Responses')
+            table = get_table(TRACKING_TABLE)
             
             # Get the item for the email_id
             response = table.get_item(
@@ -72,13 +60,14 @@ class EmailAutomationPreferences:
                     'email_id': email_id
                 }
             )
+            item = overlay_item(TRACKING_TABLE, {'email_id': email_id}, response.get('Item'))
             
-            if 'Item' in response:
+            if item is not None:
                 print(f"Status for {email_id}:")
-                print(f"Automated Response: {response['Item']['automated_response']}")
-                print(f"Important Emails: {response['Item']['important_emails']}")
-                print(f"Follow-up Emails: {response['Item']['follow_up_emails']}")
-                return response['Item']
+                print(f"Automated Response: {item.get('automated_response')}")
+                print(f"Important Emails: {item.get('important_emails')}")
+                print(f"Follow-up Emails: {item.get('follow_up_emails')}")
+                return item
             else:
                 print(f"No status found for {email_id}")
                 return None
@@ -89,26 +78,36 @@ class EmailAutomationPreferences:
 
     def update_category_status(self, email_id: str, category_name: str, value: bool) -> bool:
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-            
-            table = dynamodb.Table('Convoia_Tracking_Automated_Responses')
-            
-            # Update the specific category
+            # Update the specific category and keep its sparse index marker in sync
+            set_attributes = {category_name: value}
+            remove_attributes = ()
+            marker = ACTIVE_FLAG_INDEXES.get(category_name)
+            if marker and value:
+                set_attributes[marker[0]] = ACTIVE_MARKER
+            elif marker:
+                remove_attributes = (marker[0],)
+
+            queue = get_write_behind()
+            if queue is not None:
+                queue.update(TRACKING_TABLE, {'email_id': email_id}, set_attributes, remove_attributes)
+                print(f"Queued update of {category_name} to {value} for {email_id}")
+                return True
+
+            table = get_table(TRACKING_TABLE)
+            update_expression = f"set {category_name} = :val"
+            expression_values = {':val': value}
+            if marker and value:
+                update_expression += f", {marker[0]} = :active"
+                expression_values[':active'] = ACTIVE_MARKER
+            elif marker:
+                update_expression += f" remove {marker[0]}"
+
             response = table.update_item(
                 Key={
                     'email_id': email_id
                 },
-                UpdateExpression=f"set {category_name} = :val",
-                ExpressionAttributeValues={
-                    ':val': value
-                },
+                UpdateExpression=update_expression,
+                ExpressionAttributeValues=expression_values,
                 ReturnValues="UPDATED_NEW"
             )
             
@@ -118,86 +117,48 @@ class EmailAutomationPreferences:
         except ClientError as e:
             print(f"Error updating {category_name} for {email_id}: {str(e)}")
             return False
+
+    def _query_active_flag(self, category_name: str) -> List[str]:
+        marker_attribute, index_name = ACTIVE_FLAG_INDEXES[category_name]
+
+        try:
+            # Only items with the flag on carry the marker, so the index holds just the matches
+            pages = query_pages(TRACKING_TABLE, marker_attribute, ACTIVE_MARKER, ('email_id',), IndexName=index_name)
+            return self._with_pending_flags(category_name, [item['email_id'] for item in iter_items(pages)])
+
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('ValidationException', 'ResourceNotFoundException'):
+                raise
+            print(f"Index {index_name} unavailable, falling back to scan: {str(e)}")
+
+        # Filtered scan until the sparse index has been created (see aws/migrations.py)
+        pages = scan_pages(TRACKING_TABLE, ('email_id',), FilterExpression=Attr(category_name).eq(True))
+        return self._with_pending_flags(category_name, [item['email_id'] for item in iter_items(pages)])
+
+    def _with_pending_flags(self, category_name: str, email_ids: List[str]) -> List[str]:
+        # Flag changes still in the write-behind queue win over what DynamoDB returned
+        pending = pending_values(TRACKING_TABLE, category_name)
+        if not pending:
+            return email_ids
+        found = set(email_ids)
+        active = [email_id for email_id in email_ids if pending.get(email_id, True)]
+        return active + [email_id for email_id, value in pending.items() if value and email_id not in found]
         
     def get_email_ids_with_active_automated_response(self) -> List[str]:
 
-            try:
-                credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-                
-                dynamodb = boto3.resource(
-                    'dynamodb',
-                    region_name='us-west-2',
-                    aws_access_key_id=credentials['aws_access_key_id'],
-                    aws_secret_access_key=credentials['aws_secret_access_key']
-                )
-                
-                table = dynamodb.Table('Convoia_Tracking_Automated_Responses')
-                
-                # Scan the table for items where automated_response is True
-                response = table.scan(
-                    FilterExpression='automated_response = :val',
-                    ExpressionAttributeValues={
-                        ':val': True
-                    }
-                )
-                
-                # Extract email_ids from the response
-                email_ids = [item['email_id'] for item in response.get('Items', [])]
-                
-                # Handle pagination if necessary
-                while 'LastEvaluatedKey' in response:
-                    response = table.scan(
-                        FilterExpression='automated_response = :val',
-                        ExpressionAttributeValues={
-                            ':val': True
-                        },
-                        ExclusiveStartKey=response['LastEvaluatedKey']
-                    )
-                    email_ids.extend([item['email_id'] for item in response.get('Items', [])])
-                
-                print(f"Found {len(email_ids)} emails with automated responses enabled")
-                return email_ids
-                
-            except ClientError as e:
-                print(f"Error retrieving automated response emails: {str(e)}")
-                return []
+        try:
+            email_ids = self._query_active_flag('automated_response')
+            print(f"Found {len(email_ids)} emails with automated responses enabled")
+            return email_ids
+            
+        except ClientError as e:
+            print(f"Error retrieving automated response emails: {str(e)}")
+            return []
 
     def get_email_ids_with_active_important_flag(self) -> List[str]:
 
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-            
-            table = dynamodb.Table('Convoia_Tracking_Automated_Responses')
-            
-            # Scan the table for items where important_emails is True
-            response = table.scan(
-                FilterExpression='important_emails = :val',
-                ExpressionAttributeValues={
-                    ':val': True
-                }
-            )
-            
-            # Extract email_ids from the response
-            email_ids = [item['email_id'] for item in response.get('Items', [])]
-            
-            # Handle pagination if necessary
-            while 'LastEvaluatedKey' in response:
-                response = table.scan(
-                    FilterExpression='important_emails = :val',
-                    ExpressionAttributeValues={
-                        ':val': True
-                    },
-                    ExclusiveStartKey=response['LastEvaluatedKey']
-                )
-                email_ids.extend([item['email_id'] for item in response.get('Items', [])])
-            
+            email_ids = self._query_active_flag('important_emails')
             print(f"Found {len(email_ids)} important emails")
             return email_ids
             
@@ -208,39 +169,7 @@ class EmailAutomationPreferences:
     def get_email_ids_with_active_follow_up(self) -> List[str]:
 
         try:
-            credentials = self.get_aws_credentials("credentials/credential_aws.csv")
-            
-            dynamodb = boto3.resource(
-                'dynamodb',
-                region_name='us-west-2',
-                aws_access_key_id=credentials['aws_access_key_id'],
-                aws_secret_access_key=credentials['aws_secret_access_key']
-            )
-            
-            table = dynamodb.Table('Convoia_Tracking_Automated_Responses')
-            
-            # Scan the table for items where follow_up_emails is True
-            response = table.scan(
-                FilterExpression='follow_up_emails = :val',
-                ExpressionAttributeValues={
-                    ':val': True
-                }
-            )
-            
-            # Extract email_ids from the response
-            email_ids = [item['email_id'] for item in response.get('Items', [])]
-            
-            # Handle pagination if necessary
-            while 'LastEvaluatedKey' in response:
-                response = table.scan(
-                    FilterExpression='follow_up_emails = :val',
-                    ExpressionAttributeValues={
-                        ':val': True
-                    },
-                    ExclusiveStartKey=response['LastEvaluatedKey']
-                )
-                email_ids.extend([item['email_id'] for item in response.get('Items', [])])
-            
+            email_ids = self._query_active_flag('follow_up_emails')
             print(f"Found {len(email_ids)} emails requiring follow-up")
             return email_ids
             
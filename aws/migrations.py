@@ -0,0 +1,272 @@
+import sys
+import time
+import argparse
+from pathlib import Path
+from dataclasses import replace
+from collections import defaultdict
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+from typing import Dict, List, Optional
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from aws.dynamodb import (
+    get_client,
+    get_table,
+    AUTOMATED_RESPONSES_TABLE,
+    IMPORTANT_DESCRIPTIONS_TABLE,
+    IMPORTANT_KEYWORDS_TABLE,
+    IMPORTANT_SENDERS_TABLE,
+    TRACKING_TABLE,
+    USER_CONFIG_TABLE,
+    USERS_TABLE,
+)
+from aws.email_automation_preferences import ACTIVE_FLAG_INDEXES, ACTIVE_MARKER
+from aws.user_config import UserConfig, VersionConflictError, get_user_config_store
+from aws.users import USERS_EMAIL_INDEX
+
+# Default capacity for new indexes on PROVISIONED tables (ignored for PAY_PER_REQUEST)
+INDEX_READ_CAPACITY = 5
+INDEX_WRITE_CAPACITY = 5
+
+def _describe_table(table_name: str) -> dict:
+    return get_client().describe_table(TableName=table_name)['Table']
+
+def _find_index(description: dict, index_name: str):
+    for index in description.get('GlobalSecondaryIndexes', []):
+        if index['IndexName'] == index_name:
+            return index
+    return None
+
+def create_global_index(table_name: str, index_name: str, hash_key: str, projection: dict, range_key: Optional[str] = None) -> bool:
+    description = _describe_table(table_name)
+    if _find_index(description, index_name):
+        print(f"Index {index_name} already exists on {table_name}")
+        return True
+
+    key_schema = [{'AttributeName': hash_key, 'KeyType': 'HASH'}]
+    attribute_definitions = [{'AttributeName': hash_key, 'AttributeType': 'S'}]
+    if range_key:
+        key_schema.append({'AttributeName': range_key, 'KeyType': 'RANGE'})
+        attribute_definitions.append({'AttributeName': range_key, 'AttributeType': 'S'})
+
+    create = {
+        'IndexName': index_name,
+        'KeySchema': key_schema,
+        'Projection': projection
+    }
+    billing_mode = description.get('BillingModeSummary', {}).get('BillingMode', 'PROVISIONED')
+    if billing_mode == 'PROVISIONED':
+        create['ProvisionedThroughput'] = {
+            'ReadCapacityUnits': INDEX_READ_CAPACITY,
+            'WriteCapacityUnits': INDEX_WRITE_CAPACITY
+        }
+
+    try:
+        get_client().update_table(
+            TableName=table_name,
+            AttributeDefinitions=attribute_definitions,
+            GlobalSecondaryIndexUpdates=[{'Create': create}]
+        )
+        print(f"Creating index {index_name} on {table_name}")
+        return True
+    except ClientError as e:
+        print(f"Error creating index {index_name} on {table_name}: {str(e)}")
+        return False
+
+def wait_for_index(table_name: str, index_name: str, poll_seconds: int = 15, timeout_seconds: int = 3600) -> bool:
+    # DynamoDB backfills existing items into a new GSI on its own; this only reports progress
+    deadline = time.time() + timeout_seconds
+    while time.time() < deadline:
+        index = _find_index(_describe_table(table_name), index_name)
+        if index is None:
+            print(f"Index {index_name} not found on {table_name}")
+            return False
+
+        status = index.get('IndexStatus')
+        if status == 'ACTIVE':
+            print(f"Index {index_name} on {table_name} is ACTIVE ({index.get('ItemCount', 0)} items)")
+            return True
+
+        backfilling = index.get('Backfilling', False)
+        print(f"Index {index_name} on {table_name}: {status}{' (backfilling)' if backfilling else ''}")
+        time.sleep(poll_seconds)
+
+    print(f"Timed out waiting for index {index_name} on {table_name}")
+    return False
+
+def count_users_missing_email() -> int:
+    # Items without a string `email` are never projected into the index
+    table = get_table(USERS_TABLE)
+    scan_kwargs = {
+        'FilterExpression': Attr('email').not_exists() | ~Attr('email').attribute_type('S'),
+        'Select': 'COUNT'
+    }
+    missing = 0
+    while True:
+        response = table.scan(**scan_kwargs)
+        missing += response.get('Count', 0)
+        if 'LastEvaluatedKey' not in response:
+            return missing
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def migrate_users_email_index(wait: bool = True) -> bool:
+    description = _describe_table(USERS_TABLE)
+    key_schema = {key['KeyType']: key['AttributeName'] for key in description.get('KeySchema', [])}
+    if key_schema.get('HASH') == 'email' and 'RANGE' not in key_schema:
+        print(f"{USERS_TABLE} is already keyed on email, lookups use get_item")
+        return True
+
+    if not create_global_index(USERS_TABLE, USERS_EMAIL_INDEX, 'email', {'ProjectionType': 'ALL'}):
+        return False
+    if wait and not wait_for_index(USERS_TABLE, USERS_EMAIL_INDEX):
+        return False
+
+    missing = count_users_missing_email()
+    if missing:
+        print(f"Warning: {missing} users have no string email attribute and are not in {USERS_EMAIL_INDEX}")
+    return True
+
+def backfill_active_flag_markers() -> int:
+    # Sets the sparse marker on every item whose flag is already on, and clears stale ones
+    table = get_table(TRACKING_TABLE)
+    scan_kwargs = {}
+    updated = 0
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            set_markers = []
+            remove_markers = []
+            for category_name, (marker_attribute, _) in ACTIVE_FLAG_INDEXES.items():
+                active = item.get(category_name) is True
+                if active and item.get(marker_attribute) != ACTIVE_MARKER:
+                    set_markers.append(marker_attribute)
+                elif not active and marker_attribute in item:
+                    remove_markers.append(marker_attribute)
+
+            if not set_markers and not remove_markers:
+                continue
+
+            update_expression = ""
+            update_kwargs = {}
+            if set_markers:
+                update_expression = "set " + ", ".join(f"{marker} = :active" for marker in set_markers)
+                update_kwargs['ExpressionAttributeValues'] = {':active': ACTIVE_MARKER}
+            if remove_markers:
+                update_expression += " remove " + ", ".join(remove_markers)
+
+            table.update_item(
+                Key={'email_id': item['email_id']},
+                UpdateExpression=update_expression.strip(),
+                **update_kwargs
+            )
+            updated += 1
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    print(f"Backfilled active flag markers on {updated} items in {TRACKING_TABLE}")
+    return updated
+
+def migrate_active_flag_indexes(wait: bool = True) -> bool:
+    backfill_active_flag_markers()
+
+    # DynamoDB builds one new GSI per table at a time, so each must finish before the next
+    for marker_attribute, index_name in ACTIVE_FLAG_INDEXES.values():
+        created = create_global_index(
+            TRACKING_TABLE,
+            index_name,
+            marker_attribute,
+            {'ProjectionType': 'KEYS_ONLY'},
+            range_key='email_id'
+        )
+        if not created or not wait_for_index(TRACKING_TABLE, index_name):
+            return False
+    return True
+
+def ensure_user_config_table() -> bool:
+    try:
+        _describe_table(USER_CONFIG_TABLE)
+        return True
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ResourceNotFoundException':
+            raise
+
+    print(f"Creating table {USER_CONFIG_TABLE}")
+    get_client().create_table(
+        TableName=USER_CONFIG_TABLE,
+        KeySchema=[{'AttributeName': 'email_id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'email_id', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    get_client().get_waiter('table_exists').wait(TableName=USER_CONFIG_TABLE)
+    return True
+
+def _scan_grouped(table_name: str) -> Dict[str, List[dict]]:
+    table = get_table(table_name)
+    grouped = defaultdict(list)
+    scan_kwargs = {}
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            grouped[item['email_id']].append(item)
+        if 'LastEvaluatedKey' not in response:
+            return grouped
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def migrate_compact_config(wait: bool = True) -> bool:
+    # Copies the four one-item-per-value tables into one item per user. Values are merged
+    # into any existing compact item, so it is safe to re-run while dual writes are on.
+    ensure_user_config_table()
+
+    keywords = _scan_grouped(IMPORTANT_KEYWORDS_TABLE)
+    senders = _scan_grouped(IMPORTANT_SENDERS_TABLE)
+    descriptions = _scan_grouped(IMPORTANT_DESCRIPTIONS_TABLE)
+    categories = _scan_grouped(AUTOMATED_RESPONSES_TABLE)
+    email_ids = sorted(set(keywords) | set(senders) | set(descriptions) | set(categories))
+    print(f"Migrating automation config for {len(email_ids)} users to {USER_CONFIG_TABLE}")
+
+    store = get_user_config_store()
+    failed = 0
+    for email_id in email_ids:
+        def merge_legacy(config: UserConfig) -> UserConfig:
+            merged_categories = {
+                item['category']: {
+                    'description': item.get('description', ''),
+                    'response_directive': item.get('response_directive', '')
+                }
+                for item in categories.get(email_id, [])
+            }
+            merged_categories.update(config.categories)
+            return replace(
+                config,
+                keywords=sorted(set(config.keywords) | {item['keyword'] for item in keywords.get(email_id, [])}),
+                senders=sorted(set(config.senders) | {item['sender_email_id'] for item in senders.get(email_id, [])}),
+                descriptions=sorted(set(config.descriptions) | {item['description'] for item in descriptions.get(email_id, [])}),
+                categories=merged_categories
+            )
+
+        try:
+            store.update(email_id, merge_legacy)
+        except (ClientError, VersionConflictError) as e:
+            failed += 1
+            print(f"Error migrating config for {email_id}: {str(e)}")
+
+    print(f"Migrated {len(email_ids) - failed}/{len(email_ids)} users")
+    return failed == 0
+
+MIGRATIONS = {
+    'users-email-index': migrate_users_email_index,
+    'active-flag-indexes': migrate_active_flag_indexes,
+    'compact-config': migrate_compact_config,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convoia DynamoDB schema migrations")
+    parser.add_argument('migration', choices=sorted(MIGRATIONS))
+    parser.add_argument('--no-wait', action='store_true', help="Return once the index build has started (single-index migrations)")
+    args = parser.parse_args()
+
+    success = MIGRATIONS[args.migration](wait=not args.no_wait)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,172 @@
+import sys
+import time
+from pathlib import Path
+from types import MappingProxyType
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from aws.dynamodb import (
+    batch_get_items,
+    query_pages,
+    AUTOMATED_RESPONSES_TABLE,
+    IMPORTANT_DESCRIPTIONS_TABLE,
+    IMPORTANT_KEYWORDS_TABLE,
+    IMPORTANT_SENDERS_TABLE,
+    TRACKING_TABLE,
+    USERS_TABLE,
+)
+from aws.user_config import get_user_config_store, reads_compact
+from aws.users import UserLookup, UserRecord, get_user_cache, get_user_lookup, get_user_record
+from aws.write_behind import overlay_item, overlay_partition
+
+SNAPSHOT_MAX_WORKERS = 16
+
+@dataclass(frozen=True)
+class UserAutomationConfig:
+    email_id: str
+    keywords: Tuple[str, ...] = ()
+    senders: Tuple[str, ...] = ()
+    descriptions: Tuple[str, ...] = ()
+    categories: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    response_directives: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    flags: Mapping[str, bool] = field(default_factory=lambda: MappingProxyType({}))
+
+class TickSnapshot:
+    """
+    Read-only view of every active user's automation config, loaded once at the start of
+    a scheduler tick so per-email checks never go back to DynamoDB.
+    """
+
+    def __init__(self, configs: Dict[str, UserAutomationConfig], loaded_at: Optional[float] = None):
+        self._configs = MappingProxyType(dict(configs))
+        self.loaded_at = loaded_at if loaded_at is not None else time.time()
+
+    def __contains__(self, email_id: str) -> bool:
+        return email_id in self._configs
+
+    def __len__(self) -> int:
+        return len(self._configs)
+
+    def get(self, email_id: str) -> Optional[UserAutomationConfig]:
+        return self._configs.get(email_id)
+
+    @classmethod
+    def load(
+        cls,
+        priority_email_ids: Iterable[str] = (),
+        automated_email_ids: Iterable[str] = (),
+        max_workers: int = SNAPSHOT_MAX_WORKERS
+    ) -> "TickSnapshot":
+        priority_email_ids = list(dict.fromkeys(priority_email_ids))
+        automated_email_ids = list(dict.fromkeys(automated_email_ids))
+        all_email_ids = list(dict.fromkeys(priority_email_ids + automated_email_ids))
+        start = time.perf_counter()
+
+        # Priority users need keyword/sender/description lists, automated users need categories
+        jobs = []
+        for email_id in priority_email_ids:
+            jobs.append((email_id, 'keywords', IMPORTANT_KEYWORDS_TABLE, ('keyword',)))
+            jobs.append((email_id, 'senders', IMPORTANT_SENDERS_TABLE, ('sender_email_id',)))
+            jobs.append((email_id, 'descriptions', IMPORTANT_DESCRIPTIONS_TABLE, ('description',)))
+        for email_id in automated_email_ids:
+            jobs.append((email_id, 'categories', AUTOMATED_RESPONSES_TABLE, ('category', 'description', 'response_directive')))
+
+        results: Dict[str, Dict[str, list]] = {email_id: {} for email_id in all_email_ids}
+
+        # Compact layout: one BatchGetItem row per user replaces the per-table queries
+        if reads_compact():
+            compact_configs = get_user_config_store().get_many(all_email_ids)
+            for email_id, config in compact_configs.items():
+                results[email_id] = {
+                    'keywords': [{'keyword': value} for value in config.keywords],
+                    'senders': [{'sender_email_id': value} for value in config.senders],
+                    'descriptions': [{'description': value} for value in config.descriptions],
+                    'categories': [dict(entry, category=name) for name, entry in config.categories.items()]
+                }
+            jobs = [job for job in jobs if job[0] not in compact_configs]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            flags_future = executor.submit(_batch_get_flags, all_email_ids)
+            futures = [
+                (email_id, name, executor.submit(_query_user_items, table_name, email_id, projection))
+                for email_id, name, table_name, projection in jobs
+            ]
+            _prime_user_records(all_email_ids, executor)
+            unloaded = set()
+            for email_id, name, future in futures:
+                try:
+                    results[email_id][name] = future.result()
+                except ClientError as e:
+                    # Left out of the snapshot, so the monitors read this user per call
+                    print(f"Error loading {name} for {email_id}, leaving it out of the snapshot: {str(e)}")
+                    unloaded.add(email_id)
+            flags = flags_future.result()
+
+        configs = {}
+        for email_id in all_email_ids:
+            if email_id in unloaded:
+                continue
+            loaded = results[email_id]
+            category_items = loaded.get('categories', [])
+            configs[email_id] = UserAutomationConfig(
+                email_id=email_id,
+                keywords=tuple(item['keyword'] for item in loaded.get('keywords', [])),
+                senders=tuple(item['sender_email_id'] for item in loaded.get('senders', [])),
+                descriptions=tuple(item['description'] for item in loaded.get('descriptions', [])),
+                categories=MappingProxyType({
+                    item['category']: item.get('description', '') for item in category_items
+                }),
+                response_directives=MappingProxyType({
+                    item['category']: item.get('response_directive', '') for item in category_items
+                }),
+                flags=MappingProxyType(flags.get(email_id, {}))
+            )
+
+        print(f"Loaded tick snapshot for {len(configs)} users ({len(jobs)} queries) in {time.perf_counter() - start:.2f}s")
+        return cls(configs)
+
+def _query_user_items(table_name: str, email_id: str, attributes: Tuple[str, ...]) -> List[dict]:
+    # Raises ClientError; a partial list would pass for a user with nothing configured
+    items = []
+    for page in query_pages(table_name, 'email_id', email_id, attributes):
+        items.extend(page)
+    return overlay_partition(table_name, email_id, items)
+
+def _batch_get_flags(email_ids: List[str]) -> Dict[str, Dict[str, bool]]:
+    try:
+        items = batch_get_items(TRACKING_TABLE, [{'email_id': email_id} for email_id in email_ids])
+    except ClientError as e:
+        print(f"Error loading automation flags: {str(e)}")
+        return {}
+    found = {item['email_id']: item for item in items}
+    items = [
+        item for item in (
+            overlay_item(TRACKING_TABLE, {'email_id': email_id}, found.get(email_id))
+            for email_id in email_ids
+        )
+        if item is not None
+    ]
+    return {
+        item['email_id']: {
+            name: bool(item.get(name, False))
+            for name in ('automated_response', 'important_emails', 'follow_up_emails')
+        }
+        for item in items
+    }
+
+def _prime_user_records(email_ids: List[str], executor: ThreadPoolExecutor) -> None:
+    # Warm the user cache so fetch_tokens inside the tick is a cache hit
+    cache = get_user_cache()
+    lookup = get_user_lookup()
+    try:
+        if lookup.strategy == UserLookup.GET_ITEM:
+            for item in batch_get_items(USERS_TABLE, [{'email': email_id} for email_id in email_ids]):
+                cache.put(UserRecord.from_item(item))
+        else:
+            list(executor.map(get_user_record, email_ids))
+    except ClientError as e:
+        print(f"Error priming user records: {str(e)}")
@@ -0,0 +1,221 @@
+import os
+import sys
+from pathlib import Path
+from dataclasses import dataclass, field
+from botocore.exceptions import ClientError
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from aws.dynamodb import batch_get_items, get_table, USER_CONFIG_TABLE
+
+# Storage layout for per-user keyword/sender/description/category lists:
+#   legacy  - one item per value in the four legacy tables (default)
+#   dual    - legacy stays authoritative, compact items are written alongside and read first
+#   compact - only the single-item layout in Convoia_User_Automation_Config
+CONFIG_STORAGE_ENV = 'CONVOIA_CONFIG_STORAGE'
+STORAGE_LEGACY = 'legacy'
+STORAGE_DUAL = 'dual'
+STORAGE_COMPACT = 'compact'
+
+KEYWORDS = 'keywords'
+SENDERS = 'senders'
+DESCRIPTIONS = 'descriptions'
+CATEGORIES = 'categories'
+SET_FIELDS = (KEYWORDS, SENDERS, DESCRIPTIONS)
+
+def get_config_storage_mode() -> str:
+    mode = os.getenv(CONFIG_STORAGE_ENV, STORAGE_LEGACY).strip().lower()
+    if mode not in (STORAGE_LEGACY, STORAGE_DUAL, STORAGE_COMPACT):
+        print(f"Unknown {CONFIG_STORAGE_ENV}={mode}, using {STORAGE_LEGACY}")
+        return STORAGE_LEGACY
+    return mode
+
+def reads_compact() -> bool:
+    return get_config_storage_mode() != STORAGE_LEGACY
+
+def writes_legacy() -> bool:
+    return get_config_storage_mode() != STORAGE_COMPACT
+
+class VersionConflictError(Exception):
+    pass
+
+@dataclass(frozen=True)
+class UserConfig:
+    email_id: str
+    keywords: List[str] = field(default_factory=list)
+    senders: List[str] = field(default_factory=list)
+    descriptions: List[str] = field(default_factory=list)
+    categories: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    version: int = 0
+
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> "UserConfig":
+        return cls(
+            email_id=item['email_id'],
+            keywords=sorted(item.get(KEYWORDS, ())),
+            senders=sorted(item.get(SENDERS, ())),
+            descriptions=sorted(item.get(DESCRIPTIONS, ())),
+            categories={name: dict(value) for name, value in item.get(CATEGORIES, {}).items()},
+            version=int(item.get('version', 0))
+        )
+
+    def to_item(self) -> Dict[str, Any]:
+        # DynamoDB rejects empty string sets, so empty lists are left out entirely
+        item = {'email_id': self.email_id, 'version': self.version, CATEGORIES: self.categories}
+        for name in SET_FIELDS:
+            values = {value for value in getattr(self, name) if value}
+            if values:
+                item[name] = values
+        return item
+
+class UserConfigStore:
+    """
+    Single-item-per-user storage for automation config. Set and map members are changed
+    with atomic ADD/DELETE/SET/REMOVE expressions; whole-item rewrites are guarded by the
+    item's version number.
+    """
+
+    def __init__(self, table_name: str = USER_CONFIG_TABLE):
+        self.table_name = table_name
+
+    @property
+    def table(self):
+        return get_table(self.table_name)
+
+    def get(self, email_id: str) -> Optional[UserConfig]:
+        response = self.table.get_item(Key={'email_id': email_id}, ConsistentRead=True)
+        item = response.get('Item')
+        return UserConfig.from_item(item) if item else None
+
+    def get_many(self, email_ids: Iterable[str]) -> Dict[str, UserConfig]:
+        keys = [{'email_id': email_id} for email_id in dict.fromkeys(email_ids)]
+        return {
+            item['email_id']: UserConfig.from_item(item)
+            for item in batch_get_items(self.table_name, keys)
+        }
+
+    def put(self, config: UserConfig, expected_version: Optional[int] = None) -> UserConfig:
+        # expected_version=None creates the item; otherwise it must still be at that version
+        new_config = UserConfig(
+            email_id=config.email_id,
+            keywords=config.keywords,
+            senders=config.senders,
+            descriptions=config.descriptions,
+            categories=config.categories,
+            version=(expected_version or 0) + 1
+        )
+        if expected_version is None:
+            condition = {'ConditionExpression': 'attribute_not_exists(email_id)'}
+        else:
+            condition = {
+                'ConditionExpression': 'version = :expected',
+                'ExpressionAttributeValues': {':expected': expected_version}
+            }
+
+        try:
+            self.table.put_item(Item=new_config.to_item(), **condition)
+            return new_config
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+                raise VersionConflictError(f"Config for {config.email_id} changed concurrently")
+            raise
+
+    def update(self, email_id: str, mutate: Callable[[UserConfig], UserConfig], max_attempts: int = 5) -> UserConfig:
+        # Optimistic read-modify-write for changes that cannot be one atomic expression
+        for _ in range(max_attempts):
+            current = self.get(email_id)
+            base = current or UserConfig(email_id=email_id)
+            try:
+                return self.put(mutate(base), None if current is None else current.version)
+            except VersionConflictError:
+                continue
+        raise VersionConflictError(f"Gave up updating config for {email_id} after {max_attempts} attempts")
+
+    def _update_expression(self, email_id: str, expression: str, names: Dict[str, str], values: Dict[str, Any], require_existing: bool) -> bool:
+        values = dict(values)
+        values[':one'] = 1
+        # Each clause may appear only once, so fold the version bump into an existing ADD
+        if expression.startswith("ADD "):
+            expression = f"{expression}, version :one"
+        else:
+            expression = f"{expression} ADD version :one"
+        kwargs = {
+            'Key': {'email_id': email_id},
+            'UpdateExpression': expression,
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': values
+        }
+        if require_existing:
+            # In dual mode an unmigrated user must not get a partial compact item
+            kwargs['ConditionExpression'] = 'attribute_exists(email_id)'
+
+        try:
+            self.table.update_item(**kwargs)
+            return True
+        except ClientError as e:
+            if require_existing and e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+                return False
+            raise
+
+    def add_values(self, email_id: str, field_name: str, values: Iterable[str], require_existing: bool = False) -> bool:
+        return self._update_expression(
+            email_id, "ADD #field :values", {'#field': field_name}, {':values': set(values)}, require_existing
+        )
+
+    def remove_values(self, email_id: str, field_name: str, values: Iterable[str], require_existing: bool = False) -> bool:
+        return self._update_expression(
+            email_id, "DELETE #field :values", {'#field': field_name}, {':values': set(values)}, require_existing
+        )
+
+    def clear_field(self, email_id: str, field_name: str, require_existing: bool = False) -> bool:
+        if field_name == CATEGORIES:
+            return self._update_expression(
+                email_id, "SET #field = :empty", {'#field': field_name}, {':empty': {}}, require_existing
+            )
+        return self._update_expression(email_id, "REMOVE #field", {'#field': field_name}, {}, require_existing)
+
+    def set_category(self, email_id: str, category: str, description: str, response_directive: str, require_existing: bool = False) -> bool:
+        entry = {'description': description, 'response_directive': response_directive}
+        try:
+            return self._update_expression(
+                email_id,
+                "SET #categories.#category = :entry",
+                {'#categories': CATEGORIES, '#category': category},
+                {':entry': entry},
+                require_existing
+            )
+        except ClientError as e:
+            # The categories map itself is missing; fall back to a versioned rewrite
+            if e.response.get('Error', {}).get('Code') != 'ValidationException':
+                raise
+            if require_existing and self.get(email_id) is None:
+                return False
+
+            def add_category(config: UserConfig) -> UserConfig:
+                categories = dict(config.categories)
+                categories[category] = entry
+                return UserConfig(config.email_id, config.keywords, config.senders, config.descriptions, categories, config.version)
+
+            self.update(email_id, add_category)
+            return True
+
+    def remove_category(self, email_id: str, category: str, require_existing: bool = False) -> bool:
+        try:
+            return self._update_expression(
+                email_id,
+                "REMOVE #categories.#category",
+                {'#categories': CATEGORIES, '#category': category},
+                {},
+                require_existing
+            )
+        except ClientError as e:
+            # No categories map means there is nothing to remove
+            if e.response.get('Error', {}).get('Code') != 'ValidationException':
+                raise
+            return True
+
+_store = UserConfigStore()
+
+def get_user_config_store() -> UserConfigStore:
+    return _store
@@ -0,0 +1,370 @@
+import sys
+import threading
+from pathlib import Path
+from dataclasses import dataclass, field
+from cachetools import TTLCache
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from aws.dynamodb import get_client, get_table, USERS_TABLE
+
+# GSI on ConvoiaUsers with `email` as its partition key (see aws/migrations.py)
+USERS_EMAIL_INDEX = 'email-index'
+
+# Shorter than the 3 minute scheduler interval, so each tick reads a user at most once
+USER_CACHE_TTL_SECONDS = 120
+USER_CACHE_MAX_SIZE = 2048
+
+def _unwrap(value: Any) -> Any:
+    # Some items were written with the low-level {'S': value} wrapper still attached
+    if isinstance(value, dict) and 'S' in value:
+        return value['S']
+    return value
+
+@dataclass(frozen=True)
+class UserRecord:
+    email: str
+    mode: Optional[str] = None
+    access_token: Optional[str] = None
+    refresh_token: Optional[str] = None
+    password: Optional[str] = None
+    email_server: Optional[str] = None
+    imap_server: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict, repr=False, compare=False)
+
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> "UserRecord":
+        attributes = {key: _unwrap(value) for key, value in item.items()}
+        return cls(
+            email=attributes.get('email', ''),
+            mode=attributes.get('mode'),
+            access_token=attributes.get('access_token'),
+            refresh_token=attributes.get('refresh_token'),
+            password=attributes.get('password'),
+            email_server=attributes.get('emailServer'),
+            imap_server=attributes.get('imap_server'),
+            attributes=attributes
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.attributes)
+
+class UserLookup:
+    """
+    Resolves a user by email with a key-based read. The table's key schema is inspected
+    once: `get_item` when `email` is the partition key, a query on the email GSI otherwise,
+    and a paginated scan only while that index does not exist.
+    """
+
+    GET_ITEM = 'get_item'
+    QUERY = 'query'
+    SCAN = 'scan'
+
+    def __init__(self, table_name: str = USERS_TABLE, index_name: str = USERS_EMAIL_INDEX):
+        self.table_name = table_name
+        self.index_name = index_name
+        self._strategy: Optional[str] = None
+        self._key_names: List[str] = ['email']
+        self._lock = threading.Lock()
+
+    @property
+    def strategy(self) -> str:
+        if self._strategy is None:
+            with self._lock:
+                if self._strategy is None:
+                    self._strategy = self._detect_strategy()
+        return self._strategy
+
+    def _detect_strategy(self) -> str:
+        try:
+            description = get_client().describe_table(TableName=self.table_name)['Table']
+        except ClientError as e:
+            # Without DescribeTable permission, optimistically try the index
+            print(f"Could not describe {self.table_name}, assuming index {self.index_name}: {str(e)}")
+            return self.QUERY
+
+        key_schema = {key['KeyType']: key['AttributeName'] for key in description.get('KeySchema', [])}
+        self._key_names = [key_schema[key_type] for key_type in ('HASH', 'RANGE') if key_type in key_schema]
+        if key_schema.get('HASH') == 'email' and 'RANGE' not in key_schema:
+            return self.GET_ITEM
+
+        for index in description.get('GlobalSecondaryIndexes', []):
+            index_keys = {key['KeyType']: key['AttributeName'] for key in index.get('KeySchema', [])}
+            if index['IndexName'] == self.index_name and index_keys.get('HASH') == 'email':
+                if index.get('IndexStatus', 'ACTIVE') == 'ACTIVE':
+                    return self.QUERY
+                print(f"Index {self.index_name} is {index.get('IndexStatus')}, using scan until it is active")
+                return self.SCAN
+
+        print(f"Index {self.index_name} not found on {self.table_name}, falling back to scan")
+        return self.SCAN
+
+    def key_for(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        # Primary key of a ConvoiaUsers item, whatever the table happens to be keyed on
+        self.strategy
+        return {name: item[name] for name in self._key_names}
+
+    def refresh(self) -> None:
+        # Re-inspect the key schema, e.g. after the index finishes backfilling
+        with self._lock:
+            self._strategy = None
+
+    def get_item(self, email: str) -> Optional[Dict[str, Any]]:
+        strategy = self.strategy
+        table = get_table(self.table_name)
+
+        if strategy == self.GET_ITEM:
+            return table.get_item(Key={'email': email}).get('Item')
+
+        if strategy == self.QUERY:
+            try:
+                response = table.query(
+                    IndexName=self.index_name,
+                    KeyConditionExpression=Key('email').eq(email),
+                    Limit=1
+                )
+                items = response.get('Items', [])
+                return items[0] if items else None
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'ValidationException':
+                    raise
+                print(f"Index {self.index_name} unavailable, falling back to scan: {str(e)}")
+                with self._lock:
+                    self._strategy = self.SCAN
+
+        return self._scan_for_email(table, email)
+
+    def _scan_for_email(self, table, email: str) -> Optional[Dict[str, Any]]:
+        # A filtered scan page can be empty while later pages still match, so keep paging
+        scan_kwargs = {'FilterExpression': Attr('email').eq(email)}
+        while True:
+            response = table.scan(**scan_kwargs)
+            items = response.get('Items', [])
+            if items:
+                return items[0]
+            if 'LastEvaluatedKey' not in response:
+                return None
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+class UserRecordCache:
+    """
+    In-process TTL + LRU cache of UserRecords keyed by email. Entries are dropped on
+    writes and token refreshes; hit/miss counters show how many DynamoDB reads it saved.
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_MAX_SIZE, ttl: float = USER_CACHE_TTL_SECONDS):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, email: str, loader: Callable[[str], Optional[UserRecord]]) -> Optional[UserRecord]:
+        with self._lock:
+            record = self._cache.get(email)
+            if record is not None:
+                self.hits += 1
+                return record
+            self.misses += 1
+            generation = self._generation
+
+        record = loader(email)
+
+        with self._lock:
+            # Skip the store if an invalidation raced with the load, the record may be stale
+            if record is not None and generation == self._generation:
+                self._cache[email] = record
+        return record
+
+    def put(self, record: UserRecord) -> None:
+        with self._lock:
+            self._generation += 1
+            self._cache[record.email] = record
+
+    def invalidate(self, email: str) -> None:
+        with self._lock:
+            self._generation += 1
+            self._cache.pop(email, None)
+
+    def update(self, email: str, apply: Callable[[Dict[str, Any]], None]) -> None:
+        # Applies a write this process made to the cached copy instead of dropping it
+        with self._lock:
+            self._generation += 1
+            record = self._cache.get(email)
+            if record is not None:
+                attributes = dict(record.attributes)
+                apply(attributes)
+                self._cache[email] = UserRecord.from_item(attributes)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._cache),
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+_user_lookup = UserLookup()
+_user_cache = UserRecordCache()
+
+def get_user_lookup() -> UserLookup:
+    return _user_lookup
+
+def get_user_cache() -> UserRecordCache:
+    return _user_cache
+
+def _load_user_record(email: str) -> Optional[UserRecord]:
+    item = _user_lookup.get_item(email)
+    if item is None:
+        return None
+    return UserRecord.from_item(item)
+
+def get_user_record(email: str, use_cache: bool = True) -> Optional[UserRecord]:
+    if not use_cache:
+        return _load_user_record(email)
+    return _user_cache.get(email, _load_user_record)
+
+def invalidate_user(email: str) -> None:
+    _user_cache.invalidate(email)
+
+def update_user_attributes(email: str, attributes: Dict[str, Any]) -> bool:
+    # Write-through: persist to ConvoiaUsers, then drop the cached copy
+    try:
+        item = _user_lookup.get_item(email)
+        if item is None:
+            print(f"No account found for email: {email}")
+            return False
+
+        names = {f"#attr{i}": name for i, name in enumerate(attributes)}
+        values = {f":val{i}": value for i, value in enumerate(attributes.values())}
+        get_table(_user_lookup.table_name).update_item(
+            Key=_user_lookup.key_for(item),
+            UpdateExpression="SET " + ", ".join(f"{name} = {value}" for name, value in zip(names, values)),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+        return True
+    except ClientError as e:
+        print(f"Error updating user {email}: {str(e)}")
+        return False
+    finally:
+        invalidate_user(email)
+
+def record_token_refresh(email: str, access_token: str, refresh_token: Optional[str] = None) -> bool:
+    tokens = {'access_token': access_token}
+    if refresh_token:
+        tokens['refresh_token'] = refresh_token
+    return update_user_attributes(email, tokens)
+
+def _update_user_item(email: str, update_expression: str, names: Dict[str, str], values: Dict[str, Any], condition: Optional[str] = None) -> bool:
+    # One update_item on the key of the (usually cached) record; raises ClientError
+    record = get_user_record(email)
+    if record is None:
+        print(f"No account found for email: {email}")
+        return False
+
+    kwargs = {
+        'Key': _user_lookup.key_for(record.attributes),
+        'UpdateExpression': update_expression,
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values
+    }
+    if condition:
+        kwargs['ConditionExpression'] = condition
+    get_table(_user_lookup.table_name).update_item(**kwargs)
+    return True
+
+def _error_code(error: ClientError) -> str:
+    return error.response.get('Error', {}).get('Code', '')
+
+# Per-consumer Gmail history cursors live on the user item, e.g. `gmail_history_id_daily_extraction`.
+# They are saved on every tick, so the writes go straight to the item and into the cached
+# record, which keeps the cache current for the next read instead of evicting it
+GMAIL_HISTORY_ATTRIBUTE = 'gmail_history_id'
+
+def _history_attribute(consumer: str) -> str:
+    return f"{GMAIL_HISTORY_ATTRIBUTE}_{consumer}"
+
+def get_gmail_history_id(email: str, consumer: str) -> Optional[str]:
+    record = get_user_record(email)
+    if record is None:
+        return None
+    history_id = record.attributes.get(_history_attribute(consumer))
+    return str(history_id) if history_id is not None else None
+
+def save_gmail_history_id(email: str, consumer: str, history_id: str) -> bool:
+    name = _history_attribute(consumer)
+    try:
+        if not _update_user_item(email, "SET #cursor = :cursor", {'#cursor': name}, {':cursor': str(history_id)}):
+            return False
+    except ClientError as e:
+        print(f"Error saving {name} for {email}: {str(e)}")
+        invalidate_user(email)
+        return False
+
+    def apply(attributes: Dict[str, Any]) -> None:
+        attributes[name] = str(history_id)
+
+    _user_cache.update(email, apply)
+    return True
+
+# Per-consumer IMAP sync state for manual accounts, one map per consumer keyed by folder,
+# e.g. `imap_sync_daily_extraction` = {'INBOX': {'uidvalidity': 1, 'last_uid': 35, 'highest_modseq': 90}}
+IMAP_SYNC_ATTRIBUTE = 'imap_sync'
+
+def _imap_sync_attribute(consumer: str) -> str:
+    return f"{IMAP_SYNC_ATTRIBUTE}_{consumer}"
+
+def get_imap_sync_state(email: str, consumer: str) -> Dict[str, Dict[str, int]]:
+    record = get_user_record(email)
+    if record is None:
+        return {}
+    state = record.attributes.get(_imap_sync_attribute(consumer)) or {}
+    return {
+        folder: {name: int(value) for name, value in values.items() if value is not None}
+        for folder, values in state.items()
+    }
+
+def save_imap_sync_state(email: str, consumer: str, folder: str, folder_state: Dict[str, int]) -> bool:
+    # Only this folder's entry is written; the map itself is created by the first save
+    name = _imap_sync_attribute(consumer)
+    try:
+        try:
+            saved = _update_user_item(email, "SET #state.#folder = :folder_state", {'#state': name, '#folder': folder}, {':folder_state': folder_state})
+        except ClientError as e:
+            if _error_code(e) != 'ValidationException':
+                raise
+            try:
+                saved = _update_user_item(email, "SET #state = :state", {'#state': name}, {':state': {folder: folder_state}}, condition="attribute_not_exists(#state)")
+            except ClientError as e:
+                # Another folder's save created the map first
+                if _error_code(e) != 'ConditionalCheckFailedException':
+                    raise
+                saved = _update_user_item(email, "SET #state.#folder = :folder_state", {'#state': name, '#folder': folder}, {':folder_state': folder_state})
+        if not saved:
+            return False
+    except ClientError as e:
+        print(f"Error saving {name} for {email}: {str(e)}")
+        invalidate_user(email)
+        return False
+
+    def apply(attributes: Dict[str, Any]) -> None:
+        attributes[name] = {**(attributes.get(name) or {}), folder: folder_state}
+
+    _user_cache.update(email, apply)
+    return True
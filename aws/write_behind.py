@@ -0,0 +1,363 @@
+import os
+import sys
+import time
+import atexit
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from botocore.exceptions import ClientError, ParamValidationError
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from aws.dynamodb import (
+    get_table,
+    AUTOMATED_RESPONSES_TABLE,
+    IMPORTANT_DESCRIPTIONS_TABLE,
+    IMPORTANT_KEYWORDS_TABLE,
+    IMPORTANT_SENDERS_TABLE,
+    TRACKING_TABLE,
+)
+from env_config import env_flag
+
+# Off by default; when on, preference/contact/category writes return as soon as they
+# are queued and are flushed to DynamoDB every CONVOIA_WRITE_BEHIND_INTERVAL seconds
+WRITE_BEHIND_ENV = 'CONVOIA_WRITE_BEHIND'
+WRITE_BEHIND_INTERVAL_ENV = 'CONVOIA_WRITE_BEHIND_INTERVAL'
+DEFAULT_FLUSH_INTERVAL_SECONDS = 0.5
+
+# Queued writes were already acknowledged, so failed flushes are retried with a backoff
+# for as long as it takes; only errors no retry can fix drop a write
+RETRY_BASE_DELAY_SECONDS = 1.0
+MAX_RETRY_DELAY_SECONDS = 60.0
+PERMANENT_ERROR_CODES = frozenset({'ValidationException', 'ResourceNotFoundException', 'SerializationException'})
+
+# Key attributes of every table the queue may write to, partition key first
+TABLE_KEYS: Dict[str, Tuple[str, ...]] = {
+    TRACKING_TABLE: ('email_id',),
+    AUTOMATED_RESPONSES_TABLE: ('email_id', 'category'),
+    IMPORTANT_KEYWORDS_TABLE: ('email_id', 'keyword'),
+    IMPORTANT_SENDERS_TABLE: ('email_id', 'sender_email_id'),
+    IMPORTANT_DESCRIPTIONS_TABLE: ('email_id', 'description'),
+}
+
+PUT = 'put'
+DELETE = 'delete'
+UPDATE = 'update'
+
+def write_behind_enabled() -> bool:
+    return env_flag(WRITE_BEHIND_ENV)
+
+def _is_permanent(error: Exception) -> bool:
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code') in PERMANENT_ERROR_CODES
+    # Parameters boto3 refuses to send, or values it can't serialise
+    return isinstance(error, (ParamValidationError, TypeError))
+
+def _flush_interval() -> float:
+    try:
+        return float(os.getenv(WRITE_BEHIND_INTERVAL_ENV, DEFAULT_FLUSH_INTERVAL_SECONDS))
+    except ValueError:
+        return DEFAULT_FLUSH_INTERVAL_SECONDS
+
+@dataclass(frozen=True)
+class PendingWrite:
+    table_name: str
+    key: Dict[str, Any]
+    operation: str
+    item: Optional[Dict[str, Any]] = None
+    set_attributes: Dict[str, Any] = field(default_factory=dict)
+    remove_attributes: FrozenSet[str] = frozenset()
+
+    def apply(self, item: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        # What a read of this key returns once the write has landed
+        if self.operation == PUT:
+            return dict(self.item)
+        if self.operation == DELETE:
+            return None
+        updated = dict(item) if item is not None else dict(self.key)
+        for name in self.remove_attributes:
+            updated.pop(name, None)
+        updated.update(self.set_attributes)
+        return updated
+
+    def then(self, later: "PendingWrite") -> "PendingWrite":
+        # Coalesces two writes to the same key into the one write with the same effect
+        if later.operation in (PUT, DELETE):
+            return later
+        if self.operation == UPDATE:
+            return replace(
+                later,
+                set_attributes={
+                    **{name: value for name, value in self.set_attributes.items() if name not in later.remove_attributes},
+                    **later.set_attributes
+                },
+                remove_attributes=(self.remove_attributes - set(later.set_attributes)) | later.remove_attributes
+            )
+        # put/delete followed by an update leaves a fully known item
+        return replace(later, operation=PUT, item=later.apply(self.apply(None)), set_attributes={}, remove_attributes=frozenset())
+
+class WriteBehindQueue:
+    """
+    Coalescing write-behind buffer for small per-user writes. Writes to the same key are
+    merged while queued and flushed in batch_writer groups (partial updates as one
+    update_item per key). Pending and in-flight writes are overlaid onto reads made in
+    this process, so a caller always reads back what it just wrote.
+    """
+
+    def __init__(self, interval: float = DEFAULT_FLUSH_INTERVAL_SECONDS):
+        self.interval = interval
+        self._pending: "OrderedDict[Tuple, PendingWrite]" = OrderedDict()
+        self._inflight: Dict[Tuple, PendingWrite] = {}
+        # slot -> (failed flushes in a row, monotonic time of the next attempt)
+        self._retries: Dict[Tuple, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+
+    def _slot(self, table_name: str, key: Dict[str, Any]) -> Tuple:
+        return (table_name,) + tuple(key[name] for name in TABLE_KEYS[table_name])
+
+    def _key_of(self, table_name: str, item: Dict[str, Any]) -> Dict[str, Any]:
+        return {name: item[name] for name in TABLE_KEYS[table_name]}
+
+    def _enqueue(self, write: PendingWrite) -> None:
+        slot = self._slot(write.table_name, write.key)
+        with self._lock:
+            current = self._pending.pop(slot, None)
+            self._pending[slot] = current.then(write) if current else write
+            self.queued += 1
+        self.start()
+
+    def put(self, table_name: str, item: Dict[str, Any]) -> None:
+        self._enqueue(PendingWrite(table_name, self._key_of(table_name, item), PUT, item=dict(item)))
+
+    def delete(self, table_name: str, key: Dict[str, Any]) -> None:
+        self._enqueue(PendingWrite(table_name, self._key_of(table_name, key), DELETE))
+
+    def update(self, table_name: str, key: Dict[str, Any], set_attributes: Dict[str, Any], remove_attributes: Tuple[str, ...] = ()) -> None:
+        self._enqueue(PendingWrite(
+            table_name,
+            self._key_of(table_name, key),
+            UPDATE,
+            set_attributes=dict(set_attributes),
+            remove_attributes=frozenset(remove_attributes)
+        ))
+
+    def _writes_for(self, table_name: str, partition_value: Any) -> List[PendingWrite]:
+        # In-flight first, so a newer pending write to the same key is applied on top
+        with self._lock:
+            return [
+                write
+                for writes in (self._inflight, self._pending)
+                for slot, write in writes.items()
+                if slot[0] == table_name and slot[1] == partition_value
+            ]
+
+    def overlay_item(self, table_name: str, key: Dict[str, Any], item: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        slot = self._slot(table_name, key)
+        for write in self._writes_for(table_name, slot[1]):
+            if self._slot(table_name, write.key) == slot:
+                item = write.apply(item)
+        return item
+
+    def overlay_partition(self, table_name: str, partition_value: Any, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        writes = self._writes_for(table_name, partition_value)
+        if not writes:
+            return items
+        # Projected reads may leave out the partition key, so slots are rebuilt from the sort key
+        sort_keys = TABLE_KEYS[table_name][1:]
+        merged = OrderedDict(
+            ((table_name, partition_value) + tuple(item[name] for name in sort_keys), item)
+            for item in items
+        )
+        for write in writes:
+            slot = self._slot(table_name, write.key)
+            result = write.apply(merged.get(slot))
+            if result is None:
+                merged.pop(slot, None)
+            else:
+                merged[slot] = result
+        return list(merged.values())
+
+    def pending_values(self, table_name: str, attribute: str) -> Dict[Any, Any]:
+        # Latest queued value of one attribute per partition key; None when it is being removed
+        values = {}
+        with self._lock:
+            writes = list(self._inflight.values()) + list(self._pending.values())
+        for write in writes:
+            if write.table_name != table_name:
+                continue
+            partition_value = write.key[TABLE_KEYS[table_name][0]]
+            if write.operation == DELETE or attribute in write.remove_attributes:
+                values[partition_value] = None
+            elif write.operation == PUT:
+                values[partition_value] = write.item.get(attribute)
+            elif attribute in write.set_attributes:
+                values[partition_value] = write.set_attributes[attribute]
+        return values
+
+    def flush(self, due_only: bool = False) -> int:
+        # Serialised, so once flush() returns every write queued before the call has been
+        # tried; the background loop passes due_only to leave writes still backing off
+        with self._flush_lock:
+            now = time.monotonic()
+            with self._lock:
+                batch: "OrderedDict[Tuple, PendingWrite]" = OrderedDict()
+                waiting: "OrderedDict[Tuple, PendingWrite]" = OrderedDict()
+                for slot, write in self._pending.items():
+                    if due_only and self._retries.get(slot, (0, 0.0))[1] > now:
+                        waiting[slot] = write
+                    else:
+                        batch[slot] = write
+                self._pending = waiting
+                self._inflight = dict(batch)
+            if not batch:
+                return 0
+
+            succeeded = set()
+            errors: Dict[Tuple, Exception] = {}
+            try:
+                by_table: Dict[str, List[Tuple[Tuple, PendingWrite]]] = {}
+                for slot, write in batch.items():
+                    if write.operation == UPDATE:
+                        error = self._write_update(write)
+                        if error is None:
+                            succeeded.add(slot)
+                        else:
+                            errors[slot] = error
+                    else:
+                        by_table.setdefault(write.table_name, []).append((slot, write))
+
+                for table_name, writes in by_table.items():
+                    try:
+                        with get_table(table_name).batch_writer() as writer:
+                            for _, write in writes:
+                                if write.operation == PUT:
+                                    writer.put_item(Item=write.item)
+                                else:
+                                    writer.delete_item(Key=write.key)
+                        succeeded.update(slot for slot, _ in writes)
+                    except Exception as e:
+                        print(f"Error flushing {len(writes)} queued writes to {table_name}: {str(e)}")
+                        errors.update((slot, e) for slot, _ in writes)
+            finally:
+                # Anything not confirmed, including writes cut off by an unexpected error, is
+                # requeued ahead of any write made to the same key since
+                with self._lock:
+                    for slot, write in batch.items():
+                        if slot in succeeded:
+                            self._retries.pop(slot, None)
+                            continue
+                        error = errors.get(slot)
+                        if error is not None and _is_permanent(error):
+                            self._retries.pop(slot, None)
+                            self.dropped += 1
+                            print(f"Dropping queued {write.operation} on {write.table_name} {write.key}, it can't succeed ({error}): {write}")
+                            continue
+                        failures = self._retries.get(slot, (0, 0.0))[0] + 1
+                        delay = min(MAX_RETRY_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * 2 ** (failures - 1))
+                        self._retries[slot] = (failures, now + delay)
+                        newer = self._pending.pop(slot, None)
+                        self._pending[slot] = write.then(newer) if newer else write
+                    self._inflight = {}
+                    self.flushed += len(succeeded)
+            return len(succeeded)
+
+    def _write_update(self, write: PendingWrite) -> Optional[Exception]:
+        names = {}
+        values = {}
+        clauses = []
+        for i, (name, value) in enumerate(write.set_attributes.items()):
+            names[f"#s{i}"] = name
+            values[f":s{i}"] = value
+        for i, name in enumerate(write.remove_attributes):
+            names[f"#r{i}"] = name
+        if write.set_attributes:
+            clauses.append("SET " + ", ".join(f"#s{i} = :s{i}" for i in range(len(write.set_attributes))))
+        if write.remove_attributes:
+            clauses.append("REMOVE " + ", ".join(f"#r{i}" for i in range(len(write.remove_attributes))))
+
+        update_kwargs = {
+            'Key': write.key,
+            'UpdateExpression': " ".join(clauses),
+            'ExpressionAttributeNames': names
+        }
+        if values:
+            update_kwargs['ExpressionAttributeValues'] = values
+        try:
+            get_table(write.table_name).update_item(**update_kwargs)
+            return None
+        except Exception as e:
+            print(f"Error flushing queued update for {write.key}: {str(e)}")
+            return e
+
+    def start(self) -> None:
+        if self._thread is not None or self._stop.is_set():
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='convoia-write-behind', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush(due_only=True)
+            except Exception as e:
+                # The batch was requeued by flush(); the thread keeps going for the next one
+                print(f"Unexpected error flushing queued writes: {str(e)}")
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        flushed = self.flush()
+        if flushed:
+            print(f"Flushed {flushed} queued writes on shutdown")
+        if self._pending:
+            print(f"{len(self._pending)} queued writes could not be flushed on shutdown: {list(self._pending.values())}")
+
+_queue: Optional[WriteBehindQueue] = None
+_queue_lock = threading.Lock()
+
+def get_write_behind() -> Optional[WriteBehindQueue]:
+    # None while write-behind is disabled; callers then write synchronously
+    global _queue
+    if not write_behind_enabled():
+        return None
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = WriteBehindQueue(_flush_interval())
+                atexit.register(_queue.shutdown)
+    return _queue
+
+def flush_write_behind() -> None:
+    # Call before a synchronous write that must not be overtaken by a queued one
+    if _queue is not None:
+        _queue.flush()
+
+def shutdown_write_behind() -> None:
+    if _queue is not None:
+        _queue.shutdown()
+
+def overlay_item(table_name: str, key: Dict[str, Any], item: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if _queue is None:
+        return item
+    return _queue.overlay_item(table_name, key, item)
+
+def overlay_partition(table_name: str, partition_value: Any, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    if _queue is None:
+        return items
+    return _queue.overlay_partition(table_name, partition_value, items)
+
+def pending_values(table_name: str, attribute: str) -> Dict[Any, Any]:
+    if _queue is None:
+        return {}
+    return _queue.pending_values(table_name, attribute)
@@ -0,0 +1,224 @@
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from aws import dynamodb as dynamodb_pool
+from aws.automated_response import AutomatedResponseManager
+from aws.email_automation_preferences import ACTIVE_FLAG_INDEXES, ACTIVE_MARKER, EmailAutomationPreferences
+from aws.users import get_user_cache
+from aws.utils import fetch_tokens, get_manual_email_password, get_user_credentials
+from benchmarks.fake_dynamodb import FakeDynamoDB, create_convoia_tables
+
+# DynamoDB load benchmarks for the scheduler ticks and onboarding, run against the
+# in-process stand-in. Gmail/IMAP/LLM work is swapped out for the DynamoDB reads those
+# steps make, so the numbers only reflect the aws package.
+#
+#   python benchmarks/aws_suite.py hourly daily init --users 100 1000 --latency-ms 5
+#   python benchmarks/aws_suite.py active-flags --users 10000 100000 1000000
+
+def email_for(i: int) -> str:
+    return f"user{i:07d}@example.com"
+
+def seed(dynamodb: FakeDynamoDB, users: int, automated_fraction: float, important_fraction: float, follow_up_fraction: float) -> None:
+    fractions = {
+        'automated_response': automated_fraction,
+        'important_emails': important_fraction,
+        'follow_up_emails': follow_up_fraction,
+    }
+
+    def flag_on(i: int, fraction: float) -> bool:
+        # Spread evenly rather than randomly so every run sees the same users
+        return fraction > 0 and int(i * fraction) != int((i + 1) * fraction)
+
+    user_items = []
+    tracking_items = []
+    keyword_items = []
+    sender_items = []
+    description_items = []
+    category_items = []
+    config_items = []
+    for i in range(users):
+        email = email_for(i)
+        manual = i % 5 == 0
+        user = {'email': email, 'mode': 'manual' if manual else 'oauth'}
+        if manual:
+            user.update(password='app-password', emailServer='smtp.example.com', imap_server='imap.example.com')
+        else:
+            user.update(access_token=f"access-{i}", refresh_token=f"refresh-{i}")
+        user_items.append(user)
+
+        tracking = {'email_id': email}
+        for category_name, fraction in fractions.items():
+            tracking[category_name] = flag_on(i, fraction)
+            if tracking[category_name]:
+                tracking[ACTIVE_FLAG_INDEXES[category_name][0]] = ACTIVE_MARKER
+        tracking_items.append(tracking)
+
+        keywords = ['urgent', 'deadline', 'invoice']
+        senders = [f"boss{i}@example.com", 'ceo@example.com']
+        descriptions = ['Anything about the quarterly report']
+        categories = {
+            'Meeting Requests': {'description': 'Requests to schedule a meeting', 'response_directive': 'Share availability'},
+            'Invoices': {'description': 'Vendor invoices', 'response_directive': 'Acknowledge receipt'},
+        }
+        keyword_items.extend({'email_id': email, 'keyword': keyword} for keyword in keywords)
+        sender_items.extend({'email_id': email, 'sender_email_id': sender} for sender in senders)
+        description_items.extend({'email_id': email, 'description': description} for description in descriptions)
+        category_items.extend({'email_id': email, 'category': name, **entry} for name, entry in categories.items())
+        config_items.append({
+            'email_id': email,
+            'version': 1,
+            'keywords': set(keywords),
+            'senders': set(senders),
+            'descriptions': set(descriptions),
+            'categories': categories
+        })
+
+    dynamodb.tables[dynamodb_pool.USERS_TABLE].load(user_items)
+    dynamodb.tables[dynamodb_pool.TRACKING_TABLE].load(tracking_items)
+    dynamodb.tables[dynamodb_pool.IMPORTANT_KEYWORDS_TABLE].load(keyword_items)
+    dynamodb.tables[dynamodb_pool.IMPORTANT_SENDERS_TABLE].load(sender_items)
+    dynamodb.tables[dynamodb_pool.IMPORTANT_DESCRIPTIONS_TABLE].load(description_items)
+    dynamodb.tables[dynamodb_pool.AUTOMATED_RESPONSES_TABLE].load(category_items)
+    dynamodb.tables[dynamodb_pool.USER_CONFIG_TABLE].load(config_items)
+
+def run_hourly(args, users: int) -> None:
+    import hourly_tasks
+
+    async def automated_user(email_id: str, snapshot=None):
+        # AutomatedResponseMonitor: credentials, then categories from the snapshot
+        user = fetch_tokens(email_id)
+        if user and user.get('mode') == 'manual':
+            get_user_credentials(email_id)
+        hourly_tasks.AutomatedResponseMonitor(snapshot)._get_category_config(email_id, AutomatedResponseManager())
+
+    async def priority_user(email_id: str, snapshot=None):
+        # EmailImportanceAnalyzer: credentials, then keyword/sender checks per email
+        user = fetch_tokens(email_id)
+        if user and user.get('mode') == 'manual':
+            get_user_credentials(email_id)
+        analyzer = hourly_tasks.EmailImportanceAnalyzer(snapshot)
+        analyzer.check_keywords("Quarterly numbers attached", email_id)
+        analyzer.check_sender("someone@example.com", email_id)
+
+    hourly_tasks.execute_automated_response = automated_user
+    hourly_tasks.execute_priority_response = priority_user
+    asyncio.run(hourly_tasks.hourly())
+
+def run_daily(args, users: int) -> None:
+    import daily_tasks
+
+    async def update_database(email_id: str, mode: str):
+        # existing_user_data_extraction: mailbox credentials for the user's mode
+        if mode == 'manual':
+            get_manual_email_password(email_id)
+        else:
+            fetch_tokens(email_id)
+
+    async def initiate_follow(email_id: str):
+        fetch_tokens(email_id)
+
+    daily_tasks.update_database = update_database
+    daily_tasks.initiate_follow = initiate_follow
+    asyncio.run(daily_tasks.daily())
+
+def run_init(args, users: int) -> None:
+    import generator
+
+    class NoDataExtraction:
+        # Mailbox download and vector upload are not DynamoDB work
+        def new_user_data_extraction(self, email_id, mode):
+            return True
+
+    generator.UserDataExtractor = NoDataExtraction
+    new_users = [f"new{i:07d}@example.com" for i in range(args.new_users or users)]
+
+    def initialize(email_id: str) -> bool:
+        return generator.UserInitializationManager().new_user_initialization(email_id, 'oauth')
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(initialize, new_users))
+    print(f"Initialized {sum(results)}/{len(new_users)} users")
+
+def run_active_flags(args, users: int) -> None:
+    # Sparse GSI query vs the filtered-scan fallback for the active-user lookups
+    for label, sparse_indexes in (('index', True), ('scan', False)):
+        dynamodb = build_dynamodb(args, sparse_indexes=sparse_indexes)
+        seed(dynamodb, users, args.automated_fraction, args.important_fraction, args.follow_up_fraction)
+        dynamodb.reset_stats()
+        start = time.perf_counter()
+        active = EmailAutomationPreferences()._query_active_flag('important_emails')
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<6} {len(active):>9} active users in {elapsed:8.3f}s, {dynamodb.total_calls()} calls")
+        print(indent(dynamodb.report()))
+
+SCENARIOS: Dict[str, Callable] = {
+    'hourly': run_hourly,
+    'daily': run_daily,
+    'init': run_init,
+    'active-flags': run_active_flags,
+}
+
+def build_dynamodb(args, sparse_indexes: bool = True) -> FakeDynamoDB:
+    dynamodb = FakeDynamoDB(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        throttle_rate=args.throttle_rate,
+        page_size=args.page_size,
+        seed=args.seed
+    )
+    create_convoia_tables(dynamodb, sparse_indexes=sparse_indexes, users_hash_key=args.users_hash_key)
+    return dynamodb.install()
+
+def indent(text: str) -> str:
+    return "\n".join(f"    {line}" for line in text.splitlines())
+
+def main():
+    parser = argparse.ArgumentParser(description="aws package benchmarks against an in-memory DynamoDB")
+    parser.add_argument('scenarios', nargs='+', choices=sorted(SCENARIOS))
+    parser.add_argument('--users', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--new-users', type=int, default=0, help="Users to onboard in `init` (default: --users)")
+    parser.add_argument('--concurrency', type=int, default=8, help="Parallel onboardings in `init`")
+    parser.add_argument('--latency-ms', type=float, default=5.0)
+    parser.add_argument('--jitter-ms', type=float, default=1.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--page-size', type=int, default=1000, help="Items per page, standing in for the 1MB limit")
+    parser.add_argument('--automated-fraction', type=float, default=0.3)
+    parser.add_argument('--important-fraction', type=float, default=0.3)
+    parser.add_argument('--follow-up-fraction', type=float, default=0.1)
+    parser.add_argument('--users-hash-key', default='email', help="Anything but `email` puts user lookups on the email GSI")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    results: List[str] = []
+    for scenario in args.scenarios:
+        for users in args.users:
+            print(f"\n== {scenario} with {users} users ==")
+            if scenario == 'active-flags':
+                SCENARIOS[scenario](args, users)
+                continue
+
+            dynamodb = build_dynamodb(args)
+            seed(dynamodb, users, args.automated_fraction, args.important_fraction, args.follow_up_fraction)
+            get_user_cache().clear()
+            dynamodb.reset_stats()
+
+            start = time.perf_counter()
+            SCENARIOS[scenario](args, users)
+            elapsed = time.perf_counter() - start
+
+            print(indent(dynamodb.report()))
+            results.append(f"{scenario:<12} {users:>9} users {elapsed:9.3f}s {dynamodb.total_calls():>9} calls")
+
+    if results:
+        print("\n== summary ==")
+        print("\n".join(results))
+
+if __name__ == "__main__":
+    main()
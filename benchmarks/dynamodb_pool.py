@@ -0,0 +1,67 @@
+import os
+import csv
+import sys
+import time
+import codecs
+import argparse
+import tempfile
+import boto3
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from aws import dynamodb as dynamodb_pool
+
+# Measures the per-call setup cost paid before any request is sent: reading the
+# credentials file and building a resource + Table handle. No network calls are made.
+
+def write_dummy_credentials(path: str) -> None:
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Access key ID', 'Secret access key'])
+        writer.writerow(['AKIABENCHMARK', 'benchmark-secret'])
+
+def legacy_get_table(credentials_path: str, table_name: str):
+    # Mirrors what every aws/ function did per call before the shared pool
+    aws_credentials = {}
+    with codecs.open(credentials_path, 'r', encoding='utf-8-sig') as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            aws_credentials['aws_access_key_id'] = row.get('Access key ID', '').strip()
+            aws_credentials['aws_secret_access_key'] = row.get('Secret access key', '').strip()
+
+    dynamodb = boto3.resource(
+        'dynamodb',
+        aws_access_key_id=aws_credentials['aws_access_key_id'],
+        aws_secret_access_key=aws_credentials['aws_secret_access_key'],
+        region_name=dynamodb_pool.AWS_REGION
+    )
+    return dynamodb.Table(table_name)
+
+def measure(label: str, func, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(dynamodb_pool.CONVOIA_TABLES[i % len(dynamodb_pool.CONVOIA_TABLES)])
+    elapsed = time.perf_counter() - start
+    rate = iterations / elapsed
+    print(f"{label:<8} {iterations:>7} calls in {elapsed:8.3f}s -> {rate:12.1f} calls/s")
+    return rate
+
+def main():
+    parser = argparse.ArgumentParser(description="DynamoDB handle setup micro-benchmark")
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        credentials_path = os.path.join(tmp_dir, 'credential_aws.csv')
+        write_dummy_credentials(credentials_path)
+        dynamodb_pool.AWS_CREDENTIALS_PATH = credentials_path
+        dynamodb_pool.reset_dynamodb()
+
+        before = measure("before", lambda name: legacy_get_table(credentials_path, name), args.iterations)
+        after = measure("after", dynamodb_pool.get_table, args.iterations * 100)
+
+    print(f"\nspeedup: {after / before:.0f}x")
+
+if __name__ == "__main__":
+    main()
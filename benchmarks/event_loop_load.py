@@ -0,0 +1,121 @@
+import io
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from statistics import mean
+from contextlib import redirect_stdout
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from aws import async_facade
+from aws.dynamodb import TRACKING_TABLE
+from aws.email_automation_preferences import EmailAutomationPreferences
+from benchmarks.fake_dynamodb import FakeDynamoDB, create_convoia_tables
+
+# Fires N concurrent POSTs at /api/convoia-user-input through the FastAPI app, with the
+# in-process DynamoDB answering after --latency-ms, and measures how late a 10ms heartbeat
+# task on the same loop wakes up. Requests go through the route, FUNCTION_MAP dispatch and
+# the real enable_automated_responses handler; only the LLM feature match is fixed. The
+# blocking run swaps in a handler that calls boto3 on the loop, the way the handlers did
+# before the async facade, to show what the lag looks like when one slips through.
+#
+#   python benchmarks/event_loop_load.py --requests 200 --latency-ms 20
+
+HEARTBEAT_SECONDS = 0.01
+FEATURE = "Enable Automated Responses"
+
+# main.py starts its schedulers and resumes backfills on import; keep those local and idle
+os.environ['CONVOIA_GMAIL_PUSH'] = '0'
+os.environ['CONVOIA_WRITE_BEHIND'] = '0'
+os.environ['CONVOIA_BACKFILL_DB'] = os.path.join(tempfile.mkdtemp(prefix='convoia-load-'), 'backfill_state.db')
+os.environ.setdefault('DEEPGRAM_API_KEY', 'benchmark')
+
+class FixedFeatureMatcher:
+
+    def get_feature(self, user_input: str) -> str:
+        return FEATURE
+
+async def blocking_enable_automated_responses(text: str, email: str) -> dict:
+    status = EmailAutomationPreferences().update_category_status(email, "automated_response", True)
+    return {"status": "success" if status else "failed", "message": "blocking handler"}
+
+async def heartbeat(lags: list, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + HEARTBEAT_SECONDS
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+        lags.append(max(0.0, loop.time() - expected))
+
+async def run(app, requests: int) -> dict:
+    lags = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(heartbeat(lags, stop))
+    await asyncio.sleep(HEARTBEAT_SECONDS * 2)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://convoia', timeout=None) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post('/api/convoia-user-input', json={'user_input': 'turn on automated responses', 'user_email': f"user{i}@example.com"})
+            for i in range(requests)
+        ))
+        elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe
+    return {
+        'ok': sum(1 for response in responses if response.status_code == 200 and 'went wrong' not in response.json().get('response', '').lower()),
+        'elapsed': elapsed,
+        'max_lag': max(lags) if lags else elapsed,
+        'mean_lag': mean(lags) if lags else elapsed,
+        'ticks': len(lags)
+    }
+
+def report(label: str, stats: dict, requests: int, updates: int) -> None:
+    print(
+        f"{label:<9} {stats['ok']:>4}/{requests} ok in {stats['elapsed']:7.3f}s  "
+        f"loop lag max {stats['max_lag'] * 1000:8.1f}ms mean {stats['mean_lag'] * 1000:7.1f}ms  "
+        f"heartbeats {stats['ticks']}  UpdateItem calls {updates}"
+    )
+
+def update_calls(dynamodb: FakeDynamoDB) -> int:
+    stats = dynamodb._stats.get(f"UpdateItem {TRACKING_TABLE}")
+    return stats.calls if stats else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Event loop lag under concurrent /api/convoia-user-input requests")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    args = parser.parse_args()
+
+    dynamodb = FakeDynamoDB(latency_ms=args.latency_ms)
+    create_convoia_tables(dynamodb)
+    dynamodb.install()
+
+    # Imported here, after the environment above is in place
+    import main as app_module
+    from constants import FUNCTION_MAP
+    app_module.FeatureMatcher = FixedFeatureMatcher
+
+    try:
+        real_handler = FUNCTION_MAP[FEATURE]
+        for label, handler in (('blocking', blocking_enable_automated_responses), ('async', real_handler)):
+            FUNCTION_MAP[FEATURE] = handler
+            before = update_calls(dynamodb)
+            with redirect_stdout(io.StringIO()):
+                stats = asyncio.run(run(app_module.app, args.requests))
+            report(label, stats, args.requests, update_calls(dynamodb) - before)
+        FUNCTION_MAP[FEATURE] = real_handler
+    finally:
+        app_module.hourwise_scheduler.shutdown()
+        app_module.daywise_scheduler.shutdown()
+        async_facade.shutdown_aws_executor()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,781 @@
+import re
+import sys
+import copy
+import time
+import random
+import threading
+from bisect import bisect_left, bisect_right, insort
+from pathlib import Path
+from decimal import Decimal
+from types import SimpleNamespace
+from collections import defaultdict
+from botocore.exceptions import ClientError
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from aws import dynamodb as dynamodb_pool
+from aws.email_automation_preferences import ACTIVE_FLAG_INDEXES
+from aws.users import USERS_EMAIL_INDEX, get_user_cache, get_user_lookup
+
+# In-process stand-in for the subset of the DynamoDB resource API the aws package uses:
+# get/put/update/delete, query and scan (filters, projections, pagination, sparse GSIs),
+# batch_get_item and batch_writer. Every call can be delayed and throttled, and is
+# counted, so the aws code paths can be load-tested without touching AWS.
+
+DEFAULT_PAGE_SIZE = 1000
+BATCH_WRITE_LIMIT = 25
+
+def _error(code: str, message: str, operation: str) -> ClientError:
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+def _key_part(value: Any) -> Tuple[int, Any]:
+    # Keys are strings or numbers; the tag keeps mixed types comparable
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return (0, value)
+    return (1, str(value))
+
+class _SortedItems:
+    # Items kept in key order, so pages can resume from an ExclusiveStartKey with bisect
+
+    def __init__(self):
+        self._keys: List[tuple] = []
+        self._items: Dict[tuple, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: tuple) -> Optional[dict]:
+        return self._items.get(key)
+
+    def put(self, key: tuple, item: dict) -> None:
+        if key not in self._items:
+            insort(self._keys, key)
+        self._items[key] = item
+
+    def remove(self, key: tuple) -> None:
+        if self._items.pop(key, None) is not None:
+            del self._keys[bisect_left(self._keys, key)]
+
+    def bulk_put(self, entries: Iterable[Tuple[tuple, dict]]) -> None:
+        self._items.update(entries)
+        self._keys = sorted(self._items)
+
+    def page(self, start_after: Optional[tuple], limit: int) -> Tuple[List[dict], bool]:
+        start = 0 if start_after is None else bisect_right(self._keys, start_after)
+        keys = self._keys[start:start + limit]
+        return [self._items[key] for key in keys], start + limit < len(self._keys)
+
+class FakeTable:
+
+    def __init__(self, dynamodb: "FakeDynamoDB", name: str, hash_key: str, range_key: Optional[str] = None):
+        self.dynamodb = dynamodb
+        self.name = name
+        self.table_name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.indexes: Dict[str, Tuple[str, Optional[str]]] = {}
+        self._items = _SortedItems()
+        self._partitions: Dict[Any, _SortedItems] = defaultdict(_SortedItems)
+        self._index_partitions: Dict[str, Dict[Any, _SortedItems]] = {}
+
+    # -- storage ---------------------------------------------------------------
+
+    def _key_names(self) -> Tuple[str, ...]:
+        return (self.hash_key, self.range_key) if self.range_key else (self.hash_key,)
+
+    def _key_of(self, item: Dict[str, Any], operation: str) -> Dict[str, Any]:
+        try:
+            return {name: item[name] for name in self._key_names()}
+        except KeyError as e:
+            raise _error('ValidationException', f"Missing the key {e.args[0]} in the item", operation)
+
+    def _sort_key(self, item: Dict[str, Any]) -> tuple:
+        return tuple(_key_part(item[name]) for name in self._key_names())
+
+    def _index_sort_key(self, index_name: str, item: Dict[str, Any]) -> tuple:
+        _, index_range = self.indexes[index_name]
+        prefix = (_key_part(item[index_range]),) if index_range else ()
+        return prefix + self._sort_key(item)
+
+    def _store(self, item: Dict[str, Any]) -> None:
+        key = self._sort_key(item)
+        self._unstore(key)
+        self._items.put(key, item)
+        self._partitions[item[self.hash_key]].put(key, item)
+        for index_name, (index_hash, index_range) in self.indexes.items():
+            # Sparse: items without the index key attributes are not in the index
+            if index_hash in item and (index_range is None or index_range in item):
+                self._index_partitions[index_name][item[index_hash]].put(self._index_sort_key(index_name, item), item)
+
+    def _unstore(self, key: tuple) -> Optional[dict]:
+        old = self._items.get(key)
+        if old is None:
+            return None
+        self._items.remove(key)
+        self._partitions[old[self.hash_key]].remove(key)
+        for index_name, (index_hash, index_range) in self.indexes.items():
+            if index_hash in old and (index_range is None or index_range in old):
+                self._index_partitions[index_name][old[index_hash]].remove(self._index_sort_key(index_name, old))
+        return old
+
+    def add_index(self, index_name: str, hash_key: str, range_key: Optional[str] = None) -> None:
+        with self.dynamodb.lock:
+            self.indexes[index_name] = (hash_key, range_key)
+            partitions = self._index_partitions[index_name] = defaultdict(_SortedItems)
+            for item in self._items._items.values():
+                if hash_key in item and (range_key is None or range_key in item):
+                    partitions[item[hash_key]].put(self._index_sort_key(index_name, item), item)
+
+    def load(self, items: Iterable[Dict[str, Any]]) -> None:
+        # Bulk seeding without latency, throttling or stats; keys are sorted once at the end
+        table_entries = []
+        partitions = defaultdict(list)
+        index_partitions = {index_name: defaultdict(list) for index_name in self.indexes}
+        for item in items:
+            item = copy.deepcopy(item)
+            key = self._sort_key(item)
+            table_entries.append((key, item))
+            partitions[item[self.hash_key]].append((key, item))
+            for index_name, (index_hash, index_range) in self.indexes.items():
+                if index_hash in item and (index_range is None or index_range in item):
+                    index_partitions[index_name][item[index_hash]].append((self._index_sort_key(index_name, item), item))
+
+        with self.dynamodb.lock:
+            if len(self._items):
+                for key, item in table_entries:
+                    self._store(item)
+                return
+            self._items.bulk_put(table_entries)
+            for hash_value, entries in partitions.items():
+                self._partitions[hash_value].bulk_put(entries)
+            for index_name, index_entries in index_partitions.items():
+                for hash_value, entries in index_entries.items():
+                    self._index_partitions[index_name][hash_value].bulk_put(entries)
+
+    def item_count(self) -> int:
+        return len(self._items)
+
+    # -- item operations -------------------------------------------------------
+
+    def get_item(self, Key: Dict[str, Any], ConsistentRead: bool = False, ProjectionExpression: Optional[str] = None, ExpressionAttributeNames: Optional[Dict[str, str]] = None) -> dict:
+        def get():
+            item = self._items.get(self._sort_key(self._key_of(Key, 'GetItem')))
+            if item is None:
+                return {}, 1
+            return {'Item': _project(item, ProjectionExpression, ExpressionAttributeNames)}, 1
+        return self.dynamodb.call('GetItem', self.name, get)
+
+    def put_item(self, Item: Dict[str, Any], ConditionExpression: Any = None, ExpressionAttributeNames: Optional[Dict[str, str]] = None, ExpressionAttributeValues: Optional[Dict[str, Any]] = None) -> dict:
+        def put():
+            key = self._sort_key(self._key_of(Item, 'PutItem'))
+            if ConditionExpression is not None:
+                _check_condition(ConditionExpression, self._items.get(key), ExpressionAttributeNames, ExpressionAttributeValues, 'PutItem')
+            self._store(copy.deepcopy(Item))
+            return {}, 1
+        return self.dynamodb.call('PutItem', self.name, put)
+
+    def delete_item(self, Key: Dict[str, Any], ConditionExpression: Any = None, ExpressionAttributeNames: Optional[Dict[str, str]] = None, ExpressionAttributeValues: Optional[Dict[str, Any]] = None) -> dict:
+        def delete():
+            key = self._sort_key(self._key_of(Key, 'DeleteItem'))
+            if ConditionExpression is not None:
+                _check_condition(ConditionExpression, self._items.get(key), ExpressionAttributeNames, ExpressionAttributeValues, 'DeleteItem')
+            self._unstore(key)
+            return {}, 1
+        return self.dynamodb.call('DeleteItem', self.name, delete)
+
+    def update_item(
+        self,
+        Key: Dict[str, Any],
+        UpdateExpression: str,
+        ConditionExpression: Any = None,
+        ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+        ExpressionAttributeValues: Optional[Dict[str, Any]] = None,
+        ReturnValues: str = 'NONE'
+    ) -> dict:
+        def update():
+            key_item = self._key_of(Key, 'UpdateItem')
+            key = self._sort_key(key_item)
+            current = self._items.get(key)
+            if ConditionExpression is not None:
+                _check_condition(ConditionExpression, current, ExpressionAttributeNames, ExpressionAttributeValues, 'UpdateItem')
+            updated = copy.deepcopy(current) if current is not None else dict(key_item)
+            changed = _apply_update(updated, UpdateExpression, ExpressionAttributeNames or {}, ExpressionAttributeValues or {})
+            self._store(updated)
+            response = {}
+            if ReturnValues == 'ALL_NEW':
+                response['Attributes'] = copy.deepcopy(updated)
+            elif ReturnValues == 'UPDATED_NEW':
+                response['Attributes'] = {name: copy.deepcopy(updated[name]) for name in changed if name in updated}
+            return response, 1
+        return self.dynamodb.call('UpdateItem', self.name, update)
+
+    # -- reads -----------------------------------------------------------------
+
+    def query(
+        self,
+        KeyConditionExpression: Any,
+        IndexName: Optional[str] = None,
+        FilterExpression: Any = None,
+        ProjectionExpression: Optional[str] = None,
+        ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+        ExpressionAttributeValues: Optional[Dict[str, Any]] = None,
+        ExclusiveStartKey: Optional[Dict[str, Any]] = None,
+        Limit: Optional[int] = None,
+        ScanIndexForward: bool = True,
+        Select: Optional[str] = None
+    ) -> dict:
+        def query():
+            if IndexName is not None and IndexName not in self.indexes:
+                raise _error('ValidationException', f"The table does not have the specified index: {IndexName}", 'Query')
+            hash_name = self.indexes[IndexName][0] if IndexName else self.hash_key
+            hash_value = _partition_value(KeyConditionExpression, hash_name, ExpressionAttributeNames, ExpressionAttributeValues)
+            if IndexName:
+                partition = self._index_partitions[IndexName].get(hash_value)
+                start_after = self._index_sort_key(IndexName, ExclusiveStartKey) if ExclusiveStartKey else None
+            else:
+                partition = self._partitions.get(hash_value)
+                start_after = self._sort_key(ExclusiveStartKey) if ExclusiveStartKey else None
+            if partition is None:
+                return {'Items': [], 'Count': 0, 'ScannedCount': 0}, 0
+            page, more = partition.page(start_after, min(Limit or self.dynamodb.page_size, self.dynamodb.page_size))
+            matched = [
+                item for item in page
+                if _matches(KeyConditionExpression, item, ExpressionAttributeNames, ExpressionAttributeValues)
+                and (FilterExpression is None or _matches(FilterExpression, item, ExpressionAttributeNames, ExpressionAttributeValues))
+            ]
+            return self._page_response(page, matched, more, IndexName, ProjectionExpression, ExpressionAttributeNames, Select), len(page)
+        return self.dynamodb.call('Query', self.name, query)
+
+    def scan(
+        self,
+        FilterExpression: Any = None,
+        ProjectionExpression: Optional[str] = None,
+        ExpressionAttributeNames: Optional[Dict[str, str]] = None,
+        ExpressionAttributeValues: Optional[Dict[str, Any]] = None,
+        ExclusiveStartKey: Optional[Dict[str, Any]] = None,
+        Limit: Optional[int] = None,
+        Select: Optional[str] = None,
+        IndexName: Optional[str] = None
+    ) -> dict:
+        def scan():
+            start_after = self._sort_key(ExclusiveStartKey) if ExclusiveStartKey else None
+            page, more = self._items.page(start_after, min(Limit or self.dynamodb.page_size, self.dynamodb.page_size))
+            matched = [
+                item for item in page
+                if FilterExpression is None or _matches(FilterExpression, item, ExpressionAttributeNames, ExpressionAttributeValues)
+            ]
+            return self._page_response(page, matched, more, None, ProjectionExpression, ExpressionAttributeNames, Select), len(page)
+        return self.dynamodb.call('Scan', self.name, scan)
+
+    def _page_response(self, page, matched, more, index_name, projection, names, select) -> dict:
+        # Like DynamoDB, the page limit applies before the filter, so a page can come back empty
+        response = {'Count': len(matched), 'ScannedCount': len(page)}
+        if select != 'COUNT':
+            response['Items'] = [_project(item, projection, names) for item in matched]
+        if more and page:
+            last = page[-1]
+            last_key = self._key_of(last, 'Query')
+            if index_name:
+                index_hash, index_range = self.indexes[index_name]
+                last_key[index_hash] = last[index_hash]
+                if index_range:
+                    last_key[index_range] = last[index_range]
+            response['LastEvaluatedKey'] = last_key
+        return response
+
+    def batch_writer(self, overwrite_by_pkeys: Optional[List[str]] = None) -> "FakeBatchWriter":
+        return FakeBatchWriter(self)
+
+class FakeBatchWriter:
+    # Buffers puts/deletes into BatchWriteItem calls of 25, like boto3's batch_writer
+
+    def __init__(self, table: FakeTable):
+        self.table = table
+        self._buffer: List[Tuple[str, dict]] = []
+
+    def __enter__(self) -> "FakeBatchWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._flush()
+
+    def put_item(self, Item: Dict[str, Any]) -> None:
+        self._buffer.append(('put', copy.deepcopy(Item)))
+        if len(self._buffer) >= BATCH_WRITE_LIMIT:
+            self._flush()
+
+    def delete_item(self, Key: Dict[str, Any]) -> None:
+        self._buffer.append(('delete', dict(Key)))
+        if len(self._buffer) >= BATCH_WRITE_LIMIT:
+            self._flush()
+
+    def _flush(self) -> None:
+        while self._buffer:
+            requests = self._buffer[:BATCH_WRITE_LIMIT]
+            self._buffer = self._buffer[BATCH_WRITE_LIMIT:]
+            while requests:
+                requests = self.table.dynamodb.batch_write(self.table, requests)
+
+class FakeClient:
+    # The few low-level client calls the aws package makes (DescribeTable and friends)
+
+    def __init__(self, dynamodb: "FakeDynamoDB"):
+        self.dynamodb = dynamodb
+
+    def describe_table(self, TableName: str) -> dict:
+        table = self.dynamodb.get_table(TableName, 'DescribeTable')
+        key_schema = [{'AttributeName': table.hash_key, 'KeyType': 'HASH'}]
+        if table.range_key:
+            key_schema.append({'AttributeName': table.range_key, 'KeyType': 'RANGE'})
+        indexes = []
+        for index_name, (index_hash, index_range) in table.indexes.items():
+            index_keys = [{'AttributeName': index_hash, 'KeyType': 'HASH'}]
+            if index_range:
+                index_keys.append({'AttributeName': index_range, 'KeyType': 'RANGE'})
+            indexes.append({
+                'IndexName': index_name,
+                'KeySchema': index_keys,
+                'IndexStatus': 'ACTIVE',
+                'ItemCount': sum(len(partition) for partition in table._index_partitions[index_name].values())
+            })
+        description = {
+            'TableName': TableName,
+            'KeySchema': key_schema,
+            'ItemCount': table.item_count(),
+            'BillingModeSummary': {'BillingMode': 'PAY_PER_REQUEST'}
+        }
+        if indexes:
+            description['GlobalSecondaryIndexes'] = indexes
+        return {'Table': description}
+
+    def create_table(self, TableName: str, KeySchema: List[dict], **kwargs) -> dict:
+        keys = {key['KeyType']: key['AttributeName'] for key in KeySchema}
+        self.dynamodb.create_table(TableName, keys['HASH'], keys.get('RANGE'))
+        return self.describe_table(TableName)
+
+    def update_table(self, TableName: str, GlobalSecondaryIndexUpdates: List[dict] = (), **kwargs) -> dict:
+        # New indexes are backfilled immediately and reported ACTIVE
+        table = self.dynamodb.get_table(TableName, 'UpdateTable')
+        for update in GlobalSecondaryIndexUpdates:
+            create = update.get('Create')
+            if create:
+                keys = {key['KeyType']: key['AttributeName'] for key in create['KeySchema']}
+                table.add_index(create['IndexName'], keys['HASH'], keys.get('RANGE'))
+        return self.describe_table(TableName)
+
+    def batch_get_item(self, RequestItems: Dict[str, dict]) -> dict:
+        return self.dynamodb.batch_get_item(RequestItems)
+
+    def get_waiter(self, name: str):
+        return SimpleNamespace(wait=lambda **kwargs: None)
+
+class OperationStats:
+
+    def __init__(self):
+        self.calls = 0
+        self.throttled = 0
+        self.items_read = 0
+        self.latencies: List[float] = []
+
+    def percentile(self, fraction: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class FakeDynamoDB:
+    """
+    Stand-in for the boto3 DynamoDB resource. Install it with install() so get_table()
+    and get_client() hand out fake tables; latency_ms (+/- jitter_ms) is slept on every
+    request and throttle_rate is the chance a request is throttled and retried.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        throttle_rate: float = 0.0,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        max_attempts: int = 5,
+        latency_overrides: Optional[Dict[str, float]] = None,
+        seed: Optional[int] = None
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.page_size = page_size
+        self.max_attempts = max_attempts
+        self.latency_overrides = latency_overrides or {}
+        self.tables: Dict[str, FakeTable] = {}
+        self.lock = threading.RLock()
+        self.meta = SimpleNamespace(client=FakeClient(self))
+        self._random = random.Random(seed)
+        self._stats: Dict[str, OperationStats] = defaultdict(OperationStats)
+        self._stats_lock = threading.Lock()
+
+    def install(self) -> "FakeDynamoDB":
+        dynamodb_pool.reset_dynamodb(self)
+        get_user_lookup().refresh()
+        get_user_cache().clear()
+        return self
+
+    def create_table(self, name: str, hash_key: str, range_key: Optional[str] = None) -> FakeTable:
+        with self.lock:
+            if name in self.tables:
+                raise _error('ResourceInUseException', f"Table already exists: {name}", 'CreateTable')
+            table = self.tables[name] = FakeTable(self, name, hash_key, range_key)
+            return table
+
+    def get_table(self, name: str, operation: str) -> FakeTable:
+        table = self.tables.get(name)
+        if table is None:
+            raise _error('ResourceNotFoundException', f"Requested resource not found: Table: {name} not found", operation)
+        return table
+
+    def Table(self, name: str) -> "_TableHandle":
+        # Like boto3, the handle is lazy and a missing table only fails on first use
+        return _TableHandle(self, name)
+
+    # -- request accounting ----------------------------------------------------
+
+    def _delay(self, operation: str) -> float:
+        latency = self.latency_overrides.get(operation, self.latency_ms)
+        if self.jitter_ms:
+            latency += self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, latency) / 1000
+
+    def _throttled(self) -> bool:
+        return self.throttle_rate > 0 and self._random.random() < self.throttle_rate
+
+    def call(self, operation: str, table_name: str, func: Callable[[], Tuple[Any, int]]) -> Any:
+        # One request: throttled attempts back off and retry, like botocore's standard mode
+        start = time.perf_counter()
+        stats_key = f"{operation} {table_name}"
+        try:
+            for attempt in range(self.max_attempts):
+                time.sleep(self._delay(operation))
+                if self._throttled():
+                    self._record(stats_key, throttled=1)
+                    time.sleep(min(0.05 * (2 ** attempt), 1.0) * self._random.random())
+                    continue
+                try:
+                    with self.lock:
+                        self.get_table(table_name, operation)
+                        result, items_read = func()
+                except ClientError:
+                    # Rejected requests (conditions, validation) still cost a round trip
+                    self._record(stats_key)
+                    raise
+                self._record(stats_key, items_read=items_read)
+                return result
+            raise _error('ProvisionedThroughputExceededException', f"Throttled {self.max_attempts} times", operation)
+        finally:
+            with self._stats_lock:
+                self._stats[stats_key].latencies.append(time.perf_counter() - start)
+
+    def _record(self, stats_key: str, throttled: int = 0, items_read: int = 0) -> None:
+        with self._stats_lock:
+            stats = self._stats[stats_key]
+            stats.calls += 1
+            stats.throttled += throttled
+            stats.items_read += items_read
+
+    def batch_get_item(self, RequestItems: Dict[str, dict]) -> dict:
+        # Throttling shows up as UnprocessedKeys, which callers must resend
+        def batch_get():
+            responses = {}
+            unprocessed = {}
+            read = 0
+            for table_name, request in RequestItems.items():
+                table = self.get_table(table_name, 'BatchGetItem')
+                names = request.get('ExpressionAttributeNames')
+                found = []
+                skipped = []
+                for key in request['Keys']:
+                    if self._throttled():
+                        skipped.append(key)
+                        continue
+                    read += 1
+                    item = table._items.get(table._sort_key(key))
+                    if item is not None:
+                        found.append(_project(item, request.get('ProjectionExpression'), names))
+                responses[table_name] = found
+                if skipped:
+                    unprocessed[table_name] = dict(request, Keys=skipped)
+            return {'Responses': responses, 'UnprocessedKeys': unprocessed}, read
+
+        table_names = ','.join(RequestItems)
+        start = time.perf_counter()
+        time.sleep(self._delay('BatchGetItem'))
+        with self.lock:
+            result, read = batch_get()
+        stats_key = f"BatchGetItem {table_names}"
+        self._record(stats_key, throttled=1 if result['UnprocessedKeys'] else 0, items_read=read)
+        with self._stats_lock:
+            self._stats[stats_key].latencies.append(time.perf_counter() - start)
+        return result
+
+    def batch_write(self, table: FakeTable, requests: List[Tuple[str, dict]]) -> List[Tuple[str, dict]]:
+        # Returns the unprocessed requests; the batch writer resends them after a short backoff
+        start = time.perf_counter()
+        time.sleep(self._delay('BatchWriteItem'))
+        unprocessed = []
+        with self.lock:
+            for action, payload in requests:
+                if self._throttled():
+                    unprocessed.append((action, payload))
+                elif action == 'put':
+                    table._store(payload)
+                else:
+                    table._unstore(table._sort_key(payload))
+        stats_key = f"BatchWriteItem {table.name}"
+        self._record(stats_key, throttled=1 if unprocessed else 0, items_read=len(requests) - len(unprocessed))
+        with self._stats_lock:
+            self._stats[stats_key].latencies.append(time.perf_counter() - start)
+        if unprocessed:
+            time.sleep(0.05 * self._random.random())
+        return unprocessed
+
+    # -- reporting -------------------------------------------------------------
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self._stats = defaultdict(OperationStats)
+
+    def total_calls(self) -> int:
+        with self._stats_lock:
+            return sum(stats.calls for stats in self._stats.values())
+
+    def report(self) -> str:
+        with self._stats_lock:
+            rows = sorted(self._stats.items())
+        lines = [f"{'operation':<64} {'calls':>8} {'throttled':>9} {'items':>10} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}"]
+        for name, stats in rows:
+            lines.append(
+                f"{name[:64]:<64} {stats.calls:>8} {stats.throttled:>9} {stats.items_read:>10} "
+                f"{stats.percentile(0.5) * 1000:>8.2f} {stats.percentile(0.95) * 1000:>8.2f} "
+                f"{max(stats.latencies, default=0.0) * 1000:>8.2f}"
+            )
+        lines.append(f"{'total':<64} {sum(stats.calls for _, stats in rows):>8} {sum(stats.throttled for _, stats in rows):>9} {sum(stats.items_read for _, stats in rows):>10}")
+        return "\n".join(lines)
+
+class _TableHandle:
+
+    def __init__(self, dynamodb: FakeDynamoDB, name: str):
+        self._dynamodb = dynamodb
+        self.name = name
+        self.table_name = name
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self._dynamodb.get_table(self.name, 'DescribeTable'), attribute)
+
+# -- expressions ---------------------------------------------------------------
+
+_MISSING = object()
+
+def _resolve_path(path: str, names: Optional[Dict[str, str]]) -> List[str]:
+    return [names[part] if part.startswith('#') else part for part in path.strip().split('.')]
+
+def _get_path(item: Optional[Dict[str, Any]], parts: List[str]) -> Any:
+    value = item
+    for part in parts:
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+def _project(item: Dict[str, Any], projection: Optional[str], names: Optional[Dict[str, str]]) -> Dict[str, Any]:
+    if not projection:
+        return copy.deepcopy(item)
+    projected = {}
+    for path in projection.split(','):
+        parts = _resolve_path(path, names)
+        value = _get_path(item, parts)
+        if value is _MISSING:
+            continue
+        target = projected
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = copy.deepcopy(value)
+    return projected
+
+def _attribute_type(value: Any) -> str:
+    if isinstance(value, bool):
+        return 'BOOL'
+    if isinstance(value, str):
+        return 'S'
+    if isinstance(value, (int, float, Decimal)):
+        return 'N'
+    if isinstance(value, (bytes, bytearray)):
+        return 'B'
+    if isinstance(value, (set, frozenset)):
+        sample = next(iter(value), '')
+        return 'NS' if isinstance(sample, (int, float, Decimal)) else 'SS'
+    if isinstance(value, dict):
+        return 'M'
+    if isinstance(value, list):
+        return 'L'
+    return 'NULL'
+
+def _compare(operator: str, actual: Any, values: List[Any]) -> bool:
+    if operator in ('attribute_exists', 'attribute_not_exists'):
+        return (actual is not _MISSING) == (operator == 'attribute_exists')
+    if actual is _MISSING:
+        return operator == '<>'
+    try:
+        if operator == '=':
+            return actual == values[0]
+        if operator == '<>':
+            return actual != values[0]
+        if operator == '<':
+            return actual < values[0]
+        if operator == '<=':
+            return actual <= values[0]
+        if operator == '>':
+            return actual > values[0]
+        if operator == '>=':
+            return actual >= values[0]
+        if operator == 'BETWEEN':
+            return values[0] <= actual <= values[1]
+        if operator == 'IN':
+            return actual in values
+        if operator == 'begins_with':
+            return isinstance(actual, str) and actual.startswith(values[0])
+        if operator == 'contains':
+            return values[0] in actual
+        if operator == 'attribute_type':
+            return _attribute_type(actual) == values[0]
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported condition operator {operator}")
+
+def _matches(condition: Any, item: Optional[Dict[str, Any]], names: Optional[Dict[str, str]], values: Optional[Dict[str, Any]]) -> bool:
+    if isinstance(condition, str):
+        return _matches_string(condition, item, names or {}, values or {})
+
+    # boto3.dynamodb.conditions objects (Key(...).eq(...), Attr(...).not_exists(), &, |, ~)
+    operator = condition.expression_operator
+    operands = condition.get_expression()['values']
+    if operator == 'AND':
+        return all(_matches(operand, item, names, values) for operand in operands)
+    if operator == 'OR':
+        return any(_matches(operand, item, names, values) for operand in operands)
+    if operator == 'NOT':
+        return not _matches(operands[0], item, names, values)
+    actual = _get_path(item, operands[0].name.split('.'))
+    return _compare(operator, actual, list(operands[1:]))
+
+_FUNCTION_TERM = re.compile(r"^(attribute_exists|attribute_not_exists|begins_with|contains|attribute_type)\s*\(\s*([^,)]+?)\s*(?:,\s*(:\w+)\s*)?\)$", re.IGNORECASE)
+_COMPARE_TERM = re.compile(r"^([#\w.]+)\s*(=|<>|<=|>=|<|>)\s*(:\w+)$")
+
+def _matches_string(condition: str, item: Optional[Dict[str, Any]], names: Dict[str, str], values: Dict[str, Any]) -> bool:
+    # Enough of the expression grammar for the conditions written in this repo: terms joined by AND
+    for term in re.split(r"\s+AND\s+", condition.strip(), flags=re.IGNORECASE):
+        term = term.strip()
+        function = _FUNCTION_TERM.match(term)
+        if function:
+            operator, path, value_name = function.groups()
+            operands = [values[value_name]] if value_name else []
+            if not _compare(operator.lower(), _get_path(item, _resolve_path(path, names)), operands):
+                return False
+            continue
+        comparison = _COMPARE_TERM.match(term)
+        if not comparison:
+            raise ValueError(f"Unsupported condition expression: {term}")
+        path, operator, value_name = comparison.groups()
+        if not _compare(operator, _get_path(item, _resolve_path(path, names)), [values[value_name]]):
+            return False
+    return True
+
+def _check_condition(condition: Any, item: Optional[Dict[str, Any]], names, values, operation: str) -> None:
+    if not _matches(condition, item, names, values):
+        raise _error('ConditionalCheckFailedException', "The conditional request failed", operation)
+
+def _partition_value(condition: Any, hash_name: str, names, values) -> Any:
+    # Pulls the equality on the partition key out of a KeyConditionExpression
+    if isinstance(condition, str):
+        for term in re.split(r"\s+AND\s+", condition.strip(), flags=re.IGNORECASE):
+            comparison = _COMPARE_TERM.match(term.strip())
+            if comparison and comparison.group(2) == '=' and _resolve_path(comparison.group(1), names or {}) == [hash_name]:
+                return (values or {})[comparison.group(3)]
+    else:
+        operator = condition.expression_operator
+        operands = condition.get_expression()['values']
+        if operator == 'AND':
+            for operand in operands:
+                try:
+                    return _partition_value(operand, hash_name, names, values)
+                except ClientError:
+                    continue
+        elif operator == '=' and operands[0].name == hash_name:
+            return operands[1]
+    raise _error('ValidationException', f"Query condition missed key schema element: {hash_name}", 'Query')
+
+_UPDATE_CLAUSE = re.compile(r"\b(SET|REMOVE|ADD|DELETE)\b", re.IGNORECASE)
+
+def _apply_update(item: Dict[str, Any], expression: str, names: Dict[str, str], values: Dict[str, Any]) -> List[str]:
+    # SET path = :value, REMOVE path, ADD path :value, DELETE path :value; returns touched attributes
+    parts = _UPDATE_CLAUSE.split(expression)
+    seen = set()
+    changed = []
+    for clause, body in zip(parts[1::2], parts[2::2]):
+        clause = clause.upper()
+        if clause in seen:
+            raise _error('ValidationException', f"The \"{clause}\" section can only be used once in an update expression", 'UpdateItem')
+        seen.add(clause)
+        for action in body.split(','):
+            action = action.strip()
+            if not action:
+                continue
+            if clause == 'SET':
+                path, value_name = [part.strip() for part in action.split('=', 1)]
+                path_parts = _resolve_path(path, names)
+                _parent(item, path_parts)[path_parts[-1]] = copy.deepcopy(values[value_name])
+            elif clause == 'REMOVE':
+                path_parts = _resolve_path(action, names)
+                _parent(item, path_parts).pop(path_parts[-1], None)
+            else:
+                path, value_name = action.split()
+                path_parts = _resolve_path(path, names)
+                parent = _parent(item, path_parts)
+                current = parent.get(path_parts[-1])
+                operand = values[value_name]
+                if clause == 'ADD':
+                    if isinstance(operand, (set, frozenset)):
+                        parent[path_parts[-1]] = set(current or ()) | set(operand)
+                    else:
+                        parent[path_parts[-1]] = (current or 0) + operand
+                else:
+                    remaining = set(current or ()) - set(operand)
+                    if remaining:
+                        parent[path_parts[-1]] = remaining
+                    else:
+                        parent.pop(path_parts[-1], None)
+            changed.append(path_parts[0])
+    return changed
+
+def _parent(item: Dict[str, Any], path_parts: List[str]) -> Dict[str, Any]:
+    parent = item
+    for part in path_parts[:-1]:
+        parent = parent.get(part) if isinstance(parent, dict) else None
+        if not isinstance(parent, dict):
+            raise _error('ValidationException', "The document path provided in the update expression is invalid for update", 'UpdateItem')
+    return parent
+
+def create_convoia_tables(dynamodb: FakeDynamoDB, sparse_indexes: bool = True, users_hash_key: str = 'email') -> FakeDynamoDB:
+    # Table layouts as the aws package expects them; ConvoiaUsers can be keyed on
+    # something other than `email` to exercise the email GSI path
+    users = dynamodb.create_table(dynamodb_pool.USERS_TABLE, users_hash_key)
+    if users_hash_key != 'email':
+        users.add_index(USERS_EMAIL_INDEX, 'email')
+    tracking = dynamodb.create_table(dynamodb_pool.TRACKING_TABLE, 'email_id')
+    if sparse_indexes:
+        for marker_attribute, index_name in ACTIVE_FLAG_INDEXES.values():
+            tracking.add_index(index_name, marker_attribute, 'email_id')
+    dynamodb.create_table(dynamodb_pool.AUTOMATED_RESPONSES_TABLE, 'email_id', 'category')
+    dynamodb.create_table(dynamodb_pool.IMPORTANT_KEYWORDS_TABLE, 'email_id', 'keyword')
+    dynamodb.create_table(dynamodb_pool.IMPORTANT_SENDERS_TABLE, 'email_id', 'sender_email_id')
+    dynamodb.create_table(dynamodb_pool.IMPORTANT_DESCRIPTIONS_TABLE, 'email_id', 'description')
+    dynamodb.create_table(dynamodb_pool.USER_CONFIG_TABLE, 'email_id')
+    return dynamodb
@@ -0,0 +1,243 @@
+import re
+import sys
+import copy
+import json
+import time
+import base64
+import random
+import threading
+from pathlib import Path
+from email.parser import BytesParser
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from dataExtraction.gmail import service_factory
+from dataExtraction.gmail.rate_limiter import QUOTA_UNITS
+
+# Local HTTP stand-in for the Gmail endpoints the extraction path calls: threads.get/list,
+# messages.get/list, labels.list and the multipart/mixed batch endpoint. Each HTTP request
+# is delayed by --latency-ms, and a strict per-user quota bucket answers 429 like Gmail
+# when the client outruns it, so concurrency and backoff can be measured offline.
+
+LABELS = [
+    {'id': 'INBOX', 'name': 'INBOX', 'type': 'system'},
+    {'id': 'IMPORTANT', 'name': 'IMPORTANT', 'type': 'system'},
+    {'id': 'CATEGORY_UPDATES', 'name': 'CATEGORY_UPDATES', 'type': 'system'},
+    {'id': 'Label_1', 'name': 'Invoices', 'type': 'user'},
+]
+
+RATE_LIMITED_BODY = {
+    'error': {
+        'code': 429,
+        'message': 'User-rate limit exceeded.',
+        'errors': [{'reason': 'rateLimitExceeded', 'domain': 'usageLimits'}]
+    }
+}
+
+def _encode(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii')
+
+def build_mailbox(threads: int, max_messages: int = 4, seed: int = 7) -> Dict[str, Dict[str, Any]]:
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    mailbox = {}
+    for t in range(threads):
+        thread_id = f"t{t:07x}"
+        messages = []
+        for m in range(rng.randint(1, max_messages)):
+            sent = start + timedelta(minutes=t * 7 + m)
+            body = f"Message {m} of thread {t}. " * rng.randint(5, 40)
+            messages.append({
+                'id': f"{thread_id}m{m}",
+                'threadId': thread_id,
+                'labelIds': rng.sample([label['id'] for label in LABELS], rng.randint(1, 3)),
+                'historyId': str(1000 + t),
+                'payload': {
+                    'mimeType': 'multipart/alternative',
+                    'headers': [
+                        {'name': 'Subject', 'value': f"Thread {t}"},
+                        {'name': 'From', 'value': f"Sender {t % 97} <sender{t % 97}@example.com>"},
+                        {'name': 'To', 'value': 'owner@example.com'},
+                        {'name': 'Date', 'value': format_datetime(sent)},
+                    ],
+                    'body': {'size': 0},
+                    'parts': [
+                        {'mimeType': 'text/plain', 'body': {'data': _encode(body)}},
+                        {'mimeType': 'text/html', 'body': {'data': _encode(f"<p>{body}</p>")}},
+                    ]
+                }
+            })
+        mailbox[thread_id] = {'id': thread_id, 'historyId': str(1000 + t), 'messages': messages}
+    return mailbox
+
+class QuotaBucket:
+    # Gmail-side limiter: no debt, a call that does not fit is rejected with 429
+
+    def __init__(self, units_per_second: float):
+        self.rate = units_per_second
+        self.tokens = units_per_second
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, units: int) -> bool:
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < units:
+                return False
+            self.tokens -= units
+            return True
+
+class FakeGmailServer:
+    """
+    ThreadingHTTPServer serving a generated mailbox. `install()` points the shared Gmail
+    service factory at it, with a static token, so the real client code talks to it.
+    """
+
+    def __init__(self, mailbox: Dict[str, Dict[str, Any]], latency_ms: float = 50.0, per_item_ms: float = 1.0, quota_units: float = 250.0):
+        self.mailbox = mailbox
+        self.messages = {message['id']: message for thread in mailbox.values() for message in thread['messages']}
+        self.latency = latency_ms / 1000
+        self.per_item = per_item_ms / 1000
+        self.quota = QuotaBucket(quota_units)
+        self.stats: Dict[str, int] = defaultdict(int)
+        self._stats_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def start(self) -> "FakeGmailServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='fake-gmail', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def install(self) -> "FakeGmailServer":
+        document = copy.deepcopy(service_factory._load_discovery_document())
+        document['rootUrl'] = self.url
+        document['baseUrl'] = self.url
+        credentials = service_factory.OAuthCredentials(token='fake-access-token')
+        service_factory._discovery_document = document
+        service_factory.get_gmail_credentials = lambda email: credentials
+        return self
+
+    def handle(self, method: str, target: str) -> Tuple[int, Dict[str, Any]]:
+        # One API call: quota first, then route
+        parts = urlsplit(target)
+        query = parse_qs(parts.query)
+        path = parts.path
+
+        match = re.fullmatch(r'/gmail/v1/users/me/(threads|messages)/([^/]+)', path)
+        if method == 'GET' and match:
+            kind, item_id = match.groups()
+            cost = QUOTA_UNITS[f"{kind}.get"]
+            if not self.quota.take(cost):
+                self.count('rate_limited')
+                return 429, RATE_LIMITED_BODY
+            self.count(f"{kind}.get")
+            item = (self.mailbox if kind == 'threads' else self.messages).get(item_id)
+            if item is None:
+                return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+            if kind == 'messages' and query.get('format', ['full'])[0] == 'minimal':
+                item = {key: item[key] for key in ('id', 'threadId', 'labelIds')}
+            elif kind == 'messages' and query.get('format', ['full'])[0] == 'metadata':
+                wanted = set(query.get('metadataHeaders', []))
+                headers = [header for header in item['payload']['headers'] if not wanted or header['name'] in wanted]
+                item = {**{key: item[key] for key in ('id', 'threadId', 'labelIds')}, 'payload': {'headers': headers}}
+            return 200, item
+
+        match = re.fullmatch(r'/gmail/v1/users/me/(threads|messages|labels)', path)
+        if method == 'GET' and match:
+            kind = match.group(1)
+            cost = QUOTA_UNITS[f"{kind}.list"]
+            if not self.quota.take(cost):
+                self.count('rate_limited')
+                return 429, RATE_LIMITED_BODY
+            self.count(f"{kind}.list")
+            if kind == 'labels':
+                return 200, {'labels': LABELS}
+            items = list(self.mailbox.values()) if kind == 'threads' else list(self.messages.values())
+            start = int(query.get('pageToken', ['0'])[0])
+            size = int(query.get('maxResults', ['100'])[0])
+            page = [{'id': item['id'], 'threadId': item.get('threadId', item['id'])} for item in items[start:start + size]]
+            response = {kind: page}
+            if start + size < len(items):
+                response['nextPageToken'] = str(start + size)
+            return 200, response
+
+        return 404, {'error': {'code': 404, 'message': f"No fake route for {method} {path}"}}
+
+    def handle_batch(self, content_type: str, body: bytes) -> Tuple[str, bytes]:
+        message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        boundary = f"batch_{random.getrandbits(64):016x}"
+        chunks = []
+        for part in message.get_payload():
+            method, target, _ = part.get_payload().splitlines()[0].split(' ', 2)
+            status, payload = self.handle(method, target)
+            reason = {200: 'OK', 404: 'Not Found', 429: 'Too Many Requests'}.get(status, 'Error')
+            chunks.append(
+                f"--{boundary}\r\n"
+                f"Content-Type: application/http\r\n"
+                f"Content-ID: <response-{part['Content-ID'][1:-1]}>\r\n\r\n"
+                f"HTTP/1.1 {status} {reason}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        chunks.append(f"--{boundary}--\r\n")
+        return f"multipart/mixed; boundary={boundary}", "".join(chunks).encode('utf-8')
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, content_type: str, body: bytes) -> None:
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                server.count('http_requests')
+                time.sleep(server.latency + server.per_item)
+                status, payload = server.handle('GET', self.path)
+                self._reply(status, 'application/json; charset=UTF-8', json.dumps(payload).encode('utf-8'))
+
+            def do_POST(self):
+                server.count('http_requests')
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if urlsplit(self.path).path != '/batch':
+                    self._reply(404, 'application/json', b'{}')
+                    return
+                content_type, response = server.handle_batch(self.headers['Content-Type'], body)
+                server.count('batch_requests')
+                time.sleep(server.latency + server.per_item * response.count(b'HTTP/1.1 '))
+                self._reply(200, content_type, response)
+
+        return Handler
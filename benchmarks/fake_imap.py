@@ -0,0 +1,314 @@
+import re
+import sys
+import time
+import socket
+import imaplib
+import threading
+import socketserver
+from pathlib import Path
+from email import message_from_bytes
+from email.message import EmailMessage
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fake_gmail import build_mailbox
+
+# Local plaintext IMAP server for the commands the extractor and EmailClient send:
+# CAPABILITY, LOGIN, SELECT/EXAMINE, STATUS, SEARCH, FETCH, STORE and their UID forms, NOOP
+# and LOGOUT, plus IDLE when built with idle=True. Every command is delayed by --latency-ms before its reply, so round-trip
+# counts dominate like they do against a remote server. It advertises X-GM-EXT-1 and
+# answers X-GM-THRID; with condstore=True it also keeps mod-sequences for CHANGEDSINCE.
+
+CAPABILITIES = 'IMAP4rev1 UIDPLUS X-GM-EXT-1 AUTH=PLAIN'
+UIDVALIDITY = 1
+OWNER = 'owner@example.com'
+INBOX = 'INBOX'
+SENT = '[Gmail]/Sent Mail'
+FIRST_UID = 1001
+
+COMMAND_PATTERN = re.compile(rb'^(\S+) (?:(UID) )?(\S+) ?(.*)$', re.IGNORECASE)
+UID_RANGE_PATTERN = re.compile(r'\bUID ([\d:*,]+)', re.IGNORECASE)
+SINCE_PATTERN = re.compile(r'\bSINCE "?(\d{1,2}-\w{3}-\d{4})"?', re.IGNORECASE)
+HEADER_PATTERN = re.compile(r'\bHEADER (\S+) "([^"]*)"', re.IGNORECASE)
+CHANGEDSINCE_PATTERN = re.compile(r'\(CHANGEDSINCE (\d+)\)', re.IGNORECASE)
+HEADER_FIELDS_PATTERN = re.compile(r'BODY(?:\.PEEK)?\[HEADER\.FIELDS \(([^)]*)\)\]', re.IGNORECASE)
+
+class FakeMessage:
+
+    def __init__(self, uid: int, thread_id: int, flags: List[str], raw: bytes, received: Optional[datetime] = None, modseq: int = 1):
+        self.uid = uid
+        self.thread_id = thread_id
+        self.flags = flags
+        self.raw = raw
+        self.received = received or datetime.now(timezone.utc)
+        self.modseq = modseq
+        self.message = message_from_bytes(raw)
+
+def build_folders(threads: int, seed: int = 7) -> Dict[str, List[FakeMessage]]:
+    # The fake Gmail mailbox as RFC822 messages; every fourth message was sent by the owner
+    folders: Dict[str, List[FakeMessage]] = {INBOX: [], SENT: []}
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for t, thread in enumerate(build_mailbox(threads, seed=seed).values()):
+        for m, raw_message in enumerate(thread['messages']):
+            headers = {header['name']: header['value'] for header in raw_message['payload']['headers']}
+            sent_by_owner = (t + m) % 4 == 0
+            message = EmailMessage()
+            message['Subject'] = headers['Subject'] if m == 0 else f"Re: {headers['Subject']}"
+            message['From'] = OWNER if sent_by_owner else headers['From']
+            message['To'] = headers['From'] if sent_by_owner else OWNER
+            sent = start + timedelta(minutes=t * 7 + m)
+            message['Date'] = format_datetime(sent)
+            message['Message-ID'] = f"<{raw_message['id']}@example.com>"
+            message.set_content(f"Message {m} of thread {t}. " * (5 + (t * 13 + m) % 35))
+            message.add_alternative(f"<p>Message {m} of thread {t}.</p>", subtype='html')
+
+            folder = folders[SENT if sent_by_owner else INBOX]
+            folder.append(FakeMessage(FIRST_UID + len(folder), 5000000 + t, ['\\Seen'] if m else [], message.as_bytes(), sent, len(folder) + 1))
+    return folders
+
+def parse_set(spec: str, values: List[int]) -> List[int]:
+    # Sequence or UID set against the folder's values; '*' is the largest
+    selected = set()
+    largest = max(values) if values else 0
+    for part in spec.split(','):
+        low, _, high = part.partition(':')
+        low_value = largest if low == '*' else int(low)
+        high_value = low_value if not high else (largest if high == '*' else int(high))
+        low_value, high_value = sorted((low_value, high_value))
+        selected.update(value for value in values if low_value <= value <= high_value)
+    return sorted(selected)
+
+class FakeImapServer:
+
+    def __init__(self, folders: Dict[str, List[FakeMessage]], latency_ms: float = 20.0, condstore: bool = False, idle: bool = False):
+        self.folders = folders
+        self.latency = latency_ms / 1000.0
+        self.condstore = condstore
+        self.capabilities = CAPABILITIES + (' CONDSTORE' if condstore else '') + (' IDLE' if idle else '')
+        self.commands = 0
+        self.highest_modseq = max((m.modseq for messages in folders.values() for m in messages), default=1)
+        self.idle_commands = 0
+        self._idlers: List[socketserver.StreamRequestHandler] = []
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def start(self) -> "FakeImapServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def connect(self, user: str = OWNER, password: str = 'secret') -> imaplib.IMAP4:
+        host, port = self.address
+        mail = imaplib.IMAP4(host, port)
+        mail.login(user, password)
+        return mail
+
+    def deliver(self, folder: str, message: EmailMessage, thread_id: int = 0) -> FakeMessage:
+        # New mail arriving while clients are connected
+        with self._lock:
+            messages = self.folders[folder]
+            self.highest_modseq += 1
+            uid = (messages[-1].uid + 1) if messages else FIRST_UID
+            delivered = FakeMessage(uid, thread_id or 9000000 + uid, [], message.as_bytes(), modseq=self.highest_modseq)
+            messages.append(delivered)
+            for handler in self._idlers:
+                if handler.folder is messages:
+                    handler.wfile.write(f'* {len(messages)} EXISTS\r\n'.encode())
+            return delivered
+
+    def drop_connections(self) -> None:
+        # Hangs up on the idling clients, like a server restart
+        with self._lock:
+            idlers, self._idlers = self._idlers, []
+        for handler in idlers:
+            handler.connection.shutdown(socket.SHUT_RDWR)
+
+    def search(self, messages: List[FakeMessage], criteria: str) -> List[FakeMessage]:
+        # ALL, UID ranges, SINCE, HEADER and UNDELETED/UNDRAFT; anything else matches all
+        selected = list(messages)
+        uid_range = UID_RANGE_PATTERN.search(criteria)
+        if uid_range:
+            uids = set(parse_set(uid_range.group(1), [m.uid for m in messages]))
+            selected = [m for m in selected if m.uid in uids]
+        since = SINCE_PATTERN.search(criteria)
+        if since:
+            day = datetime.strptime(since.group(1), '%d-%b-%Y').date()
+            selected = [m for m in selected if m.received.date() >= day]
+        for name, value in HEADER_PATTERN.findall(criteria):
+            selected = [m for m in selected if value in (m.message.get(name) or '')]
+        if 'UNDELETED' in criteria.upper():
+            selected = [m for m in selected if '\\Deleted' not in m.flags]
+        if 'UNDRAFT' in criteria.upper():
+            selected = [m for m in selected if '\\Draft' not in m.flags]
+        return selected
+
+    def uid_next(self, messages: List[FakeMessage]) -> int:
+        return (messages[-1].uid + 1) if messages else FIRST_UID
+
+    def folder_modseq(self, messages: List[FakeMessage]) -> int:
+        return max((m.modseq for m in messages), default=1)
+
+    def select_reply(self, messages: List[FakeMessage]) -> bytes:
+        lines = [f'* {len(messages)} EXISTS', f'* OK [UIDVALIDITY {UIDVALIDITY}] UIDs valid', f'* OK [UIDNEXT {self.uid_next(messages)}] Predicted next UID']
+        if self.condstore:
+            lines.append(f'* OK [HIGHESTMODSEQ {self.folder_modseq(messages)}] Highest')
+        return ''.join(f'{line}\r\n' for line in lines).encode()
+
+    def status_reply(self, name: str, items: str) -> bytes:
+        messages = self.folders[name]
+        values = [f'MESSAGES {len(messages)}', f'UIDVALIDITY {UIDVALIDITY}', f'UIDNEXT {self.uid_next(messages)}']
+        if self.condstore and 'HIGHESTMODSEQ' in items.upper():
+            values.append(f'HIGHESTMODSEQ {self.folder_modseq(messages)}')
+        return f'* STATUS "{name}" ({" ".join(values)})\r\n'.encode()
+
+    def fetch_reply(self, number: int, message: FakeMessage, items: str, uid_command: bool) -> bytes:
+        items = items.upper()
+        parts = []
+        if uid_command or 'UID' in items:
+            parts.append(f'UID {message.uid}'.encode())
+        if 'MODSEQ' in items or 'CHANGEDSINCE' in items:
+            parts.append(f'MODSEQ ({message.modseq})'.encode())
+        if 'INTERNALDATE' in items:
+            parts.append(f'INTERNALDATE "{message.received.strftime("%d-%b-%Y %H:%M:%S %z")}"'.encode())
+        if 'X-GM-THRID' in items:
+            parts.append(f'X-GM-THRID {message.thread_id}'.encode())
+        if 'FLAGS' in items:
+            parts.append(f"FLAGS ({' '.join(message.flags)})".encode())
+        literal, data = None, message.raw
+        header_fields = HEADER_FIELDS_PATTERN.search(items)
+        if header_fields:
+            names = header_fields.group(1).split()
+            literal = f'BODY[HEADER.FIELDS ({" ".join(names)})]'.encode()
+            data = ''.join(f'{name}: {message.message[name]}\r\n' for name in names if message.message[name]).encode() + b'\r\n'
+        elif 'BODY.PEEK[]' in items or 'BODY[]' in items:
+            literal = b'BODY[]'
+        elif 'RFC822' in items:
+            literal = b'RFC822'
+        reply = f'* {number} FETCH ('.encode() + b' '.join(parts)
+        if literal is not None:
+            reply += (b' ' if parts else b'') + literal + f' {{{len(data)}}}\r\n'.encode() + data
+        return reply + b')\r\n'
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+
+            def handle(self):
+                self.folder: Optional[List[FakeMessage]] = None
+                self.idle_tag: Optional[str] = None
+                self.wfile.write(f'* OK [CAPABILITY {server.capabilities}] Fake IMAP ready\r\n'.encode())
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    if self.idle_tag is not None:
+                        self.end_idle(line)
+                        continue
+                    match = COMMAND_PATTERN.match(line.rstrip(b'\r\n'))
+                    if not match:
+                        self.wfile.write(b'* BAD unparsable command\r\n')
+                        continue
+                    time.sleep(server.latency)
+                    with server._lock:
+                        server.commands += 1
+                    tag, uid, command, args = (group.decode() if group else '' for group in match.groups())
+                    with server._lock:
+                        running = self.dispatch(tag, bool(uid), command.upper(), args)
+                    if not running:
+                        return
+
+            def end_idle(self, line: bytes) -> None:
+                with server._lock:
+                    if self in server._idlers:
+                        server._idlers.remove(self)
+                    tag, self.idle_tag = self.idle_tag, None
+                    if line.strip().upper() == b'DONE':
+                        self.reply(tag, 'IDLE terminated')
+                    else:
+                        self.reply(tag, 'expected DONE', status='BAD')
+
+            def reply(self, tag: str, text: str = 'completed', untagged: bytes = b'', status: str = 'OK') -> None:
+                self.wfile.write(untagged + f'{tag} {status} {text}\r\n'.encode())
+
+            def store(self, message: FakeMessage, items: str) -> None:
+                action, _, flags = items.partition(' ')
+                names = flags.strip('()').split()
+                if action.upper().startswith('+'):
+                    message.flags = list(dict.fromkeys(message.flags + names))
+                elif action.upper().startswith('-'):
+                    message.flags = [flag for flag in message.flags if flag not in names]
+                else:
+                    message.flags = names
+                server.highest_modseq += 1
+                message.modseq = server.highest_modseq
+
+            def dispatch(self, tag: str, uid_command: bool, command: str, args: str) -> bool:
+                if command == 'CAPABILITY':
+                    self.reply(tag, untagged=f'* CAPABILITY {server.capabilities}\r\n'.encode())
+                elif command == 'LOGIN':
+                    self.reply(tag, 'LOGIN completed')
+                elif command in ('SELECT', 'EXAMINE'):
+                    name = args.strip().strip('"')
+                    self.folder = server.folders.get(name)
+                    if self.folder is None:
+                        self.reply(tag, 'no such folder', status='NO')
+                    else:
+                        access = 'READ-ONLY' if command == 'EXAMINE' else 'READ-WRITE'
+                        self.reply(tag, f'[{access}] {command} completed', server.select_reply(self.folder))
+                elif command == 'STATUS':
+                    name, _, items = args.strip().partition(' (')
+                    if name.strip('"') not in server.folders:
+                        self.reply(tag, 'no such folder', status='NO')
+                    else:
+                        self.reply(tag, untagged=server.status_reply(name.strip('"'), items))
+                elif command == 'SEARCH':
+                    positions = {id(m): number for number, m in enumerate(self.folder, 1)}
+                    matches = server.search(self.folder, args)
+                    values = [m.uid if uid_command else positions[id(m)] for m in matches]
+                    self.reply(tag, untagged=f"* SEARCH {' '.join(map(str, values))}\r\n".encode())
+                elif command in ('FETCH', 'STORE'):
+                    spec, _, items = args.partition(' ')
+                    untagged = []
+                    if uid_command:
+                        positions = {m.uid: number for number, m in enumerate(self.folder, 1)}
+                        numbers = [positions[value] for value in parse_set(spec, list(positions))]
+                    else:
+                        numbers = parse_set(spec, list(range(1, len(self.folder) + 1)))
+                    changed_since = CHANGEDSINCE_PATTERN.search(items)
+                    for number in numbers:
+                        message = self.folder[number - 1]
+                        if command == 'STORE':
+                            self.store(message, items)
+                        elif changed_since and message.modseq <= int(changed_since.group(1)):
+                            continue
+                        untagged.append(server.fetch_reply(number, message, 'FLAGS' if command == 'STORE' else items, uid_command))
+                    self.reply(tag, untagged=b''.join(untagged))
+                elif command == 'IDLE' and 'IDLE' in server.capabilities.split():
+                    server.idle_commands += 1
+                    self.idle_tag = tag
+                    server._idlers.append(self)
+                    self.wfile.write(b'+ idling\r\n')
+                elif command == 'NOOP':
+                    self.reply(tag)
+                elif command == 'LOGOUT':
+                    self.reply(tag, untagged=b'* BYE logging out\r\n')
+                    return False
+                else:
+                    self.reply(tag, f'unknown command {command}', status='BAD')
+                return True
+
+        return Handler
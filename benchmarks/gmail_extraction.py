@@ -0,0 +1,65 @@
+import sys
+import time
+import json
+import hashlib
+import argparse
+from pathlib import Path
+from typing import List
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from dataExtraction.gmail import rate_limiter
+from dataExtraction.gmail.data_extraction import GmailDataExtractor
+from benchmarks.fake_gmail import FakeGmailServer, build_mailbox
+
+# Thread extraction throughput against the local fake Gmail server at several worker
+# counts. The fake enforces a per-user quota like Gmail (250 units/s by default, 10 per
+# threads.get), so beyond a few workers the quota, not latency, is the ceiling; run with
+# --quota-units 0 to see the latency-bound scaling alone.
+#
+#   python benchmarks/gmail_extraction.py --threads 2000 --workers 1 8 32
+#   python benchmarks/gmail_extraction.py --threads 2000 --quota-units 0
+
+EMAIL = 'owner@example.com'
+
+def digest(threads: List[list]) -> str:
+    return hashlib.sha256(json.dumps(threads, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+def main():
+    parser = argparse.ArgumentParser(description="Gmail thread extraction throughput against a local fake server")
+    parser.add_argument('--threads', type=int, default=1000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--latency-ms', type=float, default=50.0, help="Round trip per HTTP request")
+    parser.add_argument('--per-item-ms', type=float, default=1.0, help="Extra server time per call in a batch")
+    parser.add_argument('--quota-units', type=float, default=250.0, help="Per-user quota units per second, 0 for none")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    mailbox = build_mailbox(args.threads, seed=args.seed)
+    thread_ids = list(mailbox)
+
+    digests = set()
+    for workers in args.workers:
+        server = FakeGmailServer(mailbox, args.latency_ms, args.per_item_ms, args.quota_units).start().install()
+        # Client bucket sized to the fake's quota, fresh for every run
+        rate_limiter._limiters[EMAIL] = rate_limiter.QuotaRateLimiter(args.quota_units * rate_limiter.QUOTA_HEADROOM or 1e12)
+
+        extractor = GmailDataExtractor(EMAIL, workers=workers)
+        start = time.perf_counter()
+        threads = extractor._fetch_threads(thread_ids)
+        elapsed = time.perf_counter() - start
+        server.stop()
+
+        digests.add(digest(threads))
+        stats = server.stats
+        print(
+            f"workers {workers:>3}: {len(threads):>6} threads in {elapsed:8.2f}s "
+            f"{len(threads) / elapsed:8.1f} threads/s  "
+            f"http {stats['http_requests']:>5} batch {stats['batch_requests']:>5} "
+            f"threads.get {stats['threads.get']:>6} 429s {stats['rate_limited']:>5}"
+        )
+
+    print(f"output identical across worker counts: {len(digests) == 1}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import email
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Tuple
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fake_imap import FakeImapServer, INBOX, SENT, build_folders
+from dataExtraction.custom import imap_fetch
+from dataExtraction.custom.data_extraction import customEmailDataExtractor
+from dataExtraction.snapshot import iter_snapshot
+
+# Custom (IMAP) extraction against the local fake IMAP server: the per-message fetches
+# used before (X-GM-THRID, RFC822 and FLAGS, one round trip each) against UID FETCH of
+# whole batches, at a few batch sizes.
+#
+#   python benchmarks/imap_extraction.py --threads 2000 --latency-ms 20 --batch 50 200 500
+
+class FakeServerExtractor(customEmailDataExtractor):
+
+    def __init__(self, server: FakeImapServer):
+        super().__init__('owner@example.com', 'secret', imap_server='127.0.0.1')
+        self.server = server
+
+    def _connect(self):
+        return self.server.connect()
+
+def per_message_fetch(server: FakeImapServer) -> int:
+    # The old loop's round trips and parsing, without the thread building
+    mail = server.connect()
+    fetched = 0
+    for folder in (f'"{SENT}"', INBOX):
+        mail.select(folder, readonly=True)
+        _, numbers = mail.search(None, 'ALL')
+        for num in numbers[0].split():
+            mail.fetch(num, '(X-GM-THRID)')
+            _, msg_data = mail.fetch(num, '(RFC822)')
+            email.message_from_bytes(msg_data[0][1])
+            mail.fetch(num, '(FLAGS)')
+            fetched += 1
+    mail.logout()
+    return fetched
+
+def bulk_fetch(server: FakeImapServer, directory: str) -> Tuple[int, int]:
+    path = FakeServerExtractor(server).fetch_email_threads(output_file=os.path.join(directory, 'threads.snap'))
+    threads = list(iter_snapshot(path))
+    return len(threads), sum(thread['total_messages'] for thread in threads)
+
+def main():
+    parser = argparse.ArgumentParser(description="IMAP extraction round trips against a local fake server")
+    parser.add_argument('--threads', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=float, default=20.0, help="Delay before each command's reply")
+    parser.add_argument('--batch', type=int, nargs='+', default=[50, 200, 500])
+    parser.add_argument('--skip-per-message', action='store_true', help="Skip the slow per-message baseline")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    folders = build_folders(args.threads, seed=args.seed)
+    total = sum(len(messages) for messages in folders.values())
+    print(f"{total} messages ({len(folders[INBOX])} inbox, {len(folders[SENT])} sent), {args.latency_ms}ms per command")
+
+    server = FakeImapServer(folders, latency_ms=args.latency_ms).start()
+    try:
+        if not args.skip_per_message:
+            started = time.perf_counter()
+            fetched = per_message_fetch(server)
+            elapsed = time.perf_counter() - started
+            print(f"{'per message':>12}: {fetched} messages in {elapsed:7.2f}s  {server.commands:6d} commands  {fetched / elapsed:8.1f} msg/s")
+
+        with tempfile.TemporaryDirectory() as directory:
+            for batch in args.batch:
+                imap_fetch.DEFAULT_FETCH_BATCH = batch
+                os.environ.pop(imap_fetch.FETCH_BATCH_ENV, None)
+                server.commands = 0
+                started = time.perf_counter()
+                threads, messages = bulk_fetch(server, directory)
+                elapsed = time.perf_counter() - started
+                print(f"{f'batch {batch}':>12}: {messages} messages in {threads} threads in {elapsed:7.2f}s  "
+                      f"{server.commands:6d} commands  {messages / elapsed:8.1f} msg/s")
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import sys
+import time
+import imaplib
+import random
+import argparse
+import threading
+import statistics
+from pathlib import Path
+from email.message import EmailMessage
+from typing import Dict, List
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fake_imap import FakeImapServer, INBOX, OWNER, build_folders
+from email_operations.imap_idle import IMAPIdleListener
+from email_operations.imap_pool import IMAPSessionPool
+
+# IMAP IDLE listener against the local fake IMAP server: delivers mail at random moments
+# and times how long each takes to reach the work queue, next to the wait a poll every
+# --poll-seconds would average. Accounts past --max-sockets, and all of them with
+# --no-idle, show the polling fallback instead.
+#
+#   python benchmarks/imap_idle.py --accounts 20 --max-sockets 15 --deliveries 50 --renew-seconds 2
+
+class FakeServerPool(IMAPSessionPool):
+
+    def __init__(self, server: FakeImapServer):
+        super().__init__()
+        self.server = server
+
+    def _open_connection(self, server, port):
+        return imaplib.IMAP4(*self.server.address)
+
+class FakeServerListener(IMAPIdleListener):
+
+    def __init__(self, server: FakeImapServer, **kwargs):
+        self.received: Dict[str, List[float]] = {}
+        self._received_lock = threading.Lock()
+        super().__init__(self._record, pool=FakeServerPool(server), **kwargs)
+
+    def _record(self, email_address: str) -> None:
+        with self._received_lock:
+            self.received.setdefault(email_address, []).append(time.perf_counter())
+
+def build_message(number: int) -> EmailMessage:
+    message = EmailMessage()
+    message['Subject'] = f"Delivery {number}"
+    message['From'] = 'sender@example.com'
+    message['To'] = OWNER
+    message.set_content(f"Delivery {number}")
+    return message
+
+def main():
+    parser = argparse.ArgumentParser(description="IMAP IDLE notification latency against a local fake server")
+    parser.add_argument('--accounts', type=int, default=10)
+    parser.add_argument('--max-sockets', type=int, default=100)
+    parser.add_argument('--deliveries', type=int, default=30)
+    parser.add_argument('--interval-ms', type=float, default=200.0, help="Mean gap between deliveries")
+    parser.add_argument('--renew-seconds', type=float, default=5.0, help="IDLE renewal, 25 minutes in production")
+    parser.add_argument('--poll-seconds', type=float, default=180.0)
+    parser.add_argument('--latency-ms', type=float, default=20.0, help="Delay before each command's reply")
+    parser.add_argument('--no-idle', action='store_true', help="Server without the IDLE capability")
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    server = FakeImapServer(build_folders(5, seed=args.seed), latency_ms=args.latency_ms, idle=not args.no_idle).start()
+    listener = FakeServerListener(server, max_sockets=args.max_sockets, poll_seconds=args.poll_seconds, renew_seconds=args.renew_seconds)
+    emails = [f"user{i}@example.com" for i in range(args.accounts)]
+
+    try:
+        # Every account logs in to the same fake mailbox, so each delivery reaches all sessions
+        listener.sync_accounts({email: ('secret', '127.0.0.1', 0) for email in emails})
+        deadline = time.perf_counter() + 10
+        while time.perf_counter() < deadline and listener.stats()['idling'] < min(args.accounts, args.max_sockets) and not args.no_idle:
+            time.sleep(0.05)
+        time.sleep(0.5)
+        print(f"{args.accounts} accounts, cap {args.max_sockets}: {listener.stats()}")
+
+        started = time.perf_counter()
+        delivered = []
+        for number in range(args.deliveries):
+            time.sleep(rng.expovariate(1000.0 / args.interval_ms))
+            delivered.append(time.perf_counter())
+            server.deliver(INBOX, build_message(number))
+        time.sleep(1.0)
+        elapsed = time.perf_counter() - started
+
+        latencies = []
+        with listener._received_lock:
+            received = {email: list(times) for email, times in listener.received.items()}
+        for times in received.values():
+            for sent in delivered:
+                later = [at for at in times if at >= sent]
+                if later:
+                    latencies.append((min(later) - sent) * 1000)
+
+        stats = listener.stats()
+        idle_sessions = stats['sessions'] if not args.no_idle else 0
+        print(f"{args.deliveries} deliveries in {elapsed:.1f}s, {sum(len(t) for t in received.values())} notifications "
+              f"from {len(received)} accounts, {server.idle_commands} IDLE commands, {stats['renewals']} renewals, "
+              f"{listener.pool.stats()['logins']} logins")
+        if latencies:
+            latencies.sort()
+            print(f"IDLE latency: median {statistics.median(latencies):.1f}ms, "
+                  f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f}ms over {idle_sessions} sessions")
+        print(f"Polling every {args.poll_seconds:.0f}s waits {args.poll_seconds / 2:.0f}s on average for "
+              f"{stats['polled']} accounts")
+    finally:
+        listener.shutdown(wait=True)
+        server.stop()
+
+if __name__ == "__main__":
+    main()
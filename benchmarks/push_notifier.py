@@ -0,0 +1,127 @@
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import urllib.error
+import urllib.request
+from pathlib import Path
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+# Local stand-in for the Pub/Sub push subscription behind Gmail watch: posts synthetic
+# notifications, in the same envelope Pub/Sub uses, to the /api/gmail/push endpoint.
+# Notifications come in bursts per account with rising historyIds, plus some redelivered
+# duplicates, like Gmail under load.
+#
+#   python benchmarks/push_notifier.py --url http://127.0.0.1:8080/api/gmail/push --emails a@x.com b@x.com
+#
+# --local skips HTTP and feeds the work queue directly with a handler that sleeps
+# --handler-ms, to show how many pipeline runs the notifications coalesce into.
+
+def build_envelope(email: str, history_id: int, message_id: int) -> Dict[str, Any]:
+    data = json.dumps({'emailAddress': email, 'historyId': history_id}).encode('utf-8')
+    return {
+        'message': {
+            'data': base64.b64encode(data).decode('ascii'),
+            'messageId': str(message_id),
+            'publishTime': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        },
+        'subscription': 'projects/local/subscriptions/gmail-push'
+    }
+
+def build_notifications(emails: List[str], count: int, duplicate_rate: float, seed: int) -> List[Tuple[str, int]]:
+    rng = random.Random(seed)
+    history_ids = {email: 1000 for email in emails}
+    notifications = []
+    while len(notifications) < count:
+        email = rng.choice(emails)
+        for _ in range(rng.randint(1, 5)):
+            history_ids[email] += rng.randint(1, 20)
+            notifications.append((email, history_ids[email]))
+            if rng.random() < duplicate_rate:
+                notifications.append((email, history_ids[email]))
+    return notifications[:count]
+
+def post_notification(url: str, envelope: Dict[str, Any]) -> str:
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(envelope).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+        method='POST'
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.loads(response.read()).get('status', str(response.status))
+    except urllib.error.HTTPError as e:
+        return f"http_{e.code}"
+    except urllib.error.URLError as e:
+        return f"error: {e.reason}"
+
+def run_http(args, notifications: List[Tuple[str, int]]) -> None:
+    url = f"{args.url}?token={args.token}" if args.token else args.url
+    interval = 1 / args.rate if args.rate > 0 else 0
+    statuses: Counter = Counter()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = []
+        for i, (email, history_id) in enumerate(notifications):
+            futures.append(executor.submit(post_notification, url, build_envelope(email, history_id, i)))
+            if interval:
+                time.sleep(interval)
+        for future in futures:
+            statuses[future.result()] += 1
+    elapsed = time.perf_counter() - started
+    print(f"Posted {len(notifications)} notifications in {elapsed:.2f}s: {dict(statuses)}")
+
+def run_local(args, notifications: List[Tuple[str, int]]) -> None:
+    from push_tasks import PushWorkQueue
+
+    runs: Counter = Counter()
+
+    def handler(email: str) -> None:
+        runs[email] += 1
+        time.sleep(args.handler_ms / 1000)
+
+    queue = PushWorkQueue(workers=args.workers, handler=handler)
+    interval = 1 / args.rate if args.rate > 0 else 0
+    started = time.perf_counter()
+    for email, history_id in notifications:
+        queue.submit(email, history_id)
+        if interval:
+            time.sleep(interval)
+    while not queue.idle():
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    queue.shutdown()
+
+    print(f"{len(notifications)} notifications -> {sum(runs.values())} pipeline runs in {elapsed:.2f}s")
+    print(f"Queue stats: {queue.stats()}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Post synthetic Gmail push notifications")
+    parser.add_argument('--url', default='http://127.0.0.1:8080/api/gmail/push')
+    parser.add_argument('--token', default='', help="Value of CONVOIA_GMAIL_PUSH_TOKEN on the server")
+    parser.add_argument('--emails', nargs='+', default=[f"user{i}@example.com" for i in range(20)])
+    parser.add_argument('--count', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=200.0, help="Notifications per second, 0 for as fast as possible")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duplicate-rate', type=float, default=0.1, help="Share of notifications Pub/Sub redelivers")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--local', action='store_true', help="Feed the work queue in-process instead of posting")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--handler-ms', type=float, default=200.0, help="Simulated pipeline run time with --local")
+    args = parser.parse_args()
+
+    notifications = build_notifications(args.emails, args.count, args.duplicate_rate, args.seed)
+    if args.local:
+        run_local(args, notifications)
+    else:
+        run_http(args, notifications)
+
+if __name__ == "__main__":
+    main()
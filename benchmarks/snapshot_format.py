@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fake_gmail import build_mailbox
+from dataExtraction.gmail.data_extraction import GmailDataExtractor
+from dataExtraction.gmail.message_details import GmailMessageDetailsFetcher
+from dataExtraction.snapshot import write_snapshot
+from vectorDatabase.data_preprocessing import DataPreprocessor
+
+# Disk bytes and CPU time of the extract -> transform -> preprocess hand-off, comparing the
+# indented JSON files used before with lz4+orjson thread snapshots. Network and embedding
+# time are left out: threads are generated and parsed up front.
+#
+#   python benchmarks/snapshot_format.py --messages 50000
+
+EMAIL = 'owner@example.com'
+
+def build_threads(messages: int, seed: int) -> List[List[Dict]]:
+    # build_mailbox averages 2.5 messages per thread
+    mailbox = build_mailbox(max(1, int(messages / 2.5)), seed=seed)
+    parser = GmailMessageDetailsFetcher(EMAIL)
+    threads = []
+    for thread in mailbox.values():
+        parsed = []
+        for raw_message in thread['messages']:
+            message = parser.parse_message_details(raw_message)
+            message['label'] = raw_message['labelIds']
+            message['body'].pop('html_text', None)
+            parsed.append(message)
+        threads.append(parsed)
+    return threads
+
+def timed(stage: Callable[[], None]) -> Tuple[float, float]:
+    cpu, wall = time.process_time(), time.perf_counter()
+    stage()
+    return time.process_time() - cpu, time.perf_counter() - wall
+
+def legacy_transform(extractor: GmailDataExtractor, path: str) -> None:
+    # transform_threads as it was: read the whole file, transform, rewrite it indented
+    with open(path, 'r', encoding='utf-8') as f:
+        threads = json.load(f)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(extractor._transform_all(threads), f, indent=2, ensure_ascii=False)
+
+def run_json(extractor: GmailDataExtractor, threads: List[List[Dict]], directory: str) -> Dict[str, float]:
+    path = os.path.join(directory, 'threads.json')
+    results = {}
+
+    def extract():
+        with open(path, 'w') as f:
+            json.dump(threads, f, indent=2)
+
+    results['extract_cpu'], _ = timed(extract)
+    results['extract_bytes'] = os.path.getsize(path)
+    results['transform_cpu'], _ = timed(lambda: legacy_transform(extractor, path))
+    results['transform_bytes'] = os.path.getsize(path)
+    results['preprocess_cpu'], _ = timed(lambda: DataPreprocessor(path).convert())
+    return results
+
+def run_snapshot_stages(extractor: GmailDataExtractor, threads: List[List[Dict]], directory: str) -> Dict[str, float]:
+    # Same three stages and hand-offs, only the file format changed
+    path = os.path.join(directory, 'threads-staged.snap')
+    results = {}
+    results['extract_cpu'], _ = timed(lambda: write_snapshot(path, ({'messages': thread} for thread in threads)))
+    results['extract_bytes'] = os.path.getsize(path)
+    results['transform_cpu'], _ = timed(lambda: extractor.transform_threads(path))
+    results['transform_bytes'] = os.path.getsize(path)
+    results['preprocess_cpu'], _ = timed(lambda: DataPreprocessor(path).convert())
+    return results
+
+def run_snapshot(extractor: GmailDataExtractor, threads: List[List[Dict]], directory: str) -> Dict[str, float]:
+    # What fetch_email_threads_by_ids does now: transform in memory, write one snapshot
+    path = os.path.join(directory, 'threads.snap')
+    results = {}
+    results['extract_cpu'] = 0.0
+    results['extract_bytes'] = 0
+    results['transform_cpu'], _ = timed(lambda: write_snapshot(path, extractor._transform_all(threads)))
+    results['transform_bytes'] = os.path.getsize(path)
+    results['preprocess_cpu'], _ = timed(lambda: DataPreprocessor(path).convert())
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Thread hand-off file format: indented JSON vs lz4+orjson snapshots")
+    parser.add_argument('--messages', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    threads = build_threads(args.messages, args.seed)
+    extractor = GmailDataExtractor(EMAIL)
+    print(f"{sum(len(thread) for thread in threads)} messages in {len(threads)} threads")
+
+    outputs = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, run in (('json', run_json), ('snapshot, 3 stages', run_snapshot_stages), ('snapshot', run_snapshot)):
+            results = run(extractor, [list(map(dict, thread)) for thread in threads], directory)
+            total_cpu = results['extract_cpu'] + results['transform_cpu'] + results['preprocess_cpu']
+            written = results['extract_bytes'] + results['transform_bytes']
+            print(
+                f"{name:>18}: raw file {results['extract_bytes'] / 1e6:7.1f} MB  "
+                f"threads file {results['transform_bytes'] / 1e6:7.1f} MB  written {written / 1e6:7.1f} MB  "
+                f"cpu extract {results['extract_cpu']:5.2f}s transform {results['transform_cpu']:5.2f}s "
+                f"preprocess {results['preprocess_cpu']:5.2f}s total {total_cpu:5.2f}s"
+            )
+            text_files = sorted(Path(directory).glob('*.txt'))
+            outputs[name] = text_files[-1].read_text(encoding='utf-8') if text_files else ''
+            for text_file in text_files:
+                text_file.unlink()
+
+    print(f"preprocessed text identical: {len(set(outputs.values())) == 1}")
+
+if __name__ == "__main__":
+    main()
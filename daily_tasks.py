@@ -1,6 +1,7 @@
 import asyncio
 from aws.email_automation_preferences import EmailAutomationPreferences
-from aws.utils import get_all_email_ids_and_modes
+from aws.async_facade import aiter_pages
+from aws.utils import iter_email_id_and_mode_pages
 from services.followup_responses import EmailFollowUpService
 from generator import UserInitializationManager
 
@@ -30,11 +31,10 @@ async def initiate_follow(email_id: str):
 
 async def daily_database_addition() -> None:
 
-    # Fetch list of email IDs and modes
-    user_data = get_all_email_ids_and_modes()
-    
-    # Create tasks for each user
-    tasks = [update_database(user['email'], user['mode']) for user in user_data]
+    # Start each page's updates as soon as it arrives, while later scan pages load
+    tasks = []
+    async for users in aiter_pages(iter_email_id_and_mode_pages()):
+        tasks.extend(asyncio.create_task(update_database(user['email'], user['mode'])) for user in users)
     
     # Run all database updates concurrently
     await asyncio.gather(*tasks)
@@ -0,0 +1,272 @@
+import re
+import base64
+import binascii
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from email.message import Message
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from env_config import env_int
+
+# Body budgets for everything that reaches embeddings or prompts. Tokens are estimated
+# at CHARS_PER_TOKEN characters each, which is close enough for English mail
+BODY_MAX_BYTES_ENV = 'CONVOIA_BODY_MAX_BYTES'
+BODY_MAX_TOKENS_ENV = 'CONVOIA_BODY_MAX_TOKENS'
+DEFAULT_BODY_MAX_BYTES = 32768
+DEFAULT_BODY_MAX_TOKENS = 2000
+CHARS_PER_TOKEN = 4
+
+# HTML is converted in chunks and conversion stops once there is this much more text
+# than the budget can keep; the rest would be cut anyway
+HTML_FEED_CHUNK = 8192
+HTML_OVERSCAN = 2
+
+# Levels of nested parts requested in Gmail partial responses; real mail rarely goes past 3
+GMAIL_PART_DEPTH = 5
+GMAIL_PART_FIELDS = 'mimeType,filename,headers(name,value),body/data'
+
+# A signature block longer than this is more likely part of the message
+MAX_SIGNATURE_LINES = 15
+
+QUOTE_HEADER_PATTERNS = [
+    re.compile(r'^On .{0,300}wrote:\s*$', re.DOTALL),
+    re.compile(r'^-{2,}\s*Original Message\s*-{2,}\s*$', re.IGNORECASE),
+    re.compile(r'^-{2,}\s*Forwarded message\s*-{2,}\s*$', re.IGNORECASE),
+    re.compile(r'^_{20,}\s*$'),
+    re.compile(r'^From: .+\n(Sent|Date): ', re.IGNORECASE),
+]
+SIGNATURE_PATTERNS = [
+    re.compile(r'^-- ?$'),
+    re.compile(r'^Sent from my \w+', re.IGNORECASE),
+    re.compile(r'^Get Outlook for \w+', re.IGNORECASE),
+]
+CHARSET_PATTERN = re.compile(r'charset\s*=\s*"?([\w.:-]+)', re.IGNORECASE)
+
+BLOCK_TAGS = frozenset({
+    'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'footer',
+    'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'ol', 'p', 'pre',
+    'section', 'table', 'tr', 'ul'
+})
+SKIPPED_TAGS = frozenset({'head', 'script', 'style', 'title', 'noscript', 'template'})
+QUOTE_CLASSES = ('gmail_quote', 'yahoo_quoted', 'moz-cite-prefix')
+
+@dataclass(frozen=True)
+class BodyBudget:
+    max_bytes: int = DEFAULT_BODY_MAX_BYTES
+    max_tokens: int = DEFAULT_BODY_MAX_TOKENS
+    trim_quotes: bool = True
+    strip_signature: bool = True
+
+    @property
+    def max_chars(self) -> int:
+        return min(self.max_bytes, self.max_tokens * CHARS_PER_TOKEN)
+
+def default_budget() -> BodyBudget:
+    return BodyBudget(
+        max_bytes=env_int(BODY_MAX_BYTES_ENV, DEFAULT_BODY_MAX_BYTES),
+        max_tokens=env_int(BODY_MAX_TOKENS_ENV, DEFAULT_BODY_MAX_TOKENS)
+    )
+
+def gmail_payload_fields(depth: int = GMAIL_PART_DEPTH) -> str:
+    # Partial-response mask for a payload and `depth` levels of nested parts
+    fields = GMAIL_PART_FIELDS
+    for _ in range(depth):
+        fields = f'{GMAIL_PART_FIELDS},parts({fields})'
+    return fields
+
+class HTMLTextExtractor(HTMLParser):
+    """
+    Streaming HTML-to-text converter: keeps text and line structure, drops markup, scripts,
+    styles and, when asked, quoted replies (blockquotes and mail clients' quote containers).
+    """
+
+    def __init__(self, skip_quotes: bool = True):
+        super().__init__(convert_charrefs=True)
+        self.skip_quotes = skip_quotes
+        self.parts: List[str] = []
+        self.length = 0
+        self._skip_tag: Optional[str] = None
+        self._skip_depth = 0
+
+    def _is_quote(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> bool:
+        if tag == 'blockquote':
+            return True
+        classes = dict(attrs).get('class') or ''
+        return any(name in classes for name in QUOTE_CLASSES)
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth += 1
+            return
+        if tag in SKIPPED_TAGS or (self.skip_quotes and self._is_quote(tag, attrs)):
+            self._skip_tag, self._skip_depth = tag, 1
+            return
+        if tag in BLOCK_TAGS:
+            self._append('\n')
+        if tag == 'li':
+            self._append('- ')
+
+    def handle_startendtag(self, tag, attrs):
+        # <br/>, <hr/> and friends have no content to skip
+        if self._skip_tag is None and tag in BLOCK_TAGS:
+            self._append('\n')
+
+    def handle_endtag(self, tag):
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if self._skip_depth == 0:
+                    self._skip_tag = None
+            return
+        if tag in BLOCK_TAGS and tag not in ('li', 'tr'):
+            self._append('\n')
+        elif tag in ('td', 'th'):
+            self._append(' ')
+
+    def handle_data(self, data):
+        if self._skip_tag is None:
+            self._append(data)
+
+    def _append(self, text: str) -> None:
+        self.parts.append(text)
+        self.length += len(text)
+
+    def text(self) -> str:
+        return ''.join(self.parts)
+
+def html_to_text(html: str, max_chars: Optional[int] = None, skip_quotes: bool = True) -> str:
+    parser = HTMLTextExtractor(skip_quotes)
+    for start in range(0, len(html), HTML_FEED_CHUNK):
+        parser.feed(html[start:start + HTML_FEED_CHUNK])
+        if max_chars is not None and parser.length > max_chars * HTML_OVERSCAN:
+            break
+    parser.close()
+    # Collapse the whitespace runs markup leaves behind
+    lines = (' '.join(line.split()) for line in parser.text().splitlines())
+    return _collapse_blank_lines(lines)
+
+def _collapse_blank_lines(lines) -> str:
+    kept: List[str] = []
+    for line in lines:
+        if line or (kept and kept[-1]):
+            kept.append(line)
+    return '\n'.join(kept).strip()
+
+def trim_quoted_reply(text: str) -> str:
+    lines = text.splitlines()
+    for index, line in enumerate(lines):
+        # Reply headers are often wrapped, so each line is tried with the one after it
+        candidate = line if index + 1 == len(lines) else f'{line}\n{lines[index + 1]}'
+        if index and any(pattern.match(line) or pattern.match(candidate) for pattern in QUOTE_HEADER_PATTERNS):
+            lines = lines[:index]
+            break
+    kept = [line for line in lines if not line.lstrip().startswith('>')]
+    trimmed = '\n'.join(kept).strip()
+    # A message that is nothing but quote keeps its text
+    return trimmed or text
+
+def strip_signature(text: str) -> str:
+    lines = text.splitlines()
+    for index in range(len(lines) - 1, 0, -1):
+        if len(lines) - index > MAX_SIGNATURE_LINES:
+            break
+        if any(pattern.match(lines[index]) for pattern in SIGNATURE_PATTERNS):
+            return '\n'.join(lines[:index]).rstrip()
+    return text
+
+def truncate_text(text: str, max_chars: int, max_bytes: int) -> str:
+    if len(text) > max_chars:
+        cut = text.rfind(' ', 0, max_chars)
+        text = text[:cut if cut > max_chars // 2 else max_chars].rstrip()
+    encoded = text.encode('utf-8')
+    if len(encoded) > max_bytes:
+        text = encoded[:max_bytes].decode('utf-8', 'ignore')
+    return text
+
+def clean_body_text(text: str, budget: Optional[BodyBudget] = None) -> str:
+    budget = budget or default_budget()
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    if budget.trim_quotes:
+        text = trim_quoted_reply(text)
+    if budget.strip_signature:
+        text = strip_signature(text)
+    text = _collapse_blank_lines(line.rstrip() for line in text.splitlines())
+    return truncate_text(text, budget.max_chars, budget.max_bytes)
+
+def _decode_bytes(data: bytes, charset: Optional[str]) -> str:
+    try:
+        return data.decode(charset or 'utf-8', errors='replace')
+    except LookupError:
+        return data.decode('utf-8', errors='replace')
+
+def _build_body(plain_parts: List[str], html_parts: List[str], budget: Optional[BodyBudget]) -> Dict[str, str]:
+    # plain_text is always the clean text to use: the text/plain parts, or the HTML converted
+    budget = budget or default_budget()
+    html_text = '\n'.join(html_parts)
+    if plain_parts:
+        plain_text = '\n'.join(plain_parts)
+    elif html_text:
+        plain_text = html_to_text(html_text, budget.max_chars, budget.trim_quotes)
+    else:
+        plain_text = ''
+    return {
+        'plain_text': clean_body_text(plain_text, budget),
+        'html_text': truncate_text(html_text, budget.max_bytes, budget.max_bytes)
+    }
+
+def iter_gmail_text_parts(payload: Dict[str, Any]) -> Iterator[Tuple[str, str]]:
+    # Depth-first over the Gmail payload tree without recursion, in document order
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        if part.get('parts'):
+            stack.extend(reversed(part['parts']))
+            continue
+
+        mime_type = part.get('mimeType', '')
+        data = part.get('body', {}).get('data')
+        if mime_type not in ('text/plain', 'text/html') or not data or part.get('filename'):
+            continue
+
+        headers = {header['name'].lower(): header['value'] for header in part.get('headers', [])}
+        match = CHARSET_PATTERN.search(headers.get('content-type', ''))
+        try:
+            raw = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+        except (binascii.Error, ValueError):
+            continue
+        yield mime_type, _decode_bytes(raw, match.group(1) if match else None)
+
+def extract_gmail_body(payload: Dict[str, Any], budget: Optional[BodyBudget] = None) -> Dict[str, str]:
+    plain_parts: List[str] = []
+    html_parts: List[str] = []
+    for mime_type, text in iter_gmail_text_parts(payload):
+        (plain_parts if mime_type == 'text/plain' else html_parts).append(text)
+    return _build_body(plain_parts, html_parts, budget)
+
+def iter_mime_text_parts(message: Message) -> Iterator[Tuple[str, str]]:
+    # Same walk for email.message objects from IMAP, skipping attachments
+    stack = [message]
+    while stack:
+        part = stack.pop()
+        if part.is_multipart():
+            stack.extend(reversed(part.get_payload()))
+            continue
+
+        mime_type = part.get_content_type()
+        if mime_type not in ('text/plain', 'text/html') or part.get_content_disposition() == 'attachment':
+            continue
+
+        try:
+            raw = part.get_payload(decode=True)
+        except Exception:
+            continue
+        if raw:
+            yield mime_type, _decode_bytes(raw, part.get_content_charset())
+
+def extract_mime_body(message: Message, budget: Optional[BodyBudget] = None) -> Dict[str, str]:
+    plain_parts: List[str] = []
+    html_parts: List[str] = []
+    for mime_type, text in iter_mime_text_parts(message):
+        (plain_parts if mime_type == 'text/plain' else html_parts).append(text)
+    return _build_body(plain_parts, html_parts, budget)
@@ -1,4 +1,4 @@
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 import imaplib
 import email
@@ -8,8 +8,15 @@ import pytz
 from collections import defaultdict
 import json
 import re
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+from dataExtraction.body_extraction import extract_mime_body
+from dataExtraction.custom.imap_fetch import fetch_items, iter_fetch_messages, search_uids
+from dataExtraction.custom.imap_sync import IMAPFolderSync, IMAPSyncResult
+from dataExtraction.snapshot import snapshot_path, write_snapshot
+
 def decode_header_value(header_value: str) -> str:
     try:
         decoded_headers = decode_header(header_value or '')
@@ -61,25 +68,8 @@ def extract_email_details(email_message) -> Dict:
         else:
             date = datetime.now(pytz.UTC)
         
-        # Extract body
-        body = ""
-        if email_message.is_multipart():
-            for part in email_message.walk():
-                if part.get_content_type() == "text/plain":
-                    try:
-                        payload = part.get_payload(decode=True)
-                        if payload:
-                            body = payload.decode('utf-8', errors='replace')
-                            break
-                    except:
-                        continue
-        else:
-            try:
-                payload = email_message.get_payload(decode=True)
-                if payload:
-                    body = payload.decode('utf-8', errors='replace')
-            except:
-                body = email_message.get_payload(decode=False) or ""
+        # Extract body: every nested text part, HTML converted when there is no plain text
+        body = extract_mime_body(email_message)['plain_text']
         
         # Get labels/flags
         labels = []
@@ -127,6 +117,12 @@ class customEmailDataExtractor:
         self.email_address = email_address
         self.password = password
         self.imap_server = imap_server
+        self.sync_results: List[IMAPSyncResult] = []
+
+    def _connect(self) -> imaplib.IMAP4:
+        mail = imaplib.IMAP4_SSL(self.imap_server)
+        mail.login(self.email_address, self.password)
+        return mail
 
     def fetch_email_threads_complete(self, output_file: Optional[str] = None) -> str:
         return self._fetch_emails(None, output_file)
@@ -134,6 +130,16 @@ class customEmailDataExtractor:
     def fetch_email_threads_by_prev_days(self, num_prev_days: int, output_file: Optional[str] = None) -> str:
         return self._fetch_emails(num_prev_days, output_file)
     
+    def fetch_new_email_threads(self, consumer: str, output_file: Optional[str] = None) -> Tuple[str, List[IMAPSyncResult]]:
+        # Mail above each folder's last synced UID; save the results' cursors once it is handled
+        try:
+            output_path = self._fetch_emails(None, output_file, sync_consumer=consumer)
+            # No snapshot means nothing was handed on, so no cursor may move
+            return output_path, list(self.sync_results) if output_path else []
+        except Exception as e:
+            print(f"Error fetching new email threads: {str(e)}")
+            return "", []
+
     def fetch_email_threads(self, num_prev_days: Optional[int] = None, output_file: Optional[str] = None) -> str:
         try:
             if num_prev_days is None:
@@ -150,18 +156,16 @@ class customEmailDataExtractor:
             
             return ""  # Return empty string on error
     
-    def _fetch_emails(self, num_prev_days: Optional[int], output_file: Optional[str]) -> str:
+    def _fetch_emails(self, num_prev_days: Optional[int], output_file: Optional[str], sync_consumer: Optional[str] = None) -> str:
         email_address = self.email_address
-        password = self.password
-        imap_server = self.imap_server
+        self.sync_results = []
         
         if output_file is None:
-            output_file = f"{email_address}.json"
+            output_file = snapshot_path(email_address, 'threads')
             
         try:
             # Connect to IMAP server
-            mail = imaplib.IMAP4_SSL(imap_server)
-            mail.login(email_address, password)
+            mail = self._connect()
             
             all_emails = []
             
@@ -177,74 +181,45 @@ class customEmailDataExtractor:
                     elif ' ' in folder_name and not (folder_name.startswith('"') and folder_name.endswith('"')):
                         folder_name = f'"{folder_name}"'
 
-                    status, _ = mail.select(folder_name, readonly=True)
-                    if status != 'OK':
-                        print(f"Failed to select folder {folder_name}: {status}")
-                        return []
-                    
-                    # Set search criteria
-                    if num_prev_days is not None:
-                        date_filter = (datetime.now(pytz.UTC) - timedelta(days=num_prev_days))
-                        search_criteria = f'SINCE "{date_filter.strftime("%d-%b-%Y")}"'
+                    if sync_consumer is not None:
+                        # The sync selects the folder itself, reading the UIDs from the response
+                        changes = IMAPFolderSync(email_address, sync_consumer, folder_name).fetch_changes(mail, readonly=True)
+                        self.sync_results.append(changes)
+                        uids = changes.new_uids
                     else:
-                        search_criteria = "ALL"
-                    
-                    status, message_numbers = mail.search(None, search_criteria)
-                    if status != 'OK':
-                        return []
-                    
+                        status, _ = mail.select(folder_name, readonly=True)
+                        if status != 'OK':
+                            print(f"Failed to select folder {folder_name}: {status}")
+                            return []
+
+                        # Set search criteria
+                        if num_prev_days is not None:
+                            date_filter = (datetime.now(pytz.UTC) - timedelta(days=num_prev_days))
+                            search_criteria = f'SINCE "{date_filter.strftime("%d-%b-%Y")}"'
+                        else:
+                            search_criteria = "ALL"
+
+                        uids = search_uids(mail, search_criteria)
+
+                    # Thread id, flags and the raw message for a few hundred messages per
+                    # command; X-GM-THRID only where the server has Gmail's extensions
                     folder_emails = []
-                    for num in message_numbers[0].split():
+                    for message in iter_fetch_messages(mail, uids, fetch_items(mail)):
                         try:
-                            # First, try to get Gmail-specific headers including X-GM-THRID (thread ID)
-                            try:
-                                if imap_server == "imap.gmail.com":
-                                    status, thrid_data = mail.fetch(num, "(X-GM-THRID)")
-                                    if status == 'OK' and thrid_data and thrid_data[0]:
-                                        # Extract thread ID from the response
-                                        thread_id_match = re.search(r'X-GM-THRID\s+([0-9]+)', thrid_data[0].decode('utf-8'))
-                                        if thread_id_match:
-                                            thread_id = thread_id_match.group(1)
-                                        else:
-                                            thread_id = None
-                            except Exception as e:
-                                print(f"Error getting thread ID: {str(e)}")
-                                thread_id = None
-                                
-                            # Get email content - FIX HERE
-                            status, msg_data = mail.fetch(num, "(RFC822)")
-                            if status != 'OK' or not msg_data or not msg_data[0]:
-                                continue
-                            
-                            # Check the structure of msg_data to ensure we access it correctly
-                            if isinstance(msg_data[0], tuple) and len(msg_data[0]) > 1:
-                                email_body = msg_data[0][1]
-                                if not isinstance(email_body, bytes):
-                                    print(f"Email body is not bytes, it's {type(email_body)}")
-                                    continue
-                                email_message = email.message_from_bytes(email_body)
-                            else:
-                                print(f"Unexpected msg_data structure: {type(msg_data[0])}")
-                                continue
-                            
+                            email_message = email.message_from_bytes(message['body'])
                             email_message.folder = folder_name  # Add folder info
                             
                             # Add thread ID if we found one
-                            if thread_id:
-                                email_message.thread_id = thread_id
-                            
-                            # Get flags
-                            status, flag_data = mail.fetch(num, "(FLAGS)")
-                            if status == 'OK' and flag_data and flag_data[0]:
-                                flags_str = flag_data[0].decode('utf-8') if isinstance(flag_data[0], bytes) else str(flag_data[0])
-                                email_message.flags = re.findall(r'\(([^)]*)\)', flags_str)
+                            if message['thread_id']:
+                                email_message.thread_id = message['thread_id']
+                            email_message.flags = message['flags']
                             
                             email_details = extract_email_details(email_message)
                             if email_details:
                                 folder_emails.append(email_details)
                                 
                         except Exception as e:
-                            print(f"Error processing email {num}: {str(e)}")
+                            print(f"Error processing email {message['uid']}: {str(e)}")
                             continue
                     
                     return folder_emails
@@ -385,12 +360,11 @@ class customEmailDataExtractor:
                 if "sort_timestamp" in thread:
                     del thread["sort_timestamp"]
             
-            # Save to JSON
+            # Save as a thread snapshot
             output_path = Path(output_file)
             output_path.parent.mkdir(parents=True, exist_ok=True)
             
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(threads, f, indent=2, ensure_ascii=False)
+            write_snapshot(str(output_path), threads)
             
             print(f"\nSuccessfully saved {len(threads)} threads to {output_path.absolute()}")
             return str(output_path.absolute())
@@ -416,4 +390,4 @@ if __name__ == '__main__':
     # output_path = fetcher.fetch_email_threads(num_prev_days=1)
     
     # Test with a specific output file
-    # output_path = fetcher.fetch_email_threads(output_file="my_emails.json")
+    # output_path = fetcher.fetch_email_threads(output_file="my_emails.snap")
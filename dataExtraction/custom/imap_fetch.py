@@ -0,0 +1,107 @@
+import re
+import imaplib
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from env_config import env_int
+
+# Messages per UID FETCH command. Each command is one round trip however many messages it
+# covers; imaplib holds a command's whole response in memory, which bounds the batch
+FETCH_BATCH_ENV = 'CONVOIA_IMAP_FETCH_BATCH'
+DEFAULT_FETCH_BATCH = 200
+
+# Capability Gmail advertises for X-GM-THRID, X-GM-LABELS and X-GM-MSGID
+GMAIL_EXTENSION = 'X-GM-EXT-1'
+
+# BODY.PEEK leaves \Seen alone, unlike RFC822 on a read-write mailbox
+FETCH_ITEMS = '(UID FLAGS BODY.PEEK[])'
+GMAIL_FETCH_ITEMS = '(UID X-GM-THRID FLAGS BODY.PEEK[])'
+
+FETCH_START_PATTERN = re.compile(rb'^\d+ \(')
+UID_PATTERN = re.compile(rb'\bUID (\d+)')
+THREAD_ID_PATTERN = re.compile(rb'\bX-GM-THRID (\d+)')
+FLAGS_PATTERN = re.compile(rb'\bFLAGS \(([^)]*)\)')
+
+def fetch_batch_size() -> int:
+    return env_int(FETCH_BATCH_ENV, DEFAULT_FETCH_BATCH)
+
+def has_gmail_extensions(mail: imaplib.IMAP4) -> bool:
+    return GMAIL_EXTENSION in mail.capabilities
+
+def fetch_items(mail: imaplib.IMAP4) -> str:
+    return GMAIL_FETCH_ITEMS if has_gmail_extensions(mail) else FETCH_ITEMS
+
+def search_uids(mail: imaplib.IMAP4, criteria: str) -> List[int]:
+    status, data = mail.uid('SEARCH', None, criteria)
+    if status != 'OK' or not data or not data[0]:
+        return []
+    return [int(uid) for uid in data[0].split()]
+
+def uid_set(uids: Sequence[int]) -> str:
+    # Consecutive UIDs collapse into ranges ("3:7,9,12:15"), keeping commands short
+    ranges = []
+    start = previous = None
+    for uid in sorted(uids):
+        if previous is not None and uid == previous + 1:
+            previous = uid
+            continue
+        if start is not None:
+            ranges.append(f'{start}:{previous}' if start != previous else str(start))
+        start = previous = uid
+    if start is not None:
+        ranges.append(f'{start}:{previous}' if start != previous else str(start))
+    return ','.join(ranges)
+
+def _parse_message(meta: bytes, body: Optional[bytes]) -> Optional[Dict[str, Any]]:
+    uid = UID_PATTERN.search(meta)
+    if uid is None or body is None:
+        # Unsolicited FETCH responses (flag changes from another client) carry no body
+        return None
+    thread_id = THREAD_ID_PATTERN.search(meta)
+    flags = FLAGS_PATTERN.search(meta)
+    return {
+        'uid': int(uid.group(1)),
+        'thread_id': thread_id.group(1).decode('ascii') if thread_id else None,
+        'flags': flags.group(1).decode('utf-8', errors='replace').split() if flags else [],
+        'body': body
+    }
+
+def parse_fetch_response(data: List[Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Splits imaplib's FETCH data into messages. A message with a literal arrives as a
+    (prefix, literal) tuple, followed by a bytes item holding whatever the server sent after
+    the literal (often FLAGS or X-GM-THRID, then the closing paren).
+    """
+    meta: Optional[bytes] = None
+    body: Optional[bytes] = None
+    for item in data:
+        if isinstance(item, tuple):
+            if meta is not None:
+                message = _parse_message(meta, body)
+                if message:
+                    yield message
+            meta, body = item[0], item[1]
+        elif isinstance(item, bytes):
+            if meta is None or FETCH_START_PATTERN.match(item):
+                if meta is not None:
+                    message = _parse_message(meta, body)
+                    if message:
+                        yield message
+                meta, body = item, None
+            else:
+                meta += b' ' + item
+    if meta is not None:
+        message = _parse_message(meta, body)
+        if message:
+            yield message
+
+def iter_fetch_messages(mail: imaplib.IMAP4, uids: Sequence[int], items: str, batch_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+
+    # One UID FETCH per batch instead of a round trip per message and item
+    batch_size = batch_size or fetch_batch_size()
+    for start in range(0, len(uids), batch_size):
+        batch = uids[start:start + batch_size]
+        status, data = mail.uid('FETCH', uid_set(batch), items)
+        if status != 'OK':
+            print(f"UID FETCH failed for {len(batch)} messages: {status}")
+            continue
+        yield from parse_fetch_response(data)
@@ -0,0 +1,193 @@
+import re
+import sys
+import time
+import imaplib
+from pathlib import Path
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+from aws.users import get_imap_sync_state, save_imap_sync_state
+from dataExtraction.custom.imap_fetch import FLAGS_PATTERN, UID_PATTERN, search_uids, uid_set
+from email_operations.imap_pool import IMAPSession
+
+CONDSTORE = 'CONDSTORE'
+
+# Upper bound on a resync when there is no state or UIDVALIDITY has changed
+MAX_RESYNC_MESSAGES = 500
+
+# Messages the monitors never act on
+SKIPPED_FLAGS = frozenset({'\\Draft', '\\Deleted'})
+
+SELECT_CODES = ('UIDVALIDITY', 'UIDNEXT', 'HIGHESTMODSEQ')
+
+@dataclass
+class FolderSyncState:
+    uidvalidity: int
+    last_uid: int
+    highest_modseq: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, int]) -> "FolderSyncState":
+        return cls(values['uidvalidity'], values['last_uid'], values.get('highest_modseq'))
+
+    def as_dict(self) -> Dict[str, int]:
+        values = {'uidvalidity': self.uidvalidity, 'last_uid': self.last_uid}
+        if self.highest_modseq is not None:
+            values['highest_modseq'] = self.highest_modseq
+        return values
+
+@dataclass
+class IMAPSyncResult:
+    folder: str
+    state: FolderSyncState
+    new_uids: List[int] = field(default_factory=list)
+    # Messages seen before whose flags changed; only known with CONDSTORE
+    changed_uids: List[int] = field(default_factory=list)
+    full_resync: bool = False
+
+def quote_folder(folder: str) -> str:
+    folder = folder.strip('"')
+    return f'"{folder}"' if re.search(r'[\s\[\]"]', folder) else folder
+
+class IMAPFolderSync:
+    """
+    Incremental sync of one IMAP folder. Each consumer keeps UIDVALIDITY, the last UID seen
+    and, on CONDSTORE servers, HIGHESTMODSEQ per folder on the user item; new mail is what
+    lies above the last UID. Without state, or after UIDVALIDITY changes, a bounded resync
+    over `resync_window` stands in.
+
+    `fetch_changes` selects the folder on the connection it is given and leaves it selected.
+    """
+
+    def __init__(self, email: str, consumer: str, folder: str = 'INBOX', resync_window: timedelta = timedelta(days=1), max_resync_messages: int = MAX_RESYNC_MESSAGES):
+
+        self.email = email
+        self.consumer = consumer
+        self.folder = folder.strip('"')
+        self.resync_window = resync_window
+        self.max_resync_messages = max_resync_messages
+
+    def fetch_changes(self, mail: imaplib.IMAP4, readonly: bool = True) -> IMAPSyncResult:
+
+        try:
+            status = self._select(mail, readonly)
+            # Servers without persistent mod-sequences (NOMODSEQ) leave HIGHESTMODSEQ out
+            condstore = CONDSTORE in mail.capabilities and 'HIGHESTMODSEQ' in status
+            saved = get_imap_sync_state(self.email, self.consumer).get(self.folder)
+            state = FolderSyncState.from_dict(saved) if saved else None
+
+            if state is None or state.uidvalidity != status['UIDVALIDITY']:
+                if state is not None:
+                    print(f"UIDVALIDITY of {self.folder} changed for {self.email}, resyncing the last {self.resync_window}")
+                return self._resync(mail, status)
+
+            # Everything below UIDNEXT existed when the folder was selected, so it is safe to mark seen
+            result = IMAPSyncResult(self.folder, FolderSyncState(
+                uidvalidity=state.uidvalidity,
+                last_uid=max(state.last_uid, status['UIDNEXT'] - 1),
+                highest_modseq=status.get('HIGHESTMODSEQ')
+            ))
+            has_new_mail = status['UIDNEXT'] - 1 > state.last_uid
+
+            if condstore and state.highest_modseq is not None:
+                if status['HIGHESTMODSEQ'] != state.highest_modseq:
+                    self._changed_since(mail, state, result)
+            elif has_new_mail:
+                result.new_uids = [uid for uid in search_uids(mail, f'UID {state.last_uid + 1}:* UNDELETED UNDRAFT') if uid > state.last_uid]
+
+            if result.new_uids:
+                result.state.last_uid = max(result.state.last_uid, max(result.new_uids))
+            return result
+
+        except imaplib.IMAP4.error as e:
+            print(f"IMAP sync error for {self.email} ({self.folder}): {e}")
+            raise
+
+    def save_cursor(self, result: IMAPSyncResult) -> bool:
+        # Call once the new mail has been handled, so a failed run replays it next time
+        return save_imap_sync_state(self.email, self.consumer, result.folder, result.state.as_dict())
+
+    def _select(self, mail: imaplib.IMAP4, readonly: bool) -> Dict[str, int]:
+        # The counters come from the SELECT response; STATUS should not be sent for the
+        # selected folder (RFC 3501), and a pooled session must not answer from its cache
+        if isinstance(mail, IMAPSession):
+            status, data = mail.select(quote_folder(self.folder), readonly, refresh=True)
+        else:
+            status, data = mail.select(quote_folder(self.folder), readonly)
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"SELECT failed for {self.folder}: {data}")
+
+        values = {}
+        for code in SELECT_CODES:
+            _, value = mail.response(code)
+            if value and value[-1] is not None:
+                values[code] = int(value[-1])
+        if 'UIDVALIDITY' not in values:
+            raise imaplib.IMAP4.error(f"SELECT for {self.folder} has no UIDVALIDITY")
+        if 'UIDNEXT' not in values:
+            values['UIDNEXT'] = self._last_uid(mail, int(data[0] or 0)) + 1
+        return values
+
+    def _last_uid(self, mail: imaplib.IMAP4, exists: int) -> int:
+        # For servers that leave UIDNEXT out of the SELECT response
+        if not exists:
+            return 0
+        status, data = mail.uid('FETCH', '*', '(UID)')
+        uids = []
+        for item in data if status == 'OK' else []:
+            uid = UID_PATTERN.search((item[0] if isinstance(item, tuple) else item) or b'')
+            if uid:
+                uids.append(int(uid.group(1)))
+        if not uids:
+            raise imaplib.IMAP4.error(f"Could not find the last UID of {self.folder}: {data}")
+        return max(uids)
+
+    def _changed_since(self, mail: imaplib.IMAP4, state: FolderSyncState, result: IMAPSyncResult) -> None:
+        # New messages get a higher mod-sequence too, so one command finds new and changed mail
+        status, data = mail.uid('FETCH', '1:*', f'(UID FLAGS) (CHANGEDSINCE {state.highest_modseq})')
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"CHANGEDSINCE fetch failed for {self.folder}: {data}")
+        for uid, flags in self._uid_flags(data):
+            if uid > state.last_uid:
+                if not SKIPPED_FLAGS.intersection(flags):
+                    result.new_uids.append(uid)
+            else:
+                result.changed_uids.append(uid)
+        result.new_uids.sort()
+
+    def _uid_flags(self, data: List[Any]) -> List[Tuple[int, List[str]]]:
+        uid_flags = []
+        for item in data:
+            line = (item[0] if isinstance(item, tuple) else item) or b''
+            uid = UID_PATTERN.search(line)
+            flags = FLAGS_PATTERN.search(line)
+            if uid:
+                uid_flags.append((int(uid.group(1)), flags.group(1).decode('utf-8', errors='replace').split() if flags else []))
+        return uid_flags
+
+    def _resync(self, mail: imaplib.IMAP4, status: Dict[str, int]) -> IMAPSyncResult:
+
+        # SINCE has day granularity; INTERNALDATE narrows it to the window
+        cutoff = datetime.now() - self.resync_window
+        uids = search_uids(mail, f'SINCE {cutoff.strftime("%d-%b-%Y")} UNDELETED UNDRAFT')
+        uids = [uid for uid in uids if uid < status['UIDNEXT']][-self.max_resync_messages:]
+        if uids and self.resync_window < timedelta(days=1):
+            uids = self._received_after(mail, uids, cutoff.timestamp())
+
+        state = FolderSyncState(status['UIDVALIDITY'], status['UIDNEXT'] - 1, status.get('HIGHESTMODSEQ'))
+        return IMAPSyncResult(self.folder, state, new_uids=uids, full_resync=True)
+
+    def _received_after(self, mail: imaplib.IMAP4, uids: List[int], cutoff_timestamp: float) -> List[int]:
+        status, data = mail.uid('FETCH', uid_set(uids), '(UID INTERNALDATE)')
+        if status != 'OK':
+            return uids
+        received = []
+        for item in data:
+            line = (item[0] if isinstance(item, tuple) else item) or b''
+            uid = UID_PATTERN.search(line)
+            internal_date = imaplib.Internaldate2tuple(line)
+            if uid and internal_date and time.mktime(internal_date) >= cutoff_timestamp:
+                received.append(int(uid.group(1)))
+        return sorted(received)
@@ -0,0 +1,144 @@
+import time
+import random
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+
+from dataExtraction.gmail.rate_limiter import QuotaRateLimiter, QUOTA_UNITS
+
+# Gmail accepts up to 100 calls per batch, but batches over 50 are likely to be rate limited
+GMAIL_BATCH_SIZE = 50
+GMAIL_MAX_BATCH_SIZE = 100
+MAX_BATCH_RETRIES = 5
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 32.0
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = ('ratelimitexceeded', 'userratelimitexceeded', 'quotaexceeded')
+
+def is_retryable_error(error: Exception) -> bool:
+    if not isinstance(error, HttpError):
+        # Transport failures (timeouts, dropped connections) are worth another try
+        return isinstance(error, (OSError, TimeoutError))
+    status = getattr(error.resp, 'status', None)
+    if status in RETRYABLE_STATUSES:
+        return True
+    if status == 403:
+        content = error.content.decode('utf-8', 'ignore') if isinstance(error.content, bytes) else str(error.content)
+        return any(reason in content.lower() for reason in RATE_LIMIT_REASONS)
+    return False
+
+def backoff_delay(attempt: int) -> float:
+    return min(RETRY_BASE_SECONDS * (2 ** attempt), RETRY_MAX_SECONDS) + random.uniform(0, RETRY_BASE_SECONDS)
+
+class GmailBatchFetcher:
+    """
+    Runs many Gmail API calls as batch HTTP requests. Each sub-request succeeds or fails on
+    its own; only rate-limited and server-error sub-requests are sent again, with backoff.
+    """
+
+    def __init__(self, service, batch_size: int = GMAIL_BATCH_SIZE, max_retries: int = MAX_BATCH_RETRIES, limiter: Optional[QuotaRateLimiter] = None):
+        self.service = service
+        self.batch_size = max(1, min(batch_size, GMAIL_MAX_BATCH_SIZE))
+        self.max_retries = max_retries
+        self.limiter = limiter
+
+    def execute(self, requests: Dict[str, Callable[[], Any]], units: int = 0) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+        # `requests` maps a unique id to a factory for the googleapiclient request, so a
+        # retried sub-request is rebuilt rather than reused
+        results: Dict[str, Any] = {}
+        failures: Dict[str, Exception] = {}
+        pending = list(requests)
+
+        batch_size = self.batch_size
+        if self.limiter is not None and units:
+            # A batch costing more than a second of quota would be partly rejected every time
+            batch_size = max(1, min(batch_size, int(self.limiter.capacity // units)))
+
+        for attempt in range(self.max_retries + 1):
+            retry = []
+            for start in range(0, len(pending), batch_size):
+                chunk = pending[start:start + batch_size]
+                if self.limiter is not None:
+                    # Each sub-request costs its own quota units, batched or not
+                    self.limiter.acquire(units * len(chunk))
+                chunk_results, chunk_failures = self._execute_chunk(chunk, requests)
+                results.update(chunk_results)
+                if self.limiter is not None:
+                    if any(is_retryable_error(error) for error in chunk_failures.values()):
+                        self.limiter.throttled()
+                    else:
+                        self.limiter.succeeded()
+                for request_id, error in chunk_failures.items():
+                    if is_retryable_error(error) and attempt < self.max_retries:
+                        retry.append(request_id)
+                    else:
+                        failures[request_id] = error
+
+            if not retry:
+                break
+            print(f"Retrying {len(retry)} of {len(requests)} Gmail requests (attempt {attempt + 1})")
+            time.sleep(backoff_delay(attempt))
+            pending = retry
+
+        return results, failures
+
+    def _execute_chunk(self, chunk: List[str], requests: Dict[str, Callable[[], Any]]) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+        results: Dict[str, Any] = {}
+        failures: Dict[str, Exception] = {}
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                failures[request_id] = exception
+            else:
+                results[request_id] = response
+
+        batch = self.service.new_batch_http_request(callback=callback)
+        for request_id in chunk:
+            batch.add(requests[request_id](), request_id=request_id)
+
+        try:
+            batch.execute()
+        except Exception as e:
+            # The batch call itself failed, so every sub-request without an answer failed with it
+            for request_id in chunk:
+                if request_id not in results and request_id not in failures:
+                    failures[request_id] = e
+        return results, failures
+
+    def get_messages(
+        self,
+        message_ids: Iterable[str],
+        format: str = 'full',
+        metadata_headers: Optional[List[str]] = None,
+        fields: Optional[str] = None
+    ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Exception]]:
+        messages = self.service.users().messages()
+        get_kwargs = {'userId': 'me', 'format': format}
+        if metadata_headers:
+            get_kwargs['metadataHeaders'] = metadata_headers
+        if fields:
+            get_kwargs['fields'] = fields
+
+        requests = {
+            message_id: (lambda message_id=message_id: messages.get(id=message_id, **get_kwargs))
+            for message_id in dict.fromkeys(message_ids)
+        }
+        return self.execute(requests, QUOTA_UNITS['messages.get'])
+
+    def get_threads(
+        self,
+        thread_ids: Iterable[str],
+        format: str = 'full',
+        fields: Optional[str] = None
+    ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Exception]]:
+        threads = self.service.users().threads()
+        get_kwargs = {'userId': 'me', 'format': format}
+        if fields:
+            get_kwargs['fields'] = fields
+
+        requests = {
+            thread_id: (lambda thread_id=thread_id: threads.get(id=thread_id, **get_kwargs))
+            for thread_id in dict.fromkeys(thread_ids)
+        }
+        return self.execute(requests, QUOTA_UNITS['threads.get'])
@@ -1,14 +1,16 @@
+import os
 import sys
 import json
 import uuid
 from pathlib import Path
-from typing import List, Dict, Optional, Set
+from typing import Any, Iterable, Iterator, List, Dict, Optional, Set, Tuple
 from datetime import datetime
 import pytz
 
 import json
 from datetime import datetime
 from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
 
@@ -16,69 +18,77 @@ from dataExtraction.gmail.thread_id import GmailThreadFetcher
 from dataExtraction.gmail.message_ids import GmailMessageFetcher
 from dataExtraction.gmail.message_details import GmailMessageDetailsFetcher
 from dataExtraction.gmail.message_labels import GmailMessageLabelsFetcher
+from dataExtraction.gmail.batch_requests import GMAIL_BATCH_SIZE
+from dataExtraction.gmail.rate_limiter import get_rate_limiter
+from dataExtraction.snapshot import iter_snapshot, snapshot_path, write_snapshot
+from env_config import env_int
+
+# Worker threads fetching thread batches in parallel; 1 fetches them one batch at a time
+GMAIL_WORKERS_ENV = 'CONVOIA_GMAIL_WORKERS'
+DEFAULT_GMAIL_WORKERS = 8
 
 class GmailDataExtractor:
 
-    def __init__(self, email):
+    def __init__(self, email, workers: Optional[int] = None):
         self.email = email
+        self.workers = max(1, workers if workers is not None else env_int(GMAIL_WORKERS_ENV, DEFAULT_GMAIL_WORKERS))
         self.thread_fetcher = GmailThreadFetcher(email)
         self.message_fetcher = GmailMessageFetcher(email)
         self.detail_fetcher = GmailMessageDetailsFetcher(email)
         self.label_fetcher = GmailMessageLabelsFetcher(email)
 
-    def transform_threads(self, file_path: str) -> None:
-    
-        # Read the input file
-        with open(file_path, 'r', encoding='utf-8') as f:
-            threads_data = json.load(f)
+    def transform_thread(self, thread: List[Dict]) -> Optional[Dict[str, Any]]:
 
-        transformed_threads = []
-        
-        for thread in threads_data:
-            if not thread:  # Skip empty threads
-                continue
-                
-            # Sort messages within thread by timestamp
-            messages_in_thread = sorted(
-                thread,
-                key=lambda x: parsedate_to_datetime(x['timestamp']).timestamp()
-            )
+        if not thread:  # Skip empty threads
+            return None
             
-            # Collect all unique labels from messages
-            all_labels = set()
-            for msg in messages_in_thread:
-                all_labels.update(msg.get('label', []))
-            
-            formatted_messages = []
-            for msg in messages_in_thread:
-                # Parse the email's timestamp
-                dt = parsedate_to_datetime(msg['timestamp'])
-                dt = dt.astimezone(pytz.UTC)  # Convert to UTC
-                
-                formatted_msg = {
-                    "message_id": msg['message_id'],
-                    "datetime": dt.strftime("%Y-%m-%d %H:%M:%S UTC"),
-                    "timestamp": dt.timestamp(),
-                    "sender": msg['from']['email'],
-                    "receiver": msg['to']['email'],
-                    "subject": msg['subject'],
-                    "body": msg['body']['plain_text'],
-                    "references": [],  # No references in input data
-                    "in_reply_to": "",  # No in-reply-to in input data
-                    "labels": msg.get('label', [])
-                }
-                formatted_messages.append(formatted_msg)
+        # Sort messages within thread by timestamp
+        messages_in_thread = sorted(
+            thread,
+            key=lambda x: parsedate_to_datetime(x['timestamp']).timestamp()
+        )
+        
+        # Collect all unique labels from messages
+        all_labels = set()
+        for msg in messages_in_thread:
+            all_labels.update(msg.get('label', []))
+        
+        formatted_messages = []
+        for msg in messages_in_thread:
+            # Parse the email's timestamp
+            dt = parsedate_to_datetime(msg['timestamp'])
+            dt = dt.astimezone(pytz.UTC)  # Convert to UTC
             
-            thread_data = {
-                "thread_id": messages_in_thread[0]['thread_id'],  # Use first message's thread ID
-                "total_messages": len(messages_in_thread),
-                "labels": list(all_labels),
-                "reply_to_message_id": messages_in_thread[-1]['message_id'],  # Last message ID
-                "messages": formatted_messages,
-                "sort_timestamp": formatted_messages[-1]['timestamp']  # For sorting
+            formatted_msg = {
+                "message_id": msg['message_id'],
+                "datetime": dt.strftime("%Y-%m-%d %H:%M:%S UTC"),
+                "timestamp": dt.timestamp(),
+                "sender": msg['from']['email'],
+                "receiver": msg['to']['email'],
+                "subject": msg['subject'],
+                "body": msg['body']['plain_text'],
+                "references": [],  # No references in input data
+                "in_reply_to": "",  # No in-reply-to in input data
+                "labels": msg.get('label', [])
             }
-            
-            transformed_threads.append(thread_data)
+            formatted_messages.append(formatted_msg)
+        
+        return {
+            "thread_id": messages_in_thread[0]['thread_id'],  # Use first message's thread ID
+            "total_messages": len(messages_in_thread),
+            "labels": list(all_labels),
+            "reply_to_message_id": messages_in_thread[-1]['message_id'],  # Last message ID
+            "messages": formatted_messages,
+            "sort_timestamp": formatted_messages[-1]['timestamp']  # For sorting
+        }
+
+    def _transform_all(self, threads: Iterable[List[Dict]]) -> List[Dict[str, Any]]:
+
+        transformed_threads = [
+            thread_data
+            for thread_data in (self.transform_thread(thread) for thread in threads)
+            if thread_data is not None
+        ]
         
         # Sort threads by the timestamp of their last message (newest first)
         transformed_threads.sort(
@@ -89,119 +99,118 @@ class GmailDataExtractor:
         # Remove the temporary sort_timestamp field
         for thread in transformed_threads:
             del thread['sort_timestamp']
-        
-        # Save the transformed data back to the same file - now just as an array
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(transformed_threads, f, indent=2, ensure_ascii=False)
 
-    def fetch_email_threads_complete(self):
-        
-        email = self.email
-        gmail_thread_id_fetcher = self.thread_fetcher
-        gmail_message_id_fetcher = self.message_fetcher
-        gmail_message_detail_fetcher = self.detail_fetcher
-        gmail_message_label_fetcher = self.label_fetcher
+        return transformed_threads
 
-        thread_ids = gmail_thread_id_fetcher.fetch_all_thread_ids()
-        # thread_ids = thread_ids[:3] # For Development Environment
+    def transform_threads(self, file_path: str) -> None:
+    
+        # Rewrites a snapshot of raw threads ({'messages': [...]} records) in the preprocessing format
+        transformed_threads = self._transform_all(record['messages'] for record in iter_snapshot(file_path))
 
-        print(f"thread_ids: {thread_ids}")
+        temp_path = f'{file_path}.tmp'
+        write_snapshot(temp_path, transformed_threads)
+        os.replace(temp_path, file_path)
 
-        threads = []
+    def _fetch_raw_threads(self, thread_ids: List[str]) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Exception]]:
 
-        for thread_id in thread_ids:
+        # Workers share the account's quota bucket, so more of them never exceed Gmail's per-user rate
+        limiter = get_rate_limiter(self.email)
+        chunk_size = max(1, min(GMAIL_BATCH_SIZE, -(-len(thread_ids) // self.workers)))
+        chunks = [thread_ids[i:i + chunk_size] for i in range(0, len(thread_ids), chunk_size)]
 
-            try:
-                message_ids = gmail_message_id_fetcher.fetch_message_ids_from_thread(thread_id)
-                thread = []
-                
-                for message_id in message_ids:
-                    
-                    try:
-                        message = gmail_message_detail_fetcher.fetch_message_details(message_id)
+        def fetch_chunk(chunk: List[str]):
+            # A fetcher per chunk, so each worker thread authenticates to its own service
+            return GmailMessageFetcher(self.email).fetch_threads(chunk, limiter=limiter)
 
-                        _, label = gmail_message_label_fetcher.fetch_labels_from_messageid(message_id)
-                        message['label'] = label
+        if self.workers == 1 or len(chunks) <= 1:
+            results = [fetch_chunk(chunk) for chunk in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(chunks))) as executor:
+                results = list(executor.map(fetch_chunk, chunks))
 
-                        if 'html_text' in message['body']:
-                            message['body'].pop('html_text')
+        raw_threads: Dict[str, Dict[str, Any]] = {}
+        failures: Dict[str, Exception] = {}
+        for chunk_threads, chunk_failures in results:
+            raw_threads.update(chunk_threads)
+            failures.update(chunk_failures)
+        return raw_threads, failures
 
-                        thread.append(message)
+    def _fetch_threads(self, thread_ids: List[str], failed: Optional[Set[str]] = None) -> List[List[Dict]]:
 
-                    except Exception as e:
-                        
-                        print(f"Error processing message ID {message_id}: {e}")
-                        continue
-                
-                threads.append(thread)
+        # A single threads.get per thread carries the details and labels of all its messages.
+        # Threads that still fail after the retries are left out, and added to `failed` if given
+        raw_threads, failures = self._fetch_raw_threads(thread_ids)
+        if failed is not None:
+            failed.update(failures)
 
-            except Exception as e:
+        threads = []
 
-                print(f"Error processing thread ID {thread_id}: {e}")
+        for thread_id in thread_ids:
+
+            if thread_id in failures:
+                print(f"Error processing thread ID {thread_id}: {failures[thread_id]}")
                 continue
 
-        thread_file_path = f'{email}.json'
-        
-        with open(thread_file_path, 'w') as json_file:
-            json.dump(threads, json_file, indent=2)
+            thread = []
 
-        self.transform_threads(thread_file_path)
-        
-        return thread_file_path
-    
-    def fetch_email_threads_by_prev_days(self, num_prev_days):
-        
-        email = self.email
-        gmail_thread_id_fetcher = self.thread_fetcher
-        gmail_message_id_fetcher = self.message_fetcher
-        gmail_message_detail_fetcher = self.detail_fetcher
-        gmail_message_label_fetcher = self.label_fetcher
+            for raw_message in raw_threads[thread_id].get('messages', []):
 
-        thread_ids = gmail_thread_id_fetcher.fetch_thread_ids_by_prev_days(num_prev_days)
+                try:
+                    message = self.detail_fetcher.parse_message_details(raw_message)
+                    message['label'] = self.label_fetcher.label_names(raw_message.get('labelIds', []))
 
-        print(f"thread_ids: {thread_ids}")
+                    if 'html_text' in message['body']:
+                        message['body'].pop('html_text')
 
-        threads = []
+                    thread.append(message)
 
-        for thread_id in thread_ids:
+                except Exception as e:
 
-            try:
-                message_ids = gmail_message_id_fetcher.fetch_message_ids_from_thread(thread_id)
-                thread = []
-                
-                for message_id in message_ids:
-                    
-                    try:
-                        message = gmail_message_detail_fetcher.fetch_message_details(message_id)
+                    print(f"Error processing message ID {raw_message.get('id')}: {e}")
+                    continue
 
-                        _, label = gmail_message_label_fetcher.fetch_labels_from_messageid(message_id)
-                        message['label'] = label
+            threads.append(thread)
 
-                        if 'html_text' in message['body']:
-                            message['body'].pop('html_text')
+        return threads
 
-                        thread.append(message)
+    def iter_threads(self, thread_ids: List[str], chunk_size: Optional[int] = None, failed: Optional[Set[str]] = None) -> Iterator[List[Dict]]:
 
-                    except Exception as e:
-                        
-                        print(f"Error processing message ID {message_id}: {e}")
-                        continue
-                
-                threads.append(thread)
+        # A chunk at a time, so memory stays flat however many ids there are; each chunk is
+        # still fetched by all the workers
+        chunk_size = chunk_size or GMAIL_BATCH_SIZE * self.workers
+        for start in range(0, len(thread_ids), chunk_size):
+            yield from self._fetch_threads(thread_ids[start:start + chunk_size], failed)
 
-            except Exception as e:
+    def fetch_email_threads_by_ids(self, thread_ids: List[str], output_file: Optional[str] = None) -> str:
 
-                print(f"Error processing thread ID {thread_id}: {e}")
-                continue
+        threads = self._fetch_threads(thread_ids)
 
-        thread_file_path = f'{email}.json'
+        # Transformed in memory and written once, as a snapshot unique to this run
+        thread_file_path = output_file or snapshot_path(self.email, 'threads')
+        write_snapshot(thread_file_path, self._transform_all(threads))
         
-        with open(thread_file_path, 'w') as json_file:
-            json.dump(threads, json_file, indent=2)
+        return thread_file_path
 
-        self.transform_threads(thread_file_path)
+    def fetch_email_threads_complete(self):
         
-        return thread_file_path
+        gmail_thread_id_fetcher = self.thread_fetcher
+
+        thread_ids = gmail_thread_id_fetcher.fetch_all_thread_ids()
+        # thread_ids = thread_ids[:3] # For Development Environment
+
+        print(f"thread_ids: {thread_ids}")
+
+        return self.fetch_email_threads_by_ids(thread_ids)
+    
+    def fetch_email_threads_by_prev_days(self, num_prev_days):
+        
+        gmail_thread_id_fetcher = self.thread_fetcher
+
+        thread_ids = gmail_thread_id_fetcher.fetch_thread_ids_by_prev_days(num_prev_days)
+
+        print(f"thread_ids: {thread_ids}")
+
+        return self.fetch_email_threads_by_ids(thread_ids)
     
     def fetch_email_threads(self, num_prev_days: Optional[int] = None):
 
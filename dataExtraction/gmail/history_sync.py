@@ -0,0 +1,197 @@
+import sys
+from pathlib import Path
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+
+# Google API imports
+from googleapiclient.errors import HttpError
+
+# Custom imports
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+from dataExtraction.gmail.service_factory import get_gmail_service
+from aws.users import get_gmail_history_id, save_gmail_history_id
+
+MESSAGE_ADDED = 'added'
+MESSAGE_DELETED = 'deleted'
+LABELS_ADDED = 'labels_added'
+LABELS_REMOVED = 'labels_removed'
+
+HISTORY_TYPES = ['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved']
+HISTORY_PAGE_SIZE = 500
+
+# Messages the monitors never act on; drafts include the replies they create themselves
+SKIPPED_LABELS = frozenset({'DRAFT', 'SPAM', 'TRASH'})
+
+# Upper bound on a full resync when there is no cursor or it has expired
+MAX_RESYNC_MESSAGES = 500
+
+@dataclass(frozen=True)
+class HistoryEvent:
+    kind: str
+    message_id: str
+    thread_id: str
+    label_ids: Tuple[str, ...] = ()
+
+@dataclass
+class SyncResult:
+    history_id: Optional[str]
+    events: List[HistoryEvent] = field(default_factory=list)
+    full_resync: bool = False
+
+    def added_message_ids(self, skipped_labels: frozenset = SKIPPED_LABELS) -> List[str]:
+        # Added and still present at the end of the window, in arrival order
+        added: Dict[str, None] = {}
+        for event in self.events:
+            if event.kind == MESSAGE_ADDED and not skipped_labels.intersection(event.label_ids):
+                added[event.message_id] = None
+            elif event.kind == MESSAGE_DELETED:
+                added.pop(event.message_id, None)
+        return list(added)
+
+    def changed_thread_ids(self) -> List[str]:
+        # Threads with new messages; label-only changes (read, starred) leave their text as it
+        # was indexed, and re-uploading them would only add copies
+        deleted = {event.message_id for event in self.events if event.kind == MESSAGE_DELETED}
+        return list(dict.fromkeys(
+            event.thread_id
+            for event in self.events
+            if event.kind == MESSAGE_ADDED and event.message_id not in deleted and event.thread_id
+        ))
+
+class GmailHistorySync:
+    """
+    Incremental Gmail sync on users.history.list. Each consumer keeps its own historyId
+    cursor on the user item; when there is none, or Gmail has expired it, a bounded
+    resync over `resync_window` stands in for the missing history.
+    """
+
+    def __init__(self, email: str, consumer: str, resync_window: timedelta = timedelta(days=1), max_resync_messages: int = MAX_RESYNC_MESSAGES):
+
+        self.email = email
+        self.consumer = consumer
+        self.resync_window = resync_window
+        self.max_resync_messages = max_resync_messages
+        self._service = None
+
+    def _authenticate(self) -> None:
+
+        try:
+            # Shared per-account service; credentials and discovery are cached by the factory
+            self._service = get_gmail_service(self.email)
+
+        except (ValueError, HttpError) as e:
+            print(f"Authentication error: {e}")
+            raise
+
+    def fetch_changes(self) -> SyncResult:
+
+        try:
+            # Ensure authentication
+            if not self._service:
+                self._authenticate()
+
+            start_history_id = get_gmail_history_id(self.email, self.consumer)
+            if start_history_id is None:
+                return self._resync()
+
+            try:
+                return self._list_history(start_history_id)
+            except HttpError as e:
+                # 404 means the cursor is older than the history Gmail keeps
+                if e.resp.status != 404:
+                    raise
+                print(f"History {start_history_id} expired for {self.email}, resyncing the last {self.resync_window}")
+                return self._resync()
+
+        except HttpError as e:
+            error_details = {
+                'status_code': e.resp.status,
+                'reason': e.resp.reason,
+                'error_message': str(e)
+            }
+            print(f"Gmail API Error: {error_details}")
+            raise
+        except Exception as e:
+            print(f"Unexpected error syncing mailbox history: {e}")
+            raise
+
+    def save_cursor(self, result: SyncResult) -> bool:
+        # Call once the events have been handled, so a failed run replays them next time
+        if result.history_id is None:
+            return False
+        return save_gmail_history_id(self.email, self.consumer, result.history_id)
+
+    def _list_history(self, start_history_id: str) -> SyncResult:
+
+        result = SyncResult(history_id=start_history_id)
+        page_token = None
+
+        while True:
+            response = self._service.users().history().list(
+                userId='me',
+                startHistoryId=start_history_id,
+                historyTypes=HISTORY_TYPES,
+                maxResults=HISTORY_PAGE_SIZE,
+                pageToken=page_token
+            ).execute()
+
+            for record in response.get('history', []):
+                result.events.extend(self._events_from_record(record))
+
+            result.history_id = response.get('historyId', result.history_id)
+
+            # Get the next page token
+            page_token = response.get('nextPageToken')
+
+            # Break the loop if no more pages
+            if not page_token:
+                break
+
+        return result
+
+    def _events_from_record(self, record: Dict[str, Any]) -> List[HistoryEvent]:
+
+        events = []
+        for key, kind in (('messagesAdded', MESSAGE_ADDED), ('messagesDeleted', MESSAGE_DELETED)):
+            for change in record.get(key, []):
+                message = change.get('message', {})
+                events.append(HistoryEvent(kind, message.get('id', ''), message.get('threadId', ''), tuple(message.get('labelIds', []))))
+
+        for key, kind in (('labelsAdded', LABELS_ADDED), ('labelsRemoved', LABELS_REMOVED)):
+            for change in record.get(key, []):
+                message = change.get('message', {})
+                events.append(HistoryEvent(kind, message.get('id', ''), message.get('threadId', ''), tuple(change.get('labelIds', []))))
+
+        return events
+
+    def _resync(self) -> SyncResult:
+
+        # Take the cursor first, so anything arriving during the listing is in the next sync
+        history_id = self._service.users().getProfile(userId='me').execute().get('historyId')
+
+        cutoff_timestamp = int((datetime.now() - self.resync_window).timestamp())
+        result = SyncResult(history_id=history_id, full_resync=True)
+        page_token = None
+
+        while len(result.events) < self.max_resync_messages:
+            response = self._service.users().messages().list(
+                userId='me',
+                pageToken=page_token,
+                q=f'after:{cutoff_timestamp} -in:drafts',
+                maxResults=min(HISTORY_PAGE_SIZE, self.max_resync_messages - len(result.events))
+            ).execute()
+
+            for message in response.get('messages', []):
+                result.events.append(HistoryEvent(MESSAGE_ADDED, message['id'], message.get('threadId', '')))
+
+            # Get the next page token
+            page_token = response.get('nextPageToken')
+
+            # Break the loop if no more pages
+            if not page_token:
+                break
+
+        # messages.list is newest first; events are kept oldest first like history
+        result.events.reverse()
+        return result
@@ -1,98 +1,50 @@
-import json
 import sys
 import email
-import base64
 from pathlib import Path
-from typing import Dict, Any, Union
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Union
 
 # Google API imports
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials as OAuthCredentials
 from googleapiclient.errors import HttpError
 
 # Custom imports
 sys.path.append(str(Path(__file__).resolve().parent.parent))
-from aws.utils import fetch_tokens
+from dataExtraction.gmail.service_factory import get_gmail_service
+from dataExtraction.gmail.batch_requests import GmailBatchFetcher, GMAIL_BATCH_SIZE
+from dataExtraction.body_extraction import extract_gmail_body, gmail_payload_fields
+
+# Partial responses: the part tree with headers (for charsets) and inline data, without sizes
+# or attachment ids
+TEXT_PAYLOAD_FIELDS = gmail_payload_fields()
+TRIAGE_FIELDS = f'id,threadId,payload({TEXT_PAYLOAD_FIELDS})'
 
 class GmailMessageDetailsFetcher:
     
     def __init__(self, email: str):
 
         self.email = email
-        self._tokens = None
-        self._credentials = None
         self._service = None
     
-    def _load_credentials(self) -> Dict[str, Any]:
-
-        try:
-            credentials_path = Path("credentials/credential_gcp.json")
-            with credentials_path.open() as f:
-                return json.load(f)
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Credentials file not found at {credentials_path}")
-        except json.JSONDecodeError:
-            raise json.JSONDecodeError("Invalid JSON in credentials file", "", 0)
-    
     def _authenticate(self) -> None:
- 
-        # Fetch tokens from DynamoDB
-        self._tokens = fetch_tokens(self.email)
-        
-        if not self._tokens:
-            raise ValueError(f"No authentication tokens found for {self.email}")
-        
+
         try:
-            # Load credentials
-            credentials_data = self._load_credentials()
-            
-            # Initialize credentials
-            self._credentials = OAuthCredentials(
-                token=self._tokens['access_token'],
-                refresh_token=self._tokens['refresh_token'],
-                client_id=credentials_data['web']['client_id'],
-                client_secret=credentials_data['web']['client_secret'],
-                token_uri=credentials_data['web']['token_uri']
-            )
-            
-            # Build Gmail service
-            self._service = build('gmail', 'v1', credentials=self._credentials)
-        
+            # Shared per-account service; credentials and discovery are cached by the factory
+            self._service = get_gmail_service(self.email)
+
         except (ValueError, HttpError) as e:
             print(f"Authentication error: {e}")
             raise
     
     def _decode_body(self, payload: Dict[str, Any]) -> Dict[str, str]:
 
-        body_content = {
-            'plain_text': '',
-            'html_text': ''
-        }
-        
         try:
-            # Handle multipart messages
-            if 'parts' in payload:
-                for part in payload['parts']:
-                    if part['mimeType'] == 'text/plain':
-                        if 'data' in part['body']:
-                            body_content['plain_text'] = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-                    elif part['mimeType'] == 'text/html':
-                        if 'data' in part['body']:
-                            body_content['html_text'] = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-            
-            # Handle single part messages
-            elif payload['mimeType'] in ['text/plain', 'text/html']:
-                if 'data' in payload['body']:
-                    decoded_data = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8')
-                    if payload['mimeType'] == 'text/plain':
-                        body_content['plain_text'] = decoded_data
-                    else:
-                        body_content['html_text'] = decoded_data
-            
-            return body_content
+            # Walks every level of nested parts; plain_text falls back to the HTML as text
+            return extract_gmail_body(payload)
         except Exception as e:
             print(f"Error decoding message body: {e}")
-            return body_content
+            return {
+                'plain_text': '',
+                'html_text': ''
+            }
     
     def _parse_email_header(self, header_value: str) -> Dict[str, str]:
 
@@ -108,6 +60,53 @@ class GmailMessageDetailsFetcher:
                 'email': header_value
             }
     
+    def fetch_messages(
+        self,
+        message_ids: Iterable[str],
+        format: str = 'full',
+        batch_size: int = GMAIL_BATCH_SIZE,
+        metadata_headers: Optional[List[str]] = None,
+        fields: Optional[str] = None
+    ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Exception]]:
+
+        # Ensure authentication
+        if not self._service:
+            self._authenticate()
+
+        # One batch HTTP call per `batch_size` messages; failed sub-requests come back in the second dict
+        return GmailBatchFetcher(self._service, batch_size).get_messages(message_ids, format, metadata_headers, fields)
+
+    def _fetch_message(self, message_id: str, format: str = 'full', metadata_headers: Optional[List[str]] = None, fields: Optional[str] = None) -> Dict[str, Any]:
+
+        messages, failures = self.fetch_messages([message_id], format, metadata_headers=metadata_headers, fields=fields)
+        if message_id in failures:
+            raise failures[message_id]
+        return messages[message_id]
+
+    def parse_message_details(self, message: Dict[str, Any]) -> Dict[str, Any]:
+
+        # Extract headers
+        headers = {header['name']: header['value'] for header in message.get('payload', {}).get('headers', [])}
+        
+        # Decode body
+        body_content = self._decode_body(message['payload'])
+        
+        # Prepare message details
+        return {
+            'message_id': message['id'],
+            'thread_id': message.get('threadId', ''),
+            'subject': headers.get('Subject', ''),
+            'from': self._parse_email_header(headers.get('From', '')),
+            'to': self._parse_email_header(headers.get('To', '')),
+            'timestamp': headers.get('Date', ''),
+            'body': body_content
+        }
+
+    def fetch_messages_details(self, message_ids: Iterable[str], batch_size: int = GMAIL_BATCH_SIZE) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Exception]]:
+
+        messages, failures = self.fetch_messages(message_ids, batch_size=batch_size)
+        return {message_id: self.parse_message_details(message) for message_id, message in messages.items()}, failures
+
     def fetch_message_details(self, message_id: str) -> Dict[str, Any]:
 
         # Validate input
@@ -120,30 +119,9 @@ class GmailMessageDetailsFetcher:
                 self._authenticate()
             
             # Fetch the specific message
-            message = self._service.users().messages().get(
-                userId='me', 
-                id=message_id, 
-                format='full'
-            ).execute()
-            
-            # Extract headers
-            headers = {header['name']: header['value'] for header in message.get('payload', {}).get('headers', [])}
-            
-            # Decode body
-            body_content = self._decode_body(message['payload'])
-            
-            # Prepare message details
-            message_details = {
-                'message_id': message_id,
-                'thread_id': message.get('threadId', ''),
-                'subject': headers.get('Subject', ''),
-                'from': self._parse_email_header(headers.get('From', '')),
-                'to': self._parse_email_header(headers.get('To', '')),
-                'timestamp': headers.get('Date', ''),
-                'body': body_content
-            }
+            message = self._fetch_message(message_id)
             
-            return message_details
+            return self.parse_message_details(message)
         
         except HttpError as e:
             error_details = {
@@ -168,12 +146,8 @@ class GmailMessageDetailsFetcher:
             if not self._service:
                 self._authenticate()
             
-            # Fetch the specific message
-            message = self._service.users().messages().get(
-                userId='me', 
-                id=message_id, 
-                format='full'
-            ).execute()
+            # Headers and text parts only; the triage paths read the body straight away
+            message = self._fetch_message(message_id, fields=TRIAGE_FIELDS)
             
             # Extract headers
             headers = {
@@ -213,12 +187,8 @@ class GmailMessageDetailsFetcher:
             if not self._service:
                 self._authenticate()
             
-            # Fetch the specific message
-            message = self._service.users().messages().get(
-                userId='me', 
-                id=message_id, 
-                format='full'
-            ).execute()
+            # Headers and text parts only; the triage paths read the body straight away
+            message = self._fetch_message(message_id, fields=TRIAGE_FIELDS)
             
             # Extract headers
             headers = {
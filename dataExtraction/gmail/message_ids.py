@@ -1,12 +1,10 @@
 import json
 import sys
 from pathlib import Path
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Iterable, Optional, Tuple, Union
 from datetime import datetime, timedelta
 
 # Google API imports
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials as OAuthCredentials
 from googleapiclient.errors import HttpError
 
 import base64
@@ -15,52 +13,28 @@ from email.mime.multipart import MIMEMultipart
 
 # Custom imports
 sys.path.append(str(Path(__file__).resolve().parent.parent))
-from aws.utils import fetch_tokens
+from dataExtraction.gmail.service_factory import get_gmail_service
+from dataExtraction.gmail.batch_requests import GmailBatchFetcher, GMAIL_BATCH_SIZE
+from dataExtraction.gmail.rate_limiter import QuotaRateLimiter
+from dataExtraction.body_extraction import gmail_payload_fields
+
+# Partial response for thread extraction: just what GmailMessageDetailsFetcher.parse_message_details
+# and the label lookup read, so attachments and unused message metadata are not downloaded
+THREAD_MESSAGE_FIELDS = f'id,messages(id,threadId,labelIds,payload({gmail_payload_fields()}))'
 
 class GmailMessageFetcher:
     
     def __init__(self, email: str):
 
         self.email = email
-        self._tokens = None
-        self._credentials = None
         self._service = None
     
-    def _load_credentials(self) -> Dict[str, Any]:
-
-        try:
-            credentials_path = Path("credentials/credential_gcp.json")
-            with credentials_path.open() as f:
-                return json.load(f)
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Credentials file not found at {credentials_path}")
-        except json.JSONDecodeError:
-            raise json.JSONDecodeError("Invalid JSON in credentials file", "", 0)
-    
     def _authenticate(self) -> None:
 
-        # Fetch tokens from DynamoDB
-        self._tokens = fetch_tokens(self.email)
-        
-        if not self._tokens:
-            raise ValueError(f"No authentication tokens found for {self.email}")
-        
         try:
-            # Load credentials
-            credentials_data = self._load_credentials()
-            
-            # Initialize credentials
-            self._credentials = OAuthCredentials(
-                token=self._tokens['access_token'],
-                refresh_token=self._tokens['refresh_token'],
-                client_id=credentials_data['web']['client_id'],
-                client_secret=credentials_data['web']['client_secret'],
-                token_uri=credentials_data['web']['token_uri']
-            )
-            
-            # Build Gmail service
-            self._service = build('gmail', 'v1', credentials=self._credentials)
-        
+            # Shared per-account service; credentials and discovery are cached by the factory
+            self._service = get_gmail_service(self.email)
+
         except (ValueError, HttpError) as e:
             print(f"Authentication error: {e}")
             raise
@@ -77,7 +51,7 @@ class GmailMessageFetcher:
                 self._authenticate()
             
             # Fetch the specific thread
-            thread = self._service.users().threads().get(userId='me', id=thread_id).execute()
+            thread = self._service.users().threads().get(userId='me', id=thread_id, format='minimal', fields='messages/id').execute()
             
             # Process thread details
             message_ids = []
@@ -102,6 +76,15 @@ class GmailMessageFetcher:
             print(f"Unexpected error fetching thread messages: {e}")
             raise
 
+    def fetch_threads(self, thread_ids: Iterable[str], fields: str = THREAD_MESSAGE_FIELDS, batch_size: int = GMAIL_BATCH_SIZE, limiter: Optional[QuotaRateLimiter] = None) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Exception]]:
+
+        # Ensure authentication
+        if not self._service:
+            self._authenticate()
+
+        # One threads.get per thread returns every message with its payload and labels
+        return GmailBatchFetcher(self._service, batch_size, limiter=limiter).get_threads(thread_ids, format='full', fields=fields)
+
     def fetch_message_ids_by_prev_mins(self, num_prev_mins: int = 3) -> List[str]:
 
         # Validate input
@@ -1,65 +1,68 @@
 import json
 import sys
 from pathlib import Path
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Iterable, Optional, Tuple, Union
 
 # Google API imports
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials as OAuthCredentials
 from googleapiclient.errors import HttpError
 
 # Custom imports
 sys.path.append(str(Path(__file__).resolve().parent.parent))
-from aws.utils import fetch_tokens
+from dataExtraction.gmail.service_factory import get_gmail_service
+from dataExtraction.gmail.batch_requests import GmailBatchFetcher, GMAIL_BATCH_SIZE
 
 class GmailMessageLabelsFetcher:
     
     def __init__(self, email: str):
 
         self.email = email
-        self._tokens = None
-        self._credentials = None
         self._service = None
-    
-    def _load_credentials(self) -> Dict[str, Any]:
-
-        try:
-            credentials_path = Path("credentials/credential_gcp.json")
-            with credentials_path.open() as f:
-                return json.load(f)
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Credentials file not found at {credentials_path}")
-        except json.JSONDecodeError:
-            raise json.JSONDecodeError("Invalid JSON in credentials file", "", 0)
+        self._label_names: Optional[Dict[str, str]] = None
     
     def _authenticate(self) -> None:
 
-        # Fetch tokens from DynamoDB
-        self._tokens = fetch_tokens(self.email)
-        
-        if not self._tokens:
-            raise ValueError(f"No authentication tokens found for {self.email}")
-        
         try:
-            # Load credentials
-            credentials_data = self._load_credentials()
-            
-            # Initialize credentials
-            self._credentials = OAuthCredentials(
-                token=self._tokens['access_token'],
-                refresh_token=self._tokens['refresh_token'],
-                client_id=credentials_data['web']['client_id'],
-                client_secret=credentials_data['web']['client_secret'],
-                token_uri=credentials_data['web']['token_uri']
-            )
-            
-            # Build Gmail service
-            self._service = build('gmail', 'v1', credentials=self._credentials)
-        
+            # Shared per-account service; credentials and discovery are cached by the factory
+            self._service = get_gmail_service(self.email)
+
         except (ValueError, HttpError) as e:
             print(f"Authentication error: {e}")
             raise
     
+    def _load_label_names(self) -> Dict[str, str]:
+
+        # Ensure authentication
+        if not self._service:
+            self._authenticate()
+
+        # A single labels.list replaces one labels.get per label per message
+        response = self._service.users().labels().list(userId='me').execute()
+        self._label_names = {label['id']: label.get('name', 'Unknown') for label in response.get('labels', [])}
+        return self._label_names
+
+    def label_names(self, label_ids: List[str]) -> List[str]:
+
+        if self._label_names is None or any(label_id not in self._label_names for label_id in label_ids):
+            # Labels created since the last load are picked up by one refresh
+            self._load_label_names()
+
+        return [self._label_names.get(label_id, 'Unknown') for label_id in label_ids]
+
+    def fetch_labels_for_messages(self, message_ids: Iterable[str], batch_size: int = GMAIL_BATCH_SIZE) -> Tuple[Dict[str, Tuple[List[str], List[str]]], Dict[str, Exception]]:
+
+        # Ensure authentication
+        if not self._service:
+            self._authenticate()
+
+        # Label ids are part of the minimal format, so the message body is never downloaded
+        messages, failures = GmailBatchFetcher(self._service, batch_size).get_messages(message_ids, format='minimal')
+
+        labels = {}
+        for message_id, message in messages.items():
+            label_ids = message.get('labelIds', [])
+            labels[message_id] = (label_ids, self.label_names(label_ids))
+        return labels, failures
+
     def fetch_labels_from_messageid(self, message_id: str) -> List[str]:
 
         # Validate input
@@ -71,22 +74,11 @@ class GmailMessageLabelsFetcher:
             if not self._service:
                 self._authenticate()
 
-            # Fetch the specific message with full details
-            message = self._service.users().messages().get(userId='me', id=message_id, format='full').execute()
-            
-            # Extract and return all available labels
-            labels_list = message.get('labelIds', [])
-            
-            label_ids = []
-            label_names = []
-
-            for label_id in labels_list:
-                label_info = self._service.users().labels().get(userId='me', id=label_id).execute()
-
-                label_ids.append(label_id)
-                label_names.append(label_info.get('name', 'Unknown'))
-            
-            return label_ids, label_names
+            labels, failures = self.fetch_labels_for_messages([message_id])
+            if message_id in failures:
+                raise failures[message_id]
+
+            return labels[message_id]
         
         except HttpError as e:
             error_details = {
@@ -0,0 +1,84 @@
+import time
+import threading
+from typing import Dict
+
+# Gmail's per-user limit is 250 quota units per second, shared by every client of the account;
+# extraction aims a little under it so the monitors' calls still fit
+GMAIL_USER_QUOTA_UNITS_PER_SECOND = 250.0
+QUOTA_HEADROOM = 0.9
+
+# Quota units per call (https://developers.google.com/gmail/api/reference/quota)
+QUOTA_UNITS: Dict[str, int] = {
+    'threads.get': 10,
+    'threads.list': 10,
+    'messages.get': 5,
+    'messages.list': 5,
+    'history.list': 2,
+    'labels.list': 1,
+    'getProfile': 1,
+    'watch': 100,
+}
+
+# Multiplicative decrease on 429/5xx, additive increase on clean batches. Decreases are at
+# most one per cooldown, so workers hitting the same limit together back off once
+THROTTLE_FACTOR = 0.5
+THROTTLE_COOLDOWN_SECONDS = 1.0
+RECOVERY_FRACTION = 0.1
+MIN_RATE_FRACTION = 0.1
+
+class QuotaRateLimiter:
+    """
+    Token bucket in Gmail quota units. A request larger than the bucket (a whole batch)
+    is let through and the debt paid off before the next one, so batches keep their size.
+    The refill rate halves on throttling and climbs back as calls succeed.
+    """
+
+    def __init__(self, units_per_second: float = GMAIL_USER_QUOTA_UNITS_PER_SECOND * QUOTA_HEADROOM):
+        self.max_rate = units_per_second
+        self.min_rate = units_per_second * MIN_RATE_FRACTION
+        self.rate = units_per_second
+        self.capacity = units_per_second
+        self._tokens = units_per_second
+        self._updated = time.monotonic()
+        self._throttled_at = float('-inf')
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, units: float) -> float:
+        # Reserve now and sleep off any debt outside the lock; returns the time waited
+        with self._lock:
+            self._refill()
+            self._tokens -= units
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def throttled(self) -> None:
+        with self._lock:
+            if time.monotonic() - self._throttled_at < THROTTLE_COOLDOWN_SECONDS:
+                return
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * THROTTLE_FACTOR)
+            self._throttled_at = time.monotonic()
+
+    def succeeded(self) -> None:
+        with self._lock:
+            if self.rate < self.max_rate:
+                self._refill()
+                self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_FRACTION)
+
+_limiters: Dict[str, QuotaRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(email: str) -> QuotaRateLimiter:
+    # One bucket per account, shared by every worker thread fetching for it
+    with _limiters_lock:
+        limiter = _limiters.get(email)
+        if limiter is None:
+            limiter = _limiters[email] = QuotaRateLimiter()
+        return limiter
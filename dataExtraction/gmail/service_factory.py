@@ -0,0 +1,142 @@
+import json
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Google API imports
+import httplib2
+import google_auth_httplib2
+from cachetools import LRUCache, TTLCache
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from google.auth.exceptions import RefreshError
+from google.oauth2.credentials import Credentials as OAuthCredentials
+
+# Custom imports
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+from aws.utils import fetch_tokens
+from aws.users import record_token_refresh
+
+GCP_CREDENTIALS_PATH = 'credentials/credential_gcp.json'
+GMAIL_SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
+GMAIL_HTTP_TIMEOUT_SECONDS = 60
+
+# Credentials refresh themselves as they expire; the TTL only bounds how long a
+# re-authorised account can keep using the tokens it had when first loaded
+CREDENTIALS_CACHE_TTL_SECONDS = 3600
+CREDENTIALS_CACHE_MAX_SIZE = 2048
+
+# Services kept per worker thread; older accounts' connections are dropped first
+THREAD_SERVICE_CACHE_SIZE = 256
+
+_lock = threading.Lock()
+_client_config: Optional[Dict[str, str]] = None
+_discovery_document: Optional[Dict[str, Any]] = None
+_credentials: TTLCache = TTLCache(maxsize=CREDENTIALS_CACHE_MAX_SIZE, ttl=CREDENTIALS_CACHE_TTL_SECONDS)
+_local = threading.local()
+
+class RecordingCredentials(OAuthCredentials):
+    """
+    OAuth credentials shared by every Gmail service of one account. Refreshes are
+    serialised and the new tokens written back to ConvoiaUsers.
+    """
+
+    def __init__(self, email: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.account_email = email
+        self._refresh_lock = threading.Lock()
+
+    def refresh(self, request) -> None:
+        stale_token = self.token
+        with self._refresh_lock:
+            # Another thread may have refreshed while this one waited
+            if self.token != stale_token:
+                return
+            try:
+                super().refresh(request)
+            except RefreshError:
+                # Revoked or replaced refresh token; reload from ConvoiaUsers on next use
+                invalidate_gmail_credentials(self.account_email)
+                raise
+        record_token_refresh(self.account_email, self.token, self.refresh_token)
+
+def load_client_config(credentials_path: str = GCP_CREDENTIALS_PATH) -> Dict[str, str]:
+    global _client_config
+    if _client_config is not None:
+        return _client_config
+
+    with _lock:
+        if _client_config is None:
+            try:
+                with open(credentials_path) as f:
+                    _client_config = json.load(f)['web']
+            except FileNotFoundError:
+                raise FileNotFoundError(f"Credentials file not found at {credentials_path}")
+            except json.JSONDecodeError:
+                raise json.JSONDecodeError("Invalid JSON in credentials file", "", 0)
+        return _client_config
+
+def _load_discovery_document() -> Optional[Dict[str, Any]]:
+    # The Gmail discovery document ships with google-api-python-client; parse it once
+    global _discovery_document
+    if _discovery_document is None:
+        with _lock:
+            if _discovery_document is None:
+                document = get_static_doc('gmail', 'v1')
+                _discovery_document = json.loads(document) if document else {}
+    return _discovery_document or None
+
+def get_gmail_credentials(email: str) -> RecordingCredentials:
+    with _lock:
+        credentials = _credentials.get(email)
+    if credentials is not None:
+        return credentials
+
+    # Fetch tokens from DynamoDB
+    tokens = fetch_tokens(email)
+
+    if not tokens:
+        raise ValueError(f"No authentication tokens found for {email}")
+
+    client_config = load_client_config()
+    credentials = RecordingCredentials(
+        email,
+        token=tokens['access_token'],
+        refresh_token=tokens['refresh_token'],
+        client_id=client_config['client_id'],
+        client_secret=client_config['client_secret'],
+        token_uri=client_config['token_uri'],
+        scopes=GMAIL_SCOPES
+    )
+
+    with _lock:
+        # Keep the first one stored, so concurrent loads still share one credentials object
+        return _credentials.setdefault(email, credentials)
+
+def get_gmail_service(email: str):
+    # httplib2.Http is not thread-safe, so each thread builds its own service and
+    # connection per account; credentials and the discovery document are shared
+    credentials = get_gmail_credentials(email)
+    services: LRUCache = getattr(_local, 'services', None)
+    if services is None:
+        services = _local.services = LRUCache(maxsize=THREAD_SERVICE_CACHE_SIZE)
+
+    cached = services.get(email)
+    if cached is not None and cached[0] is credentials:
+        return cached[1]
+
+    http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=GMAIL_HTTP_TIMEOUT_SECONDS))
+    document = _load_discovery_document()
+    if document is not None:
+        service = build_from_document(document, http=http)
+    else:
+        service = build('gmail', 'v1', http=http, cache_discovery=False)
+
+    services[email] = (credentials, service)
+    return service
+
+def invalidate_gmail_credentials(email: str) -> None:
+    # Drop the account's credentials, e.g. after it is re-authorised; services are rebuilt on next use
+    with _lock:
+        _credentials.pop(email, None)
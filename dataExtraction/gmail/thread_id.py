@@ -5,61 +5,28 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Any
 
 # Google API imports
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials as OAuthCredentials
 from googleapiclient.errors import HttpError
 
 # Add the root directory to the Python path
 root_dir = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(root_dir))
 
-# Now import aws module
-from aws.utils import fetch_tokens
+# Now import the shared Gmail service factory
+from dataExtraction.gmail.service_factory import get_gmail_service
 
 class GmailThreadFetcher:
     
     def __init__(self, email: str):
 
         self.email = email
-        self._tokens = None
-        self._credentials = None
         self._service = None
     
-    def _load_credentials(self) -> Dict[str, Any]:
-
-        try:
-            credentials_path = Path("credentials/credential_gcp.json")
-            with credentials_path.open() as f:
-                return json.load(f)
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Credentials file not found at {credentials_path}")
-        except json.JSONDecodeError:
-            raise json.JSONDecodeError("Invalid JSON in credentials file")
-    
     def _authenticate(self) -> None:
 
-        # Fetch tokens from DynamoDB
-        self._tokens = fetch_tokens(self.email)
-        
-        if not self._tokens:
-            raise ValueError(f"No authentication tokens found for {self.email}")
-        
         try:
-            # Load credentials
-            credentials_data = self._load_credentials()
-            
-            # Initialize credentials
-            self._credentials = OAuthCredentials(
-                token=self._tokens['access_token'],
-                refresh_token=self._tokens['refresh_token'],
-                client_id=credentials_data['web']['client_id'],
-                client_secret=credentials_data['web']['client_secret'],
-                token_uri=credentials_data['web']['token_uri']
-            )
-            
-            # Build Gmail service
-            self._service = build('gmail', 'v1', credentials=self._credentials)
-        
+            # Shared per-account service; credentials and discovery are cached by the factory
+            self._service = get_gmail_service(self.email)
+
         except (ValueError, HttpError) as e:
             print(f"Authentication error: {e}")
             raise
@@ -9,10 +9,18 @@ from email.parser import BytesParser
 from email.policy import default
 import email.utils
 import re
+import sys
 import logging
-from typing import Dict, Union, List
+from pathlib import Path
+from typing import Dict, Union, List, Tuple
 from datetime import datetime, timedelta
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from dataExtraction.body_extraction import extract_mime_body
+from dataExtraction.custom.imap_fetch import search_uids
+from dataExtraction.custom.imap_sync import IMAPFolderSync, IMAPSyncResult
+from email_operations.imap_pool import get_imap_pool
+
 class EmailClient:
     
     def __init__(
@@ -40,6 +48,19 @@ class EmailClient:
             handler.setFormatter(formatter)
             self.logger.addHandler(handler)
             self.logger.setLevel(logging.INFO)
+
+    def _imap_session(self):
+        # Pooled per account, so the calls of one monitor tick share a single login
+        return get_imap_pool().session(self.email_address, self.password, self.imap_server, self.imap_port)
+
+    def _message_uid(self, mail: imaplib.IMAP4, message: Union[int, str]) -> str:
+        # Messages are given by INBOX UID, as the monitors' sync returns them, or by Message-ID
+        if isinstance(message, int):
+            return str(message)
+        uids = search_uids(mail, f'HEADER Message-ID "{message}"')
+        if not uids:
+            raise Exception(f"Email with Message-ID {message} not found")
+        return str(uids[0])
     
     def send_email(
         self,
@@ -101,22 +122,19 @@ class EmailClient:
             msg.attach(MIMEText(body, 'plain'))
             
             # Connect to IMAP server
-            server = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
-            server.login(self.email_address, self.password)
-            
-            # Select drafts folder
-            server.select(draft_folder)
+            with self._imap_session() as server:
             
-            # Save message as draft
-            message_string = msg.as_string()
-            server.append(draft_folder, '\\Draft', None, message_string.encode('utf-8'))
+                # Select drafts folder
+                server.select(draft_folder)
             
-            server.logout()
+                # Save message as draft
+                message_string = msg.as_string()
+                server.append(draft_folder, '\\Draft', None, message_string.encode('utf-8'))
             
-            return {
-                "success": True,
-                "message": "Email draft saved successfully"
-            }
+                return {
+                    "success": True,
+                    "message": "Email draft saved successfully"
+                }
             
         except Exception as e:
             error_message = f"Failed to save draft: {str(e)}"
@@ -130,45 +148,41 @@ class EmailClient:
 
         try:
             # Connect to the IMAP server
-            mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
-            mail.login(self.email_address, self.password)
-            
-            # Check if the label already exists
-            status, existing_labels = mail.list()
-            
-            # Check if label already exists
-            label_exists = False
-            if status == "OK":
-                for label in existing_labels:
-                    if isinstance(label, bytes):
-                        label = label.decode('utf-8')
-                    if f'"{label_name}"' in label or f'/{label_name}' in label:
-                        label_exists = True
-                        break
-            
-            if label_exists:
-                mail.logout()
-                return {
-                    "success": True,
-                    "message": f"Label '{label_name}' already exists"
-                }
+            with self._imap_session() as mail:
             
-            # For Gmail, labels might need special formatting
-            # Enclose the label name in quotes to handle spaces
-            quoted_label = f'"{label_name}"'
+                # Check if the label already exists
+                status, existing_labels = mail.list()
             
-            # Create the label/folder
-            status, response = mail.create(quoted_label)
+                # Check if label already exists
+                label_exists = False
+                if status == "OK":
+                    for label in existing_labels:
+                        if isinstance(label, bytes):
+                            label = label.decode('utf-8')
+                        if f'"{label_name}"' in label or f'/{label_name}' in label:
+                            label_exists = True
+                            break
             
-            if status != "OK":
-                raise Exception(f"Failed to create label '{label_name}': {response}")
+                if label_exists:
+                    return {
+                        "success": True,
+                        "message": f"Label '{label_name}' already exists"
+                    }
             
-            mail.logout()
+                # For Gmail, labels might need special formatting
+                # Enclose the label name in quotes to handle spaces
+                quoted_label = f'"{label_name}"'
             
-            return {
-                "success": True,
-                "message": f"Label '{label_name}' created successfully"
-            }
+                # Create the label/folder
+                status, response = mail.create(quoted_label)
+            
+                if status != "OK":
+                    raise Exception(f"Failed to create label '{label_name}': {response}")
+            
+                return {
+                    "success": True,
+                    "message": f"Label '{label_name}' created successfully"
+                }
             
         except Exception as e:
             error_message = f"Failed to create label: {str(e)}"
@@ -178,130 +192,108 @@ class EmailClient:
                 "message": error_message
             }
     
-    def add_label_to_email(self, message_id: str, label: str) -> bool:
+    def add_label_to_email(self, message_id: Union[int, str], label: str) -> bool:
 
         try:
             # Connect to the IMAP server
-            mail = imaplib.IMAP4_SSL(self.imap_server)
-            mail.login(self.email_address, self.password)
-            mail.select("INBOX")  # Ensure we're in the correct folder
-            
-            # Search for the email by Message-ID
-            status, message_numbers = mail.search(None, f'HEADER Message-ID "{message_id}"')
-            if status != "OK" or not message_numbers[0]:
-                raise Exception(f"Email with Message-ID {message_id} not found.")
+            with self._imap_session() as mail:
+                mail.select("INBOX")  # Ensure we're in the correct folder
             
-            # Get the email's unique identifier
-            email_id = message_numbers[0].split()[0]
+                # Get the email's unique identifier
+                email_uid = self._message_uid(mail, message_id)
             
-            # Add the Gmail label using X-GM-LABELS
-            status, response = mail.store(email_id, "+X-GM-LABELS", f'"{label}"')
-            if status != "OK":
-                raise Exception(f"Failed to add label '{label}' to email.")
+                # Add the Gmail label using X-GM-LABELS
+                status, response = mail.uid('STORE', email_uid, "+X-GM-LABELS", f'"{label}"')
+                if status != "OK":
+                    raise Exception(f"Failed to add label '{label}' to email.")
             
-            self.logger.info(f"Label '{label}' added to email with Message-ID {message_id}.")
-            return True
+                self.logger.info(f"Label '{label}' added to email {message_id}.")
+                return True
             
         except Exception as e:
             self.logger.error(f"Error adding label: {str(e)}")
             return False
     
-    def mark_as_starred(self, message_id: str) -> bool:
+    def mark_as_starred(self, message_id: Union[int, str]) -> bool:
 
         try:
             # Connect to IMAP server
-            mail = imaplib.IMAP4_SSL(self.imap_server)
-            mail.login(self.email_address, self.password)
+            with self._imap_session() as mail:
             
-            # Select the inbox
-            status, messages = mail.select("INBOX")
-            if status != "OK":
-                raise Exception("Could not access INBOX")
+                # Select the inbox
+                status, messages = mail.select("INBOX")
+                if status != "OK":
+                    raise Exception("Could not access INBOX")
 
-            # Search for the email with the given Message-ID
-            search_criteria = f'HEADER Message-ID "{message_id}"'
-            status, message_numbers = mail.search(None, search_criteria)
-            if status != "OK" or not message_numbers[0]:
-                raise Exception(f"Email with Message-ID {message_id} not found")
-
-            # Mark the email as starred
-            email_id = message_numbers[0].split()[0]
-            mail.store(email_id, "+FLAGS", "\\Flagged")
-            self.logger.info(f"Email with Message-ID {message_id} marked as starred.")
-            mail.logout()
-            return True
+                # Mark the email as starred
+                email_uid = self._message_uid(mail, message_id)
+                mail.uid('STORE', email_uid, "+FLAGS", "\\Flagged")
+                self.logger.info(f"Email {message_id} marked as starred.")
+                return True
             
         except Exception as e:
             self.logger.error(f"Error marking email as starred: {str(e)}")
             return False
     
-    def send_reply(self, message_id: str, reply_body: str) -> Dict[str, Union[bool, str]]:
+    def send_reply(self, message_id: Union[int, str], reply_body: str) -> Dict[str, Union[bool, str]]:
 
         try:
             # Connect to IMAP server to find the original message
-            mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
-            mail.login(self.email_address, self.password)
-            mail.select("INBOX")
-            
-            # Search for the email with the given Message-ID
-            search_criteria = f'HEADER Message-ID "{message_id}"'
-            status, message_numbers = mail.search(None, search_criteria)
-            if status != "OK" or not message_numbers[0]:
-                raise Exception(f"Email with Message-ID {message_id} not found")
-            
-            # Get the email data
-            email_id_num = message_numbers[0].split()[0]
-            status, msg_data = mail.fetch(email_id_num, '(RFC822)')
-            if status != "OK":
-                raise Exception("Failed to fetch email data")
-            
-            # Parse the email
-            raw_email = msg_data[0][1]
-            original_msg = BytesParser(policy=default).parsebytes(raw_email)
-            
+            with self._imap_session() as mail:
+                mail.select("INBOX")
+            
+                # Get the email data
+                email_uid = self._message_uid(mail, message_id)
+                status, msg_data = mail.uid('FETCH', email_uid, '(RFC822)')
+                if status != "OK" or not msg_data or not msg_data[0]:
+                    raise Exception("Failed to fetch email data")
+            
+                # Parse the email
+                raw_email = msg_data[0][1]
+                original_msg = BytesParser(policy=default).parsebytes(raw_email)
+        
             # Get original sender and subject
             original_sender = original_msg['From']
             original_subject = original_msg['Subject']
-            
+        
             # Extract email address from sender (might be in format "Name <email@example.com>")
             email_match = re.search(r'<(.+?)>', original_sender)
             if email_match:
                 receiver_email = email_match.group(1)
             else:
                 receiver_email = original_sender
-            
+        
             # Create reply subject (add Re: if not already present)
             if original_subject.lower().startswith('re:'):
                 reply_subject = original_subject
             else:
                 reply_subject = f"Re: {original_subject}"
-            
+        
             # Create reply message
             msg = MIMEMultipart()
             msg['From'] = self.email_address
             msg['To'] = receiver_email
             msg['Subject'] = reply_subject
-            msg['In-Reply-To'] = message_id
-            msg['References'] = message_id
-            
+            if original_msg['Message-ID']:
+                msg['In-Reply-To'] = original_msg['Message-ID']
+                msg['References'] = original_msg['Message-ID']
+        
             # Attach body text
             msg.attach(MIMEText(reply_body, 'plain'))
-            
-            # Connect to SMTP server and send the message
+        
+            # Connect to SMTP server and send the message; the IMAP session is already back in
+            # the pool, so the account's other work isn't held up by the SMTP round trips
             server = smtplib.SMTP(self.smtp_server, self.smtp_port)
             server.starttls()
             server.login(self.email_address, self.password)
             server.sendmail(self.email_address, receiver_email, msg.as_string())
             server.quit()
-            
-            # Close IMAP connection
-            mail.logout()
-            
+        
             return {
                 "success": True,
                 "message": f"Reply sent successfully to {receiver_email}"
             }
-            
+        
         except Exception as e:
             error_message = f"Failed to send reply: {str(e)}"
             self.logger.error(error_message)
@@ -312,50 +304,43 @@ class EmailClient:
     
     def draft_reply(
         self, 
-        message_id: str, 
+        message_id: Union[int, str], 
         reply_body: str, 
         draft_folder: str
     ) -> Dict[str, Union[bool, str]]:
 
         try:
             # Connect to IMAP server
-            mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
-            mail.login(self.email_address, self.password)
-            mail.select("INBOX")
-            
-            # Search for the email with the given Message-ID
-            search_criteria = f'HEADER Message-ID "{message_id}"'
-            status, message_numbers = mail.search(None, search_criteria)
-            if status != "OK" or not message_numbers[0]:
-                raise Exception(f"Email with Message-ID {message_id} not found")
-            
-            # Get the email data
-            email_id_num = message_numbers[0].split()[0]
-            status, msg_data = mail.fetch(email_id_num, '(RFC822)')
-            if status != "OK":
-                raise Exception("Failed to fetch email data")
-            
-            # Parse the email
-            raw_email = msg_data[0][1]
-            original_msg = BytesParser(policy=default).parsebytes(raw_email)
-            
+            with self._imap_session() as mail:
+                mail.select("INBOX")
+            
+                # Get the email data
+                email_uid = self._message_uid(mail, message_id)
+                status, msg_data = mail.uid('FETCH', email_uid, '(RFC822)')
+                if status != "OK" or not msg_data or not msg_data[0]:
+                    raise Exception("Failed to fetch email data")
+            
+                # Parse the email
+                raw_email = msg_data[0][1]
+                original_msg = BytesParser(policy=default).parsebytes(raw_email)
+        
             # Get original sender and subject
             original_sender = original_msg['From']
             original_subject = original_msg['Subject']
-            
+        
             # Extract email address from sender
             email_match = re.search(r'<(.+?)>', original_sender)
             if email_match:
                 receiver_email = email_match.group(1)
             else:
                 receiver_email = original_sender
-            
+        
             # Create reply subject
             if original_subject.lower().startswith('re:'):
                 reply_subject = original_subject
             else:
                 reply_subject = f"Re: {original_subject}"
-            
+        
             # Create draft reply message
             msg = MIMEMultipart()
             msg['From'] = self.email_address
@@ -363,26 +348,23 @@ class EmailClient:
             msg['Subject'] = reply_subject
             msg['Date'] = email.utils.formatdate(localtime=True)
             msg['Message-ID'] = email.utils.make_msgid()
-            msg['In-Reply-To'] = message_id
-            msg['References'] = message_id
-            
+            if original_msg['Message-ID']:
+                msg['In-Reply-To'] = original_msg['Message-ID']
+                msg['References'] = original_msg['Message-ID']
+        
             # Attach body text
             msg.attach(MIMEText(reply_body, 'plain'))
-            
-            # Switch to drafts folder
-            mail.select(draft_folder)
-            
-            # Save message as draft
+        
+            # Save message as draft; APPEND needs no selected folder
             message_string = msg.as_string()
-            mail.append(draft_folder, '\\Draft', None, message_string.encode('utf-8'))
-            
-            mail.logout()
-            
+            with self._imap_session() as mail:
+                mail.append(draft_folder, '\\Draft', None, message_string.encode('utf-8'))
+        
             return {
                 "success": True,
                 "message": f"Reply draft saved successfully for email to {receiver_email}"
             }
-            
+        
         except Exception as e:
             error_message = f"Failed to save reply draft: {str(e)}"
             self.logger.error(error_message)
@@ -395,37 +377,34 @@ class EmailClient:
 
         try:
             # Connect to the IMAP server
-            mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
-            mail.login(self.email_address, self.password)
-            
-            # List all available folders/mailboxes
-            status, folder_list = mail.list()
-            
-            if status != "OK":
-                raise Exception(f"Failed to retrieve folder list: {folder_list}")
-            
-            # Parse folder names
-            folders = []
-            for folder in folder_list:
-                if folder:
-                    # Decode bytes to string if necessary
-                    if isinstance(folder, bytes):
-                        folder = folder.decode('utf-8')
+            with self._imap_session() as mail:
+            
+                # List all available folders/mailboxes
+                status, folder_list = mail.list()
+            
+                if status != "OK":
+                    raise Exception(f"Failed to retrieve folder list: {folder_list}")
+            
+                # Parse folder names
+                folders = []
+                for folder in folder_list:
+                    if folder:
+                        # Decode bytes to string if necessary
+                        if isinstance(folder, bytes):
+                            folder = folder.decode('utf-8')
                     
-                    # Extract the folder name (typically the last part after the delimiter)
-                    parts = folder.split(' "/"' if ' "/" ' in folder else ' "." ' if ' "." ' in folder else ' ')
-                    folder_name = parts[-1].strip('"')
-                    folders.append(folder_name)
-            
-            mail.logout()
-            
-            # return {
-            #     "success": True,
-            #     "folders": folders,
-            #     "message": f"Successfully retrieved {len(folders)} folders"
-            # }
+                        # Extract the folder name (typically the last part after the delimiter)
+                        parts = folder.split(' "/"' if ' "/" ' in folder else ' "." ' if ' "." ' in folder else ' ')
+                        folder_name = parts[-1].strip('"')
+                        folders.append(folder_name)
+            
+                # return {
+                #     "success": True,
+                #     "folders": folders,
+                #     "message": f"Successfully retrieved {len(folders)} folders"
+                # }
         
-            return folders
+                return folders
             
         except Exception as e:
             error_message = f"Failed to list email folders: {str(e)}"
@@ -444,70 +423,67 @@ class EmailClient:
 
         try:
             # Connect to the IMAP server
-            mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
-            mail.login(self.email_address, self.password)
-            mail.select(folder)
+            with self._imap_session() as mail:
+                mail.select(folder)
             
-            # Calculate the time threshold (current time - minutes)
-            time_threshold = datetime.now() - timedelta(minutes=minutes)
-            # Format the date according to IMAP4 search criteria (DD-MMM-YYYY)
-            date_str = time_threshold.strftime("%d-%b-%Y")
+                # Calculate the time threshold (current time - minutes)
+                time_threshold = datetime.now() - timedelta(minutes=minutes)
+                # Format the date according to IMAP4 search criteria (DD-MMM-YYYY)
+                date_str = time_threshold.strftime("%d-%b-%Y")
             
-            # Search for emails newer than the threshold
-            status, message_numbers = mail.search(None, f'SENTSINCE {date_str}')
+                # Search for emails newer than the threshold
+                status, message_numbers = mail.search(None, f'SENTSINCE {date_str}')
             
-            if status != "OK":
-                raise Exception(f"Failed to search for recent emails: {message_numbers}")
+                if status != "OK":
+                    raise Exception(f"Failed to search for recent emails: {message_numbers}")
             
-            message_ids = []
+                message_ids = []
             
-            # If we have message numbers, fetch each message header
-            if message_numbers and message_numbers[0]:
-                message_number_list = message_numbers[0].split()
+                # If we have message numbers, fetch each message header
+                if message_numbers and message_numbers[0]:
+                    message_number_list = message_numbers[0].split()
                 
-                for num in message_number_list:
-                    # Fetch the message headers
-                    status, msg_data = mail.fetch(num, '(BODY.PEEK[HEADER.FIELDS (MESSAGE-ID DATE)])')
-                    if status != "OK":
-                        continue
+                    for num in message_number_list:
+                        # Fetch the message headers
+                        status, msg_data = mail.fetch(num, '(BODY.PEEK[HEADER.FIELDS (MESSAGE-ID DATE)])')
+                        if status != "OK":
+                            continue
                     
-                    # Parse the headers
-                    for response_part in msg_data:
-                        if isinstance(response_part, tuple):
-                            # Parse header
-                            header_data = response_part[1]
-                            parser = BytesParser(policy=default)
-                            headers = parser.parsebytes(header_data)
+                        # Parse the headers
+                        for response_part in msg_data:
+                            if isinstance(response_part, tuple):
+                                # Parse header
+                                header_data = response_part[1]
+                                parser = BytesParser(policy=default)
+                                headers = parser.parsebytes(header_data)
                             
-                            # Get message ID and date
-                            message_id = headers.get('Message-ID', headers.get('Message-Id', None))
-                            date_str = headers.get('Date', None)
+                                # Get message ID and date
+                                message_id = headers.get('Message-ID', headers.get('Message-Id', None))
+                                date_str = headers.get('Date', None)
                             
-                            if message_id and date_str:
-                                # Parse the date to compare with our threshold
-                                try:
-                                    # Parse email date format
-                                    date_tuple = email.utils.parsedate_tz(date_str)
-                                    if date_tuple:
-                                        # Convert to timestamp and then to datetime
-                                        timestamp = email.utils.mktime_tz(date_tuple)
-                                        message_date = datetime.fromtimestamp(timestamp)
+                                if message_id and date_str:
+                                    # Parse the date to compare with our threshold
+                                    try:
+                                        # Parse email date format
+                                        date_tuple = email.utils.parsedate_tz(date_str)
+                                        if date_tuple:
+                                            # Convert to timestamp and then to datetime
+                                            timestamp = email.utils.mktime_tz(date_tuple)
+                                            message_date = datetime.fromtimestamp(timestamp)
                                         
-                                        # Check if the message is within our time window
-                                        if message_date >= time_threshold:
-                                            message_ids.append(message_id)
-                                except Exception as date_error:
-                                    self.logger.warning(f"Error parsing date: {date_error}")
-            
-            mail.logout()
-            
-            # return {
-            #     "success": True,
-            #     "message_ids": message_ids,
-            #     "message": f"Found {len(message_ids)} messages in the last {minutes} minutes"
-            # }
+                                            # Check if the message is within our time window
+                                            if message_date >= time_threshold:
+                                                message_ids.append(message_id)
+                                    except Exception as date_error:
+                                        self.logger.warning(f"Error parsing date: {date_error}")
+            
+                # return {
+                #     "success": True,
+                #     "message_ids": message_ids,
+                #     "message": f"Found {len(message_ids)} messages in the last {minutes} minutes"
+                # }
 
-            return message_ids
+                return message_ids
             
         except Exception as e:
             error_message = f"Failed to retrieve recent message IDs: {str(e)}"
@@ -518,6 +494,20 @@ class EmailClient:
                 "message": error_message
             }
     
+    def get_new_message_ids(self, imap_sync: IMAPFolderSync) -> Tuple[List[int], IMAPSyncResult]:
+
+        try:
+            with self._imap_session() as mail:
+                # Only mail above the consumer's last seen UID; the UIDs are what the other
+                # methods take, so mail without a Message-ID header is handled too
+                changes = imap_sync.fetch_changes(mail, readonly=False)
+                return changes.new_uids, changes
+
+        except Exception as e:
+            # Raised rather than returned, so the caller never saves a cursor past unread mail
+            self.logger.error(f"Failed to sync new message IDs: {str(e)}")
+            raise
+    
     def get_recent_thread_ids(
         self, 
         minutes: int = 3, 
@@ -526,136 +516,133 @@ class EmailClient:
 
         try:
             # Connect to the IMAP server
-            mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
-            mail.login(self.email_address, self.password)
-            mail.select(folder)
+            with self._imap_session() as mail:
+                mail.select(folder)
             
-            # Calculate the time threshold (current time - minutes)
-            time_threshold = datetime.now() - timedelta(minutes=minutes)
-            # Format the date according to IMAP4 search criteria (DD-MMM-YYYY)
-            date_str = time_threshold.strftime("%d-%b-%Y")
+                # Calculate the time threshold (current time - minutes)
+                time_threshold = datetime.now() - timedelta(minutes=minutes)
+                # Format the date according to IMAP4 search criteria (DD-MMM-YYYY)
+                date_str = time_threshold.strftime("%d-%b-%Y")
             
-            # Search for emails newer than the threshold
-            status, message_numbers = mail.search(None, f'SENTSINCE {date_str}')
+                # Search for emails newer than the threshold
+                status, message_numbers = mail.search(None, f'SENTSINCE {date_str}')
             
-            if status != "OK":
-                raise Exception(f"Failed to search for recent emails: {message_numbers}")
+                if status != "OK":
+                    raise Exception(f"Failed to search for recent emails: {message_numbers}")
             
-            thread_ids = set()  # Use a set to avoid duplicates
+                thread_ids = set()  # Use a set to avoid duplicates
             
-            # If we have message numbers, fetch each message
-            if message_numbers and message_numbers[0]:
-                message_number_list = message_numbers[0].split()
+                # If we have message numbers, fetch each message
+                if message_numbers and message_numbers[0]:
+                    message_number_list = message_numbers[0].split()
                 
-                # Determine if this is Gmail (which supports X-GM-THRID)
-                is_gmail = "gmail" in self.imap_server.lower()
+                    # Determine if this is Gmail (which supports X-GM-THRID)
+                    is_gmail = "gmail" in self.imap_server.lower()
                 
-                for num in message_number_list:
-                    # For Gmail, fetch the thread ID using X-GM-THRID
-                    if is_gmail:
-                        try:
-                            # Fetch Gmail's thread ID
-                            status, response = mail.fetch(num, '(X-GM-THRID)')
-                            if status == "OK" and response and response[0]:
-                                # Extract thread ID from response
-                                response_str = response[0].decode('utf-8') if isinstance(response[0], bytes) else response[0]
-                                thread_match = re.search(r'X-GM-THRID\s+(\d+)', response_str)
-                                if thread_match:
-                                    thread_id = thread_match.group(1)
+                    for num in message_number_list:
+                        # For Gmail, fetch the thread ID using X-GM-THRID
+                        if is_gmail:
+                            try:
+                                # Fetch Gmail's thread ID
+                                status, response = mail.fetch(num, '(X-GM-THRID)')
+                                if status == "OK" and response and response[0]:
+                                    # Extract thread ID from response
+                                    response_str = response[0].decode('utf-8') if isinstance(response[0], bytes) else response[0]
+                                    thread_match = re.search(r'X-GM-THRID\s+(\d+)', response_str)
+                                    if thread_match:
+                                        thread_id = thread_match.group(1)
                                     
-                                    # Fetch the message date to check if it's within our time window
-                                    status, msg_data = mail.fetch(num, '(BODY.PEEK[HEADER.FIELDS (DATE)])')
-                                    if status == "OK" and msg_data and msg_data[0]:
-                                        for response_part in msg_data:
-                                            if isinstance(response_part, tuple):
-                                                # Parse header
-                                                header_data = response_part[1]
-                                                parser = BytesParser(policy=default)
-                                                headers = parser.parsebytes(header_data)
+                                        # Fetch the message date to check if it's within our time window
+                                        status, msg_data = mail.fetch(num, '(BODY.PEEK[HEADER.FIELDS (DATE)])')
+                                        if status == "OK" and msg_data and msg_data[0]:
+                                            for response_part in msg_data:
+                                                if isinstance(response_part, tuple):
+                                                    # Parse header
+                                                    header_data = response_part[1]
+                                                    parser = BytesParser(policy=default)
+                                                    headers = parser.parsebytes(header_data)
                                                 
-                                                date_str = headers.get('Date', None)
+                                                    date_str = headers.get('Date', None)
                                                 
-                                                if date_str:
-                                                    try:
-                                                        # Parse email date format
-                                                        date_tuple = email.utils.parsedate_tz(date_str)
-                                                        if date_tuple:
-                                                            # Convert to timestamp and then to datetime
-                                                            timestamp = email.utils.mktime_tz(date_tuple)
-                                                            message_date = datetime.fromtimestamp(timestamp)
+                                                    if date_str:
+                                                        try:
+                                                            # Parse email date format
+                                                            date_tuple = email.utils.parsedate_tz(date_str)
+                                                            if date_tuple:
+                                                                # Convert to timestamp and then to datetime
+                                                                timestamp = email.utils.mktime_tz(date_tuple)
+                                                                message_date = datetime.fromtimestamp(timestamp)
                                                             
-                                                            # Check if the message is within our time window
-                                                            if message_date >= time_threshold:
-                                                                thread_ids.add(thread_id)
-                                                    except Exception as date_error:
-                                                        self.logger.warning(f"Error parsing date: {date_error}")
-                        except Exception as thread_error:
-                            self.logger.warning(f"Error fetching Gmail thread ID: {thread_error}")
+                                                                # Check if the message is within our time window
+                                                                if message_date >= time_threshold:
+                                                                    thread_ids.add(thread_id)
+                                                        except Exception as date_error:
+                                                            self.logger.warning(f"Error parsing date: {date_error}")
+                            except Exception as thread_error:
+                                self.logger.warning(f"Error fetching Gmail thread ID: {thread_error}")
                     
-                    # For non-Gmail or as fallback, use References and In-Reply-To headers
-                    if not is_gmail or len(thread_ids) == 0:
-                        try:
-                            # Fetch message headers
-                            status, msg_data = mail.fetch(num, '(BODY.PEEK[HEADER.FIELDS (MESSAGE-ID REFERENCES IN-REPLY-TO DATE)])')
-                            if status == "OK" and msg_data and msg_data[0]:
-                                for response_part in msg_data:
-                                    if isinstance(response_part, tuple):
-                                        # Parse header
-                                        header_data = response_part[1]
-                                        parser = BytesParser(policy=default)
-                                        headers = parser.parsebytes(header_data)
+                        # For non-Gmail or as fallback, use References and In-Reply-To headers
+                        if not is_gmail or len(thread_ids) == 0:
+                            try:
+                                # Fetch message headers
+                                status, msg_data = mail.fetch(num, '(BODY.PEEK[HEADER.FIELDS (MESSAGE-ID REFERENCES IN-REPLY-TO DATE)])')
+                                if status == "OK" and msg_data and msg_data[0]:
+                                    for response_part in msg_data:
+                                        if isinstance(response_part, tuple):
+                                            # Parse header
+                                            header_data = response_part[1]
+                                            parser = BytesParser(policy=default)
+                                            headers = parser.parsebytes(header_data)
                                         
-                                        # Get message ID, references, and date
-                                        message_id = headers.get('Message-ID', headers.get('Message-Id', None))
-                                        references = headers.get('References', None)
-                                        in_reply_to = headers.get('In-Reply-To', None)
-                                        date_str = headers.get('Date', None)
+                                            # Get message ID, references, and date
+                                            message_id = headers.get('Message-ID', headers.get('Message-Id', None))
+                                            references = headers.get('References', None)
+                                            in_reply_to = headers.get('In-Reply-To', None)
+                                            date_str = headers.get('Date', None)
                                         
-                                        # Check if it's within our time window
-                                        if date_str:
-                                            try:
-                                                # Parse email date format
-                                                date_tuple = email.utils.parsedate_tz(date_str)
-                                                if date_tuple:
-                                                    # Convert to timestamp and then to datetime
-                                                    timestamp = email.utils.mktime_tz(date_tuple)
-                                                    message_date = datetime.fromtimestamp(timestamp)
+                                            # Check if it's within our time window
+                                            if date_str:
+                                                try:
+                                                    # Parse email date format
+                                                    date_tuple = email.utils.parsedate_tz(date_str)
+                                                    if date_tuple:
+                                                        # Convert to timestamp and then to datetime
+                                                        timestamp = email.utils.mktime_tz(date_tuple)
+                                                        message_date = datetime.fromtimestamp(timestamp)
                                                     
-                                                    # Check if the message is within our time window
-                                                    if message_date >= time_threshold:
-                                                        # For non-Gmail, we'll use the first message ID in References
-                                                        # or the In-Reply-To as the thread ID
-                                                        thread_id = None
+                                                        # Check if the message is within our time window
+                                                        if message_date >= time_threshold:
+                                                            # For non-Gmail, we'll use the first message ID in References
+                                                            # or the In-Reply-To as the thread ID
+                                                            thread_id = None
                                                         
-                                                        if references:
-                                                            # Get the first Message-ID in the References header
-                                                            ref_ids = references.split()
-                                                            if ref_ids:
-                                                                thread_id = ref_ids[0].strip('<>')
+                                                            if references:
+                                                                # Get the first Message-ID in the References header
+                                                                ref_ids = references.split()
+                                                                if ref_ids:
+                                                                    thread_id = ref_ids[0].strip('<>')
                                                         
-                                                        if not thread_id and in_reply_to:
-                                                            thread_id = in_reply_to.strip('<>')
+                                                            if not thread_id and in_reply_to:
+                                                                thread_id = in_reply_to.strip('<>')
                                                         
-                                                        # If no thread information, use its own Message-ID
-                                                        if not thread_id and message_id:
-                                                            thread_id = message_id.strip('<>')
+                                                            # If no thread information, use its own Message-ID
+                                                            if not thread_id and message_id:
+                                                                thread_id = message_id.strip('<>')
                                                         
-                                                        if thread_id:
-                                                            thread_ids.add(thread_id)
-                                            except Exception as date_error:
-                                                self.logger.warning(f"Error parsing date: {date_error}")
-                        except Exception as header_error:
-                            self.logger.warning(f"Error fetching message headers: {header_error}")
-            
-            mail.logout()
-            
-            # return {
-            #     "success": True,
-            #     "thread_ids": list(thread_ids),
-            #     "message": f"Found {len(thread_ids)} thread IDs in the last {minutes} minutes"
-            # }
+                                                            if thread_id:
+                                                                thread_ids.add(thread_id)
+                                                except Exception as date_error:
+                                                    self.logger.warning(f"Error parsing date: {date_error}")
+                            except Exception as header_error:
+                                self.logger.warning(f"Error fetching message headers: {header_error}")
+            
+                # return {
+                #     "success": True,
+                #     "thread_ids": list(thread_ids),
+                #     "message": f"Found {len(thread_ids)} thread IDs in the last {minutes} minutes"
+                # }
 
-            return list(thread_ids)
+                return list(thread_ids)
             
         except Exception as e:
             error_message = f"Failed to retrieve recent thread IDs: {str(e)}"
@@ -666,76 +653,44 @@ class EmailClient:
                 "message": error_message
             }
 
-    def fetch_message_details_condensed(self, message_id: str) -> Dict[str, Union[str, Dict[str, str]]]:
+    def fetch_message_details_condensed(self, message_id: Union[int, str]) -> Dict[str, Union[str, Dict[str, str]]]:
 
         try:
             # Connect to IMAP server
-            mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
-            mail.login(self.email_address, self.password)
-            mail.select("INBOX")
-            
-            # Search for the email with the given Message-ID
-            search_criteria = f'HEADER Message-ID "{message_id}"'
-            status, message_numbers = mail.search(None, search_criteria)
-            
-            if status != "OK" or not message_numbers[0]:
-                raise Exception(f"Email with Message-ID {message_id} not found")
+            with self._imap_session() as mail:
+                mail.select("INBOX")
             
-            # Get the email data
-            email_id_num = message_numbers[0].split()[0]
-            status, msg_data = mail.fetch(email_id_num, '(RFC822)')
+                # Get the email data
+                email_uid = self._message_uid(mail, message_id)
+                status, msg_data = mail.uid('FETCH', email_uid, '(RFC822)')
             
-            if status != "OK":
-                raise Exception("Failed to fetch email data")
+                if status != "OK" or not msg_data or not msg_data[0]:
+                    raise Exception("Failed to fetch email data")
             
-            # Parse the email
-            raw_email = msg_data[0][1]
-            msg = BytesParser(policy=default).parsebytes(raw_email)
+                # Parse the email
+                raw_email = msg_data[0][1]
+                msg = BytesParser(policy=default).parsebytes(raw_email)
             
-            # Extract subject
-            subject = msg.get('Subject', '')
+                # Extract subject
+                subject = msg.get('Subject', '')
             
-            # Extract sender email
-            sender = msg.get('From', '')
-            # Extract just the email address from the sender field
-            email_match = re.search(r'<(.+?)>', sender)
-            if email_match:
-                sender_email = email_match.group(1)
-            else:
-                sender_email = sender
+                # Extract sender email
+                sender = msg.get('From', '')
+                # Extract just the email address from the sender field
+                email_match = re.search(r'<(.+?)>', sender)
+                if email_match:
+                    sender_email = email_match.group(1)
+                else:
+                    sender_email = sender
             
-            # Extract body content
-            body = ""
+                # Extract body content, cleaned and within the prompt budget
+                body = extract_mime_body(msg)['plain_text']
             
-            # Handle multipart messages
-            if msg.is_multipart():
-                for part in msg.walk():
-                    content_type = part.get_content_type()
-                    content_disposition = str(part.get("Content-Disposition"))
-                    
-                    # Skip attachments
-                    if "attachment" in content_disposition:
-                        continue
-                    
-                    # Get plain text body
-                    if content_type == "text/plain":
-                        body = part.get_payload(decode=True).decode()
-                        break
-                    
-                    # Fallback to HTML if no plain text
-                    elif content_type == "text/html" and not body:
-                        body = part.get_payload(decode=True).decode()
-            else:
-                # For non-multipart messages
-                body = msg.get_payload(decode=True).decode()
-            
-            mail.logout()
-            
-            return {
-                "subject": subject,
-                "body": body,
-                "sender_email": sender_email
-            }
+                return {
+                    "subject": subject,
+                    "body": body,
+                    "sender_email": sender_email
+                }
             
         except Exception as e:
             error_message = f"Failed to fetch message details: {str(e)}"
@@ -1,12 +1,15 @@
-import json
+import sys
 import base64
+from pathlib import Path
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from datetime import datetime, timedelta
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from dataExtraction.gmail.service_factory import get_gmail_service
+
 class GmailAutomation:
     
     def __init__(self, email_id, refresh_token, access_token):
@@ -14,32 +17,13 @@ class GmailAutomation:
         self.email_id = email_id
         self.refresh_token = refresh_token
         self.access_token = access_token
-        self.gcp_creds = self._load_gcp_credentials()
         self.service = self._create_gmail_service()
 
-    def _load_gcp_credentials(self):
-
-        try:
-            with open('credentials/credential_gcp.json', 'r') as f:
-                creds_data = json.load(f)
-            return creds_data['web']
-        except FileNotFoundError:
-            raise FileNotFoundError("GCP credentials file not found at 'credentials/credential_gcp.json'")
-        except json.JSONDecodeError:
-            raise ValueError("Invalid JSON in GCP credentials file")
-
     def _create_gmail_service(self):
 
         try:
-            creds = Credentials(
-                token=self.access_token,
-                refresh_token=self.refresh_token,
-                token_uri=self.gcp_creds['token_uri'],
-                client_id=self.gcp_creds['client_id'],
-                client_secret=self.gcp_creds['client_secret'],
-                scopes=['https://www.googleapis.com/auth/gmail.modify']
-            )
-            return build('gmail', 'v1', credentials=creds)
+            # Tokens come from ConvoiaUsers through the shared factory, which persists refreshes
+            return get_gmail_service(self.email_id)
         except Exception as e:
             raise Exception(f"Failed to create Gmail service: {str(e)}")
 
@@ -86,11 +70,13 @@ class GmailAutomation:
     def draft_reply(self, message_id, reply_body):
 
         try:
-            # Get the original message to extract headers
+            # Get the original message's headers; the body is not needed for a reply
             original = self.service.users().messages().get(
                 userId='me', 
                 id=message_id, 
-                format='full'
+                format='metadata',
+                metadataHeaders=['From', 'Subject'],
+                fields='threadId,payload/headers'
             ).execute()
 
             # Get thread ID to maintain conversation
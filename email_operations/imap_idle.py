@@ -0,0 +1,329 @@
+import re
+import time
+import select
+import socket
+import imaplib
+import threading
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from email_operations.imap_pool import CONNECTION_ERRORS, IMAPSessionPool, get_imap_pool
+from env_config import env_flag, env_int
+
+# Off by default; when on, manual accounts hold an IDLE session on their inbox and new mail
+# is pushed onto the monitors' work queue instead of waiting for the next poll
+IMAP_IDLE_ENV = 'CONVOIA_IMAP_IDLE'
+
+# Every IDLE session is an open socket and a thread; accounts past the cap are polled
+IMAP_IDLE_MAX_SOCKETS_ENV = 'CONVOIA_IMAP_IDLE_MAX_SOCKETS'
+DEFAULT_IDLE_MAX_SOCKETS = 100
+
+# How often accounts without an IDLE session are queued, same as the interval poll
+IMAP_POLL_SECONDS_ENV = 'CONVOIA_IMAP_POLL_SECONDS'
+DEFAULT_POLL_SECONDS = 180
+
+# RFC 2177 lets a server drop a client idling for 30 minutes and Gmail ends IDLE at 29,
+# so each IDLE is closed with DONE and re-issued well before that
+IDLE_RENEW_SECONDS = 25 * 60
+
+# Time the server gets to answer IDLE with a continuation and DONE with its tagged reply
+IDLE_RESPONSE_TIMEOUT_SECONDS = 30
+
+RECONNECT_MIN_SECONDS = 5
+RECONNECT_MAX_SECONDS = 300
+
+IDLE_CAPABILITY = 'IDLE'
+IDLE_TAG_PREFIX = 'IDLE'
+
+UNTAGGED_PATTERN = re.compile(rb'^\* (\d+) (EXISTS|EXPUNGE)\b', re.IGNORECASE)
+
+IdleAccount = Tuple[str, str, int]
+
+def imap_idle_enabled() -> bool:
+    return env_flag(IMAP_IDLE_ENV)
+
+class _LineReader:
+    """
+    Reads response lines straight off the socket with a timeout. imaplib reads through a
+    buffered file that is unusable after a timeout, and it has no IDLE command of its own.
+    """
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.buffer = b''
+
+    def read_line(self, timeout: float) -> Optional[bytes]:
+        # None when nothing arrived within the timeout
+        deadline = time.monotonic() + timeout
+        while b'\n' not in self.buffer:
+            # TLS may hold decrypted bytes that select can't see
+            pending = getattr(self.sock, 'pending', None)
+            if not (pending and pending()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                ready, _, _ = select.select([self.sock], [], [], remaining)
+                if not ready:
+                    return None
+            data = self.sock.recv(65536)
+            if not data:
+                raise EOFError("IMAP server closed the connection")
+            self.buffer += data
+        line, _, self.buffer = self.buffer.partition(b'\n')
+        return line.rstrip(b'\r')
+
+class IMAPIdleWatcher:
+    """
+    One account's IDLE session on INBOX, on its own thread. Each EXISTS that grows the
+    mailbox calls `notify`; IDLE is renewed before the server's timeout and the session is
+    reconnected with backoff when it drops.
+    """
+
+    def __init__(self, listener: "IMAPIdleListener", email_address: str, password: str, server: str, port: int = 993):
+        self.listener = listener
+        self.email_address = email_address
+        self.password = password
+        self.server = server
+        self.port = port
+        self.state = 'starting'
+        self.notifications = 0
+        self.renewals = 0
+        self.reconnects = 0
+        self._exists = 0
+        self._tags = 0
+        self._stop = threading.Event()
+        self._connection: Optional[imaplib.IMAP4] = None
+        self._thread = threading.Thread(target=self._run, name=f'imap-idle-{email_address}', daemon=True)
+
+    @property
+    def key(self) -> IdleAccount:
+        return (self.email_address, self.server, self.port)
+
+    def start(self) -> "IMAPIdleWatcher":
+        self._thread.start()
+        return self
+
+    def stop(self, wait: bool = False) -> None:
+        self._stop.set()
+        connection = self._connection
+        if connection is not None:
+            # Wakes the select the thread is blocked in
+            try:
+                connection.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if wait and self._thread.is_alive():
+            self._thread.join(IDLE_RESPONSE_TIMEOUT_SECONDS)
+
+    def _run(self) -> None:
+        backoff = RECONNECT_MIN_SECONDS
+        connected_before = False
+
+        while not self._stop.is_set():
+            self.state = 'connecting'
+            try:
+                self._connection = self.listener.pool.login(self.email_address, self.password, self.server, self.port)
+                if IDLE_CAPABILITY not in self._connection.capabilities:
+                    print(f"{self.server} has no IDLE, polling {self.email_address} instead")
+                    self.state = 'no_idle'
+                    self.listener._degrade(self)
+                    return
+
+                status, data = self._connection.select('INBOX', readonly=True)
+                if status != 'OK':
+                    raise imaplib.IMAP4.error(f"EXAMINE INBOX failed: {data}")
+                self._exists = int(data[0]) if data and data[0] else 0
+
+                if connected_before:
+                    # Mail may have arrived while the session was down
+                    self.reconnects += 1
+                    self._notify()
+                connected_before = True
+                backoff = RECONNECT_MIN_SECONDS
+
+                reader = _LineReader(self._connection.sock)
+                self.state = 'idling'
+                while not self._stop.is_set():
+                    self._idle(reader)
+
+            except (imaplib.IMAP4.error, *CONNECTION_ERRORS) as e:
+                if self._stop.is_set():
+                    break
+                print(f"IMAP IDLE session for {self.email_address} dropped: {e}; reconnecting in {backoff}s")
+                self.state = 'reconnecting'
+            finally:
+                self._close()
+
+            if self._stop.wait(backoff):
+                break
+            backoff = min(backoff * 2, RECONNECT_MAX_SECONDS)
+
+        self.state = 'stopped'
+
+    def _idle(self, reader: _LineReader) -> None:
+        self._tags += 1
+        tag = f'{IDLE_TAG_PREFIX}{self._tags}'.encode()
+        self._connection.send(tag + b' IDLE\r\n')
+        while True:
+            line = self._expect(reader)
+            if line.startswith(b'+'):
+                break
+            if line.startswith(tag + b' '):
+                raise imaplib.IMAP4.error(f"IDLE refused: {line!r}")
+            self._untagged(line)
+
+        deadline = time.monotonic() + self.listener.renew_seconds
+        while not self._stop.is_set():
+            line = reader.read_line(deadline - time.monotonic())
+            if line is None:
+                break
+            self._untagged(line)
+        if self._stop.is_set():
+            return
+
+        self._connection.send(b'DONE\r\n')
+        while True:
+            line = self._expect(reader)
+            if line.startswith(tag + b' '):
+                if not line[len(tag) + 1:].upper().startswith(b'OK'):
+                    raise imaplib.IMAP4.error(f"IDLE ended with {line!r}")
+                self.renewals += 1
+                return
+            self._untagged(line)
+
+    def _expect(self, reader: _LineReader) -> bytes:
+        line = reader.read_line(IDLE_RESPONSE_TIMEOUT_SECONDS)
+        if line is None:
+            raise TimeoutError(f"No IDLE response from {self.server} in {IDLE_RESPONSE_TIMEOUT_SECONDS}s")
+        return line
+
+    def _untagged(self, line: bytes) -> None:
+        if line[:5].upper() == b'* BYE':
+            raise imaplib.IMAP4.abort(line.decode('utf-8', errors='replace'))
+        match = UNTAGGED_PATTERN.match(line)
+        if not match:
+            return
+        count = int(match.group(1))
+        if match.group(2).upper() == b'EXPUNGE':
+            self._exists = max(0, self._exists - 1)
+        elif count > self._exists:
+            self._exists = count
+            self._notify()
+        else:
+            self._exists = count
+
+    def _notify(self) -> None:
+        self.notifications += 1
+        try:
+            self.listener.notify(self.email_address)
+        except Exception as e:
+            print(f"Error queueing IMAP notification for {self.email_address}: {e}")
+
+    def _close(self) -> None:
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        try:
+            connection.shutdown()
+        except Exception:
+            pass
+
+class IMAPIdleListener:
+    """
+    Holds an IDLE session per manual account, up to `max_sockets` per process, and calls
+    `notify(email)` when one sees new mail. Accounts over the cap, or on servers without
+    IDLE, are passed to `notify` every `poll_seconds` instead.
+    """
+
+    def __init__(self, notify: Callable[[str], Any], max_sockets: Optional[int] = None, poll_seconds: Optional[float] = None, renew_seconds: float = IDLE_RENEW_SECONDS, pool: Optional[IMAPSessionPool] = None):
+        self.notify = notify
+        # Logs in through the session pool, so IDLE connections share its timeouts and counters
+        self.pool = pool or get_imap_pool()
+        self.max_sockets = max_sockets or env_int(IMAP_IDLE_MAX_SOCKETS_ENV, DEFAULT_IDLE_MAX_SOCKETS)
+        self.poll_seconds = poll_seconds or env_int(IMAP_POLL_SECONDS_ENV, DEFAULT_POLL_SECONDS)
+        self.renew_seconds = renew_seconds
+        self._watchers: Dict[str, IMAPIdleWatcher] = {}
+        self._polled: Set[str] = set()
+        # Servers found without IDLE, not retried until their account changes
+        self._no_idle: Set[IdleAccount] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._poll_thread: Optional[threading.Thread] = None
+
+    def sync_accounts(self, accounts: Dict[str, Tuple[str, str, int]]) -> None:
+        # accounts: email -> (password, imap_server, port) of every active manual account
+        started, stopped = [], []
+        with self._lock:
+            if self._stop.is_set():
+                return
+            for email_address, watcher in list(self._watchers.items()):
+                account = accounts.get(email_address)
+                if account is None or (account[1], account[2]) != (watcher.server, watcher.port) or account[0] != watcher.password:
+                    stopped.append(self._watchers.pop(email_address))
+
+            self._polled = set()
+            for email_address, (password, server, port) in accounts.items():
+                if email_address in self._watchers:
+                    continue
+                if (email_address, server, port) in self._no_idle or len(self._watchers) >= self.max_sockets:
+                    self._polled.add(email_address)
+                    continue
+                watcher = IMAPIdleWatcher(self, email_address, password, server, port)
+                self._watchers[email_address] = watcher
+                started.append(watcher)
+
+            self._no_idle = {key for key in self._no_idle if key[0] in accounts}
+            if self._polled and self._poll_thread is None:
+                self._poll_thread = threading.Thread(target=self._poll_loop, name='imap-idle-poll', daemon=True)
+                self._poll_thread.start()
+
+        for watcher in stopped:
+            watcher.stop()
+        for watcher in started:
+            watcher.start()
+        if started or stopped:
+            print(f"IMAP IDLE: started {len(started)}, stopped {len(stopped)} sessions; {self.stats()}")
+
+    def _degrade(self, watcher: IMAPIdleWatcher) -> None:
+        with self._lock:
+            if self._watchers.get(watcher.email_address) is watcher:
+                del self._watchers[watcher.email_address]
+                self._no_idle.add(watcher.key)
+                self._polled.add(watcher.email_address)
+                if self._poll_thread is None and not self._stop.is_set():
+                    self._poll_thread = threading.Thread(target=self._poll_loop, name='imap-idle-poll', daemon=True)
+                    self._poll_thread.start()
+
+    def _poll_loop(self) -> None:
+        while not self._stop.wait(self.poll_seconds):
+            with self._lock:
+                polled = sorted(self._polled)
+            for email_address in polled:
+                try:
+                    self.notify(email_address)
+                except Exception as e:
+                    print(f"Error queueing IMAP poll for {email_address}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            watchers = list(self._watchers.values())
+            polled = len(self._polled)
+        return {
+            'sessions': len(watchers),
+            'idling': sum(1 for watcher in watchers if watcher.state == 'idling'),
+            'polled': polled,
+            'notifications': sum(watcher.notifications for watcher in watchers),
+            'renewals': sum(watcher.renewals for watcher in watchers),
+            'reconnects': sum(watcher.reconnects for watcher in watchers)
+        }
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._stop.set()
+        with self._lock:
+            watchers = list(self._watchers.values())
+            self._watchers.clear()
+            self._polled.clear()
+        for watcher in watchers:
+            watcher.stop()
+        if wait:
+            for watcher in watchers:
+                watcher.stop(wait=True)
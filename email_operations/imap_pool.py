@@ -0,0 +1,253 @@
+import time
+import imaplib
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from env_config import env_int
+
+# Open IMAP sessions kept per account. Gmail allows 15 simultaneous IMAP connections per
+# account, so the pool stays well under it and the user's own mail clients keep working
+IMAP_POOL_SIZE_ENV = 'CONVOIA_IMAP_POOL_SIZE'
+DEFAULT_IMAP_POOL_SIZE = 2
+
+# Idle sessions are sent a NOOP this often so the server keeps them (RFC 3501 allows it to
+# drop a session after 30 idle minutes), and logged out once unused for the idle timeout,
+# which spans several monitor ticks
+IMAP_KEEPALIVE_SECONDS = 120
+IMAP_IDLE_TIMEOUT_SECONDS = 900
+
+# A session idle longer than this is checked with NOOP before it is handed out
+IMAP_VALIDATE_AFTER_SECONDS = 30
+
+IMAP_CONNECT_TIMEOUT_SECONDS = 30
+IMAP_CHECKOUT_TIMEOUT_SECONDS = 60
+
+# Errors after which a session's connection can't be trusted; imaplib raises abort when
+# the server hangs up and OSError for socket failures and timeouts
+CONNECTION_ERRORS = (imaplib.IMAP4.abort, OSError, EOFError)
+
+SessionKey = Tuple[str, str, int]
+
+class IMAPSession:
+    """
+    A logged-in IMAP connection checked out of the pool. It remembers the selected folder,
+    so selecting it again is free; every other imaplib method goes to the connection.
+    """
+
+    def __init__(self, key: SessionKey, connection: imaplib.IMAP4):
+        self.key = key
+        self.connection = connection
+        self.selected: Optional[Tuple[str, bool]] = None
+        self.last_used = time.monotonic()
+        self.last_noop = self.last_used
+        self._select_response: Optional[Tuple[str, List[Any]]] = None
+
+    def select(self, mailbox: str = 'INBOX', readonly: bool = False, refresh: bool = False) -> Tuple[str, List[Any]]:
+        # refresh sends the SELECT anyway, for callers reading its untagged responses
+        if self.selected == (mailbox, readonly) and not refresh:
+            return self._select_response
+        self.selected = None
+        status, data = self.connection.select(mailbox, readonly)
+        if status == 'OK':
+            self.selected, self._select_response = (mailbox, readonly), (status, data)
+        return status, data
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.connection, name)
+
+class IMAPSessionPool:
+    """
+    Logged-in IMAP sessions per account, checked out by one thread at a time. Sessions are
+    validated before reuse, kept alive while idle, and replaced when their connection fails.
+    """
+
+    def __init__(self, max_per_account: Optional[int] = None, keepalive_seconds: float = IMAP_KEEPALIVE_SECONDS, idle_timeout_seconds: float = IMAP_IDLE_TIMEOUT_SECONDS):
+        self.max_per_account = max_per_account or env_int(IMAP_POOL_SIZE_ENV, DEFAULT_IMAP_POOL_SIZE)
+        self.keepalive_seconds = keepalive_seconds
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self._condition = threading.Condition()
+        self._idle: Dict[SessionKey, List[IMAPSession]] = {}
+        self._open: Dict[SessionKey, int] = {}
+        self._counts = {'logins': 0, 'reused': 0, 'reconnects': 0, 'expired': 0}
+        self._closed = False
+        self._stop = threading.Event()
+        self._keepalive_thread: Optional[threading.Thread] = None
+
+    def _open_connection(self, server: str, port: int) -> imaplib.IMAP4:
+        return imaplib.IMAP4_SSL(server, port, timeout=IMAP_CONNECT_TIMEOUT_SECONDS)
+
+    def login(self, email_address: str, password: str, server: str, port: int = 993) -> imaplib.IMAP4:
+        # Also opens the connections held outside the pool, like the IDLE sessions
+        connection = self._open_connection(server, port)
+        try:
+            connection.login(email_address, password)
+        except Exception:
+            connection.shutdown()
+            raise
+        with self._condition:
+            self._counts['logins'] += 1
+        return connection
+
+    def _connect(self, key: SessionKey, password: str) -> IMAPSession:
+        email_address, server, port = key
+        return IMAPSession(key, self.login(email_address, password, server, port))
+
+    def _alive(self, session: IMAPSession) -> bool:
+        try:
+            status, _ = session.connection.noop()
+            session.last_noop = time.monotonic()
+            return status == 'OK'
+        except Exception:
+            return False
+
+    def _close(self, session: IMAPSession) -> None:
+        try:
+            session.connection.logout()
+        except Exception:
+            try:
+                session.connection.shutdown()
+            except Exception:
+                pass
+
+    def _release_slot(self, key: SessionKey) -> None:
+        with self._condition:
+            self._open[key] -= 1
+            if not self._open[key]:
+                del self._open[key]
+            self._condition.notify_all()
+
+    def _ensure_keepalive(self) -> None:
+        # Called with the condition held
+        if self._keepalive_thread is None:
+            self._keepalive_thread = threading.Thread(target=self._keepalive_loop, name='imap-keepalive', daemon=True)
+            self._keepalive_thread.start()
+
+    def checkout(self, email_address: str, password: str, server: str, port: int = 993) -> IMAPSession:
+        key = (email_address, server, port)
+        deadline = time.monotonic() + IMAP_CHECKOUT_TIMEOUT_SECONDS
+        session = None
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("IMAP session pool is shut down")
+            while True:
+                if self._idle.get(key):
+                    session = self._idle[key].pop()
+                    break
+                if self._open.get(key, 0) < self.max_per_account:
+                    self._open[key] = self._open.get(key, 0) + 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No IMAP session free for {email_address} after {IMAP_CHECKOUT_TIMEOUT_SECONDS}s")
+                self._condition.wait(remaining)
+            self._ensure_keepalive()
+
+        if session is not None:
+            if time.monotonic() - session.last_used < IMAP_VALIDATE_AFTER_SECONDS or self._alive(session):
+                with self._condition:
+                    self._counts['reused'] += 1
+                return session
+            # Dropped by the server; its slot goes to the replacement
+            self._close(session)
+            with self._condition:
+                self._counts['reconnects'] += 1
+
+        try:
+            return self._connect(key, password)
+        except Exception:
+            self._release_slot(key)
+            raise
+
+    def checkin(self, session: IMAPSession, broken: bool = False) -> None:
+        if broken:
+            self._close(session)
+            self._release_slot(session.key)
+            return
+
+        # imaplib only clears untagged responses on SELECT, which reuse skips
+        session.connection.untagged_responses.clear()
+        session.last_used = time.monotonic()
+        self._return_idle(session)
+
+    def _return_idle(self, session: IMAPSession) -> None:
+        with self._condition:
+            if not self._closed:
+                self._idle.setdefault(session.key, []).append(session)
+                self._condition.notify_all()
+                return
+        self._close(session)
+        self._release_slot(session.key)
+
+    @contextmanager
+    def session(self, email_address: str, password: str, server: str, port: int = 993) -> Iterator[IMAPSession]:
+        session = self.checkout(email_address, password, server, port)
+        try:
+            yield session
+        except BaseException as e:
+            # A NO/BAD reply or a caller's own error leaves the connection usable
+            self.checkin(session, broken=isinstance(e, CONNECTION_ERRORS) or not isinstance(e, Exception))
+            raise
+        else:
+            self.checkin(session)
+
+    def _keepalive_loop(self) -> None:
+        while not self._stop.wait(self.keepalive_seconds / 2):
+            now = time.monotonic()
+            due: List[IMAPSession] = []
+            expired: List[IMAPSession] = []
+            with self._condition:
+                for sessions in self._idle.values():
+                    for session in list(sessions):
+                        if now - session.last_used > self.idle_timeout_seconds:
+                            sessions.remove(session)
+                            expired.append(session)
+                        elif now - max(session.last_used, session.last_noop) > self.keepalive_seconds:
+                            sessions.remove(session)
+                            due.append(session)
+                self._counts['expired'] += len(expired)
+
+            for session in expired:
+                self._close(session)
+                self._release_slot(session.key)
+            for session in due:
+                if self._alive(session):
+                    self._return_idle(session)
+                else:
+                    self._close(session)
+                    self._release_slot(session.key)
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            return {
+                'accounts': len(self._open),
+                'open': sum(self._open.values()),
+                'idle': sum(len(sessions) for sessions in self._idle.values()),
+                **self._counts
+            }
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        with self._condition:
+            self._closed = True
+            idle = [session for sessions in self._idle.values() for session in sessions]
+            self._idle.clear()
+        for session in idle:
+            self._close(session)
+            self._release_slot(session.key)
+
+_pool: Optional[IMAPSessionPool] = None
+_pool_lock = threading.Lock()
+
+def get_imap_pool() -> IMAPSessionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = IMAPSessionPool()
+    return _pool
+
+def shutdown_imap_pool() -> None:
+    if _pool is not None:
+        _pool.shutdown()
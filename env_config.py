@@ -0,0 +1,15 @@
+import os
+
+# Values accepted as "on" for the CONVOIA_* feature switches
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+def env_flag(name: str) -> bool:
+    # Off unless set to one of TRUE_VALUES
+    return os.getenv(name, '').strip().lower() in TRUE_VALUES
+
+def env_int(name: str, default: int, minimum: int = 1) -> int:
+    # Unset or unparsable falls back to the default; anything lower is raised to the minimum
+    try:
+        return max(minimum, int(os.getenv(name, default)))
+    except ValueError:
+        return default
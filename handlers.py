@@ -1,5 +1,6 @@
+import asyncio
 from typing import Dict, Any
-from aws.email_automation_preferences import EmailAutomationPreferences
+from aws.async_facade import AsyncEmailAutomationPreferences
 from services.priority_response import ImportantContactsManager
 from services.automated_response import AutomatedResponseCategoryManager
 from services.send_email import EmailSender
@@ -12,7 +13,7 @@ async def send_email(text: str, email: str) -> Dict[str, Any]:
     
     try:
         email_sender = EmailSender()
-        status = email_sender.send_email(email, text)
+        status = await asyncio.to_thread(email_sender.send_email, email, text)
 
         if status:
             return {"status": "success", "message": "✉️ Great! Your email has been sent successfully."}
@@ -27,7 +28,7 @@ async def send_reply_follow_up(text: str, email: str) -> Dict[str, Any]:
     
     try:
         email_replier = EmailReplier()
-        status = email_replier.send_reply(email, text)
+        status = await asyncio.to_thread(email_replier.send_reply, email, text)
 
         if status:
             return {"status": "success", "message": "✅ Perfect! Your reply has been sent successfully."}
@@ -42,7 +43,7 @@ async def summarize_emails(text: str, email: str) -> Dict[str, Any]:
     
     try:
         generator = GenerateSummarization()
-        status, result = generator.generate_summarization(email, text)
+        status, result = await asyncio.to_thread(generator.generate_summarization, email, text)
 
         if status:
             return {"status": "success", "message": f"📝 Here's your email summary:\n\n{result}"}
@@ -57,7 +58,7 @@ async def email_conversational_agent(text: str, email: str) -> Dict[str, Any]:
     
     try:
         generator = EmailConversational_Agent()
-        status, result = generator.email_conversational_agent(email, text)
+        status, result = await asyncio.to_thread(generator.email_conversational_agent, email, text)
 
         if status:
             return {"status": "success", "message": f"💬 {result}"}
@@ -72,7 +73,7 @@ async def add_email_label(text: str, email: str) -> Dict[str, Any]:
     
     try:
         emailLabel = EmailLabel()
-        status = emailLabel.add_label_to_message(email, text)
+        status = await asyncio.to_thread(emailLabel.add_label_to_message, email, text)
 
         if status:
             return {"status": "success", "message": "🏷️ Label added successfully to your email!"}
@@ -87,7 +88,7 @@ async def create_email_label(text: str, email: str) -> Dict[str, Any]:
     
     try:
         emailLabel = EmailLabel()
-        status = emailLabel.create_label(email, text)
+        status = await asyncio.to_thread(emailLabel.create_label, email, text)
 
         if status:
             return {"status": "success", "message": "✨ Great! Your new label has been created."}
@@ -101,8 +102,8 @@ async def create_email_label(text: str, email: str) -> Dict[str, Any]:
 async def enable_follow_up_reminders(text: str, email: str) -> Dict[str, Any]:
     
     try:
-        emailAutomationPreferences = EmailAutomationPreferences()
-        status = emailAutomationPreferences.update_category_status(email, "follow_up_emails", True)
+        emailAutomationPreferences = AsyncEmailAutomationPreferences()
+        status = await emailAutomationPreferences.update_category_status(email, "follow_up_emails", True)
         if status:
             return {"status": "success", "message": "⏰ Follow-up reminders are now turned on! I'll help you stay on top of your emails."}
         else:
@@ -115,8 +116,8 @@ async def enable_follow_up_reminders(text: str, email: str) -> Dict[str, Any]:
 async def disable_follow_up_reminders(text: str, email: str) -> Dict[str, Any]:
     
     try:
-        emailAutomationPreferences = EmailAutomationPreferences()
-        status = emailAutomationPreferences.update_category_status(email, "follow_up_emails", False)
+        emailAutomationPreferences = AsyncEmailAutomationPreferences()
+        status = await emailAutomationPreferences.update_category_status(email, "follow_up_emails", False)
         if status:
             return {"status": "success", "message": "🔕 Follow-up reminders have been turned off. You won't receive any more notifications."}
         else:
@@ -129,8 +130,8 @@ async def disable_follow_up_reminders(text: str, email: str) -> Dict[str, Any]:
 async def enable_important_email_highlighting(text: str, email: str) -> Dict[str, Any]:
     
     try:
-        emailAutomationPreferences = EmailAutomationPreferences()
-        status = emailAutomationPreferences.update_category_status(email, "important_emails", True)
+        emailAutomationPreferences = AsyncEmailAutomationPreferences()
+        status = await emailAutomationPreferences.update_category_status(email, "important_emails", True)
         if status:
             return {"status": "success", "message": "🌟 Important email highlighting is now active! I'll help you spot the key messages."}
         else:
@@ -143,8 +144,8 @@ async def enable_important_email_highlighting(text: str, email: str) -> Dict[str
 async def disable_important_email_highlighting(text: str, email: str) -> Dict[str, Any]:
     
     try:
-        emailAutomationPreferences = EmailAutomationPreferences()
-        status = emailAutomationPreferences.update_category_status(email, "important_emails", False)
+        emailAutomationPreferences = AsyncEmailAutomationPreferences()
+        status = await emailAutomationPreferences.update_category_status(email, "important_emails", False)
         if status:
             return {"status": "success", "message": "💡 Email highlighting has been turned off. All emails will appear normal now."}
         else:
@@ -157,8 +158,8 @@ async def disable_important_email_highlighting(text: str, email: str) -> Dict[st
 async def enable_automated_responses(text: str, email: str) -> Dict[str, Any]:
     
     try:
-        emailAutomationPreferences = EmailAutomationPreferences()
-        status = emailAutomationPreferences.update_category_status(email, "automated_response", True)
+        emailAutomationPreferences = AsyncEmailAutomationPreferences()
+        status = await emailAutomationPreferences.update_category_status(email, "automated_response", True)
         if status:
             return {"status": "success", "message": "🤖 Automated responses are now active! I'll help handle routine emails for you."}
         else:
@@ -171,8 +172,8 @@ async def enable_automated_responses(text: str, email: str) -> Dict[str, Any]:
 async def disable_automated_responses(text: str, email: str) -> Dict[str, Any]:
     
     try:
-        emailAutomationPreferences = EmailAutomationPreferences()
-        status = emailAutomationPreferences.update_category_status(email, "automated_response", False)
+        emailAutomationPreferences = AsyncEmailAutomationPreferences()
+        status = await emailAutomationPreferences.update_category_status(email, "automated_response", False)
         if status:
             return {"status": "success", "message": "📫 Automated responses have been turned off. You'll need to respond to emails manually now."}
         else:
@@ -186,7 +187,7 @@ async def add_important_contacts(text: str, email: str) -> Dict[str, Any]:
     
     try:
         important_contacts_manager = ImportantContactsManager()
-        status = important_contacts_manager.add_important_contact(email, text)
+        status = await asyncio.to_thread(important_contacts_manager.add_important_contact, email, text)
         
         if status:
             return {"status": "success", "message": "👥 Contact added to your VIP list! Their emails will be highlighted."}
@@ -201,7 +202,7 @@ async def remove_important_contacts(text: str, email: str) -> Dict[str, Any]:
     
     try:
         important_contacts_manager = ImportantContactsManager()
-        status = important_contacts_manager.remove_important_contact(email, text)
+        status = await asyncio.to_thread(important_contacts_manager.remove_important_contact, email, text)
         
         if status:
             return {"status": "success", "message": "✂️ Contact removed from your VIP list. Their emails won't be highlighted anymore."}
@@ -216,7 +217,7 @@ async def add_automated_response_categories(text: str, email: str) -> Dict[str,
     
     try:
         automated_response_category_manager = AutomatedResponseCategoryManager()
-        status = automated_response_category_manager.add_categories_to_automated_responses(email, text)
+        status = await asyncio.to_thread(automated_response_category_manager.add_categories_to_automated_responses, email, text)
 
         if status:
             return {"status": "success", "message": "📑 Great! New response category added. I'll use it to help manage your emails."}
@@ -231,7 +232,7 @@ async def remove_automated_response_categories(text: str, email: str) -> Dict[st
     
     try:
         automated_response_category_manager = AutomatedResponseCategoryManager()
-        status = automated_response_category_manager.remove_categories_from_automated_responses(email, text)
+        status = await asyncio.to_thread(automated_response_category_manager.remove_categories_from_automated_responses, email, text)
 
         if status:
             return {"status": "success", "message": "🗑️ Response category removed successfully! It won't be used for automated replies anymore."}
@@ -1,22 +1,24 @@
 import asyncio
-from typing import List
+from typing import List, Optional
 from aws.email_automation_preferences import EmailAutomationPreferences
+from aws.tick_snapshot import TickSnapshot
+from aws.users import get_user_cache
 from services.automated_response import AutomatedResponseMonitor
 from services.priority_response import EmailImportanceAnalyzer
 
-async def execute_automated_response(email_id: str):
+async def execute_automated_response(email_id: str, snapshot: Optional[TickSnapshot] = None):
 
     print(f"\n\nSTARTING TO EXECUTE AUTOMATED RESPONSES FOR: {email_id}\n\n")
 
-    automated_response_monitor = AutomatedResponseMonitor()
+    automated_response_monitor = AutomatedResponseMonitor(snapshot)
     await automated_response_monitor.automated_emails_responses(email_id)
 
     print(f"Executed automated response for email: {email_id}")
 
-async def execute_priority_response(email_id: str):
+async def execute_priority_response(email_id: str, snapshot: Optional[TickSnapshot] = None):
     print(f"\n\nexecute_priority_response: {email_id}\n\n")
     
-    email_importance_analyzer = EmailImportanceAnalyzer()
+    email_importance_analyzer = EmailImportanceAnalyzer(snapshot)
     result = await email_importance_analyzer.automated_priority_response_emails(email_id)
     
     if result:
@@ -24,25 +26,27 @@ async def execute_priority_response(email_id: str):
     else:
         print(f"Failed to execute priority response for email: {email_id}")
 
-async def automated_response() -> None:
+async def automated_response(email_ids: Optional[List[str]] = None, snapshot: Optional[TickSnapshot] = None) -> None:
 
     # Fetch list of email IDs for automated responses
-    email_ids = EmailAutomationPreferences().get_email_ids_with_active_automated_response()
+    if email_ids is None:
+        email_ids = EmailAutomationPreferences().get_email_ids_with_active_automated_response()
     
     # Create tasks for each email ID
-    tasks = [execute_automated_response(email_id) for email_id in email_ids]
+    tasks = [execute_automated_response(email_id, snapshot) for email_id in email_ids]
     
     # Run all automated responses concurrently
     await asyncio.gather(*tasks)
     print("Completed all automated responses")
 
-async def priority_response() -> None:
+async def priority_response(email_ids: Optional[List[str]] = None, snapshot: Optional[TickSnapshot] = None) -> None:
 
     # Fetch list of email IDs for priority handling
-    email_ids = EmailAutomationPreferences().get_email_ids_with_active_important_flag()
+    if email_ids is None:
+        email_ids = EmailAutomationPreferences().get_email_ids_with_active_important_flag()
     
     # Create tasks for each email ID
-    tasks = [execute_priority_response(email_id) for email_id in email_ids]
+    tasks = [execute_priority_response(email_id, snapshot) for email_id in email_ids]
     
     # Run all priority responses concurrently
     await asyncio.gather(*tasks)
@@ -50,12 +54,22 @@ async def priority_response() -> None:
 
 async def hourly():
 
+    # Per-tick user cache counters, DynamoDB user reads should stay at one per user
+    get_user_cache().reset_stats()
+
+    # Load every active user's config once, so per-email checks read from memory
+    preferences = EmailAutomationPreferences()
+    automated_email_ids = preferences.get_email_ids_with_active_automated_response()
+    priority_email_ids = preferences.get_email_ids_with_active_important_flag()
+    snapshot = await asyncio.to_thread(TickSnapshot.load, priority_email_ids, automated_email_ids)
+
     # Create tasks for both main functions
-    automated_task = asyncio.create_task(automated_response())
-    priority_task = asyncio.create_task(priority_response())
+    automated_task = asyncio.create_task(automated_response(automated_email_ids, snapshot))
+    priority_task = asyncio.create_task(priority_response(priority_email_ids, snapshot))
     
     # Run both tasks concurrently
     await asyncio.gather(automated_task, priority_task)
+    print(f"User record cache: {get_user_cache().stats()}")
     print("Hourly tasks completed")
 
 # Run the hourly function
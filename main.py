@@ -11,8 +11,22 @@ from fastapi.middleware.cors import CORSMiddleware
 from scheduler_manager_daywise import DaywiseSchedulerManager
 from scheduler_manager_hourwise import HourwiseSchedulerManager
 from aws.utils import get_all_email_ids
+from aws.async_facade import shutdown_aws_executor
+from aws.write_behind import shutdown_write_behind
+from email_operations.imap_pool import shutdown_imap_pool
+from email_operations.imap_idle import imap_idle_enabled
+from userManagement.mailbox_backfill import get_backfill_progress, resume_backfills
+from push_tasks import (
+    WATCH_RENEWAL_HOURS,
+    push_enabled,
+    verify_push_token,
+    decode_notification,
+    get_push_queue,
+    shutdown_push_queue,
+    shutdown_idle_listener
+)
 
-from fastapi import FastAPI, HTTPException, File, UploadFile
+from fastapi import FastAPI, HTTPException, File, UploadFile, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
@@ -57,6 +71,12 @@ from handlers import (
 # Minute Scheduler
 MINUTE_SCHEDULER = 3
 
+# With Gmail push on, polling only backs up the notifications
+PUSH_FALLBACK_SCHEDULER = 30
+
+# IMAP IDLE sessions pick up newly active manual accounts this often
+IMAP_IDLE_REFRESH_SCHEDULER = 5
+
 # Initialize FastAPI
 
 app = FastAPI()
@@ -92,6 +112,11 @@ def signal_handler(sig, frame):
     print("Shutting down schedulers...")
     hourwise_scheduler.shutdown()
     daywise_scheduler.shutdown()
+    shutdown_aws_executor(wait=False)
+    shutdown_write_behind()
+    shutdown_idle_listener()
+    shutdown_push_queue()
+    shutdown_imap_pool()
     sys.exit(0)
 
 signal.signal(signal.SIGINT, signal_handler)
@@ -122,20 +147,29 @@ async def perform_initialization(email_id: str, mode: str):
     try:
         print("in perform initialzation")
         # Your existing long-running initialization code
-        existing_users_email_ids = get_all_email_ids()
+        existing_users_email_ids = await asyncio.to_thread(get_all_email_ids)
 
         if email_id in existing_users_email_ids:
             print(f"\nModified New User Data Initialization {email_id}\n")
         else:
             print(f"\nNew User Data Initialization {email_id}\n")
 
-        success = init_manager.new_user_initialization(
+        success = await asyncio.to_thread(
+            init_manager.new_user_initialization,
             email_id=email_id,
             mode=mode
         )
     except Exception as e:
         print(f"Error during initialization for {email_id}: {str(e)}")
     
+@app.get("/api/convoia-backfill-progress")
+async def backfill_progress(email_id: str):
+
+    progress = await asyncio.to_thread(get_backfill_progress, email_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail=f"No mailbox backfill found for {email_id}")
+    return progress
+
 @app.post("/api")
 async def process_user_input(request: UserInput):
     
@@ -156,7 +190,7 @@ async def process_user_input(request: UserInput):
         error_message = "Something Went Wrong Please Try Again"
 
         featureMatcher = FeatureMatcher()
-        feature = featureMatcher.get_feature(request.user_input)
+        feature = await asyncio.to_thread(featureMatcher.get_feature, request.user_input)
 
         print(f"\nIdentified feature: {feature}")
         print(f"Available functions: {list(FUNCTION_MAP.keys())}")
@@ -172,7 +206,7 @@ async def process_user_input(request: UserInput):
             print(f"Handler for feature '{feature}' is not callable: {type(handler_function)}")
             return {"response": error_message}
         
-        print(f"Calling handler function: {handler_function._name_}")
+        print(f"Calling handler function: {handler_function.__name__}")
         
         result = await handler_function(
             text=request.user_input,
@@ -190,6 +224,28 @@ async def process_user_input(request: UserInput):
         traceback.print_exc()
         return {"response": error_message}
 
+@app.post("/api/gmail/push")
+async def gmail_push_notification(request: Request, token: str = ""):
+
+    if not push_enabled():
+        raise HTTPException(status_code=404, detail="Gmail push is not enabled")
+    if not verify_push_token(token):
+        raise HTTPException(status_code=403, detail="Invalid push token")
+
+    try:
+        envelope = await request.json()
+    except ValueError:
+        envelope = None
+
+    # Acknowledge everything else with a 2xx, Pub/Sub redelivers on any error
+    notification = decode_notification(envelope)
+    if notification is None:
+        return {"status": "ignored"}
+
+    email_id, history_id = notification
+    queued = get_push_queue().submit(email_id, history_id)
+    return {"status": "queued" if queued else "skipped"}
+
 @app.post("/api/transcribe")
 async def transcribe_audio(file: UploadFile = File(...)):
     try:
@@ -274,8 +330,19 @@ async def text_to_speech(request: TextToSpeechRequest):
     )
 
 # Set up the Schedules
-hourwise_scheduler.schedule_task(interval_minutes=MINUTE_SCHEDULER)  
+if push_enabled():
+    hourwise_scheduler.schedule_push_tasks(fallback_minutes=PUSH_FALLBACK_SCHEDULER, renewal_hours=WATCH_RENEWAL_HOURS)
+    # IDLE notifications share the push queue, so they only run in push mode
+    if imap_idle_enabled():
+        hourwise_scheduler.schedule_imap_idle_tasks(refresh_minutes=IMAP_IDLE_REFRESH_SCHEDULER)
+    else:
+        hourwise_scheduler.schedule_manual_poll(interval_minutes=MINUTE_SCHEDULER)
+else:
+    hourwise_scheduler.schedule_task(interval_minutes=MINUTE_SCHEDULER)
 daywise_scheduler.schedule_task(hour=0, minute=0)
 
+# Continue any mailbox backfill a restart interrupted
+resume_backfills()
+
 # if __name__ == "__main__":
 #     uvicorn.run(app, host="0.0.0.0", port=8080)
@@ -0,0 +1,293 @@
+import os
+import sys
+import hmac
+import json
+import base64
+import asyncio
+import binascii
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from googleapiclient.errors import HttpError
+
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from aws.email_automation_preferences import EmailAutomationPreferences
+from aws.users import get_user_record
+from dataExtraction.gmail.rate_limiter import get_rate_limiter, QUOTA_UNITS
+from dataExtraction.gmail.service_factory import get_gmail_service
+from email_operations.imap_idle import IMAPIdleListener
+from env_config import env_flag, env_int
+from hourly_tasks import execute_automated_response, execute_priority_response
+
+# Off by default; when on, Gmail watch notifications delivered by a Pub/Sub push
+# subscription drive the monitors and the interval poll only backs them up
+GMAIL_PUSH_ENV = 'CONVOIA_GMAIL_PUSH'
+GMAIL_PUSH_TOPIC_ENV = 'CONVOIA_GMAIL_PUSH_TOPIC'
+GMAIL_PUSH_TOKEN_ENV = 'CONVOIA_GMAIL_PUSH_TOKEN'
+GMAIL_PUSH_WORKERS_ENV = 'CONVOIA_GMAIL_PUSH_WORKERS'
+DEFAULT_PUSH_WORKERS = 8
+
+# Watches expire after 7 days; Google recommends renewing once a day
+WATCH_LABEL_IDS = ['INBOX']
+WATCH_RENEWAL_HOURS = 12
+
+# Manual accounts are reached over IMAPS, as in the monitors
+MANUAL_IMAP_PORT = 993
+
+def push_enabled() -> bool:
+    return env_flag(GMAIL_PUSH_ENV)
+
+def verify_push_token(token: Optional[str]) -> bool:
+    # The subscription's push endpoint carries ?token=...; with no token configured every
+    # request is refused, since anyone could otherwise start the pipelines for any account
+    expected = os.getenv(GMAIL_PUSH_TOKEN_ENV, '')
+    if not expected:
+        print(f"{GMAIL_PUSH_TOKEN_ENV} is not set, rejecting Gmail push notification")
+        return False
+    return hmac.compare_digest(token or '', expected)
+
+def decode_notification(envelope: Any) -> Optional[Tuple[str, int]]:
+    # Pub/Sub push body: {"message": {"data": base64(JSON)}, "subscription": ...}, where
+    # Gmail's JSON is {"emailAddress": ..., "historyId": ...}
+    try:
+        data = json.loads(base64.b64decode(envelope['message']['data']))
+        return data['emailAddress'].strip().lower(), int(data['historyId'])
+    except (KeyError, TypeError, ValueError, AttributeError, binascii.Error) as e:
+        print(f"Ignoring malformed Gmail push notification: {e}")
+        return None
+
+def run_push_pipelines(email_id: str) -> bool:
+    # The monitors read from their own history cursors, so a run only sees what changed
+    status = EmailAutomationPreferences().get_automated_response_status(email_id) or {}
+    if not status.get('automated_response') and not status.get('important_emails'):
+        print(f"No active monitors for {email_id}, skipping push notification")
+        return False
+
+    async def run() -> None:
+        tasks = []
+        if status.get('automated_response'):
+            tasks.append(execute_automated_response(email_id))
+        if status.get('important_emails'):
+            tasks.append(execute_priority_response(email_id))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    return True
+
+class PushWorkQueue:
+    """
+    Per-account work queue fed by push notifications. Notifications for an account that is
+    already queued or running are coalesced into one more run, and ones at or below the
+    historyId of the last completed run are dropped, so each account is processed by at
+    most one worker at a time.
+    """
+
+    def __init__(self, workers: int = DEFAULT_PUSH_WORKERS, handler: Callable[[str], Any] = run_push_pipelines):
+        self.handler = handler
+        self._pending: "OrderedDict[str, Optional[int]]" = OrderedDict()
+        self._running: Set[str] = set()
+        self._rerun: Dict[str, Optional[int]] = {}
+        self._synced: Dict[str, int] = {}
+        self._stats: Dict[str, int] = {'received': 0, 'stale': 0, 'coalesced': 0, 'runs': 0, 'failures': 0}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._run, name=f'convoia-gmail-push-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, email: str, history_id: Optional[int] = None) -> bool:
+        # history_id None forces a run, e.g. from the fallback poll; returns False if dropped
+        with self._cond:
+            self._stats['received'] += 1
+            if self._closed:
+                return False
+            if history_id is not None and history_id <= self._synced.get(email, -1):
+                self._stats['stale'] += 1
+                return False
+
+            if email in self._running:
+                queue = self._rerun
+            elif email in self._pending:
+                queue = self._pending
+            else:
+                self._pending[email] = history_id
+                self._cond.notify()
+                return True
+
+            self._stats['coalesced'] += 1
+            queue[email] = _later(queue[email], history_id) if email in queue else history_id
+            return True
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                email, history_id = self._pending.popitem(last=False)
+                self._running.add(email)
+
+            succeeded = False
+            try:
+                self.handler(email)
+                succeeded = True
+            except Exception as e:
+                print(f"Error processing Gmail push for {email}: {e}")
+
+            with self._cond:
+                self._running.discard(email)
+                self._stats['runs'] += 1
+                if not succeeded:
+                    self._stats['failures'] += 1
+                elif history_id is not None:
+                    # The run synced to at least the notified historyId
+                    self._synced[email] = max(self._synced.get(email, -1), history_id)
+
+                if email in self._rerun:
+                    rerun_id = self._rerun.pop(email)
+                    if rerun_id is None or rerun_id > self._synced.get(email, -1):
+                        self._pending[email] = rerun_id
+                        self._cond.notify()
+
+    def idle(self) -> bool:
+        with self._cond:
+            return not self._pending and not self._running
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return dict(self._stats, pending=len(self._pending), running=len(self._running))
+
+    def shutdown(self, wait: bool = True) -> None:
+        # Queued notifications are dropped; the next push or poll picks their changes up
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+def _later(current: Optional[int], history_id: Optional[int]) -> Optional[int]:
+    # A forced run (None) stays forced
+    if current is None or history_id is None:
+        return None
+    return max(current, history_id)
+
+_queue: Optional[PushWorkQueue] = None
+_queue_lock = threading.Lock()
+
+def get_push_queue() -> PushWorkQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = PushWorkQueue(env_int(GMAIL_PUSH_WORKERS_ENV, DEFAULT_PUSH_WORKERS))
+    return _queue
+
+def shutdown_push_queue(wait: bool = False) -> None:
+    if _queue is not None:
+        _queue.shutdown(wait)
+
+def _active_email_ids() -> List[str]:
+    preferences = EmailAutomationPreferences()
+    email_ids = preferences.get_email_ids_with_active_automated_response()
+    email_ids += preferences.get_email_ids_with_active_important_flag()
+    return list(dict.fromkeys(email_ids))
+
+def enqueue_active_accounts(mode: Optional[str] = None) -> int:
+    # Polls in push mode go through the queue, so they never overlap a push run
+    email_ids = _active_email_ids()
+    if mode is not None:
+        users = {email_id: get_user_record(email_id) for email_id in email_ids}
+        email_ids = [email_id for email_id, user in users.items() if user is not None and user.mode == mode]
+    queue = get_push_queue()
+    for email_id in email_ids:
+        queue.submit(email_id)
+    print(f"Queued {len(email_ids)} {mode or 'active'} accounts for polling: {queue.stats()}")
+    return len(email_ids)
+
+def enqueue_manual_accounts() -> int:
+    # Gmail push only covers oauth accounts; manual ones keep the interval poll
+    return enqueue_active_accounts(mode='manual')
+
+def watch_mailbox(email: str, topic_name: str) -> Optional[Dict[str, Any]]:
+
+    try:
+        get_rate_limiter(email).acquire(QUOTA_UNITS['watch'])
+        response = get_gmail_service(email).users().watch(
+            userId='me',
+            body={
+                'topicName': topic_name,
+                'labelIds': WATCH_LABEL_IDS,
+                'labelFilterBehavior': 'include'
+            }
+        ).execute()
+        print(f"Watching {email} from history {response.get('historyId')} until {response.get('expiration')}")
+        return response
+
+    except HttpError as e:
+        error_details = {
+            'status_code': e.resp.status,
+            'reason': e.resp.reason,
+            'error_message': str(e)
+        }
+        print(f"Gmail API Error: {error_details}")
+        return None
+    except Exception as e:
+        print(f"Error watching mailbox for {email}: {e}")
+        return None
+
+def renew_gmail_watches() -> int:
+    # users.watch is idempotent, re-calling it extends the existing watch
+    topic_name = os.getenv(GMAIL_PUSH_TOPIC_ENV)
+    if not topic_name:
+        print(f"{GMAIL_PUSH_TOPIC_ENV} is not set, skipping Gmail watch renewal")
+        return 0
+
+    renewed = 0
+    for email_id in _active_email_ids():
+        user = get_user_record(email_id)
+        if user is None or user.mode != 'oauth':
+            continue
+        if watch_mailbox(email_id, topic_name) is not None:
+            renewed += 1
+
+    print(f"Renewed {renewed} Gmail watches")
+    return renewed
+
+_idle_listener: Optional[IMAPIdleListener] = None
+_idle_listener_lock = threading.Lock()
+
+def get_idle_listener() -> IMAPIdleListener:
+    # IMAP IDLE sessions feed the same queue as Gmail push, so a manual account's new mail
+    # is handled like an oauth account's notification
+    global _idle_listener
+    if _idle_listener is None:
+        with _idle_listener_lock:
+            if _idle_listener is None:
+                _idle_listener = IMAPIdleListener(lambda email_id: get_push_queue().submit(email_id))
+    return _idle_listener
+
+def shutdown_idle_listener() -> None:
+    if _idle_listener is not None:
+        _idle_listener.shutdown()
+
+def refresh_idle_accounts() -> int:
+    # Starts sessions for newly active manual accounts and closes those no longer active
+    accounts = {}
+    for email_id in _active_email_ids():
+        user = get_user_record(email_id)
+        if user is None or user.mode != 'manual' or not user.password or not user.imap_server:
+            continue
+        accounts[email_id] = (user.password, user.imap_server, MANUAL_IMAP_PORT)
+
+    listener = get_idle_listener()
+    listener.sync_accounts(accounts)
+    print(f"IMAP IDLE covers {len(accounts)} manual accounts: {listener.stats()}")
+    return len(accounts)
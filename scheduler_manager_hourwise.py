@@ -2,6 +2,8 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 import logging
 from hourly_tasks import hourly
+from push_tasks import enqueue_active_accounts, enqueue_manual_accounts, refresh_idle_accounts, renew_gmail_watches
+from datetime import datetime
 import asyncio
 
 logging.basicConfig()
@@ -31,6 +33,60 @@ class HourwiseSchedulerManager:
         except Exception as e:
             print(f"Error scheduling hourly task: {str(e)}")
 
+    def schedule_push_tasks(self, fallback_minutes: int, renewal_hours: int):
+
+        # Push mode: notifications drive the monitors, a slow poll catches any that were lost
+        try:
+            self.scheduler.add_job(
+                func=enqueue_active_accounts,
+                trigger=IntervalTrigger(minutes=fallback_minutes),
+                id='push_fallback_task',
+                name='Push Fallback Poll',
+                replace_existing=True
+            )
+            self.scheduler.add_job(
+                func=renew_gmail_watches,
+                trigger=IntervalTrigger(hours=renewal_hours),
+                id='gmail_watch_renewal',
+                name='Gmail Watch Renewal',
+                next_run_time=datetime.now(),
+                replace_existing=True
+            )
+            print(f"\nScheduled push fallback poll every {fallback_minutes} minutes and watch renewal every {renewal_hours} hours\n")
+        except Exception as e:
+            print(f"Error scheduling push tasks: {str(e)}")
+
+    def schedule_manual_poll(self, interval_minutes: int):
+
+        # Manual accounts have no Gmail push; without IMAP IDLE they are polled as before
+        try:
+            self.scheduler.add_job(
+                func=enqueue_manual_accounts,
+                trigger=IntervalTrigger(minutes=interval_minutes),
+                id='manual_poll_task',
+                name='Manual Account Poll',
+                replace_existing=True
+            )
+            print(f"\nScheduled manual account poll every {interval_minutes} minutes\n")
+        except Exception as e:
+            print(f"Error scheduling manual account poll: {str(e)}")
+
+    def schedule_imap_idle_tasks(self, refresh_minutes: int):
+
+        # IDLE sessions follow the active manual accounts, starting with the current ones
+        try:
+            self.scheduler.add_job(
+                func=refresh_idle_accounts,
+                trigger=IntervalTrigger(minutes=refresh_minutes),
+                id='imap_idle_refresh',
+                name='IMAP IDLE Account Refresh',
+                next_run_time=datetime.now(),
+                replace_existing=True
+            )
+            print(f"\nScheduled IMAP IDLE account refresh every {refresh_minutes} minutes\n")
+        except Exception as e:
+            print(f"Error scheduling IMAP IDLE tasks: {str(e)}")
+
     def shutdown(self):
 
         self.scheduler.shutdown()
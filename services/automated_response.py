@@ -2,7 +2,8 @@ import asyncio
 import os
 import sys
 from pathlib import Path
-from typing import Dict
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
 
 # Pydantic imports
 from pydantic import BaseModel, Field
@@ -20,10 +21,12 @@ sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 # Custom imports
 from aws.automated_response import AutomatedResponseManager
+from aws.tick_snapshot import TickSnapshot
 from aws.utils import fetch_tokens, get_user_credentials
 from email_operations.gmail import GmailAutomation
 from dataExtraction.gmail.message_details import GmailMessageDetailsFetcher
-from dataExtraction.gmail.message_ids import GmailMessageFetcher
+from dataExtraction.gmail.history_sync import GmailHistorySync
+from dataExtraction.custom.imap_sync import IMAPFolderSync
 from email_operations.custom import EmailClient
 
 from dotenv import load_dotenv
@@ -233,7 +236,10 @@ class ResponseOutput(BaseModel):
 
 class AutomatedResponseMonitor:
     
-    def __init__(self):
+    def __init__(self, snapshot: Optional[TickSnapshot] = None):
+
+        # Tick-wide config loaded once by hourly(); without it categories are queried per user
+        self.snapshot = snapshot
 
         try:
             self.openai_api_key = os.environ.get('OPENAI_API_KEY')
@@ -279,6 +285,16 @@ class AutomatedResponseMonitor:
             print(f"Error initializing AutomatedResponseMonitor: {e}")
             raise
     
+    def _get_category_config(self, user_email: str, response_manager: AutomatedResponseManager) -> Tuple[Optional[Dict[str, str]], Optional[Dict[str, str]]]:
+
+        config = self.snapshot.get(user_email) if self.snapshot is not None else None
+        if config is not None:
+            return dict(config.categories), dict(config.response_directives)
+
+        categories_dict = response_manager.get_categories_with_descriptions(user_email)
+        response_dict = response_manager.get_categories_with_response_directive(user_email)
+        return categories_dict, response_dict
+
     async def _generate_email_response(self, response_format: str, message_subject: str, message_body: str, max_retries: int = 3) -> str:
 
         try:
@@ -405,20 +421,21 @@ class AutomatedResponseMonitor:
             if user_details.get('mode') == 'oauth':
                 
                 # Initialize necessary components
-                message_fetcher = GmailMessageFetcher(user_email)
+                history_sync = GmailHistorySync(user_email, 'automated_response', resync_window=timedelta(minutes=num_prev_mins))
                 details_fetcher = GmailMessageDetailsFetcher(user_email)
                 response_manager = AutomatedResponseManager()
                 
-                # Fetch recent message IDs
-                message_ids = message_fetcher.fetch_message_ids_by_prev_mins(num_prev_mins)
-                print(f"\n\nMessage IDs from the past 3 mins: {message_ids}\n\n")
+                # Messages added since the last tick's history cursor
+                changes = history_sync.fetch_changes()
+                message_ids = changes.added_message_ids()
+                print(f"\n\nMessage IDs since the last sync: {message_ids}\n\n")
 
                 if not message_ids:
+                    history_sync.save_cursor(changes)
                     return True
                 
                 # Get categories
-                categories_dict = response_manager.get_categories_with_descriptions(user_email)
-                response_dict = response_manager.get_categories_with_response_directive(user_email)
+                categories_dict, response_dict = self._get_category_config(user_email, response_manager)
 
                 print(f"\n\ncategories_dict: {categories_dict}\n\nresponse_dict: {response_dict}\n\n")
                 
@@ -433,7 +450,7 @@ class AutomatedResponseMonitor:
                         # Fetch message details
                         message_details = details_fetcher.fetch_message_details_condensed(message_id)
                         message_subject = message_details['subject']
-                        message_body = message_details['body'].get('plain_text', '') or message_details['body'].get('html_text', '')
+                        message_body = message_details['body'].get('plain_text', '')
                         
                         print(f"\n\nmessage_subject: {message_subject}\n\nmessage_body: {message_body}\n\n")
                         # Format email content
@@ -468,6 +485,7 @@ class AutomatedResponseMonitor:
                         print(f"Error processing message {message_id}: {e}")
                         pass
                 
+                history_sync.save_cursor(changes)
                 return True
 
             elif user_details.get('mode') == 'manual':
@@ -484,17 +502,18 @@ class AutomatedResponseMonitor:
                     imap_port=imap_port
                 )
 
-                # Fetch recent message IDs
-                message_ids = client.get_recent_message_ids(num_prev_mins)
-                print(f"\n\nMessage IDs from the past 3 mins: {message_ids}\n\n")
+                # Messages above the last tick's UID in the inbox
+                imap_sync = IMAPFolderSync(user_email, 'automated_response', resync_window=timedelta(minutes=num_prev_mins))
+                message_ids, changes = client.get_new_message_ids(imap_sync)
+                print(f"\n\nMessage UIDs since the last sync: {message_ids}\n\n")
                 
                 if not message_ids:
+                    imap_sync.save_cursor(changes)
                     return True
                 
                 # Get categories
                 response_manager = AutomatedResponseManager()
-                categories_dict = response_manager.get_categories_with_descriptions(user_email)
-                response_dict = response_manager.get_categories_with_response_directive(user_email)
+                categories_dict, response_dict = self._get_category_config(user_email, response_manager)
 
                 print(f"\n\ncategories_dict: {categories_dict}\n\nresponse_dict: {response_dict}\n\n")
                 
@@ -544,6 +563,7 @@ class AutomatedResponseMonitor:
                         print(f"Error processing message {message_id}: {e}")
                         pass
                 
+                imap_sync.save_cursor(changes)
                 return True
 
             else:
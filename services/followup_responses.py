@@ -17,6 +17,7 @@ from aws.utils import fetch_tokens
 from email_operations.gmail import GmailAutomation
 from vectorDatabase.pinecone_chatbot_handler import Chatbot
 from dataExtraction.gmail.data_extraction import GmailDataExtractor
+from dataExtraction.snapshot import iter_snapshot, remove_files
 
 # Load OpenAI API key from .env file
 load_dotenv()
@@ -243,17 +244,19 @@ class FollowUpEmailMonitor:
                     raise FollowUpError("Failed to setup Gmail automation")
 
                 extractor = GmailDataExtractor(user_email)
-                json_file_path = extractor.fetch_email_threads(
+                snapshot_file_path = extractor.fetch_email_threads(
                     num_prev_days or self.config.num_prev_days
                 )
-
-                with open(json_file_path, 'r', encoding='utf-8') as file:
-                    threads = json.load(file)
-                    
-                for thread in threads:
-                    if self._process_single_thread(thread, gmail_automation):
-                        return True
-                return False
+                if not snapshot_file_path:
+                    return False
+
+                try:
+                    for thread in iter_snapshot(snapshot_file_path):
+                        if self._process_single_thread(thread, gmail_automation):
+                            return True
+                    return False
+                finally:
+                    remove_files(snapshot_file_path)
                 
             # Handle Manual mode
             elif mode == 'manual':
@@ -2,6 +2,7 @@ import os
 import sys
 import asyncio
 from pathlib import Path
+from datetime import timedelta
 from typing import Optional
 
 # Environment and third-party imports
@@ -14,9 +15,11 @@ sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 # Custom imports
 from aws.automated_priority_response import ImportantEmailManager
+from aws.tick_snapshot import TickSnapshot, UserAutomationConfig
 from aws.utils import fetch_tokens, get_user_credentials
 from dataExtraction.gmail.message_details import GmailMessageDetailsFetcher
-from dataExtraction.gmail.message_ids import GmailMessageFetcher
+from dataExtraction.gmail.history_sync import GmailHistorySync
+from dataExtraction.custom.imap_sync import IMAPFolderSync
 from email_operations.gmail import GmailAutomation
 from services.send_email import EmailGenerator, EmailID_Extractor
 from email_operations.custom import EmailClient
@@ -75,8 +78,14 @@ class ImportantContactsManager:
 
 class EmailImportanceAnalyzer:
 
-    def __init__(self):
-        pass
+    def __init__(self, snapshot: Optional[TickSnapshot] = None):
+        # Tick-wide config loaded once by hourly(); without it each check queries DynamoDB
+        self.snapshot = snapshot
+
+    def _snapshot_config(self, email_id: str) -> Optional[UserAutomationConfig]:
+        if self.snapshot is None:
+            return None
+        return self.snapshot.get(email_id)
 
     def check_keywords(self, text: str, email_id: str) -> bool:
 
@@ -85,8 +94,12 @@ class EmailImportanceAnalyzer:
         
         text = text.lower()
 
-        important_email_manager = ImportantEmailManager()
-        important_keywords = important_email_manager.get_keywords_for_email(email_id)
+        config = self._snapshot_config(email_id)
+        if config is not None:
+            important_keywords = config.keywords
+        else:
+            important_email_manager = ImportantEmailManager()
+            important_keywords = important_email_manager.get_keywords_for_email(email_id) or []
         print(f"\n\nDefault important_keywords : {important_keywords}\n\n")
         important_keywords = [keyword.lower() for keyword in important_keywords]
 
@@ -94,8 +107,12 @@ class EmailImportanceAnalyzer:
 
     def check_sender(self, email_sender: str, email_id: str) -> bool:
 
-        important_email_manager = ImportantEmailManager()
-        important_contacts = important_email_manager.get_senders_for_email(email_id)
+        config = self._snapshot_config(email_id)
+        if config is not None:
+            important_contacts = config.senders
+        else:
+            important_email_manager = ImportantEmailManager()
+            important_contacts = important_email_manager.get_senders_for_email(email_id) or []
         print(f"\n\nDefault important_contacts : {important_contacts}\n\n")
 
         return email_sender.lower() in [contact.lower() for contact in important_contacts]
@@ -176,16 +193,19 @@ class EmailImportanceAnalyzer:
 
             if user_details.get('mode') == 'oauth':
 
-                message_fetcher = GmailMessageFetcher(user_email)
+                history_sync = GmailHistorySync(user_email, 'priority_response', resync_window=timedelta(minutes=num_prev_mins))
                 details_fetcher = GmailMessageDetailsFetcher(user_email)
                 gmail_automation = GmailAutomation(user_email, refresh_token, access_token)
                 
-                message_ids = message_fetcher.fetch_message_ids_by_prev_mins(num_prev_mins)
-                print(f"\n\nMessage IDs from the past 3 mins: {message_ids}\n\n")
+                # Messages added since the last tick's history cursor
+                changes = history_sync.fetch_changes()
+                message_ids = changes.added_message_ids()
+                print(f"\n\nMessage IDs since the last sync: {message_ids}\n\n")
 
                 gmail_automation.create_label(label_name)
 
                 if not message_ids:
+                    history_sync.save_cursor(changes)
                     return True
                 
                 for message_id in message_ids:
@@ -193,7 +213,7 @@ class EmailImportanceAnalyzer:
                         message_details = details_fetcher.fetch_message_essentials(message_id)
                         
                         message_subject = message_details['subject']
-                        message_body = message_details['body'].get('plain_text', '') or message_details['body'].get('html_text', '')
+                        message_body = message_details['body'].get('plain_text', '')
                         sender_email = message_details['sender_email']
 
                         print(f"\n\nImportant message_subject: {message_subject}\n\nImportant message_body: {message_body}\n\nsender_email: {sender_email}\n\n")
@@ -239,6 +259,7 @@ class EmailImportanceAnalyzer:
                         print(f"Error in priority email response monitoring: {e}\n\n{message_id}")
                         continue
                     
+                history_sync.save_cursor(changes)
                 return True
 
             elif user_details.get('mode') == 'manual':
@@ -255,13 +276,15 @@ class EmailImportanceAnalyzer:
                     imap_port=imap_port
                 )
 
-                # Fetch recent message IDs
-                message_ids = client.get_recent_message_ids(num_prev_mins)
-                print(f"\n\nMessage IDs from the past 3 mins: {message_ids}\n\n")
+                # Messages above the last tick's UID in the inbox
+                imap_sync = IMAPFolderSync(user_email, 'priority_response', resync_window=timedelta(minutes=num_prev_mins))
+                message_ids, changes = client.get_new_message_ids(imap_sync)
+                print(f"\n\nMessage UIDs since the last sync: {message_ids}\n\n")
 
                 client.create_label(label_name)
                 
                 if not message_ids:
+                    imap_sync.save_cursor(changes)
                     return True
                 
                 for message_id in message_ids:
@@ -317,6 +340,7 @@ class EmailImportanceAnalyzer:
                         print(f"Error in priority email response monitoring: {e}\n\n{message_id}")
                         continue
                     
+                imap_sync.save_cursor(changes)
                 return True
                
             else:
@@ -0,0 +1,331 @@
+import sys
+import time
+import uuid
+import queue
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from dataExtraction.gmail.data_extraction import GmailDataExtractor
+from vectorDatabase.data_preprocessing import DataPreprocessor
+from vectorDatabase.pinecone_chatbot_handler import Chatbot
+
+# Items each queue between two stages holds; with them full, upstream stages wait, so memory
+# stays bounded whatever the mailbox size
+PIPELINE_QUEUE_SIZE = 64
+
+# Same chunking and upsert batch as Chatbot.upload_file
+CHUNK_SIZE = 1000
+EMBED_BATCH_SIZE = 100
+EMBED_WORKERS = 4
+
+THREAD_SEPARATOR = "=" * 58
+
+_DONE = object()
+
+class StageStats:
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items_in = 0
+        self.items_out = 0
+        self.busy_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, items_out: int, seconds: float) -> None:
+        with self.lock:
+            self.items_in += 1
+            self.items_out += items_out
+            self.busy_seconds += seconds
+
+    def record_finish(self, items_out: int) -> None:
+        with self.lock:
+            self.items_out += items_out
+
+    def as_dict(self, elapsed: float) -> Dict[str, Any]:
+        return {
+            'stage': self.name,
+            'workers': self.workers,
+            'items_in': self.items_in,
+            'items_out': self.items_out,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'items_per_second': round(self.items_in / elapsed, 1) if elapsed else 0.0
+        }
+
+class Stage:
+    """
+    One step of the pipeline. `process` maps an item to zero or more items for the next
+    stage; `finish` emits whatever a stateful stage still holds once its input has ended.
+    """
+
+    name = 'stage'
+    workers = 1
+
+    def process(self, item: Any) -> Iterable[Any]:
+        raise NotImplementedError
+
+    def finish(self) -> Iterable[Any]:
+        return ()
+
+class NormalizeStage(Stage):
+    # Raw Gmail messages of a thread -> the thread record DataPreprocessor formats
+    name = 'normalize'
+
+    def __init__(self, extractor: GmailDataExtractor):
+        self.extractor = extractor
+
+    def process(self, item):
+        thread = self.extractor.transform_thread(item)
+        if thread is None:
+            return ()
+        thread.pop('sort_timestamp', None)
+        return (thread,)
+
+class FormatStage(Stage):
+    name = 'format'
+
+    def __init__(self):
+        self.preprocessor = DataPreprocessor('')
+
+    def process(self, item):
+        return (self.preprocessor.format_thread(item) + "\n",)
+
+class ChunkStage(Stage):
+    # Fixed-size chunks across thread boundaries, exactly as slicing the whole text file would
+    name = 'chunk'
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self._buffer = ''
+
+    def process(self, item):
+        text = self._buffer + item
+        cut = len(text) - len(text) % self.chunk_size
+        self._buffer = text[cut:]
+        return [text[i:i + self.chunk_size] for i in range(0, cut, self.chunk_size)]
+
+    def finish(self):
+        text = self._buffer + THREAD_SEPARATOR
+        self._buffer = ''
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+
+class BatchStage(Stage):
+    # Numbers chunks and groups them for one embeddings call and one upsert each
+    name = 'batch'
+
+    def __init__(self, batch_size: int = EMBED_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._batch: List[Dict[str, Any]] = []
+        self._count = 0
+
+    def process(self, item):
+        self._batch.append({'chunk_number': self._count, 'text': item})
+        self._count += 1
+        if len(self._batch) < self.batch_size:
+            return ()
+        batch, self._batch = self._batch, []
+        return (batch,)
+
+    def finish(self):
+        return (self._batch,) if self._batch else ()
+
+class EmbedStage(Stage):
+    name = 'embed'
+
+    def __init__(self, chatbot: Chatbot, source: str, workers: int = EMBED_WORKERS):
+        self.chatbot = chatbot
+        self.source = source
+        self.workers = workers
+
+    def process(self, item):
+        embeddings = self.chatbot.create_embeddings([chunk['text'] for chunk in item])
+        return ([
+            {
+                # Stable per source, so ingesting a source again overwrites its vectors
+                'id': f"{self.source}_{chunk['chunk_number']}",
+                'values': embedding,
+                'metadata': {
+                    'text': chunk['text'],
+                    'source': self.source,
+                    'chunk_number': chunk['chunk_number']
+                }
+            }
+            for chunk, embedding in zip(item, embeddings)
+        ],)
+
+class UpsertStage(Stage):
+    name = 'upsert'
+
+    def __init__(self, chatbot: Chatbot, namespace: str, workers: int = 2):
+        self.chatbot = chatbot
+        self.namespace = namespace
+        self.workers = workers
+        self.vectors = 0
+        self.uploaded = 0
+        self._lock = threading.Lock()
+
+    def process(self, item):
+        uploaded = self.chatbot.upsert_vectors(item, self.namespace)
+        with self._lock:
+            self.vectors += len(item)
+            self.uploaded += uploaded
+        return ()
+
+class IngestionPipeline:
+    """
+    Streams threads from a source through bounded queues into the vector index, every stage
+    on its own thread(s) so fetching, formatting, embedding and upserting overlap. The first
+    stage error stops the run and is raised from `run`.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = PIPELINE_QUEUE_SIZE):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.stats = [StageStats('fetch', 1)] + [StageStats(stage.name, stage.workers) for stage in stages]
+        self.elapsed = 0.0
+        self._failed = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+
+    def _fail(self, error: BaseException) -> None:
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._failed.set()
+
+    def _put(self, target: queue.Queue, item: Any) -> bool:
+        while not self._failed.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue) -> Any:
+        while not self._failed.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _feed(self, source: Iterable[Any], output: queue.Queue) -> None:
+        stats = self.stats[0]
+        try:
+            iterator = iter(source)
+            while not self._failed.is_set():
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                stats.record(1, time.perf_counter() - started)
+                if not self._put(output, item):
+                    return
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._put(output, _DONE)
+
+    def _work(self, stage: Stage, stats: StageStats, input: queue.Queue, output: Optional[queue.Queue], remaining: List[int]) -> None:
+        try:
+            while True:
+                item = self._get(input)
+                if item is _DONE:
+                    # Let the stage's other workers see the end too
+                    self._put(input, _DONE)
+                    break
+                started = time.perf_counter()
+                results = list(stage.process(item))
+                stats.record(len(results), time.perf_counter() - started)
+                if output is not None:
+                    for result in results:
+                        if not self._put(output, result):
+                            return
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            with self._lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                try:
+                    if not self._failed.is_set():
+                        results = list(stage.finish())
+                        stats.record_finish(len(results))
+                        for result in results:
+                            if output is not None:
+                                self._put(output, result)
+                except BaseException as e:
+                    self._fail(e)
+                if output is not None:
+                    self._put(output, _DONE)
+
+    def run(self, source: Iterable[Any]) -> List[Dict[str, Any]]:
+
+        started = time.perf_counter()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = [threading.Thread(target=self._feed, args=(source, queues[0]), name='ingest-fetch', daemon=True)]
+
+        for index, stage in enumerate(self.stages):
+            output = queues[index + 1] if index + 1 < len(queues) else None
+            remaining = [stage.workers]
+            for worker in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work,
+                    args=(stage, self.stats[index + 1], queues[index], output, remaining),
+                    name=f'ingest-{stage.name}-{worker}',
+                    daemon=True
+                ))
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.elapsed = time.perf_counter() - started
+        report = self.report()
+        for line in report:
+            print(f"Ingestion {line['stage']:>9}: {line['items_in']} in, {line['items_out']} out, "
+                  f"{line['items_per_second']}/s, busy {line['busy_seconds']}s x{line['workers']}")
+
+        if self._error is not None:
+            raise self._error
+        return report
+
+    def report(self) -> List[Dict[str, Any]]:
+        return [stats.as_dict(self.elapsed) for stats in self.stats]
+
+def ingest_threads(threads: Iterable[Any], namespace: str, source: str, extractor: Optional[GmailDataExtractor] = None, chatbot: Optional[Chatbot] = None) -> int:
+
+    # `threads` are raw Gmail threads when an extractor is given to normalize them, else
+    # already-normalized thread records (IMAP extraction, snapshots). Raises unless every
+    # chunk made it into the index, so callers never advance a cursor past lost threads
+    chatbot = chatbot or Chatbot()
+    upsert = UpsertStage(chatbot, namespace)
+    stages: List[Stage] = [NormalizeStage(extractor)] if extractor is not None else []
+    stages += [FormatStage(), ChunkStage(), BatchStage(), EmbedStage(chatbot, source), upsert]
+
+    IngestionPipeline(stages).run(threads)
+    print(f"Ingested {upsert.uploaded}/{upsert.vectors} chunks into namespace '{namespace}'")
+    if upsert.uploaded != upsert.vectors:
+        raise RuntimeError(f"Only {upsert.uploaded}/{upsert.vectors} chunks were uploaded to namespace '{namespace}'")
+    return upsert.uploaded
+
+def ingest_gmail_threads(email: str, thread_ids: List[str], source: Optional[str] = None, chatbot: Optional[Chatbot] = None) -> int:
+    extractor = GmailDataExtractor(email)
+    failed: Set[str] = set()
+    uploaded = ingest_threads(
+        extractor.iter_threads(thread_ids, failed=failed),
+        namespace=email.split('@')[0],
+        source=source or f"{email}.{uuid.uuid4().hex[:12]}",
+        extractor=extractor,
+        chatbot=chatbot
+    )
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(thread_ids)} threads could not be fetched for {email}")
+    return uploaded
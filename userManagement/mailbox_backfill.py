@@ -0,0 +1,391 @@
+import os
+import sys
+import time
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+# Google API imports
+from googleapiclient.errors import HttpError
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from aws.users import get_gmail_history_id, save_gmail_history_id
+from dataExtraction.gmail.data_extraction import GmailDataExtractor
+from dataExtraction.gmail.rate_limiter import get_rate_limiter, QUOTA_UNITS
+from dataExtraction.gmail.service_factory import get_gmail_service
+from env_config import env_int
+from userManagement.ingestion_pipeline import ingest_threads
+from vectorDatabase.pinecone_chatbot_handler import Chatbot
+
+# Local SQLite file holding backfill checkpoints; keep it on a volume that survives deploys
+BACKFILL_DB_ENV = 'CONVOIA_BACKFILL_DB'
+BACKFILL_RECENT_DAYS_ENV = 'CONVOIA_BACKFILL_RECENT_DAYS'
+DEFAULT_BACKFILL_DB = 'backfill_state.db'
+DEFAULT_RECENT_DAYS = 30
+
+LIST_PAGE_SIZE = 500
+UPLOAD_CHUNK_THREADS = 200
+
+# The newest mail is indexed first, so the assistant is useful before the older mail is in
+RECENT = 'recent'
+OLDER = 'older'
+PHASES = (RECENT, OLDER)
+
+RUNNING = 'running'
+COMPLETE = 'complete'
+FAILED = 'failed'
+
+# The daily extraction continues from where the backfill started
+DAILY_EXTRACTION_CONSUMER = 'daily_extraction'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS backfill_jobs (
+    email TEXT PRIMARY KEY,
+    mode TEXT NOT NULL,
+    status TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    cutoff INTEGER NOT NULL,
+    page_token TEXT,
+    listing_done INTEGER NOT NULL DEFAULT 0,
+    threads_listed INTEGER NOT NULL DEFAULT 0,
+    threads_done INTEGER NOT NULL DEFAULT 0,
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS backfill_threads (
+    email TEXT NOT NULL,
+    thread_id TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (email, thread_id)
+);
+"""
+
+class BackfillStore:
+    """
+    SQLite checkpoints for mailbox backfills: one job row per account with its phase and
+    next page token, and one row per listed thread, flagged once it has been uploaded.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv(BACKFILL_DB_ENV, DEFAULT_BACKFILL_DB)
+        with self._transaction() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # A connection per call, so worker threads never share one
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_job(self, email: str) -> Optional[Dict[str, Any]]:
+        with self._transaction() as conn:
+            row = conn.execute('SELECT * FROM backfill_jobs WHERE email = ?', (email,)).fetchone()
+        return dict(row) if row else None
+
+    def create_job(self, email: str, mode: str, cutoff: int) -> Dict[str, Any]:
+        # An existing job is kept as is, so a repeated initialization resumes it
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT OR IGNORE INTO backfill_jobs (email, mode, status, phase, cutoff, started_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (email, mode, RUNNING, RECENT, cutoff, now, now)
+            )
+        return self.get_job(email)
+
+    def incomplete_jobs(self) -> List[Dict[str, Any]]:
+        with self._transaction() as conn:
+            rows = conn.execute('SELECT * FROM backfill_jobs WHERE status != ?', (COMPLETE,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def record_page(self, email: str, phase: str, thread_ids: List[str], next_page_token: Optional[str]) -> int:
+        # Threads and the token after them land together, so a page is never half-recorded
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO backfill_threads (email, thread_id, phase) VALUES (?, ?, ?)',
+                [(email, thread_id, phase) for thread_id in thread_ids]
+            )
+            inserted = conn.total_changes - before
+            conn.execute(
+                'UPDATE backfill_jobs SET page_token = ?, listing_done = ?, threads_listed = threads_listed + ?, '
+                'updated_at = ? WHERE email = ?',
+                (next_page_token, int(next_page_token is None), inserted, time.time(), email)
+            )
+        return inserted
+
+    def pending_threads(self, email: str, phases: Tuple[str, ...], limit: int, after: int = 0) -> List[Tuple[int, str]]:
+        # (rowid, thread_id) in listing order; `after` skips rows a run has already tried
+        placeholders = ', '.join('?' * len(phases))
+        with self._transaction() as conn:
+            rows = conn.execute(
+                f'SELECT rowid, thread_id FROM backfill_threads WHERE email = ? AND phase IN ({placeholders}) '
+                'AND done = 0 AND rowid > ? ORDER BY rowid LIMIT ?',
+                (email, *phases, after, limit)
+            ).fetchall()
+        return [(row['rowid'], row['thread_id']) for row in rows]
+
+    def pending_count(self, email: str) -> int:
+        with self._transaction() as conn:
+            row = conn.execute('SELECT COUNT(*) FROM backfill_threads WHERE email = ? AND done = 0', (email,)).fetchone()
+        return row[0]
+
+    def mark_done(self, email: str, thread_ids: List[str]) -> None:
+        with self._transaction() as conn:
+            conn.executemany(
+                'UPDATE backfill_threads SET done = 1 WHERE email = ? AND thread_id = ?',
+                [(email, thread_id) for thread_id in thread_ids]
+            )
+            conn.execute(
+                'UPDATE backfill_jobs SET threads_done = threads_done + ?, updated_at = ? WHERE email = ?',
+                (len(thread_ids), time.time(), email)
+            )
+
+    def start_phase(self, email: str, phase: str) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE backfill_jobs SET phase = ?, page_token = NULL, listing_done = 0, updated_at = ? WHERE email = ?',
+                (phase, time.time(), email)
+            )
+
+    def set_status(self, email: str, status: str, error: Optional[str] = None) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE backfill_jobs SET status = ?, error = ?, updated_at = ? WHERE email = ?',
+                (status, error, time.time(), email)
+            )
+            if status == COMPLETE:
+                # Only the job row's counters are kept once everything is in
+                conn.execute('DELETE FROM backfill_threads WHERE email = ?', (email,))
+
+class MailboxBackfill:
+    """
+    Resumable full-mailbox backfill for a Gmail account. Thread ids are listed a page at a
+    time into the checkpoint store and uploaded in chunks; after a crash or restart the run
+    picks up at the first thread not yet uploaded, and at the saved page token. Mail from the
+    last `recent_days` goes first.
+    """
+
+    def __init__(self, email: str, mode: str = 'oauth', store: Optional[BackfillStore] = None, recent_days: Optional[int] = None, chunk_size: int = UPLOAD_CHUNK_THREADS):
+
+        self.email = email
+        self.mode = mode
+        self.store = store or get_backfill_store()
+        self.recent_days = recent_days or env_int(BACKFILL_RECENT_DAYS_ENV, DEFAULT_RECENT_DAYS)
+        self.chunk_size = chunk_size
+        self.namespace = email.split('@')[0]
+        self._service = None
+        self._extractor: Optional[GmailDataExtractor] = None
+        self._chatbot: Optional[Chatbot] = None
+
+    def run(self, phases: Tuple[str, ...] = PHASES) -> bool:
+
+        if not _claim(self.email):
+            print(f"Backfill already running for {self.email}")
+            return False
+
+        try:
+            job = self.store.get_job(self.email)
+            if job is None:
+                cutoff = int((datetime.now() - timedelta(days=self.recent_days)).timestamp())
+                self._seed_daily_cursor()
+                job = self.store.create_job(self.email, self.mode, cutoff)
+            elif job['status'] == COMPLETE:
+                return True
+            self.store.set_status(self.email, RUNNING)
+
+            for phase in PHASES[PHASES.index(job['phase']):]:
+                if phase not in phases:
+                    break
+                self._run_phase(phase, job['cutoff'])
+                if phase != PHASES[-1]:
+                    self.store.start_phase(self.email, PHASES[PHASES.index(phase) + 1])
+            else:
+                # Threads Gmail wouldn't return stay pending, and the job open, for the next resume
+                pending = self.store.pending_count(self.email)
+                if pending:
+                    print(f"Backfill for {self.email} left {pending} threads pending: {self.progress()}")
+                    self.store.set_status(self.email, FAILED, f"{pending} threads could not be fetched")
+                    return False
+                self.store.set_status(self.email, COMPLETE)
+                print(f"Backfill complete for {self.email}: {self.progress()}")
+            return True
+
+        except Exception as e:
+            # The checkpoint stays; the next run carries on from it
+            print(f"Backfill failed for {self.email}: {e}")
+            self.store.set_status(self.email, FAILED, str(e))
+            return False
+        finally:
+            _release(self.email)
+
+    def progress(self) -> Optional[Dict[str, Any]]:
+        return get_backfill_progress(self.email, self.store)
+
+    def _run_phase(self, phase: str, cutoff: int) -> None:
+
+        # Threads an earlier phase or run left pending are retried first, once per run
+        phases = PHASES[:PHASES.index(phase) + 1]
+        after = 0
+
+        while True:
+            # Threads already listed go first; only then is the next page fetched
+            pending = self.store.pending_threads(self.email, phases, self.chunk_size, after)
+            if pending:
+                after = pending[-1][0]
+                thread_ids = [thread_id for _, thread_id in pending]
+                failed = self._upload(thread_ids)
+                self.store.mark_done(self.email, [thread_id for thread_id in thread_ids if thread_id not in failed])
+                print(f"Backfill {self.email} ({phase}): {self.progress()}")
+                continue
+
+            job = self.store.get_job(self.email)
+            if job['listing_done']:
+                return
+
+            thread_ids, next_page_token = self._list_page(phase, cutoff, job['page_token'])
+            self.store.record_page(self.email, phase, thread_ids, next_page_token)
+
+    def _authenticate(self) -> None:
+
+        try:
+            # Shared per-account service; credentials and discovery are cached by the factory
+            self._service = get_gmail_service(self.email)
+
+        except (ValueError, HttpError) as e:
+            print(f"Authentication error: {e}")
+            raise
+
+    def _list_page(self, phase: str, cutoff: int, page_token: Optional[str]) -> Tuple[List[str], Optional[str]]:
+
+        try:
+            # Ensure authentication
+            if not self._service:
+                self._authenticate()
+
+            get_rate_limiter(self.email).acquire(QUOTA_UNITS['threads.list'])
+            query = f'after:{cutoff}' if phase == RECENT else f'before:{cutoff}'
+            results = self._service.users().threads().list(
+                userId='me',
+                q=query,
+                maxResults=LIST_PAGE_SIZE,
+                pageToken=page_token
+            ).execute()
+
+            thread_ids = [thread['id'] for thread in results.get('threads', [])]
+            return thread_ids, results.get('nextPageToken')
+
+        except HttpError as e:
+            error_details = {
+                'status_code': e.resp.status,
+                'reason': e.resp.reason,
+                'error_message': str(e)
+            }
+            print(f"Gmail API Error: {error_details}")
+            raise
+
+    def _upload(self, thread_ids: List[str]) -> Set[str]:
+
+        if self._extractor is None:
+            self._extractor = GmailDataExtractor(self.email)
+            self._chatbot = Chatbot()
+
+        # Uploaded before the chunk is marked done: a crash in between uploads it again, and
+        # as the source follows from the chunk's threads, the replay overwrites the same
+        # vectors. A failed upload raises; threads that couldn't be fetched are returned
+        failed: Set[str] = set()
+        chunk_key = hashlib.sha1(','.join(thread_ids).encode('utf-8')).hexdigest()[:16]
+        ingest_threads(
+            self._extractor.iter_threads(thread_ids, failed=failed),
+            namespace=self.namespace,
+            source=f"{self.email}.backfill.{chunk_key}",
+            extractor=self._extractor,
+            chatbot=self._chatbot
+        )
+        if failed:
+            print(f"Backfill {self.email}: {len(failed)} threads could not be fetched and stay pending")
+        return failed
+
+    def _seed_daily_cursor(self) -> None:
+
+        # Changes from here on reach the index through the daily history sync
+        if get_gmail_history_id(self.email, DAILY_EXTRACTION_CONSUMER) is not None:
+            return
+        if not self._service:
+            self._authenticate()
+        history_id = self._service.users().getProfile(userId='me').execute().get('historyId')
+        if history_id:
+            save_gmail_history_id(self.email, DAILY_EXTRACTION_CONSUMER, history_id)
+
+_store: Optional[BackfillStore] = None
+_store_lock = threading.Lock()
+_active: Set[str] = set()
+
+def get_backfill_store() -> BackfillStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = BackfillStore()
+    return _store
+
+def _claim(email: str) -> bool:
+    with _store_lock:
+        if email in _active:
+            return False
+        _active.add(email)
+        return True
+
+def _release(email: str) -> None:
+    with _store_lock:
+        _active.discard(email)
+
+def get_backfill_progress(email: str, store: Optional[BackfillStore] = None) -> Optional[Dict[str, Any]]:
+
+    job = (store or get_backfill_store()).get_job(email)
+    if job is None:
+        return None
+
+    return {
+        'email': email,
+        'status': job['status'],
+        'phase': job['phase'],
+        'recent_complete': job['phase'] != RECENT or job['status'] == COMPLETE,
+        'listing_complete': bool(job['listing_done']) and job['phase'] == PHASES[-1],
+        'threads_listed': job['threads_listed'],
+        'threads_done': job['threads_done'],
+        'running': email in _active,
+        'started_at': datetime.fromtimestamp(job['started_at']).isoformat(),
+        'updated_at': datetime.fromtimestamp(job['updated_at']).isoformat(),
+        'error': job['error']
+    }
+
+def start_background_backfill(email: str, mode: str = 'oauth') -> threading.Thread:
+    thread = threading.Thread(
+        target=MailboxBackfill(email, mode).run,
+        name=f'convoia-backfill-{email}',
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+def resume_backfills() -> int:
+    # Called on startup: continues every backfill a crash or deploy interrupted
+    jobs = get_backfill_store().incomplete_jobs()
+    for job in jobs:
+        print(f"Resuming backfill for {job['email']} at {job['phase']} ({job['threads_done']}/{job['threads_listed']} threads)")
+        start_background_backfill(job['email'], job['mode'])
+    return len(jobs)
@@ -3,11 +3,13 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
-from dataExtraction.gmail.data_extraction import GmailDataExtractor
+from dataExtraction.gmail.history_sync import GmailHistorySync
 from dataExtraction.custom.data_extraction import customEmailDataExtractor
+from dataExtraction.custom.imap_sync import IMAPFolderSync
+from userManagement.mailbox_backfill import MailboxBackfill, RECENT, start_background_backfill
 from aws.utils import get_manual_email_password
-from vectorDatabase.data_preprocessing import DataPreprocessor
-from vectorDatabase.pinecone_chatbot_handler import Chatbot
+from dataExtraction.snapshot import iter_snapshot, remove_files
+from userManagement.ingestion_pipeline import ingest_gmail_threads, ingest_threads
 
 class UserDataExtractor:
 
@@ -18,30 +20,28 @@ class UserDataExtractor:
 
         try:
 
-            # if mode == "oauth": 
-            #     gmailDataExtractor = GmailDataExtractor(email_id)
-            #     json_file_path = gmailDataExtractor.fetch_email_threads()
-            
-            # elif mode == "manual":
-            #     email_address = email_id
-            #     password = get_manual_email_password(email_address)
-            #     fetcher = customEmailDataExtractor(email_address, password)
-            #     json_file_path = fetcher.fetch_email_threads()
-
-            # dataPreprocessor = DataPreprocessor(json_file_path)
-            # txt_file_path = dataPreprocessor.convert()
+            if mode == "oauth":
+                # The recent mail is indexed before returning; older mail follows in the
+                # background, resumable from its checkpoint if the process restarts
+                backfill = MailboxBackfill(email_id, mode)
+                if not backfill.run(phases=(RECENT,)):
+                    return False
+                start_background_backfill(email_id, mode)
+                return True
 
-            txt_file_path = "subhraturning@gmail.com.txt"
+            email_address = email_id
+            password = get_manual_email_password(email_address)
+            fetcher = customEmailDataExtractor(email_address, password)
+            snapshot_file_path = fetcher.fetch_email_threads()
 
-            chatbot = Chatbot()
             namespace = email_id.split('@')[0]
 
             print(f"namespace: {namespace}")
-            
-            chatbot.upload_file(txt_file_path, namespace)
 
-            # os.remove(json_file_path)
-            # os.remove(txt_file_path)
+            try:
+                ingest_threads(iter_snapshot(snapshot_file_path), namespace, os.path.basename(snapshot_file_path))
+            finally:
+                remove_files(snapshot_file_path)
 
             return True
         
@@ -54,24 +54,37 @@ class UserDataExtractor:
         try:
 
             if mode == "oauth": 
-                gmailDataExtractor = GmailDataExtractor(email_id)
-                json_file_path = gmailDataExtractor.fetch_email_threads()
+                # Only threads that changed since the last daily run are extracted again
+                history_sync = GmailHistorySync(email_id, 'daily_extraction')
+                changes = history_sync.fetch_changes()
+                thread_ids = changes.changed_thread_ids()
+
+                if not thread_ids:
+                    history_sync.save_cursor(changes)
+                    return True
+
+                # Threads stream from Gmail into the index; nothing is written to disk. A
+                # failed upload raises, so the cursor stays and the next run retries them
+                ingest_gmail_threads(email_id, thread_ids)
+                history_sync.save_cursor(changes)
             
             elif mode == "manual":
                 email_address = email_id
                 password = get_manual_email_password(email_address)
                 fetcher = customEmailDataExtractor(email_address, password)
-                json_file_path = fetcher.fetch_email_threads(1)
 
-            dataPreprocessor = DataPreprocessor(json_file_path)
-            txt_file_path = dataPreprocessor.convert()
+                # Only mail that arrived since the last daily run, per folder
+                snapshot_file_path, folder_changes = fetcher.fetch_new_email_threads('daily_extraction')
 
-            chatbot = Chatbot()
-            namespace = email_id.split('@')[0]
-            chatbot.upload_file(txt_file_path, namespace)
+                # Snapshot paths are unique per run, so nothing else is reading them
+                try:
+                    if any(changes.new_uids for changes in folder_changes):
+                        ingest_threads(iter_snapshot(snapshot_file_path), email_id.split('@')[0], os.path.basename(snapshot_file_path))
+                finally:
+                    remove_files(snapshot_file_path)
 
-            # os.remove(json_file_path)
-            # os.remove(txt_file_path)
+                for changes in folder_changes:
+                    IMAPFolderSync(email_id, 'daily_extraction', changes.folder).save_cursor(changes)
 
             return True
         
@@ -1,5 +1,10 @@
 import json
 import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from dataExtraction.snapshot import is_snapshot, iter_snapshot
 
 class DataPreprocessor:
     
@@ -59,21 +64,22 @@ class DataPreprocessor:
     def convert(self):
 
         try:
-            # Read JSON data
-            with open(self.input_path, 'r', encoding='utf-8') as file:
-                self.email_data = json.load(file)
-            
-            # Format all threads
-            formatted_content = []
-            for thread in self.email_data:
-                formatted_content.append(self.format_thread(thread))
-            
-            # Add final separator
-            formatted_content.append("=" * 58)
+            # Thread snapshots are streamed a thread at a time; legacy JSON files are read whole
+            if is_snapshot(self.input_path):
+                threads = iter_snapshot(self.input_path)
+            else:
+                with open(self.input_path, 'r', encoding='utf-8') as file:
+                    self.email_data = json.load(file)
+                threads = self.email_data
             
-            # Write to output file
+            # Format each thread straight into the output file
             with open(self.output_path, 'w', encoding='utf-8') as file:
-                file.write("\n".join(formatted_content))
+                for thread in threads:
+                    file.write(self.format_thread(thread))
+                    file.write("\n")
+                
+                # Add final separator
+                file.write("=" * 58)
             
             return self.output_path
             
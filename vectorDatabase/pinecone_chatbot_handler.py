@@ -1,6 +1,6 @@
 import os
 import uuid
-from typing import List
+from typing import Any, Dict, List
 from openai import OpenAI
 from dotenv import load_dotenv
 from pinecone import Pinecone
@@ -36,6 +36,49 @@ class Chatbot:
             print(f"Error creating embedding: {str(e)}")
             raise
     
+    def create_embeddings(self, texts: List[str]) -> List[List[float]]:
+        try:
+            # One request for the whole list; the API returns them tagged with their index
+            response = self.openai_client.embeddings.create(
+                input=texts,
+                model="text-embedding-ada-002"
+            )
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except Exception as e:
+            print(f"Error creating embeddings: {str(e)}")
+            raise
+
+    def upsert_vectors(self, batch_vectors: List[Dict[str, Any]], namespace: str) -> int:
+
+        try:
+            self.index.upsert(vectors=batch_vectors, namespace=namespace)
+            print(f"Uploaded batch of {len(batch_vectors)} vectors")
+            return len(batch_vectors)
+        except Exception as batch_error:
+            print(f"Error uploading batch: {str(batch_error)}")
+            
+            # If the batch is still too large, reduce size and retry with smaller batches
+            if "message length too large" not in str(batch_error).lower():
+                return 0
+
+            half_batch = len(batch_vectors) // 2
+            if half_batch == 0:
+                print("Cannot reduce batch size further, skipping problematic vectors")
+                return 0
+
+            print(f"Batch too large, retrying with smaller batches of {half_batch}")
+            successful_uploads = 0
+            
+            # Split batch and retry
+            for half in (batch_vectors[:half_batch], batch_vectors[half_batch:]):
+                try:
+                    self.index.upsert(vectors=half, namespace=namespace)
+                    successful_uploads += len(half)
+                    print(f"Uploaded half-batch of {len(half)} vectors")
+                except Exception as e:
+                    print(f"Error uploading half-batch: {str(e)}")
+            return successful_uploads
+
     def upload_file(self, file_path: str, namespace: str, chunk_size: int = 1000, batch_size: int = 100) -> None:
 
         try:
@@ -66,41 +109,9 @@ class Chatbot:
                 
                 # Upload when batch is full or on the last chunk
                 if len(batch_vectors) >= batch_size or i == total_chunks - 1:
-                    try:
-                        self.index.upsert(vectors=batch_vectors, namespace=namespace)
-                        successful_uploads += len(batch_vectors)
-                        print(f"Uploaded batch of {len(batch_vectors)} vectors ({successful_uploads}/{total_chunks} total)")
-                        batch_vectors = []  # Reset batch after successful upload
-                    except Exception as batch_error:
-                        print(f"Error uploading batch: {str(batch_error)}")
-                        
-                        # If the batch is still too large, reduce size and retry with smaller batches
-                        if "message length too large" in str(batch_error).lower():
-                            half_batch = len(batch_vectors) // 2
-                            if half_batch > 0:
-                                print(f"Batch too large, retrying with smaller batches of {half_batch}")
-                                
-                                # Split batch and retry
-                                first_half = batch_vectors[:half_batch]
-                                second_half = batch_vectors[half_batch:]
-                                
-                                try:
-                                    self.index.upsert(vectors=first_half, namespace=namespace)
-                                    successful_uploads += len(first_half)
-                                    print(f"Uploaded first half-batch of {len(first_half)} vectors")
-                                except Exception as e:
-                                    print(f"Error uploading first half-batch: {str(e)}")
-                                
-                                try:
-                                    self.index.upsert(vectors=second_half, namespace=namespace)
-                                    successful_uploads += len(second_half)
-                                    print(f"Uploaded second half-batch of {len(second_half)} vectors")
-                                except Exception as e:
-                                    print(f"Error uploading second half-batch: {str(e)}")
-                            else:
-                                print("Cannot reduce batch size further, skipping problematic vectors")
-                        
-                        batch_vectors = []  # Reset batch after handling the error
+                    successful_uploads += self.upsert_vectors(batch_vectors, namespace)
+                    print(f"{successful_uploads}/{total_chunks} chunks uploaded")
+                    batch_vectors = []  # Reset batch after upload
             
             print(f"Completed upload process. Successfully uploaded {successful_uploads}/{total_chunks} chunks to namespace '{namespace}'")
             return successful_uploads == total_chunks  # Return True if all chunks were uploaded